@@ -0,0 +1,97 @@
+"""Add daily analytics rollup tables
+
+Revision ID: 003_add_analytics_rollups
+Revises: 002_add_delivery_date
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003_add_analytics_rollups'
+down_revision = '002_add_delivery_date'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create rollup tables; backfill with `python manage.py rebuild-rollups`."""
+
+    op.create_table('analytics_daily_order_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rollup_date', sa.Date(), nullable=False),
+        sa.Column('hour', sa.Integer(), nullable=False),
+        sa.Column('customer_type', sa.String(50), nullable=False, server_default=''),
+        sa.Column('area', sa.String(50), nullable=False, server_default=''),
+        sa.Column('driver_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'uq_daily_order_rollup',
+        'analytics_daily_order_rollups',
+        ['rollup_date', 'hour', 'customer_type', 'area', 'driver_id', 'status'],
+        unique=True
+    )
+    op.create_index(
+        'idx_daily_order_rollup_date_status',
+        'analytics_daily_order_rollups',
+        ['rollup_date', 'status']
+    )
+
+    op.create_table('analytics_daily_product_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rollup_date', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('customer_type', sa.String(50), nullable=False, server_default=''),
+        sa.Column('area', sa.String(50), nullable=False, server_default=''),
+        sa.Column('driver_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('amount', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'uq_daily_product_rollup',
+        'analytics_daily_product_rollups',
+        ['rollup_date', 'product_id', 'customer_type', 'area', 'driver_id', 'status'],
+        unique=True
+    )
+    op.create_index(
+        'idx_daily_product_rollup_date_status',
+        'analytics_daily_product_rollups',
+        ['rollup_date', 'status']
+    )
+
+    op.create_table('analytics_daily_customer_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rollup_date', sa.Date(), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'uq_daily_customer_rollup',
+        'analytics_daily_customer_rollups',
+        ['rollup_date', 'customer_id', 'status'],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('uq_daily_customer_rollup', 'analytics_daily_customer_rollups')
+    op.drop_table('analytics_daily_customer_rollups')
+    op.drop_index('idx_daily_product_rollup_date_status', 'analytics_daily_product_rollups')
+    op.drop_index('uq_daily_product_rollup', 'analytics_daily_product_rollups')
+    op.drop_table('analytics_daily_product_rollups')
+    op.drop_index('idx_daily_order_rollup_date_status', 'analytics_daily_order_rollups')
+    op.drop_index('uq_daily_order_rollup', 'analytics_daily_order_rollups')
+    op.drop_table('analytics_daily_order_rollups')
@@ -0,0 +1,36 @@
+"""Add customer balance ledger
+
+Revision ID: 004_add_customer_balance_ledger
+Revises: 003_add_analytics_rollups
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004_add_customer_balance_ledger'
+down_revision = '003_add_analytics_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create the ledger; backfill with `python manage.py reconcile-balances`."""
+
+    op.create_table('customer_balance_ledger',
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('credit_limit', sa.Float(), nullable=True),
+        sa.Column('is_credit_blocked', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('unpaid_order_amount', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('receivable_amount', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('reconciled_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+        sa.PrimaryKeyConstraint('customer_id')
+    )
+
+
+def downgrade():
+    op.drop_table('customer_balance_ledger')
@@ -0,0 +1,38 @@
+"""Add next_run_at to order templates for the template scheduler
+
+Revision ID: 005_add_template_next_run_at
+Revises: 004_add_customer_balance_ledger
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005_add_template_next_run_at'
+down_revision = '004_add_customer_balance_ledger'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('order_templates', sa.Column('next_run_at', sa.DateTime(), nullable=True))
+
+    # Orders are created one day ahead of delivery (TEMPLATE_LEAD_TIME)
+    op.execute(
+        "UPDATE order_templates SET next_run_at = next_scheduled_date - INTERVAL '1 day' "
+        "WHERE is_recurring AND next_scheduled_date IS NOT NULL"
+    )
+
+    op.create_index(
+        'idx_order_templates_next_run_at',
+        'order_templates',
+        ['next_run_at'],
+        postgresql_where=sa.text('is_active AND is_recurring')
+    )
+
+
+def downgrade():
+    op.drop_index('idx_order_templates_next_run_at', 'order_templates')
+    op.drop_column('order_templates', 'next_run_at')
@@ -0,0 +1,59 @@
+"""Add invoice number blocks for block-allocated invoice sequences
+
+Revision ID: 006_add_invoice_number_blocks
+Revises: 005_add_template_next_run_at
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_add_invoice_number_blocks'
+down_revision = '005_add_template_next_run_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('invoice_number_blocks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sequence_id', sa.Integer(), nullable=False),
+        sa.Column('year_month', sa.String(length=6), nullable=False),
+        sa.Column('prefix', sa.String(length=2), nullable=False),
+        sa.Column('range_start', sa.Integer(), nullable=False),
+        sa.Column('range_end', sa.Integer(), nullable=False),
+        sa.Column('used_until', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='active'),
+        sa.Column('worker_id', sa.String(length=100), nullable=False),
+        sa.Column('allocated_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('released_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['sequence_id'], ['invoice_sequences.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_invoice_number_blocks_id', 'invoice_number_blocks', ['id'])
+    op.create_index('idx_invoice_number_blocks_period', 'invoice_number_blocks', ['year_month', 'prefix'])
+    op.create_index('idx_invoice_number_blocks_allocated_at', 'invoice_number_blocks', ['allocated_at'])
+
+    # A fully allocated sequence points one past its range
+    op.drop_constraint('check_current_number_in_range', 'invoice_sequences', type_='check')
+    op.create_check_constraint(
+        'check_current_number_in_range',
+        'invoice_sequences',
+        'current_number >= range_start AND current_number <= range_end + 1'
+    )
+
+
+def downgrade():
+    op.drop_constraint('check_current_number_in_range', 'invoice_sequences', type_='check')
+    op.create_check_constraint(
+        'check_current_number_in_range',
+        'invoice_sequences',
+        'current_number >= range_start AND current_number <= range_end'
+    )
+
+    op.drop_index('idx_invoice_number_blocks_allocated_at', table_name='invoice_number_blocks')
+    op.drop_index('idx_invoice_number_blocks_period', table_name='invoice_number_blocks')
+    op.drop_index('ix_invoice_number_blocks_id', table_name='invoice_number_blocks')
+    op.drop_table('invoice_number_blocks')
@@ -0,0 +1,48 @@
+"""Add notification outbox
+
+Revision ID: 007_add_notification_outbox
+Revises: 006_add_invoice_number_blocks
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '007_add_notification_outbox'
+down_revision = '006_add_invoice_number_blocks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # notification tables may predate the migrations (created by create_all)
+    channel = postgresql.ENUM('SMS', 'EMAIL', 'PUSH', 'IN_APP', name='notificationchannel', create_type=False)
+    channel.create(op.get_bind(), checkfirst=True)
+
+    op.create_table('notification_outbox',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('channel', channel, nullable=False),
+        sa.Column('recipient', sa.String(length=255), nullable=False),
+        sa.Column('notification_type', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'PROCESSING', 'SENT', 'FAILED', name='outboxstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_notification_outbox_due', 'notification_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('idx_notification_outbox_due', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
+    sa.Enum(name='outboxstatus').drop(op.get_bind(), checkfirst=True)
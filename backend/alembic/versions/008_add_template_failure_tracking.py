@@ -0,0 +1,31 @@
+"""Record template scheduler failures on order templates
+
+Revision ID: 008_add_template_failure_tracking
+Revises: 007_add_notification_outbox
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_template_failure_tracking'
+down_revision = '007_add_notification_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'order_templates',
+        sa.Column('failure_count', sa.Integer(), nullable=False, server_default='0')
+    )
+    op.add_column('order_templates', sa.Column('last_error', sa.Text(), nullable=True))
+    op.add_column('order_templates', sa.Column('last_failed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('order_templates', 'last_failed_at')
+    op.drop_column('order_templates', 'last_error')
+    op.drop_column('order_templates', 'failure_count')
@@ -0,0 +1,44 @@
+"""Add the order type dimension to the daily order rollups
+
+Revision ID: 009_add_rollup_order_type
+Revises: 008_add_template_failure_tracking
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_add_rollup_order_type'
+down_revision = '008_add_template_failure_tracking'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Existing rows count as regular; rebuild with `python manage.py rebuild-rollups`."""
+    op.add_column(
+        'analytics_daily_order_rollups',
+        sa.Column('order_type', sa.String(20), nullable=False, server_default='regular')
+    )
+    op.drop_index('uq_daily_order_rollup', 'analytics_daily_order_rollups')
+    op.create_index(
+        'uq_daily_order_rollup',
+        'analytics_daily_order_rollups',
+        ['rollup_date', 'hour', 'customer_type', 'area', 'driver_id', 'order_type', 'status'],
+        unique=True
+    )
+
+
+def downgrade():
+    # Rows differing only by order type would collide; rebuild afterwards
+    op.execute("DELETE FROM analytics_daily_order_rollups")
+    op.drop_index('uq_daily_order_rollup', 'analytics_daily_order_rollups')
+    op.drop_column('analytics_daily_order_rollups', 'order_type')
+    op.create_index(
+        'uq_daily_order_rollup',
+        'analytics_daily_order_rollups',
+        ['rollup_date', 'hour', 'customer_type', 'area', 'driver_id', 'status'],
+        unique=True
+    )
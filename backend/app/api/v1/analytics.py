@@ -3,10 +3,11 @@ Route analytics API endpoints - MVP version.
 """
 
 import logging
-from datetime import date, timedelta
-from typing import Dict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user, get_db
@@ -14,6 +15,7 @@ from app.core.api_utils import handle_api_errors, require_roles, success_respons
 from app.core.decorators import rate_limit
 from app.models.user import User
 from app.schemas.user import UserRole
+from app.services.report_job_service import REPORT_MEDIA_TYPES, report_job_queue
 from app.services.route_analytics_service import route_analytics_service
 
 router = APIRouter()
@@ -204,3 +206,66 @@ async def get_top_drivers(
     drivers_data = {"date": today.isoformat(), "top_drivers": enhanced_drivers}
     
     return success_response(data=drivers_data, message="最佳司機資料獲取成功")
+
+
+@router.post("/reports")
+@handle_api_errors({
+    ValueError: "無效的報表參數"
+})
+@require_roles([UserRole.MANAGER, UserRole.SUPER_ADMIN, UserRole.OFFICE_STAFF])
+async def request_report(
+    report_type: str = Query(..., pattern="^(executive|financial)$"),
+    format: str = Query("excel", pattern="^(excel|csv)$"),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    email: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+) -> Dict:
+    """
+    Queue a report for background generation.
+
+    Progress and completion are pushed over the websocket (report.progress /
+    report.ready); identical requests share one job and its artifact.
+    """
+    job = await report_job_queue.submit(
+        report_type,
+        format,
+        datetime.combine(start_date, time.min),
+        datetime.combine(end_date, time.max),
+        str(current_user.id),
+        email=email,
+    )
+    return success_response(data=job.to_dict(), message="報表已排入產生佇列")
+
+
+@router.get("/reports/{job_id}")
+@require_roles([UserRole.MANAGER, UserRole.SUPER_ADMIN, UserRole.OFFICE_STAFF])
+async def get_report_job(
+    job_id: str, current_user: User = Depends(get_current_user)
+) -> Dict:
+    """Get the status and progress of a report job."""
+    # Other users' jobs look the same as missing ones
+    if not report_job_queue.can_access(job_id, str(current_user.id)):
+        raise HTTPException(status_code=404, detail="找不到報表工作")
+
+    job = report_job_queue.get(job_id)
+    return success_response(data=job.to_dict(), message="報表狀態獲取成功")
+
+
+@router.get("/reports/{job_id}/download")
+@require_roles([UserRole.MANAGER, UserRole.SUPER_ADMIN, UserRole.OFFICE_STAFF])
+async def download_report(job_id: str, current_user: User = Depends(get_current_user)):
+    """Download a finished report."""
+    if not report_job_queue.can_access(job_id, str(current_user.id)):
+        raise HTTPException(status_code=404, detail="找不到報表工作")
+
+    path = report_job_queue.artifact_path(job_id)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="報表尚未產生完成")
+
+    extension = path.suffix.lstrip(".")
+    return FileResponse(
+        path,
+        media_type=REPORT_MEDIA_TYPES[extension],
+        filename=f"report_{job_id[:8]}.{extension}",
+    )
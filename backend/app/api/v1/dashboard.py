@@ -7,11 +7,12 @@ from datetime import datetime, timedelta, date
 from typing import Any, Dict
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, text
+from sqlalchemy import or_, text
 
 from app.core.database import get_db
-from app.models import Order, Customer, Driver, OrderStatus, UserRole, User
+from app.models import UserRole, User
 from app.api.deps import get_current_user
+from app.services.dashboard_summary_service import DashboardSummaryService
 
 router = APIRouter()
 
@@ -38,98 +39,11 @@ def get_dashboard_summary(
     - Recent activities
     """
     
-    # Get today's date
-    today = date.today()
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-    
-    # Calculate today's orders
-    today_orders = db.query(func.count(Order.id)).filter(
-        and_(
-            Order.order_date >= today,
-            Order.order_date <= today
-        )
-    ).scalar() or 0
-    
-    # Calculate today's revenue (simplified calculation)
-    today_revenue = 0
-    try:
-        today_orders_list = db.query(Order).filter(
-            and_(
-                Order.order_date >= today,
-                Order.order_date <= today,
-                Order.status == OrderStatus.DELIVERED
-            )
-        ).all()
-        
-        for order in today_orders_list:
-            if order.total_amount:
-                today_revenue += float(order.total_amount)
-    except:
-        today_revenue = 0
-    
-    # Get active customers (all customers for now)
-    active_customers = db.query(func.count(Customer.id)).scalar() or 0
-    
-    # Get active drivers (simplified - just count active drivers)
-    drivers_on_route = db.query(func.count(Driver.id)).filter(
-        Driver.is_active == True
-    ).scalar() or 0
-    
-    # Get recent deliveries count
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_deliveries = db.query(func.count(Order.id)).filter(
-        and_(
-            Order.updated_at >= seven_days_ago,
-            Order.status == OrderStatus.DELIVERED
-        )
-    ).scalar() or 0
-    
-    # Get urgent orders (orders pending or confirmed)
-    urgent_orders = db.query(func.count(Order.id)).filter(
-        Order.status.in_([OrderStatus.PENDING, OrderStatus.CONFIRMED])
-    ).scalar() or 0
-    
-    # Calculate completion rate
-    if today_orders > 0:
-        delivered_today = db.query(func.count(Order.id)).filter(
-            and_(
-                Order.order_date >= today,
-                Order.order_date <= today,
-                Order.status == OrderStatus.DELIVERED
-            )
-        ).scalar() or 0
-        completion_rate = (delivered_today / today_orders) * 100
-    else:
-        completion_rate = 0
-    
-    # Get route progress (get real routes from DB or use mock if none exist)
-    routes = []
-    try:
-        # Try to get real routes from the database
-        from app.models import Route
-        active_routes = db.query(Route).filter(
-            and_(
-                Route.route_date >= today_start.date(),
-                Route.route_date <= today_end.date()
-            )
-        ).limit(5).all()
-        
-        for route in active_routes:
-            driver = db.query(Driver).filter(Driver.id == route.driver_id).first() if route.driver_id else None
-            progress = (route.completed_stops / route.total_stops * 100) if route.total_stops > 0 else 0
-            routes.append({
-                "id": route.id,
-                "routeNumber": route.route_code,
-                "status": "完成" if route.is_completed else "進行中",
-                "totalOrders": route.total_stops,
-                "completedOrders": route.completed_stops,
-                "driverName": driver.name if driver else "未指派",
-                "progressPercentage": round(progress)
-            })
-    except:
-        pass
-    
+    # One aggregate round trip, shared across users via a short-TTL snapshot
+    summary = DashboardSummaryService(db).get_summary()
+    routes = list(summary["routes"])
+    activities = list(summary["activities"])
+
     # If no real routes, use mock data
     if not routes:
         routes = [
@@ -162,19 +76,6 @@ def get_dashboard_summary(
         "recommendedDrivers": 5
     }
     
-    # Get recent activities (simplified)
-    activities = []
-    recent_orders = db.query(Order).order_by(Order.created_at.desc()).limit(5).all()
-    for order in recent_orders:
-        customer = db.query(Customer).filter(Customer.id == order.customer_id).first()
-        activities.append({
-            "id": f"order-{order.id}",
-            "type": "order",
-            "message": f"新訂單來自 {customer.short_name if customer else '未知客戶'}",
-            "timestamp": order.created_at.isoformat() if order.created_at else datetime.utcnow().isoformat(),
-            "status": "info"
-        })
-    
     # Add some mock activities if not enough orders
     if len(activities) < 5:
         mock_activities = [
@@ -204,19 +105,11 @@ def get_dashboard_summary(
     
     # Return comprehensive dashboard data
     return {
-        "stats": {
-            "todayOrders": today_orders,
-            "todayRevenue": round(today_revenue, 2),
-            "activeCustomers": active_customers,
-            "driversOnRoute": drivers_on_route,
-            "recentDeliveries": recent_deliveries,
-            "urgentOrders": urgent_orders,
-            "completionRate": round(completion_rate, 1)
-        },
+        "stats": summary["stats"],
         "routes": routes,
         "predictions": predictions,
         "activities": activities,
-        "lastUpdated": datetime.utcnow().isoformat()
+        "lastUpdated": summary["lastUpdated"]
     }
 
 @router.get("/metrics")
@@ -19,6 +19,7 @@ from app.schemas.delivery import (
 )
 from app.services.file_storage import upload_delivery_photo, upload_signature
 from app.services.notification_service import NotificationType, notification_service
+from app.services.order_service import OrderService
 from app.services.websocket_service import websocket_manager
 
 logger = logging.getLogger(__name__)
@@ -86,15 +87,18 @@ async def update_delivery_status(
 
     # Update order status
     old_status = order.status
+    order_service = OrderService(db)
+    snapshot = order_service.snapshot_orders([order])
     order.status = OrderStatus(status_update.status)
     order.updated_at = datetime.now()
 
     if status_update.notes:
         order.delivery_notes = status_update.notes
 
-    await db.commit()
+    # Rollups and customer balance move with the status, in this commit
+    await order_service.record_order_edits([order], snapshot)
 
-    # Send notifications based on status
+    # Queue notifications based on status
     notification_type = None
     if status_update.status == OrderStatus.IN_DELIVERY.value:
         notification_type = NotificationType.DELIVERY_ON_WAY
@@ -113,8 +117,11 @@ async def update_delivery_status(
                 "eta_minutes": 30,  # Default ETA
             },
             event_type=notification_type,
+            db=db,
         )
 
+    await db.commit()
+
     # Broadcast status update
     await websocket_manager.notify_order_update(
         order_id=str(order_id),
@@ -206,6 +213,8 @@ async def confirm_delivery(
             pass
 
     # Update order
+    order_service = OrderService(db)
+    snapshot = order_service.snapshot_orders([order])
     order.status = OrderStatus.DELIVERED
     order.delivered_at = datetime.now()
     order.signature_url = signature_url
@@ -216,9 +225,9 @@ async def confirm_delivery(
     if cylinder_info:
         order.cylinder_serial_numbers = cylinder_info
 
-    await db.commit()
+    await order_service.record_order_edits([order], snapshot)
 
-    # Send delivery confirmation notifications
+    # Queue delivery confirmation notifications
     await notification_service.send_order_notifications(
         order={
             "order_number": order.order_number,
@@ -231,8 +240,11 @@ async def confirm_delivery(
             "delivered_at": order.delivered_at.isoformat(),
         },
         event_type=NotificationType.DELIVERY_COMPLETED,
+        db=db,
     )
 
+    await db.commit()
+
     # Broadcast delivery confirmation
     await websocket_manager.handle_delivery_confirmation(
         driver_id=str(current_user.id),
@@ -283,15 +295,16 @@ async def cancel_delivery(
             status_code=status.HTTP_403_FORBIDDEN, detail="您未被指派此訂單"
         )
 
-    # Update order
-    order.status = OrderStatus.CANCELLED
-    order.cancelled_at = datetime.now()
-    order.cancelled_by = current_user.id
-    order.cancellation_reason = reason
-
-    await db.commit()
+    # Cancel through the order service so the analytics rollups and the
+    # customer balance ledger move with the status
+    order = await OrderService(db).update_delivery_status(
+        order_id=order_id,
+        status=OrderStatus.CANCELLED.value,
+        notes=f"取消原因: {reason}",
+        updated_by=current_user.id,
+    )
 
-    # Send cancellation notification
+    # Queue cancellation notification
     await notification_service.send_order_notifications(
         order={
             "order_number": order.order_number,
@@ -302,8 +315,11 @@ async def cancel_delivery(
             "cancellation_reason": reason,
         },
         event_type=NotificationType.ORDER_CANCELLED,
+        db=db,
     )
 
+    await db.commit()
+
     # Broadcast cancellation
     await websocket_manager.notify_order_update(
         order_id=str(order_id),
@@ -1,5 +1,7 @@
 from datetime import date
+from typing import Optional
 
+import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -16,9 +18,24 @@ from app.schemas.delivery_history import (
     DeliveryHistoryStats,
     DeliveryHistoryUpdate,
 )
+from app.services.analytics_archive_service import (
+    ArchiveQueryEngine,
+    ArchiveWindow,
+    live_filter,
+)
 
 router = APIRouter()
 
+# Cylinder type -> quantity columns summed into it
+CYLINDER_TYPE_COLUMNS = {
+    "50kg": ["qty_50kg"],
+    "20kg": ["qty_20kg", "qty_ying20"],
+    "16kg": ["qty_16kg", "qty_ying16", "qty_haoyun16"],
+    "10kg": ["qty_10kg", "qty_pingantong10"],
+    "4kg": ["qty_4kg", "qty_xingfuwan4"],
+    "haoyun20": ["qty_haoyun20"],
+}
+
 
 @router.get("", response_model=DeliveryHistoryList)
 async def get_delivery_history(
@@ -31,7 +48,6 @@ async def get_delivery_history(
     db: AsyncSession = Depends(get_db),
 ):
     """Get delivery history with optional filters"""
-from typing import Optional
     # Build query
     query = select(DeliveryHistoryModel).options(
         joinedload(DeliveryHistoryModel.customer)
@@ -85,8 +101,13 @@ async def get_delivery_stats(
     db: AsyncSession = Depends(get_db),
 ):
     """Get delivery history statistics"""
-    # Build base query
-    query = select(DeliveryHistoryModel)
+    # Closed months exported to the Parquet archive are scanned there
+    archive = ArchiveQueryEngine()
+    window = archive.split("delivery_history", date_from, date_to)
+    if window.has_archive:
+        return await _get_delivery_stats_with_archive(
+            db, archive, window, date_from, date_to
+        )
 
     # Apply date filters
     filters = []
@@ -95,79 +116,115 @@ async def get_delivery_stats(
     if date_to:
         filters.append(DeliveryHistoryModel.transaction_date <= date_to)
 
+    weight = func.coalesce(DeliveryHistoryModel.total_weight_kg, 0)
+    cylinders = func.coalesce(DeliveryHistoryModel.total_cylinders, 0)
+
+    def qty_sum(*columns):
+        return func.coalesce(func.sum(sum(func.coalesce(c, 0) for c in columns)), 0)
+
+    # Totals and cylinders by type in a single aggregate pass
+    totals_query = select(
+        func.count(DeliveryHistoryModel.id).label("total_deliveries"),
+        func.coalesce(func.sum(weight), 0).label("total_weight_kg"),
+        func.coalesce(func.sum(cylinders), 0).label("total_cylinders"),
+        func.count(func.distinct(DeliveryHistoryModel.customer_code)).label(
+            "unique_customers"
+        ),
+        qty_sum(DeliveryHistoryModel.qty_50kg).label("qty_50kg"),
+        qty_sum(DeliveryHistoryModel.qty_20kg, DeliveryHistoryModel.qty_ying20).label(
+            "qty_20kg"
+        ),
+        qty_sum(
+            DeliveryHistoryModel.qty_16kg,
+            DeliveryHistoryModel.qty_ying16,
+            DeliveryHistoryModel.qty_haoyun16,
+        ).label("qty_16kg"),
+        qty_sum(
+            DeliveryHistoryModel.qty_10kg, DeliveryHistoryModel.qty_pingantong10
+        ).label("qty_10kg"),
+        qty_sum(DeliveryHistoryModel.qty_4kg, DeliveryHistoryModel.qty_xingfuwan4).label(
+            "qty_4kg"
+        ),
+        qty_sum(DeliveryHistoryModel.qty_haoyun20).label("qty_haoyun20"),
+    )
     if filters:
-        query = query.where(and_(*filters))
+        totals_query = totals_query.where(and_(*filters))
 
-    # Get all records for statistics
-    result = await db.execute(query)
-    records = result.scalars().all()
+    result = await db.execute(totals_query)
+    totals = result.one()
 
-    # Calculate statistics
-    total_deliveries = len(records)
-    total_weight_kg = sum(r.total_weight_kg or 0 for r in records)
-    total_cylinders = sum(r.total_cylinders or 0 for r in records)
-    unique_customers = len(set(r.customer_code for r in records))
+    total_deliveries = totals.total_deliveries or 0
+    total_weight_kg = float(totals.total_weight_kg or 0)
+    total_cylinders = int(totals.total_cylinders or 0)
+    unique_customers = totals.unique_customers or 0
 
     # Cylinders by type
     cylinders_by_type = {
-        "50kg": sum(r.qty_50kg for r in records),
-        "20kg": sum(r.qty_20kg + r.qty_ying20 for r in records),
-        "16kg": sum(r.qty_16kg + r.qty_ying16 + r.qty_haoyun16 for r in records),
-        "10kg": sum(r.qty_10kg + r.qty_pingantong10 for r in records),
-        "4kg": sum(r.qty_4kg + r.qty_xingfuwan4 for r in records),
-        "haoyun20": sum(r.qty_haoyun20 for r in records),
+        "50kg": int(totals.qty_50kg),
+        "20kg": int(totals.qty_20kg),
+        "16kg": int(totals.qty_16kg),
+        "10kg": int(totals.qty_10kg),
+        "4kg": int(totals.qty_4kg),
+        "haoyun20": int(totals.qty_haoyun20),
     }
 
-    # Top customers by delivery count
-    customer_counts = {}
-    for record in records:
-        if record.customer_code not in customer_counts:
-            customer_counts[record.customer_code] = {
-                "customer_code": record.customer_code,
-                "deliveries": 0,
-                "total_weight": 0,
-                "total_cylinders": 0,
-            }
-        customer_counts[record.customer_code]["deliveries"] += 1
-        customer_counts[record.customer_code]["total_weight"] += (
-            record.total_weight_kg or 0
-        )
-        customer_counts[record.customer_code]["total_cylinders"] += (
-            record.total_cylinders or 0
+    # Top customers by delivery count, named via a join on the grouped rows
+    per_customer = (
+        select(
+            DeliveryHistoryModel.customer_code.label("customer_code"),
+            func.count(DeliveryHistoryModel.id).label("deliveries"),
+            func.coalesce(func.sum(weight), 0).label("total_weight"),
+            func.coalesce(func.sum(cylinders), 0).label("total_cylinders"),
         )
+        .group_by(DeliveryHistoryModel.customer_code)
+        .order_by(func.count(DeliveryHistoryModel.id).desc())
+        .limit(10)
+    )
+    if filters:
+        per_customer = per_customer.where(and_(*filters))
+    per_customer = per_customer.subquery()
 
-    # Get customer names
-    if customer_counts:
-        customer_codes = list(customer_counts.keys())
-        stmt = select(Customer).where(Customer.customer_code.in_(customer_codes))
-        result = await db.execute(stmt)
-        customers = {c.customer_code: c.short_name for c in result.scalars().all()}
-
-        for code, data in customer_counts.items():
-            data["customer_name"] = customers.get(code, code)
-
-    top_customers = sorted(
-        customer_counts.values(), key=lambda x: x["deliveries"], reverse=True
-    )[:10]
+    top_query = (
+        select(per_customer, Customer.short_name)
+        .outerjoin(Customer, Customer.customer_code == per_customer.c.customer_code)
+        .order_by(per_customer.c.deliveries.desc())
+    )
+    result = await db.execute(top_query)
+    top_customers = [
+        {
+            "customer_code": row.customer_code,
+            "deliveries": row.deliveries,
+            "total_weight": float(row.total_weight or 0),
+            "total_cylinders": int(row.total_cylinders or 0),
+            "customer_name": row.short_name or row.customer_code,
+        }
+        for row in result
+    ]
 
     # Deliveries by date
-    deliveries_by_date = {}
-    for record in records:
-        date_key = record.transaction_date.isoformat()
-        if date_key not in deliveries_by_date:
-            deliveries_by_date[date_key] = {
-                "date": date_key,
-                "count": 0,
-                "weight": 0,
-                "cylinders": 0,
-            }
-        deliveries_by_date[date_key]["count"] += 1
-        deliveries_by_date[date_key]["weight"] += record.total_weight_kg or 0
-        deliveries_by_date[date_key]["cylinders"] += record.total_cylinders or 0
-
-    deliveries_by_date_list = sorted(
-        deliveries_by_date.values(), key=lambda x: x["date"]
+    by_date_query = (
+        select(
+            DeliveryHistoryModel.transaction_date,
+            func.count(DeliveryHistoryModel.id).label("count"),
+            func.coalesce(func.sum(weight), 0).label("weight"),
+            func.coalesce(func.sum(cylinders), 0).label("cylinders"),
+        )
+        .group_by(DeliveryHistoryModel.transaction_date)
+        .order_by(DeliveryHistoryModel.transaction_date)
     )
+    if filters:
+        by_date_query = by_date_query.where(and_(*filters))
+
+    result = await db.execute(by_date_query)
+    deliveries_by_date_list = [
+        {
+            "date": row.transaction_date.isoformat(),
+            "count": row.count,
+            "weight": float(row.weight or 0),
+            "cylinders": int(row.cylinders or 0),
+        }
+        for row in result
+    ]
 
     return DeliveryHistoryStats(
         total_deliveries=total_deliveries,
@@ -182,6 +239,143 @@ async def get_delivery_stats(
     )
 
 
+async def _get_delivery_stats_with_archive(
+    db: AsyncSession,
+    archive: ArchiveQueryEngine,
+    window: ArchiveWindow,
+    date_from: Optional[date],
+    date_to: Optional[date],
+) -> DeliveryHistoryStats:
+    """
+    Delivery statistics merged from the Parquet archive and the live table
+
+    Both sides are reduced to one row per (date, customer), which is small
+    enough to combine in pandas for every statistic of the report.
+    """
+    # Archived months, scanned by DuckDB
+    type_sums = ", ".join(
+        f"SUM({' + '.join(f'COALESCE({column}, 0)' for column in columns)}) AS \"{name}\""
+        for name, columns in CYLINDER_TYPE_COLUMNS.items()
+    )
+    archive_sql = f"""
+        SELECT transaction_date,
+               customer_code,
+               COUNT(*) AS deliveries,
+               SUM(COALESCE(total_weight_kg, 0)) AS weight,
+               SUM(COALESCE(total_cylinders, 0)) AS cylinders,
+               {type_sums}
+        FROM delivery_history
+        WHERE month >= ? AND month < ?
+          AND (? IS NULL OR transaction_date >= ?)
+          AND (? IS NULL OR transaction_date <= ?)
+        GROUP BY transaction_date, customer_code
+    """
+    archived = await archive.query_async(
+        archive_sql,
+        [
+            f"{window.archive_start:%Y-%m}",
+            f"{window.archive_end:%Y-%m}",
+            date_from,
+            date_from,
+            date_to,
+            date_to,
+        ],
+    )
+
+    # Everything outside the archived months, from the primary database
+    live_query = select(
+        DeliveryHistoryModel.transaction_date,
+        DeliveryHistoryModel.customer_code,
+        func.count(DeliveryHistoryModel.id).label("deliveries"),
+        func.sum(func.coalesce(DeliveryHistoryModel.total_weight_kg, 0)).label("weight"),
+        func.sum(func.coalesce(DeliveryHistoryModel.total_cylinders, 0)).label(
+            "cylinders"
+        ),
+        *[
+            func.sum(
+                sum(
+                    func.coalesce(getattr(DeliveryHistoryModel, column), 0)
+                    for column in columns
+                )
+            ).label(name)
+            for name, columns in CYLINDER_TYPE_COLUMNS.items()
+        ],
+    ).where(live_filter(DeliveryHistoryModel.transaction_date, window))
+    if date_from:
+        live_query = live_query.where(DeliveryHistoryModel.transaction_date >= date_from)
+    if date_to:
+        live_query = live_query.where(DeliveryHistoryModel.transaction_date <= date_to)
+    live_query = live_query.group_by(
+        DeliveryHistoryModel.transaction_date, DeliveryHistoryModel.customer_code
+    )
+
+    result = await db.execute(live_query)
+    live = pd.DataFrame(result.all(), columns=list(result.keys()))
+
+    frames = [frame for frame in (archived, live) if not frame.empty]
+    grain = pd.concat(frames, ignore_index=True) if frames else live
+    grain["transaction_date"] = pd.to_datetime(grain["transaction_date"]).dt.date
+    measures = ["deliveries", "weight", "cylinders", *CYLINDER_TYPE_COLUMNS]
+    grain[measures] = grain[measures].fillna(0)
+
+    # Top customers by delivery count
+    per_customer = (
+        grain.groupby("customer_code", as_index=False)[["deliveries", "weight", "cylinders"]]
+        .sum()
+        .sort_values("deliveries", ascending=False)
+        .head(10)
+    )
+    names = {}
+    if not per_customer.empty:
+        result = await db.execute(
+            select(Customer.customer_code, Customer.short_name).where(
+                Customer.customer_code.in_(per_customer["customer_code"].tolist())
+            )
+        )
+        names = {row.customer_code: row.short_name for row in result}
+
+    top_customers = [
+        {
+            "customer_code": row.customer_code,
+            "deliveries": int(row.deliveries),
+            "total_weight": float(row.weight),
+            "total_cylinders": int(row.cylinders),
+            "customer_name": names.get(row.customer_code) or row.customer_code,
+        }
+        for row in per_customer.itertuples(index=False)
+    ]
+
+    # Deliveries by date
+    per_date = (
+        grain.groupby("transaction_date", as_index=False)[["deliveries", "weight", "cylinders"]]
+        .sum()
+        .sort_values("transaction_date")
+    )
+    deliveries_by_date_list = [
+        {
+            "date": row.transaction_date.isoformat(),
+            "count": int(row.deliveries),
+            "weight": float(row.weight),
+            "cylinders": int(row.cylinders),
+        }
+        for row in per_date.itertuples(index=False)
+    ]
+
+    return DeliveryHistoryStats(
+        total_deliveries=int(grain["deliveries"].sum()),
+        total_weight_kg=float(grain["weight"].sum()),
+        total_cylinders=int(grain["cylinders"].sum()),
+        unique_customers=int(grain["customer_code"].nunique()),
+        date_from=date_from,
+        date_to=date_to,
+        cylinders_by_type={
+            name: int(grain[name].sum()) for name in CYLINDER_TYPE_COLUMNS
+        },
+        top_customers=top_customers,
+        deliveries_by_date=deliveries_by_date_list,
+    )
+
+
 @router.get("/{delivery_id}", response_model=DeliveryHistory)
 async def get_delivery(
     delivery_id: int,
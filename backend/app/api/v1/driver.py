@@ -35,6 +35,7 @@ from app.schemas.driver import (
 )
 from app.services.gps_service import GPSService
 from app.services.notification_service import NotificationService, NotificationType
+from app.services.order_service import OrderService
 from app.services.websocket_service import websocket_manager as ws_manager
 from app.models.route import Route
 
@@ -318,12 +319,16 @@ async def update_delivery_status(
     db.add(history)
 
     # Update order status if needed
+    order_service = OrderService(db)
+    snapshot = order_service.snapshot_orders([delivery.order])
     if delivery.status == DeliveryStatus.DELIVERED:
         delivery.order.status = OrderStatus.DELIVERED
         delivery.delivered_at = datetime.utcnow()
     elif delivery.status == DeliveryStatus.FAILED:
         delivery.order.status = OrderStatus.FAILED
 
+    # Rollups and customer balance move with the order status, in this commit
+    await order_service.record_order_edits([delivery.order], snapshot)
     await db.commit()
 
     # Send WebSocket notification
@@ -443,8 +448,11 @@ async def confirm_delivery(
 
         delivery.photo_path = str(photo_path)
 
-    # Update order status
+    # Update order status, with its rollups and customer balance
+    order_service = OrderService(db)
+    snapshot = order_service.snapshot_orders([delivery.order])
     delivery.order.status = OrderStatus.DELIVERED
+    await order_service.record_order_edits([delivery.order], snapshot)
 
     # Create history record
     history = DeliveryStatusHistory(
@@ -1,16 +1,19 @@
 """
 Invoice management API endpoints
 """
+import json
 from typing import List, Optional
 
 from datetime import date
 
 from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy import and_, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.api.deps import get_current_user, get_db
+from app.core.database_async import get_async_session
 from app.models.customer import Customer
 from app.models.order import Order
 from app.models.user import User
@@ -21,7 +24,7 @@ from app.schemas.invoice import (
     InvoiceStats,
     InvoiceUpdate,
 )
-from app.services.einvoice_service import EInvoiceService
+from app.services.einvoice_service import get_einvoice_service
 from app.services.invoice_service import InvoiceService
 from app.models.invoice import Invoice
 from app.models.invoice import InvoicePaymentStatus
@@ -57,9 +60,13 @@ async def create_invoice(
 
     # Create invoice using service
     service = InvoiceService(db)
-    invoice = await service.create_invoice(
-        invoice_data=invoice_data, created_by=current_user.id
-    )
+    try:
+        invoice = await service.create_invoice(
+            invoice_data=invoice_data, created_by=current_user.id
+        )
+    except ValueError as e:
+        # Numbers only come from ranges allocated for the invoice's period
+        raise HTTPException(status_code=400, detail=str(e))
 
     return invoice
 
@@ -220,7 +227,7 @@ async def issue_invoice(
         raise HTTPException(status_code=400, detail="只有草稿發票可以開立")
 
     # Submit to e - invoice service
-    einvoice_service = EInvoiceService()
+    einvoice_service = get_einvoice_service()
     service = InvoiceService(db)
 
     try:
@@ -251,7 +258,7 @@ async def void_invoice(
         raise HTTPException(status_code=400, detail="只有已開立發票可以作廢")
 
     service = InvoiceService(db)
-    einvoice_service = EInvoiceService()
+    einvoice_service = get_einvoice_service()
 
     try:
         voided_invoice = await service.void_invoice(
@@ -307,7 +314,7 @@ async def bulk_invoice_action(
     service = InvoiceService(db)
 
     if action.action == "issue":
-        einvoice_service = EInvoiceService()
+        einvoice_service = get_einvoice_service()
         results = await service.bulk_issue_invoices(
             invoice_ids=action.invoice_ids, einvoice_service=einvoice_service
         )
@@ -323,6 +330,27 @@ async def bulk_invoice_action(
     return results
 
 
+@router.post("/bulk-issue/stream")
+async def stream_bulk_issue(
+    invoice_ids: List[int],
+    current_user: User = Depends(get_current_user),
+):
+    """Issue invoices concurrently, streaming one JSON line per invoice"""
+    if current_user.role not in ["super_admin", "manager"]:
+        raise HTTPException(status_code=403, detail="沒有權限執行批次操作")
+
+    async def content():
+        # The response outlives request dependencies, so the stream owns its session
+        async for session in get_async_session():
+            service = InvoiceService(session)
+            async for outcome in service.iter_bulk_issue(
+                invoice_ids, get_einvoice_service()
+            ):
+                yield json.dumps(outcome, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(content(), media_type="application/x-ndjson")
+
+
 @router.get("/download/{period}")
 async def download_period_invoices(
     period: str = Path(..., pattern="^\\d{6}$"),
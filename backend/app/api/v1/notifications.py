@@ -32,6 +32,7 @@ from app.schemas.notification import (
     SMSTemplateUpdate,
 )
 from app.services.sms_service import enhanced_sms_service
+from app.services.template_registry import sms_template_registry
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -127,6 +128,7 @@ async def send_bulk_sms(
         template_code=request.template_code,
         provider=request.provider,
         batch_size=request.batch_size or 100,
+        db=db,
     )
 
     return result
@@ -157,6 +159,7 @@ async def create_sms_template(
     db.add(db_template)
     await db.commit()
     await db.refresh(db_template)
+    sms_template_registry.invalidate()
 
     return SMSTemplateResponse.from_orm(db_template)
 
@@ -211,6 +214,7 @@ async def update_sms_template(
 
     await db.commit()
     await db.refresh(template)
+    sms_template_registry.invalidate()
 
     return SMSTemplateResponse.from_orm(template)
 
@@ -236,6 +240,7 @@ async def delete_sms_template(
 
     await db.delete(template)
     await db.commit()
+    sms_template_registry.invalidate()
 
     return {"message": "Template deleted successfully"}
 
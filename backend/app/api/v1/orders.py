@@ -3,11 +3,19 @@ Order management endpoints - Simple implementation
 """
 from typing import Optional
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date, datetime
 
 from app.core.database import get_db
+from app.core.database_async import get_async_session
 from app.api.deps import get_current_user
+from app.models.order import OrderStatus
+from app.services.data_export_service import (
+    EXPORT_FILE_EXTENSIONS,
+    EXPORT_MEDIA_TYPES,
+    DataExportService,
+)
 
 router = APIRouter()
 
@@ -89,6 +97,41 @@ def search_orders(
         "query": q
     }
 
+@router.get("/export")
+async def export_orders(
+    format: str = Query("csv", pattern="^(csv|excel|json)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    current_user = Depends(get_current_user)
+):
+    """Stream orders with items as CSV, Excel or JSON"""
+    # Validate before the response starts; errors inside the stream can no
+    # longer change the status code
+    order_status = None
+    if status is not None:
+        try:
+            order_status = OrderStatus(status)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"無效的訂單狀態: {status}")
+
+    async def content():
+        # The response outlives request dependencies, so the stream owns its session
+        async for session in get_async_session():
+            service = DataExportService(session)
+            async for chunk in service.stream_orders(
+                format, start_date, end_date, order_status, customer_id
+            ):
+                yield chunk
+
+    filename = f"orders_{datetime.now():%Y%m%d_%H%M%S}.{EXPORT_FILE_EXTENSIONS[format]}"
+    return StreamingResponse(
+        content(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @router.get("/{order_id}")
 def get_order(
     order_id: int,
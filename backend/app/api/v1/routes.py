@@ -22,6 +22,7 @@ from app.schemas.prediction import (
     RouteOptimizationRequest,
     RouteOptimizationResponse,
 )
+from app.services.order_service import OrderService
 # realtime_route_adjustment service temporarily disabled - implementation pending
 from app.services.route_optimization_service import route_optimization_service
 from app.schemas.route import AdjustmentRequest
@@ -74,6 +75,9 @@ from typing import Any, Dict, List, Optional
     await db.flush()
 
     # Add stops if provided
+    order_service = OrderService(db)
+    assigned = []
+    snapshot = {}
     for stop_data in route_data.get("stops", []):
         stop = RouteStop(
             route_id=route.id,
@@ -96,10 +100,14 @@ from typing import Any, Dict, List, Optional
         # Update order status
         order = await db.get(Order, stop_data["order_id"])
         if order:
+            snapshot.update(order_service.snapshot_orders([order]))
             order.route_id = route.id
             order.driver_id = None  # Skip due to foreign key issue
             order.status = OrderStatus.ASSIGNED
+            assigned.append(order)
 
+    # Rollups and customer balances move with the assignment, in this commit
+    await order_service.record_order_edits(assigned, snapshot)
     await db.commit()
     await db.refresh(route)
 
@@ -251,12 +259,14 @@ async def cancel_route(
     query = select(Order).where(Order.route_id == route_id)
     result = await db.execute(query)
     orders = result.scalars().all()
+    snapshot = OrderService.snapshot_orders(orders)
 
     for order in orders:
         order.route_id = None
         order.driver_id = None
         order.status = OrderStatus.PENDING
 
+    await OrderService(db).record_order_edits(orders, snapshot)
     await db.commit()
 
     return success_response(message="路線已成功取消", data={"route_id": route_id})
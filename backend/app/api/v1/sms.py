@@ -28,6 +28,7 @@ from app.schemas.sms import (
     SMSTemplateUpdate,
 )
 from app.services.sms_service import enhanced_sms_service
+from app.services.template_registry import sms_template_registry
 
 router = APIRouter()
 
@@ -194,6 +195,7 @@ async def create_sms_template(
     db.add(db_template)
     await db.commit()
     await db.refresh(db_template)
+    sms_template_registry.invalidate()
 
     return db_template
 
@@ -219,6 +221,7 @@ async def update_sms_template(
 
     await db.commit()
     await db.refresh(template)
+    sms_template_registry.invalidate()
 
     return template
 
@@ -365,6 +368,7 @@ async def send_bulk_sms(
         message_type=message_type,
         template_code=template_code,
         provider=provider,
+        db=db,
     )
 
     return result
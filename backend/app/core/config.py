@@ -63,9 +63,43 @@ class Settings(BaseSettings):
     # Timezone
     TIMEZONE: str = "Asia/Taipei"
     
+    # Analytics archive (closed months exported to Parquet)
+    ANALYTICS_ARCHIVE_DIR: str = os.getenv("ANALYTICS_ARCHIVE_DIR", "./data/analytics_archive")
+    
+    # E-invoice bulk issuance: submissions in flight at once
+    EINVOICE_MAX_IN_FLIGHT: int = int(os.getenv("EINVOICE_MAX_IN_FLIGHT", "20"))
+    
+    # Bank file transfer: SFTP sessions kept per bank in each worker process
+    BANKING_SFTP_POOL_SIZE: int = int(os.getenv("BANKING_SFTP_POOL_SIZE", "3"))
+    # Directory standing in for the banks' SFTP servers (dev / tests)
+    BANKING_SFTP_LOCAL_ROOT: Optional[str] = os.getenv("BANKING_SFTP_LOCAL_ROOT", None)
+    # Banking Celery subtasks allowed to work on one bank at once
+    BANKING_MAX_CONCURRENT_PER_BANK: int = int(
+        os.getenv("BANKING_MAX_CONCURRENT_PER_BANK", "1")
+    )
+    # Celery broker / result backend, also used for banking task slots
+    REDIS_URL: Optional[str] = os.getenv("REDIS_URL", None)
+    # Log level of setup_logging (Celery workers)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    
+    # Email (SMTP)
+    SMTP_HOST: str = os.getenv("SMTP_HOST", "localhost")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))
+    SMTP_USER: Optional[str] = os.getenv("SMTP_USER", None)
+    SMTP_PASSWORD: Optional[str] = os.getenv("SMTP_PASSWORD", None)
+    EMAIL_FROM: Optional[str] = os.getenv("EMAIL_FROM", None)
+    # Authenticated SMTP sessions kept open by each notification worker
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "5"))
+    
     # External Services
     GOOGLE_MAPS_API_KEY: Optional[str] = os.getenv("GOOGLE_MAPS_API_KEY", None)
     
+    def is_development(self) -> bool:
+        return self.ENVIRONMENT == "development"
+
+    def is_production(self) -> bool:
+        return self.ENVIRONMENT == "production"
+
     class Config:
         env_file = ".env.local" if os.path.exists(".env.local") else ".env"
         case_sensitive = True
@@ -3,6 +3,7 @@ Structured logging configuration for Lucky Gas
 """
 
 import logging
+import sys
 from typing import Optional, Dict, Any
 from contextvars import ContextVar
 from datetime import datetime
@@ -29,7 +30,7 @@ class ContextFilter(logging.Filter):
         record.client_ip = client_ip_context.get()
 
         # Add application metadata
-        record.environment = settings.ENVIRONMENT.value
+        record.environment = settings.ENVIRONMENT
         record.service = "lucky - gas - backend"
         record.version = "1.0.0"
 
@@ -143,7 +144,7 @@ def setup_logging():
         "Logging configured",
         extra={
             "log_level": settings.LOG_LEVEL,
-            "environment": settings.ENVIRONMENT.value,
+            "environment": settings.ENVIRONMENT,
             "json_logging": not settings.is_development(),
         },
     )
@@ -6,14 +6,17 @@ error handling, validation, and transaction management code in service layer.
 """
 
 import functools
+import inspect
 import logging
 import time
 from contextlib import asynccontextmanager
 from datetime import datetime, date
 from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
 
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 from fastapi import HTTPException, status
 
 logger = logging.getLogger(__name__)
@@ -134,6 +137,13 @@ def handle_service_errors(
     return decorator
 
 
+async def _maybe_await(value: Any) -> Any:
+    """Await ``value`` if an async session returned an awaitable"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
 def transactional(
     auto_commit: bool = True,
     auto_rollback: bool = True,
@@ -160,30 +170,32 @@ def transactional(
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         async def async_wrapper(self, *args, **kwargs):
-            db: Session = self.db
+            # Services keep their session as ``db`` or ``session``; either may
+            # be an AsyncSession, whose transaction methods must be awaited
+            db: Union[Session, AsyncSession] = getattr(self, "db", None) or self.session
             
             if nested and db.in_transaction():
                 # Use savepoint for nested transaction
-                savepoint = db.begin_nested()
+                savepoint = await _maybe_await(db.begin_nested())
                 try:
                     result = await func(self, *args, **kwargs)
                     if auto_commit:
-                        savepoint.commit()
+                        await _maybe_await(savepoint.commit())
                     return result
                 except Exception as e:
                     if auto_rollback:
-                        savepoint.rollback()
+                        await _maybe_await(savepoint.rollback())
                     raise
             else:
                 # Regular transaction
                 try:
                     result = await func(self, *args, **kwargs)
                     if auto_commit:
-                        db.commit()
+                        await _maybe_await(db.commit())
                     return result
                 except Exception as e:
                     if auto_rollback:
-                        db.rollback()
+                        await _maybe_await(db.rollback())
                     raise
         
         @functools.wraps(func)
@@ -245,32 +257,51 @@ def cache_result(
     def decorator(func: Callable) -> Callable:
         cache: Dict[str, tuple[Any, float]] = {}
         
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generate cache key
+        def make_key(args, kwargs) -> str:
             if key_prefix:
-                cache_key = f"{key_prefix}:{func.__name__}:{str(args[1:])}:{str(kwargs)}"
-            else:
-                cache_key = f"{func.__name__}:{str(args[1:])}:{str(kwargs)}"
-            
-            # Check cache
+                return f"{key_prefix}:{func.__name__}:{str(args[1:])}:{str(kwargs)}"
+            return f"{func.__name__}:{str(args[1:])}:{str(kwargs)}"
+        
+        def lookup(cache_key: str) -> Tuple[bool, Any]:
             if cache_key in cache:
                 result, timestamp = cache[cache_key]
                 if time.time() - timestamp < ttl:
                     logger.debug(f"Cache hit for {cache_key}")
-                    return result
-            
-            # Execute function
-            result = func(*args, **kwargs)
-            
-            # Cache result
+                    return True, result
+            return False, None
+        
+        def store(cache_key: str, result: Any) -> None:
             if result is not None or cache_none:
                 cache[cache_key] = (result, time.time())
                 logger.debug(f"Cached result for {cache_key}")
+        
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Cache the awaited value - a coroutine object can only be awaited once
+            cache_key = make_key(args, kwargs)
+            hit, result = lookup(cache_key)
+            if hit:
+                return result
             
+            result = await func(*args, **kwargs)
+            store(cache_key, result)
             return result
         
-        return wrapper
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            cache_key = make_key(args, kwargs)
+            hit, result = lookup(cache_key)
+            if hit:
+                return result
+            
+            result = func(*args, **kwargs)
+            store(cache_key, result)
+            return result
+        
+        if asyncio.iscoroutinefunction(func):
+            return async_wrapper
+        else:
+            return sync_wrapper
     
     return decorator
 
@@ -561,6 +592,108 @@ class BatchProcessor:
         return results
 
 
+class QueryFanout:
+    """
+    Run independent read-only queries concurrently on separate pooled sessions.
+    
+    An AsyncSession can only run one statement at a time, so composite reports
+    that await several aggregates on the same session pay the sum of all query
+    times. The fanout gives every query its own short-lived session from the
+    same engine, caps how many run at once, and exposes a single snapshot
+    timestamp so every part of a report uses the same notion of "now".
+    
+    SQLite (single writer, per-connection in-memory databases) and sessions
+    without an engine fall back to running the queries one by one on the
+    original session.
+    
+    Example:
+        fanout = QueryFanout(self.db, max_concurrency=4)
+        revenue, orders = await fanout.run(
+            lambda session: revenue_query(session, start_date, end_date),
+            lambda session: order_query(session, start_date, end_date),
+        )
+    """
+    
+    def __init__(
+        self,
+        db: AsyncSession,
+        max_concurrency: int = 4,
+        snapshot_at: Optional[datetime] = None
+    ):
+        """
+        Args:
+            db: Request session; its engine provides the pooled connections
+            max_concurrency: Maximum number of queries in flight at once
+            snapshot_at: Shared "now" for every query (defaults to creation time)
+        """
+        self.db = db
+        self.snapshot_at = snapshot_at or datetime.now()
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._session_factory = self._build_session_factory(db)
+    
+    @staticmethod
+    def _build_session_factory(db: AsyncSession) -> Optional[async_sessionmaker]:
+        bind = getattr(db, "bind", None)
+        if not isinstance(bind, AsyncEngine) or bind.dialect.name == "sqlite":
+            return None
+        return async_sessionmaker(bind, class_=AsyncSession, expire_on_commit=False)
+    
+    @property
+    def concurrent(self) -> bool:
+        """Whether queries actually run in parallel"""
+        return self._session_factory is not None
+    
+    async def run(self, *calls: Callable[[AsyncSession], Awaitable[Any]]) -> List[Any]:
+        """
+        Run query callables, each with its own session.
+        
+        Args:
+            calls: Callables taking a session and returning an awaitable
+        
+        Returns:
+            Results in the same order as the calls
+        """
+        if not self.concurrent:
+            return [await call(self.db) for call in calls]
+        
+        async def run_one(call: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+            async with self._semaphore:
+                async with self._session_factory() as session:
+                    return await call(session)
+        
+        return await self._gather([run_one(call) for call in calls])
+    
+    async def gather(self, *calls: Callable[[], Awaitable[Any]]) -> List[Any]:
+        """
+        Run composite steps that fan out their own queries through this instance.
+        
+        Composite steps do not hold a session or a concurrency slot themselves,
+        so nesting them cannot exhaust the limit.
+        
+        Args:
+            calls: Zero-argument callables returning an awaitable
+        
+        Returns:
+            Results in the same order as the calls
+        """
+        if not self.concurrent:
+            return [await call() for call in calls]
+        
+        return await self._gather([call() for call in calls])
+    
+    @staticmethod
+    async def _gather(awaitables: List[Awaitable[Any]]) -> List[Any]:
+        tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            # Do not leave sibling queries running on a failed report
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
 # Performance monitoring
 def measure_performance(
     metric_name: Optional[str] = None,
@@ -4,6 +4,7 @@ import os
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
 
 import aiofiles
 
@@ -23,6 +23,9 @@ from app.client_models import (
 )
 from app.core.database import get_db, SessionLocal, engine
 from app.api.v1 import customers, customers_stats, products, delivery_optimization_test
+from app.services.einvoice_service import close_einvoice_service
+from app.services.invoice_number_allocator import close_invoice_number_allocator
+from app.services.report_job_service import report_job_queue
 
 logging.basicConfig(
     level=logging.INFO,
@@ -49,6 +52,21 @@ async def lifespan(app: FastAPI):
     
     logger.info("👋 Shutting down Lucky Gas Backend")
 
+    try:
+        await report_job_queue.stop()
+    except Exception as e:
+        logger.error(f"❌ Failed to stop report workers: {e}")
+
+    try:
+        await close_invoice_number_allocator()
+    except Exception as e:
+        logger.error(f"❌ Failed to release invoice numbers: {e}")
+
+    try:
+        await close_einvoice_service()
+    except Exception as e:
+        logger.error(f"❌ Failed to close e-invoice client: {e}")
+
 
 app = FastAPI(
     title="Lucky Gas Management System",
@@ -19,8 +19,10 @@ __all__ = [
     'SyncOperation',
     'WebhookLog',
     'SMSLog',
+    'NotificationOutbox',
     'PaymentBatch',
     'InvoiceSequence',
+    'InvoiceNumberBlock',
     'PredictionBatch',
     'DeliveryHistoryItem',
     'Vehicle',
@@ -31,16 +33,21 @@ __all__ = [
     'OrderItem',
     'GasProduct',
     'RouteDelivery',
-    'Invoice'
+    'Invoice',
+    'DailyOrderRollup',
+    'DailyProductRollup',
+    'DailyCustomerRollup',
+    'CustomerBalanceLedger'
 ]
 # from .feature_flag import FeatureFlag  # Commented out - causing DB initialization errors
 from .audit import AuditLog
 from .route_plan import RoutePlan
 from .sync_operation import SyncOperation
 from .webhook import WebhookLog
-from .notification import SMSLog
+from .notification import SMSLog, NotificationOutbox
 from .banking import PaymentBatch
 from .invoice_sequence import InvoiceSequence
+from .invoice_number_block import InvoiceNumberBlock
 from .prediction_batch import PredictionBatch
 from .delivery_history_item import DeliveryHistoryItem
 from .vehicle import Vehicle
@@ -52,3 +59,5 @@ from .order_item import OrderItem
 from .gas_product import GasProduct
 from .route_delivery import RouteDelivery
 from .invoice import Invoice
+from .analytics_rollup import DailyOrderRollup, DailyProductRollup, DailyCustomerRollup
+from .customer_ledger import CustomerBalanceLedger
@@ -0,0 +1,124 @@
+"""
+Daily analytics rollup tables
+
+Pre-aggregated order facts maintained incrementally by the order service and
+rebuilt in bulk by the rollup job. Analytics reads these instead of scanning
+orders / order_items for historical ranges.
+"""
+
+from sqlalchemy import Column, Date, DateTime, Float, Index, Integer, String
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class DailyOrderRollup(Base):
+    """Order-level daily facts (date × hour × customer_type × area × driver × status)"""
+
+    __tablename__ = "analytics_daily_order_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Dimensions - empty string / 0 instead of NULL so the unique key works
+    rollup_date = Column(Date, nullable=False)
+    hour = Column(Integer, nullable=False, default=0)
+    customer_type = Column(String(50), nullable=False, default="", server_default="")
+    area = Column(String(50), nullable=False, default="", server_default="")
+    driver_id = Column(Integer, nullable=False, default=0, server_default="0")
+    # "urgent" / "regular", from Order.is_urgent
+    order_type = Column(
+        String(20), nullable=False, default="regular", server_default="regular"
+    )
+    status = Column(String(20), nullable=False)
+
+    # Measures
+    order_count = Column(Integer, nullable=False, default=0, server_default="0")
+    revenue = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    __table_args__ = (
+        Index(
+            "uq_daily_order_rollup",
+            "rollup_date",
+            "hour",
+            "customer_type",
+            "area",
+            "driver_id",
+            "order_type",
+            "status",
+            unique=True,
+        ),
+        Index("idx_daily_order_rollup_date_status", "rollup_date", "status"),
+    )
+
+    def __repr__(self):
+        return f"<DailyOrderRollup {self.rollup_date} {self.status}: {self.order_count}>"
+
+
+class DailyProductRollup(Base):
+    """Line-item daily facts (date × product × customer_type × area × driver × status)"""
+
+    __tablename__ = "analytics_daily_product_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Dimensions
+    rollup_date = Column(Date, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    customer_type = Column(String(50), nullable=False, default="", server_default="")
+    area = Column(String(50), nullable=False, default="", server_default="")
+    driver_id = Column(Integer, nullable=False, default=0, server_default="0")
+    status = Column(String(20), nullable=False)
+
+    # Measures
+    quantity = Column(Integer, nullable=False, default=0, server_default="0")
+    amount = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    __table_args__ = (
+        Index(
+            "uq_daily_product_rollup",
+            "rollup_date",
+            "product_id",
+            "customer_type",
+            "area",
+            "driver_id",
+            "status",
+            unique=True,
+        ),
+        Index("idx_daily_product_rollup_date_status", "rollup_date", "status"),
+    )
+
+    def __repr__(self):
+        return f"<DailyProductRollup {self.rollup_date} product={self.product_id}: {self.quantity}>"
+
+
+class DailyCustomerRollup(Base):
+    """Per-customer daily facts, used for distinct active-customer counts"""
+
+    __tablename__ = "analytics_daily_customer_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    rollup_date = Column(Date, nullable=False)
+    customer_id = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False)
+
+    order_count = Column(Integer, nullable=False, default=0, server_default="0")
+    revenue = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    __table_args__ = (
+        Index(
+            "uq_daily_customer_rollup",
+            "rollup_date",
+            "customer_id",
+            "status",
+            unique=True,
+        ),
+    )
@@ -104,8 +104,9 @@ class PaymentTransaction(Base):
     __tablename__ = "payment_transactions"
 
     id = Column(Integer, primary_key=True, index=True)
+    # Unset for files that failed before any line matched a batch
     batch_id = Column(
-        Integer, ForeignKey("payment_batches.id"), nullable=False, index=True
+        Integer, ForeignKey("payment_batches.id"), nullable=True, index=True
     )
 
     # Transaction details
@@ -157,8 +158,9 @@ class ReconciliationLog(Base):
     __tablename__ = "reconciliation_logs"
 
     id = Column(Integer, primary_key=True, index=True)
+    # Unset for files that failed before any line matched a batch
     batch_id = Column(
-        Integer, ForeignKey("payment_batches.id"), nullable=False, index=True
+        Integer, ForeignKey("payment_batches.id"), nullable=True, index=True
     )
 
     # File information
@@ -0,0 +1,48 @@
+"""
+Customer balance ledger
+
+One row per customer holding the running balances used for credit control.
+Adjusted incrementally in the same transaction as the order, invoice or
+payment change that moves them, and reconciled periodically against the full
+sums by the ledger reconciliation job.
+"""
+
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class CustomerBalanceLedger(Base):
+    """Materialized balances and credit settings of a customer"""
+
+    __tablename__ = "customer_balance_ledger"
+
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+
+    # Credit settings (not stored on customers); NULL limit = 不限額度
+    credit_limit = Column(Float, nullable=True)  # 信用額度
+    is_credit_blocked = Column(
+        Boolean, nullable=False, default=False, server_default="0"
+    )  # 信用額度封鎖
+
+    # Balances
+    # Unpaid / partially paid, non-cancelled orders (order total_amount)
+    unpaid_order_amount = Column(
+        Float, nullable=False, default=0.0, server_default="0"
+    )  # 未付訂單金額
+    # Issued invoices: total_amount - paid_amount
+    receivable_amount = Column(
+        Float, nullable=False, default=0.0, server_default="0"
+    )  # 應收帳款
+
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+    reconciled_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return (
+            f"<CustomerBalanceLedger {self.customer_id}: "
+            f"orders={self.unpaid_order_amount} receivable={self.receivable_amount}>"
+        )
@@ -0,0 +1,57 @@
+"""
+Invoice number blocks reserved from an invoice sequence
+
+Workers reserve contiguous blocks of numbers from an ``InvoiceSequence`` in a
+short transaction and hand them out from memory, so issuing an invoice never
+locks the sequence row. A released block records how far it was used; the
+numbers it never used are blank numbers (空白字軌) that must be reported to
+the e - invoice platform for the period.
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class InvoiceNumberBlock(Base):
+    """A contiguous range of invoice numbers reserved by one worker"""
+
+    __tablename__ = "invoice_number_blocks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sequence_id = Column(Integer, ForeignKey("invoice_sequences.id"), nullable=False)
+
+    # Copied from the sequence for period reports
+    year_month = Column(String(6), nullable=False)
+    prefix = Column(String(2), nullable=False)
+
+    # Reserved range (inclusive)
+    range_start = Column(Integer, nullable=False)
+    range_end = Column(Integer, nullable=False)
+
+    # Last number handed out; NULL if none was used
+    used_until = Column(Integer, nullable=True)
+
+    # active: held by a worker, released: unused numbers returned / blank
+    status = Column(String(20), nullable=False, default="active")
+    worker_id = Column(String(100), nullable=False)
+
+    allocated_at = Column(DateTime, server_default=func.now())
+    released_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("idx_invoice_number_blocks_period", "year_month", "prefix"),
+        Index("idx_invoice_number_blocks_allocated_at", "allocated_at"),
+    )
+
+    def __repr__(self):
+        return (
+            f"<InvoiceNumberBlock {self.year_month}-{self.prefix}: "
+            f"{self.range_start}-{self.range_end} ({self.status})>"
+        )
+
+    @property
+    def size(self) -> int:
+        """Numbers in the block"""
+        return self.range_end - self.range_start + 1
@@ -63,9 +63,9 @@ class InvoiceSequence(Base):
         Index("idx_invoice_sequence_unique", "year_month", "prefix", unique=True),
         # Index for finding active sequences
         Index("idx_invoice_sequence_active", "is_active", "year_month"),
-        # Ensure current_number is within allocated range
+        # Ensure current_number is within allocated range (range_end + 1 = exhausted)
         CheckConstraint(
-            "current_number >= range_start AND current_number <= range_end",
+            "current_number >= range_start AND current_number <= range_end + 1",
             name="check_current_number_in_range",
         ),
         # Ensure range is valid
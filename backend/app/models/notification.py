@@ -49,6 +49,15 @@ class NotificationChannel(str, enum.Enum):
     IN_APP = "in_app"
 
 
+class OutboxStatus(str, enum.Enum):
+    """Notification outbox entry status"""
+
+    PENDING = "pending"  # Waiting for (another) attempt
+    PROCESSING = "processing"  # Claimed by a worker
+    SENT = "sent"
+    FAILED = "failed"  # Gave up after max attempts
+
+
 class SMSLog(Base):
     """SMS delivery log for audit trail"""
 
@@ -232,3 +241,46 @@ class ProviderConfig(Base):
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+
+
+class NotificationOutbox(Base):
+    """
+    Durable queue of notifications to send
+
+    Request handlers only insert rows; the outbox workers claim due rows,
+    send them and retry failures with backoff.
+    """
+
+    __tablename__ = "notification_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # What to send
+    channel = Column(Enum(NotificationChannel), nullable=False)
+    recipient = Column(String(255), nullable=False)  # Phone, email, user_id
+    notification_type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)  # Template data
+
+    # Delivery state
+    status = Column(
+        Enum(OutboxStatus), default=OutboxStatus.PENDING, nullable=False
+    )
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(Text)
+
+    # Worker lease (PROCESSING rows whose lease expired are claimed again)
+    locked_by = Column(String(100))
+    locked_until = Column(DateTime(timezone=True))
+
+    # Timestamps
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    sent_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # Claim query: due rows by status
+        Index("idx_notification_outbox_due", "status", "next_attempt_at"),
+    )
@@ -1,4 +1,14 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    text,
+)
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -45,6 +55,12 @@ class OrderTemplate(Base):
     recurrence_interval = Column(Integer, default=1)  # Every N days / weeks / months
     recurrence_days = Column(JSON)  # For weekly: [1, 3, 5] for Mon / Wed / Fri
     next_scheduled_date = Column(DateTime)
+    # When the scheduler should create the next order (see template_scheduler_service)
+    next_run_at = Column(DateTime)
+    # Consecutive scheduler failures; the template is retried with backoff
+    failure_count = Column(Integer, default=0, nullable=False, server_default="0")
+    last_error = Column(Text)
+    last_failed_at = Column(DateTime)
 
     # Usage tracking
     times_used = Column(Integer, default=0)
@@ -63,6 +79,15 @@ class OrderTemplate(Base):
     creator = relationship("User", foreign_keys=[created_by])
     updater = relationship("User", foreign_keys=[updated_by])
 
+    __table_args__ = (
+        # Due-template lookups by the scheduler
+        Index(
+            "idx_order_templates_next_run_at",
+            "next_run_at",
+            postgresql_where=text("is_active AND is_recurring"),
+        ),
+    )
+
     def to_dict(self):
         """Convert template to dictionary"""
         return {
@@ -84,6 +109,7 @@ class OrderTemplate(Base):
                 if self.next_scheduled_date
                 else None
             ),
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
             "times_used": self.times_used,
             "last_used_at": (
                 self.last_used_at.isoformat() if self.last_used_at else None
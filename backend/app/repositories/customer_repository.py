@@ -5,6 +5,7 @@ Implements customer - specific queries and operations
 
 import logging
 from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
 from sqlalchemy import and_, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,7 +13,7 @@ from sqlalchemy.orm import selectinload
 
 from app.core.metrics import cache_operations_counter
 from app.models.customer import Customer
-from app.models.order import Order
+from app.models.order import Order, OrderStatus
 from app.repositories.base import CachedRepository
 
 logger = logging.getLogger(__name__)
@@ -157,7 +158,7 @@ class CustomerRepository(CachedRepository[Customer]):
         # This is a complex query that would join with orders and predictions
         # For now, return customers with subscription or regular delivery
         query = select(Customer).where(
-            and_(~Customer.is_terminated, Customer.is_subscription)
+            and_(Customer.is_active, Customer.is_subscription)
         )
 
         if area:
@@ -166,6 +167,92 @@ class CustomerRepository(CachedRepository[Customer]):
         result = await self.session.execute(query)
         return result.scalars().all()
 
+    async def get_delivery_candidate_rows(
+        self, target_date: date, area: Optional[str] = None, days: int = 60
+    ) -> List[Dict[str, Any]]:
+        """
+        Delivery candidates with their latest order and recent order stats
+
+        One query: a window over the customers' recent orders picks the
+        latest order per customer (row_number = 1) alongside the order count,
+        first order date and kilograms ordered in the look-back window.
+
+        Args:
+            target_date: Target delivery date
+            area: Optional area filter
+            days: Order history look-back in days
+
+        Returns:
+            One row per candidate; order columns are None without recent orders
+        """
+        cutoff = datetime.combine(target_date - timedelta(days=days), datetime.min.time())
+        per_customer = {"partition_by": Order.customer_id}
+        kilograms = (
+            func.coalesce(Order.qty_50kg, 0) * 50
+            + func.coalesce(Order.qty_20kg, 0) * 20
+            + func.coalesce(Order.qty_16kg, 0) * 16
+            + func.coalesce(Order.qty_10kg, 0) * 10
+            + func.coalesce(Order.qty_4kg, 0) * 4
+        )
+
+        recent = (
+            select(
+                Order.customer_id,
+                Order.scheduled_date,
+                Order.qty_50kg,
+                Order.qty_20kg,
+                Order.qty_16kg,
+                Order.qty_10kg,
+                Order.qty_4kg,
+                func.row_number()
+                .over(
+                    order_by=(Order.scheduled_date.desc(), Order.id.desc()),
+                    **per_customer,
+                )
+                .label("rn"),
+                func.count().over(**per_customer).label("order_count"),
+                func.min(Order.scheduled_date).over(**per_customer).label("first_date"),
+                func.sum(kilograms).over(**per_customer).label("total_kg"),
+            )
+            .where(
+                and_(
+                    Order.scheduled_date >= cutoff,
+                    Order.status != OrderStatus.CANCELLED,
+                )
+            )
+            .subquery()
+        )
+
+        query = (
+            select(
+                Customer.id.label("customer_id"),
+                Customer.customer_code,
+                Customer.short_name,
+                Customer.area,
+                Customer.customer_type,
+                Customer.is_subscription,
+                recent.c.scheduled_date.label("last_date"),
+                recent.c.qty_50kg,
+                recent.c.qty_20kg,
+                recent.c.qty_16kg,
+                recent.c.qty_10kg,
+                recent.c.qty_4kg,
+                recent.c.order_count,
+                recent.c.first_date,
+                recent.c.total_kg,
+            )
+            .outerjoin(
+                recent, and_(recent.c.customer_id == Customer.id, recent.c.rn == 1)
+            )
+            .where(and_(Customer.is_active, Customer.is_subscription))
+        )
+
+        if area:
+            query = query.where(Customer.area == area)
+
+        result = await self.session.execute(query)
+        return [dict(row) for row in result.mappings()]
+
     async def get_customer_with_recent_orders(
         self, customer_id: int, days: int = 30
     ) -> Optional[Customer]:
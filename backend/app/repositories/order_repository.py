@@ -5,8 +5,9 @@ Implements order - specific queries and operations
 
 import logging
 from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import and_, func, select, update
+from sqlalchemy import and_, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
 
@@ -141,12 +142,35 @@ class OrderRepository(BaseRepository[Order]):
         result = await self.session.execute(query)
         return result.unique().scalars().all()
 
+    async def bulk_create(self, rows: List[Dict[str, Any]]) -> List[Order]:
+        """
+        Insert many orders with a multi-row INSERT ... RETURNING
+
+        Runs in the caller's transaction; the caller commits.
+
+        Args:
+            rows: Column values of each new order
+
+        Returns:
+            Created orders, in the order of ``rows``
+        """
+        if not rows:
+            return []
+
+        # RETURNING order is not guaranteed; order numbers are unique, so
+        # map the results back instead of forcing row-at-a-time inserts
+        result = await self.session.scalars(insert(Order).returning(Order), rows)
+        created = {order.order_number: order for order in result}
+        return [created[row["order_number"]] for row in rows]
+
     async def bulk_assign_to_route(
         self, order_ids: List[int], route_id: int, driver_id: Optional[int] = None
     ) -> int:
         """
         Bulk assign orders to a route
 
+        Runs in the caller's transaction; the caller commits.
+
         Args:
             order_ids: List of order IDs
             route_id: Route ID to assign to
@@ -170,7 +194,6 @@ class OrderRepository(BaseRepository[Order]):
         )
 
         result = await self.session.execute(stmt)
-        await self.session.commit()
 
         updated_count = result.rowcount
         logger.info(f"Assigned {updated_count} orders to route {route_id}")
@@ -187,6 +210,8 @@ class OrderRepository(BaseRepository[Order]):
         """
         Update order delivery status
 
+        Runs in the caller's transaction; the caller commits.
+
         Args:
             order_id: Order ID
             status: New status
@@ -216,8 +241,7 @@ class OrderRepository(BaseRepository[Order]):
         if status == OrderStatus.DELIVERED and order.payment_method == "現金":
             order.payment_status = PaymentStatus.PAID
 
-        await self.session.commit()
-        await self.session.refresh(order)
+        await self.session.flush()
 
         return order
 
@@ -12,9 +12,9 @@ class CreditCheckResult(BaseModel):
 
     approved: bool = Field(..., description="是否通過信用額度檢查")
     reason: str = Field(..., description="檢查結果原因")
-    credit_limit: float = Field(..., description="信用額度")
+    credit_limit: Optional[float] = Field(None, description="信用額度 (未設定則不限額度)")
     current_balance: float = Field(..., description="當前應收帳款")
-    available_credit: float = Field(..., description="可用信用額度")
+    available_credit: Optional[float] = Field(None, description="可用信用額度 (不限額度時為空)")
     requested_amount: Optional[float] = Field(None, description="請求金額")
     exceeds_by: Optional[float] = Field(None, description="超出額度金額")
     is_blocked: bool = Field(default=False, description="信用是否被封鎖")
@@ -40,9 +40,9 @@ class CreditSummary(BaseModel):
 
     customer_id: int = Field(..., description="客戶ID")
     customer_name: str = Field(..., description="客戶名稱")
-    credit_limit: float = Field(..., description="信用額度")
+    credit_limit: Optional[float] = Field(None, description="信用額度 (未設定則不限額度)")
     current_balance: float = Field(..., description="當前應收帳款")
-    available_credit: float = Field(..., description="可用信用額度")
+    available_credit: Optional[float] = Field(None, description="可用信用額度 (不限額度時為空)")
     overdue_amount: float = Field(..., description="逾期金額")
     is_credit_blocked: bool = Field(..., description="信用是否被封鎖")
     credit_utilization: float = Field(..., description="信用額度使用率(%)")
@@ -3,7 +3,7 @@ from datetime import date, datetime
 from pydantic import BaseModel, Field
 
 from app.schemas.delivery_history_item import DeliveryHistoryItem
-from typing import Optional
+from typing import List, Optional
 
 
 class DeliveryHistoryBase(BaseModel):
@@ -6,7 +6,7 @@ from pydantic import BaseModel, ConfigDict, Field, field_validator, model_valida
 from app.core.validators import TaiwanValidators
 from app.models.order import OrderStatus, PaymentStatus
 from app.schemas.order_item import OrderItem, OrderItemCreate
-from typing import Optional
+from typing import List, Optional
 
 
 class OrderBase(BaseModel):
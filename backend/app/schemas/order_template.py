@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 
 class OrderTemplateProductItem(BaseModel):
@@ -85,6 +85,7 @@ class OrderTemplateInDB(OrderTemplateBase):
     times_used: int = 0
     last_used_at: Optional[datetime] = None
     next_scheduled_date: Optional[datetime] = None
+    next_run_at: Optional[datetime] = None
     is_active: bool = True
     created_at: datetime
     updated_at: datetime
@@ -152,9 +152,9 @@ class CustomerBalance(BaseModel):
     overdue_90: float  # 61 - 90 days overdue
     overdue_over_90: float  # >90 days overdue
 
-    # Credit info
-    credit_limit: float
-    available_credit: float
+    # Credit info (no limit when unset)
+    credit_limit: Optional[float]
+    available_credit: Optional[float]
     is_credit_blocked: bool
 
     # Outstanding invoices
@@ -0,0 +1,325 @@
+"""
+Columnar analytics archive
+
+Closed months of orders, order items, deliveries and delivery history are
+exported nightly to month-partitioned Parquet files:
+
+    {ANALYTICS_ARCHIVE_DIR}/{table}/month=YYYY-MM/data.parquet
+
+Heavy historical reports read the archived months through an embedded DuckDB
+engine and only query the primary database for the part of the range that is
+not archived yet (normally the current month), then merge both results.
+
+pyarrow and duckdb are optional - without them the exporter is a no-op and
+every report keeps querying the primary database.
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, and_, or_, select
+from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.models import Delivery, DeliveryHistory, Order, OrderItem
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    HAS_ARCHIVE_ENGINE = True
+except ImportError:
+    HAS_ARCHIVE_ENGINE = False
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the database per Parquet row group
+EXPORT_BATCH_SIZE = 10000
+
+# Date column each archived table is partitioned on
+ARCHIVE_DATE_COLUMNS = {
+    "orders": Order.created_at,
+    "order_items": Order.created_at,
+    "deliveries": Delivery.created_at,
+    "delivery_history": DeliveryHistory.transaction_date,
+}
+
+
+def month_start(value: date) -> date:
+    """First day of the month containing ``value``"""
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    """First day of the month after ``value``"""
+    return (month_start(value) + timedelta(days=32)).replace(day=1)
+
+
+def archive_statement(table: str, start: date, end: date) -> Select:
+    """
+    SELECT producing the archived rows of ``table`` for [start, end)
+
+    Order items carry their order's date and status so item-level reports do
+    not need a join at query time.
+    """
+    date_column = ARCHIVE_DATE_COLUMNS[table]
+    if table == "order_items":
+        stmt = select(
+            OrderItem.__table__,
+            Order.created_at.label("order_created_at"),
+            Order.status.label("order_status"),
+        ).join(Order, OrderItem.order_id == Order.id)
+    else:
+        stmt = select(date_column.table)
+
+    if isinstance(date_column.type, DateTime):
+        lower = datetime.combine(start, datetime.min.time())
+        upper = datetime.combine(end, datetime.min.time())
+    else:
+        lower, upper = start, end
+    return stmt.where(and_(date_column >= lower, date_column < upper))
+
+
+def _arrow_type(column_type: Any):
+    """Map a SQLAlchemy column type to an Arrow type"""
+    if isinstance(column_type, SQLEnum):
+        return pa.string()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, (Float, Numeric)):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _plain_value(value: Any) -> Any:
+    """Convert a database value to something Arrow stores as-is"""
+    if isinstance(value, Enum):
+        # Same representation as the database (SQLEnum stores names)
+        return value.name
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # Keep the wall-clock time the database returned
+        return value.replace(tzinfo=None)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (dict, list)):
+        return str(value)
+    return value
+
+
+@dataclass
+class ArchiveWindow:
+    """Split of a requested range into an archived and a live part"""
+
+    archive_start: Optional[date] = None  # inclusive month start
+    archive_end: Optional[date] = None  # exclusive month start
+
+    @property
+    def has_archive(self) -> bool:
+        return self.archive_start is not None
+
+
+class ArchiveQueryEngine:
+    """Runs SQL over the Parquet archive with an embedded DuckDB connection"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.ANALYTICS_ARCHIVE_DIR)
+
+    @property
+    def available(self) -> bool:
+        return HAS_ARCHIVE_ENGINE and self.root.is_dir()
+
+    def partition_path(self, table: str, month: date) -> Path:
+        return self.root / table / f"month={month:%Y-%m}" / "data.parquet"
+
+    def archived_months(self, table: str) -> List[date]:
+        """Closed months of ``table`` present in the archive, oldest first"""
+        table_dir = self.root / table
+        if not table_dir.is_dir():
+            return []
+
+        current_month = month_start(date.today())
+        months = []
+        for partition in table_dir.glob("month=*/data.parquet"):
+            try:
+                month = datetime.strptime(partition.parent.name[6:], "%Y-%m").date()
+            except ValueError:
+                continue
+            if month < current_month:
+                months.append(month)
+        return sorted(months)
+
+    def split(
+        self, table: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> ArchiveWindow:
+        """
+        Pick the archived months to use for [start, end]
+
+        The archive part is the longest run of consecutive archived months
+        overlapping the range; everything outside it is read live, so gaps in
+        the archive never drop data.
+        """
+        if not self.available:
+            return ArchiveWindow()
+
+        months = [
+            month
+            for month in self.archived_months(table)
+            if (start is None or next_month(month) > start)
+            and (end is None or month <= end)
+        ]
+        if not months:
+            return ArchiveWindow()
+
+        best_start = run_start = months[0]
+        best_len = run_len = 1
+        for previous, month in zip(months, months[1:]):
+            if month == next_month(previous):
+                run_len += 1
+            else:
+                run_start, run_len = month, 1
+            if run_len > best_len:
+                best_start, best_len = run_start, run_len
+
+        best_end = best_start
+        for _ in range(best_len):
+            best_end = next_month(best_end)
+        return ArchiveWindow(archive_start=best_start, archive_end=best_end)
+
+    def query(self, sql: str, params: Optional[Sequence[Any]] = None) -> pd.DataFrame:
+        """
+        Run ``sql`` against the archive
+
+        Each archived table is exposed as a view of the same name; the hive
+        ``month`` partition column can be used to prune files.
+        """
+        connection = duckdb.connect()
+        try:
+            for table in ARCHIVE_DATE_COLUMNS:
+                if any((self.root / table).glob("month=*/data.parquet")):
+                    pattern = (self.root / table / "month=*" / "data.parquet").as_posix()
+                    connection.execute(
+                        f"CREATE VIEW {table} AS SELECT * FROM "
+                        f"read_parquet('{pattern}', hive_partitioning = true)"
+                    )
+            return connection.execute(sql, list(params or [])).df()
+        finally:
+            connection.close()
+
+    async def query_async(
+        self, sql: str, params: Optional[Sequence[Any]] = None
+    ) -> pd.DataFrame:
+        """Run ``query`` in a worker thread so the event loop is not blocked"""
+        return await asyncio.to_thread(self.query, sql, params)
+
+
+def live_filter(column, window: ArchiveWindow):
+    """Restrict an OLTP query to rows outside the archived months"""
+    if not window.has_archive:
+        return None
+    if isinstance(column.type, DateTime):
+        lower = datetime.combine(window.archive_start, datetime.min.time())
+        upper = datetime.combine(window.archive_end, datetime.min.time())
+    else:
+        lower, upper = window.archive_start, window.archive_end
+    return or_(column < lower, column >= upper)
+
+
+class AnalyticsArchiveService:
+    """Exports closed months from the primary database to the Parquet archive"""
+
+    def __init__(self, db: AsyncSession, engine: Optional[ArchiveQueryEngine] = None):
+        self.db = db
+        self.engine = engine or ArchiveQueryEngine()
+
+    async def export_month(self, table: str, month: date) -> int:
+        """
+        Write one month of ``table`` to its Parquet partition
+
+        The file is written next to the target and renamed into place, so
+        readers never see a half-written partition.
+
+        Returns:
+            Number of rows exported
+        """
+        month = month_start(month)
+        stmt = archive_statement(table, month, next_month(month))
+        columns = list(stmt.selected_columns)
+        schema = pa.schema(
+            [(column.key, _arrow_type(column.type)) for column in columns]
+        )
+
+        target = self.engine.partition_path(table, month)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = target.with_suffix(".parquet.tmp")
+
+        row_count = 0
+        result = await self.db.stream(stmt)
+        with pq.ParquetWriter(temp_path, schema, compression="zstd") as writer:
+            async for rows in result.partitions(EXPORT_BATCH_SIZE):
+                batch = {
+                    column.key: [_plain_value(row[index]) for row in rows]
+                    for index, column in enumerate(columns)
+                }
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+                row_count += len(rows)
+
+        os.replace(temp_path, target)
+        logger.info(f"Archived {row_count} {table} rows for {month:%Y-%m}")
+        return row_count
+
+    async def export_closed_months(
+        self, months: int = 2, tables: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Export the last ``months`` closed months of each table
+
+        Existing partitions are overwritten, so late edits (status changes,
+        corrections) to recently closed months reach the archive.
+
+        Returns:
+            Exported row count per table
+        """
+        if not HAS_ARCHIVE_ENGINE:
+            logger.warning("pyarrow / duckdb not installed, analytics archive disabled")
+            return {}
+
+        last_closed = month_start(month_start(date.today()) - timedelta(days=1))
+        month_list = [last_closed]
+        for _ in range(max(months, 1) - 1):
+            month_list.append(month_start(month_list[-1] - timedelta(days=1)))
+
+        exported = {}
+        for table in tables or list(ARCHIVE_DATE_COLUMNS):
+            exported[table] = 0
+            for month in sorted(month_list):
+                exported[table] += await self.export_month(table, month)
+        return exported
+
+
+async def export_analytics_archive(months: int = 2) -> Dict[str, int]:
+    """
+    Archive export job entry point
+
+    Run nightly; use a large ``months`` value once for the initial backfill.
+    """
+    from app.core.database_async import get_async_session
+
+    async for session in get_async_session():
+        return await AnalyticsArchiveService(session).export_closed_months(months)
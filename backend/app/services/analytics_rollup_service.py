@@ -0,0 +1,626 @@
+"""
+Daily analytics rollup maintenance and query helpers
+
+Order facts are folded into the analytics_daily_* tables:
+- incrementally, whenever the order service changes an order's status
+- in bulk, by the rebuild job (backfill / nightly reconciliation)
+
+Readers get "fact sources" that union the rollups for closed days with a
+live aggregate of today's orders, so callers aggregate once over a small
+relation instead of scanning orders for the whole range.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Integer,
+    String,
+    and_,
+    case,
+    cast,
+    delete,
+    func,
+    literal,
+    select,
+    true,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Subquery
+
+from app.models.analytics_rollup import (
+    DailyCustomerRollup,
+    DailyOrderRollup,
+    DailyProductRollup,
+)
+from app.models.customer import Customer
+from app.models.order import Order, OrderStatus
+from app.models.order_item import OrderItem
+
+logger = logging.getLogger(__name__)
+
+ORDER_KEYS = [
+    "rollup_date", "hour", "customer_type", "area", "driver_id", "order_type", "status"
+]
+PRODUCT_KEYS = ["rollup_date", "product_id", "customer_type", "area", "driver_id", "status"]
+CUSTOMER_KEYS = ["rollup_date", "customer_id", "status"]
+
+
+def status_key(status: Any) -> str:
+    """
+    Normalize an order status to the value stored in rollup tables
+
+    SQLEnum persists enum names, so rollups store names too; this keeps the
+    union with live ``CAST(orders.status AS VARCHAR)`` rows consistent.
+    """
+    if isinstance(status, OrderStatus):
+        return status.name
+    try:
+        return OrderStatus(status).name
+    except ValueError:
+        return str(status).upper()
+
+
+def order_type_key(is_urgent: Optional[bool]) -> str:
+    """Order type stored in the order rollup for an order's urgency flag"""
+    return "urgent" if is_urgent else "regular"
+
+
+def status_keys(statuses: Iterable[Any]) -> List[str]:
+    """Normalize a list of statuses for rollup filters"""
+    return [status_key(s) for s in statuses]
+
+
+def status_from_key(key: str) -> Any:
+    """Map a stored rollup status back to OrderStatus where possible"""
+    return OrderStatus[key] if key in OrderStatus.__members__ else key
+
+
+@dataclass
+class RollupWindow:
+    """Split of a requested range into rollup-covered days and a live tail"""
+
+    history_start: Optional[date] = None
+    history_end: Optional[date] = None
+    live_start: Optional[datetime] = None
+    live_end: Optional[datetime] = None
+
+    @property
+    def has_history(self) -> bool:
+        return self.history_start is not None
+
+    @property
+    def has_live(self) -> bool:
+        return self.live_start is not None
+
+
+class AnalyticsRollupService:
+    """Maintains and queries the daily analytics rollup tables"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Range handling
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def split_range(
+        start_date: datetime, end_date: datetime, today: Optional[date] = None
+    ) -> RollupWindow:
+        """
+        Split [start_date, end_date] into closed days (rollups) and today (live)
+
+        Rollups have day granularity, so historical days are included whole.
+
+        Args:
+            start_date: Range start
+            end_date: Range end (inclusive)
+            today: Override for the current date (tests)
+
+        Returns:
+            RollupWindow describing both parts
+        """
+        today = today or date.today()
+        start_day = start_date.date() if isinstance(start_date, datetime) else start_date
+        end_day = end_date.date() if isinstance(end_date, datetime) else end_date
+
+        window = RollupWindow()
+        if start_day < today:
+            window.history_start = start_day
+            window.history_end = min(end_day, today - timedelta(days=1))
+
+        if end_day >= today:
+            tzinfo = start_date.tzinfo if isinstance(start_date, datetime) else None
+            today_start = datetime.combine(today, time.min, tzinfo=tzinfo)
+            window.live_start = (
+                max(start_date, today_start)
+                if isinstance(start_date, datetime)
+                else today_start
+            )
+            window.live_end = (
+                end_date
+                if isinstance(end_date, datetime)
+                else datetime.combine(end_day, time.max, tzinfo=tzinfo)
+            )
+
+        return window
+
+    # ------------------------------------------------------------------
+    # Live aggregates (shared by the fact sources and the rebuild job)
+    # ------------------------------------------------------------------
+
+    def _live_order_select(self, start: datetime, end: datetime):
+        day = func.date(Order.created_at)
+        hour = cast(func.extract("hour", Order.created_at), Integer)
+        customer_type = func.coalesce(Customer.customer_type, "")
+        area = func.coalesce(Customer.area, "")
+        driver_id = func.coalesce(Order.driver_id, 0)
+        order_type = case(
+            (Order.is_urgent == true(), order_type_key(True)),
+            else_=order_type_key(False),
+        )
+        status = cast(Order.status, String)
+
+        return (
+            select(
+                day.label("rollup_date"),
+                hour.label("hour"),
+                customer_type.label("customer_type"),
+                area.label("area"),
+                driver_id.label("driver_id"),
+                order_type.label("order_type"),
+                status.label("status"),
+                func.count(Order.id).label("order_count"),
+                func.coalesce(func.sum(Order.total_amount), 0).label("revenue"),
+            )
+            .select_from(Order)
+            .join(Customer, Order.customer_id == Customer.id)
+            .where(and_(Order.created_at >= start, Order.created_at <= end))
+            .group_by(day, hour, customer_type, area, driver_id, order_type, status)
+        )
+
+    def _live_product_select(self, start: datetime, end: datetime):
+        day = func.date(Order.created_at)
+        customer_type = func.coalesce(Customer.customer_type, "")
+        area = func.coalesce(Customer.area, "")
+        driver_id = func.coalesce(Order.driver_id, 0)
+        status = cast(Order.status, String)
+
+        return (
+            select(
+                day.label("rollup_date"),
+                OrderItem.gas_product_id.label("product_id"),
+                customer_type.label("customer_type"),
+                area.label("area"),
+                driver_id.label("driver_id"),
+                status.label("status"),
+                func.coalesce(func.sum(OrderItem.quantity), 0).label("quantity"),
+                func.coalesce(func.sum(OrderItem.subtotal), 0).label("amount"),
+            )
+            .select_from(OrderItem)
+            .join(Order, OrderItem.order_id == Order.id)
+            .join(Customer, Order.customer_id == Customer.id)
+            .where(and_(Order.created_at >= start, Order.created_at <= end))
+            .group_by(
+                day, OrderItem.gas_product_id, customer_type, area, driver_id, status
+            )
+        )
+
+    def _live_customer_select(self, start: datetime, end: datetime):
+        day = func.date(Order.created_at)
+        status = cast(Order.status, String)
+
+        return (
+            select(
+                day.label("rollup_date"),
+                Order.customer_id.label("customer_id"),
+                status.label("status"),
+                func.count(Order.id).label("order_count"),
+                func.coalesce(func.sum(Order.total_amount), 0).label("revenue"),
+            )
+            .where(and_(Order.created_at >= start, Order.created_at <= end))
+            .group_by(day, Order.customer_id, status)
+        )
+
+    # ------------------------------------------------------------------
+    # Fact sources
+    # ------------------------------------------------------------------
+
+    def _fact_source(self, model, columns: List[str], window: RollupWindow, live_select):
+        parts = []
+        if window.has_history:
+            parts.append(
+                select(*[getattr(model, c).label(c) for c in columns]).where(
+                    and_(
+                        model.rollup_date >= window.history_start,
+                        model.rollup_date <= window.history_end,
+                    )
+                )
+            )
+        if window.has_live:
+            parts.append(live_select(window.live_start, window.live_end))
+
+        if not parts:
+            # Empty range - keep the column shape so callers can still aggregate
+            parts.append(
+                select(*[getattr(model, c).label(c) for c in columns]).where(
+                    literal(False)
+                )
+            )
+
+        if len(parts) == 1:
+            return parts[0].subquery()
+        return union_all(*parts).subquery()
+
+    def order_facts(self, start_date: datetime, end_date: datetime) -> Subquery:
+        """Order-level facts for the range (rollups + live today)"""
+        return self._fact_source(
+            DailyOrderRollup,
+            ORDER_KEYS + ["order_count", "revenue"],
+            self.split_range(start_date, end_date),
+            self._live_order_select,
+        )
+
+    def product_facts(self, start_date: datetime, end_date: datetime) -> Subquery:
+        """Line-item facts for the range (rollups + live today)"""
+        return self._fact_source(
+            DailyProductRollup,
+            PRODUCT_KEYS + ["quantity", "amount"],
+            self.split_range(start_date, end_date),
+            self._live_product_select,
+        )
+
+    def customer_facts(self, start_date: datetime, end_date: datetime) -> Subquery:
+        """Per-customer facts for the range (rollups + live today)"""
+        return self._fact_source(
+            DailyCustomerRollup,
+            CUSTOMER_KEYS + ["order_count", "revenue"],
+            self.split_range(start_date, end_date),
+            self._live_customer_select,
+        )
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    def _insert(self, model):
+        bind = self.db.bind
+        dialect = bind.dialect.name if bind is not None else "postgresql"
+        return sqlite_insert(model) if dialect == "sqlite" else pg_insert(model)
+
+    async def _upsert(
+        self, model, rows: List[Dict[str, Any]], keys: List[str], measures: List[str]
+    ) -> None:
+        if not rows:
+            return
+
+        stmt = self._insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={m: getattr(model, m) + getattr(stmt.excluded, m) for m in measures},
+        )
+        await self.db.execute(stmt)
+
+    async def _order_dimensions(
+        self, orders: Sequence[Order]
+    ) -> Dict[int, Tuple[str, str, List[Tuple[int, int, float]]]]:
+        """Customer type, area and per-product items of each order (two queries)"""
+        customer_ids = {order.customer_id for order in orders}
+        customer_result = await self.db.execute(
+            select(Customer.id, Customer.customer_type, Customer.area).where(
+                Customer.id.in_(customer_ids)
+            )
+        )
+        customers = {
+            row.id: (row.customer_type or "", row.area or "") for row in customer_result
+        }
+
+        items: Dict[int, List[Tuple[int, int, float]]] = {}
+        items_result = await self.db.execute(
+            select(
+                OrderItem.order_id,
+                OrderItem.gas_product_id,
+                func.coalesce(func.sum(OrderItem.quantity), 0),
+                func.coalesce(func.sum(OrderItem.subtotal), 0),
+            )
+            .where(OrderItem.order_id.in_([order.id for order in orders]))
+            .group_by(OrderItem.order_id, OrderItem.gas_product_id)
+        )
+        for order_id, product_id, quantity, amount in items_result:
+            items.setdefault(order_id, []).append((product_id, int(quantity), float(amount)))
+
+        return {
+            order.id: (*customers.get(order.customer_id, ("", "")), items.get(order.id, []))
+            for order in orders
+        }
+
+    @staticmethod
+    def _add(
+        rows: Dict[tuple, Dict[str, Any]], keys: List[str], row: Dict[str, Any], measures: List[str]
+    ) -> None:
+        """Fold a row into ``rows``, summing measures of rows with equal keys"""
+        key = tuple(row[k] for k in keys)
+        existing = rows.get(key)
+        if existing is None:
+            rows[key] = row
+        else:
+            for measure in measures:
+                existing[measure] += row[measure]
+
+    def _apply_order(
+        self,
+        rows: Tuple[Dict[tuple, Dict[str, Any]], ...],
+        order: Order,
+        status: Any,
+        driver_id: Optional[int],
+        sign: int,
+        customer_type: str,
+        area: str,
+        items: List[Tuple[int, int, float]],
+        amount: float,
+        is_urgent: Optional[bool],
+    ) -> None:
+        order_rows, product_rows, customer_rows = rows
+        created_at = order.created_at or datetime.now()
+        rollup_date = created_at.date()
+        status_value = status_key(status)
+        driver_value = driver_id or 0
+        revenue = amount * sign
+
+        self._add(
+            order_rows,
+            ORDER_KEYS,
+            {
+                "rollup_date": rollup_date,
+                "hour": created_at.hour,
+                "customer_type": customer_type,
+                "area": area,
+                "driver_id": driver_value,
+                "order_type": order_type_key(is_urgent),
+                "status": status_value,
+                "order_count": sign,
+                "revenue": revenue,
+            },
+            ["order_count", "revenue"],
+        )
+
+        for product_id, quantity, amount in items:
+            self._add(
+                product_rows,
+                PRODUCT_KEYS,
+                {
+                    "rollup_date": rollup_date,
+                    "product_id": product_id,
+                    "customer_type": customer_type,
+                    "area": area,
+                    "driver_id": driver_value,
+                    "status": status_value,
+                    "quantity": quantity * sign,
+                    "amount": amount * sign,
+                },
+                ["quantity", "amount"],
+            )
+
+        self._add(
+            customer_rows,
+            CUSTOMER_KEYS,
+            {
+                "rollup_date": rollup_date,
+                "customer_id": order.customer_id,
+                "status": status_value,
+                "order_count": sign,
+                "revenue": revenue,
+            },
+            ["order_count", "revenue"],
+        )
+
+    async def order_items(self, order: Order) -> List[Tuple[int, int, float]]:
+        """
+        Per-product (product_id, quantity, amount) items of an order
+
+        Callers snapshot these before changing an order so the old bucket
+        can be reversed with the old figures.
+        """
+        dimensions = await self._order_dimensions([order])
+        return dimensions[order.id][2]
+
+    async def record_order_change(
+        self,
+        order: Order,
+        previous_status: Optional[Any] = None,
+        previous_driver_id: Optional[int] = None,
+        previous_amount: Optional[float] = None,
+        previous_items: Optional[List[Tuple[int, int, float]]] = None,
+        previous_is_urgent: Optional[bool] = None,
+    ) -> None:
+        """
+        Move an order's contribution between rollup buckets
+
+        Runs inside the caller's transaction; the caller commits.
+
+        Args:
+            order: Order in its new state
+            previous_status: Status before the change (None for new orders)
+            previous_driver_id: Driver before the change (defaults to current)
+            previous_amount: Total amount before the change (defaults to current)
+            previous_items: ``order_items`` before the change (defaults to current)
+            previous_is_urgent: Urgency flag before the change (defaults to current)
+        """
+        previous = None
+        if (
+            previous_amount is not None
+            or previous_items is not None
+            or previous_is_urgent is not None
+        ):
+            previous = {
+                order.id: (previous_amount, previous_items, previous_is_urgent)
+            }
+        await self.record_order_changes(
+            [(order, previous_status, previous_driver_id)], previous
+        )
+
+    async def record_order_changes(
+        self,
+        changes: Sequence[Tuple[Order, Optional[Any], Optional[int]]],
+        previous: Optional[
+            Dict[
+                int,
+                Tuple[
+                    Optional[float],
+                    Optional[List[Tuple[int, int, float]]],
+                    Optional[bool],
+                ],
+            ]
+        ] = None,
+    ) -> None:
+        """
+        Batch form of ``record_order_change``
+
+        Looks up all dimensions in two queries and writes one upsert per
+        rollup table; changes landing in the same bucket are summed first.
+
+        Args:
+            changes: (order, previous_status, previous_driver_id) tuples
+            previous: Order ID -> (previous_amount, previous_items,
+                previous_is_urgent) for orders whose amount, items or urgency
+                changed
+        """
+        if not changes:
+            return
+
+        previous = previous or {}
+        dimensions = await self._order_dimensions([order for order, _, _ in changes])
+        rows: Tuple[Dict[tuple, Dict[str, Any]], ...] = ({}, {}, {})
+
+        for order, previous_status, previous_driver_id in changes:
+            customer_type, area, items = dimensions[order.id]
+            amount = float(order.total_amount or 0)
+            if previous_status is not None:
+                previous_amount, previous_items, previous_is_urgent = previous.get(
+                    order.id, (None, None, None)
+                )
+                self._apply_order(
+                    rows,
+                    order,
+                    previous_status,
+                    previous_driver_id if previous_driver_id is not None else order.driver_id,
+                    -1,
+                    customer_type,
+                    area,
+                    previous_items if previous_items is not None else items,
+                    float(previous_amount) if previous_amount is not None else amount,
+                    (
+                        previous_is_urgent
+                        if previous_is_urgent is not None
+                        else order.is_urgent
+                    ),
+                )
+            self._apply_order(
+                rows,
+                order,
+                order.status,
+                order.driver_id,
+                1,
+                customer_type,
+                area,
+                items,
+                amount,
+                order.is_urgent,
+            )
+
+        order_rows, product_rows, customer_rows = rows
+        await self._upsert(
+            DailyOrderRollup, list(order_rows.values()), ORDER_KEYS, ["order_count", "revenue"]
+        )
+        await self._upsert(
+            DailyProductRollup, list(product_rows.values()), PRODUCT_KEYS, ["quantity", "amount"]
+        )
+        await self._upsert(
+            DailyCustomerRollup,
+            list(customer_rows.values()),
+            CUSTOMER_KEYS,
+            ["order_count", "revenue"],
+        )
+
+    # ------------------------------------------------------------------
+    # Rebuild job
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def as_date(value: Any) -> date:
+        """Coerce a rollup_date value (date, datetime or ISO string) to a date"""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return date.fromisoformat(str(value)[:10])
+
+    async def rebuild(self, start_day: date, end_day: date) -> Dict[str, int]:
+        """
+        Recompute rollups for [start_day, end_day] from orders
+
+        Used for the initial backfill and as a periodic reconciliation of the
+        incrementally maintained rows. Commits when done.
+
+        Args:
+            start_day: First day to rebuild
+            end_day: Last day to rebuild (inclusive)
+
+        Returns:
+            Number of rollup rows written per table
+        """
+        start = datetime.combine(start_day, time.min)
+        end = datetime.combine(end_day, time.max)
+        written: Dict[str, int] = {}
+
+        for model, keys, measures, live_select in (
+            (DailyOrderRollup, ORDER_KEYS, ["order_count", "revenue"], self._live_order_select),
+            (DailyProductRollup, PRODUCT_KEYS, ["quantity", "amount"], self._live_product_select),
+            (DailyCustomerRollup, CUSTOMER_KEYS, ["order_count", "revenue"], self._live_customer_select),
+        ):
+            await self.db.execute(
+                delete(model).where(
+                    and_(model.rollup_date >= start_day, model.rollup_date <= end_day)
+                )
+            )
+
+            result = await self.db.execute(live_select(start, end))
+            rows = []
+            for row in result.mappings():
+                values = {c: row[c] for c in keys + measures}
+                values["rollup_date"] = self.as_date(values["rollup_date"])
+                values["status"] = status_key(values["status"])
+                rows.append(values)
+
+            # Keep statements well under driver parameter limits
+            for i in range(0, len(rows), 1000):
+                await self.db.execute(self._insert(model).values(rows[i : i + 1000]))
+
+            written[model.__tablename__] = len(rows)
+
+        await self.db.commit()
+        logger.info(f"Rebuilt analytics rollups {start_day} → {end_day}: {written}")
+
+        return written
+
+
+async def rebuild_daily_rollups(days: int = 2) -> Dict[str, int]:
+    """
+    Rebuild job entry point
+
+    Reconciles the last ``days`` closed days. Run nightly; use a large
+    ``days`` value once for the initial backfill.
+    """
+    from app.core.database_async import get_async_session
+
+    end_day = date.today() - timedelta(days=1)
+    start_day = end_day - timedelta(days=max(days, 1) - 1)
+
+    async for session in get_async_session():
+        return await AnalyticsRollupService(session).rebuild(start_day, end_day)
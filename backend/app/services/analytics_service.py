@@ -1,6 +1,14 @@
 """Analytics service for generating dashboard metrics and reports."""
 
+import asyncio
+import copy
+import json
+import logging
+import re
+from contextvars import ContextVar
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
@@ -9,6 +17,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.core.service_utils import (
+    QueryFanout,
     handle_service_errors,
     validate_date_range,
     cache_result,
@@ -23,14 +32,31 @@ from app.models import (
     Invoice,
     Order,
     OrderItem,
-    Payment,
     Route,
     User,
 )
+from app.models.invoice import Payment
 from app.models.order import OrderStatus
 from app.models.route import RouteStatus
 from app.models.route_delivery import DeliveryStatus
+from app.services.analytics_archive_service import ArchiveQueryEngine, live_filter
+from app.services.analytics_rollup_service import (
+    AnalyticsRollupService,
+    status_from_key,
+    status_keys,
+)
 from app.services.email_service import EmailService
+from app.services.report_job_service import ReportJob, report_job_queue
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of analytics queries in flight for one request / report
+ANALYTICS_QUERY_CONCURRENCY = 4
+
+# Fanout shared by every metric of the report currently being generated
+_report_fanout: ContextVar[Optional[QueryFanout]] = ContextVar(
+    "analytics_report_fanout", default=None
+)
 
 
 class AnalyticsService:
@@ -40,6 +66,21 @@ class AnalyticsService:
         self.db = db
         self.email_service = EmailService()
         self.storage_service = StorageService()
+        self.rollups = AnalyticsRollupService(db)
+        self.archive = ArchiveQueryEngine()
+
+    def _query_fanout(self) -> QueryFanout:
+        """Fanout of the report being generated, or a new one for this call."""
+        return _report_fanout.get() or QueryFanout(
+            self.db, max_concurrency=ANALYTICS_QUERY_CONCURRENCY
+        )
+
+    def _bound_to(self, session: AsyncSession) -> "AnalyticsService":
+        """Copy of this service that runs its queries on another session."""
+        service = copy.copy(self)
+        service.db = session
+        service.rollups = AnalyticsRollupService(session)
+        return service
 
     @handle_service_errors(operation="計算營收指標")
     @validate_date_range(max_days=365, allow_future=False)
@@ -49,19 +90,27 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Get revenue metrics for executive dashboard."""
-        # Get base revenue data
-        current_revenue, order_count = await self._calculate_base_revenue(
-            start_date, end_date
-        )
-        
-        # Calculate period comparisons
-        prev_revenue, growth = await self._calculate_period_comparisons(
-            start_date, end_date, current_revenue
+        # Base revenue, previous period and trends are independent queries
+        (
+            (current_revenue, order_count),
+            prev_revenue,
+            (daily_trend, revenue_by_product),
+        ) = await self._query_fanout().run(
+            lambda session: self._bound_to(session)._calculate_base_revenue(
+                start_date, end_date
+            ),
+            lambda session: self._bound_to(session)._calculate_previous_revenue(
+                start_date, end_date
+            ),
+            lambda session: self._bound_to(session)._calculate_revenue_trends(
+                start_date, end_date
+            ),
         )
-        
-        # Get revenue trends and breakdowns
-        daily_trend, revenue_by_product = await self._calculate_revenue_trends(
-            start_date, end_date
+
+        growth = (
+            ((current_revenue - prev_revenue) / prev_revenue * 100)
+            if prev_revenue > 0
+            else 0
         )
 
         return {
@@ -82,14 +131,13 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> tuple[float, int]:
         """Calculate base revenue and order count for period."""
+        facts = self.rollups.order_facts(start_date, end_date)
         revenue_query = select(
-            func.sum(Order.total_amount).label("total"),
-            func.count(Order.id).label("order_count"),
+            func.sum(facts.c.revenue).label("total"),
+            func.sum(facts.c.order_count).label("order_count"),
         ).where(
-            and_(
-                Order.created_at >= start_date,
-                Order.created_at <= end_date,
-                Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
+            facts.c.status.in_(
+                status_keys([OrderStatus.DELIVERED])
             )
         )
         result = await self.db.execute(revenue_query)
@@ -97,77 +145,65 @@ class AnalyticsService:
         
         return revenue_data.total or 0, revenue_data.order_count or 0
 
-    async def _calculate_period_comparisons(
-        self, start_date: datetime, end_date: datetime, current_revenue: float
-    ) -> tuple[float, float]:
-        """Calculate previous period comparison and growth rate."""
+    async def _calculate_previous_revenue(
+        self, start_date: datetime, end_date: datetime
+    ) -> float:
+        """Calculate revenue of the period preceding the given one."""
         period_days = (end_date - start_date).days
         prev_start = start_date - timedelta(days=period_days)
         prev_end = start_date
 
-        prev_query = select(func.sum(Order.total_amount).label("total")).where(
-            and_(
-                Order.created_at >= prev_start,
-                Order.created_at < prev_end,
-                Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
+        # Previous period ends just before start_date (exclusive bound)
+        facts = self.rollups.order_facts(
+            prev_start, prev_end - timedelta(microseconds=1)
+        )
+        prev_query = select(func.sum(facts.c.revenue).label("total")).where(
+            facts.c.status.in_(
+                status_keys([OrderStatus.DELIVERED])
             )
         )
         prev_result = await self.db.execute(prev_query)
-        prev_revenue = prev_result.scalar() or 0
-
-        growth = (
-            ((current_revenue - prev_revenue) / prev_revenue * 100)
-            if prev_revenue > 0
-            else 0
-        )
-        
-        return prev_revenue, growth
+        return prev_result.scalar() or 0
 
     async def _calculate_revenue_trends(
         self, start_date: datetime, end_date: datetime
     ) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         """Calculate daily revenue trends and product breakdown."""
+        revenue_statuses = status_keys([OrderStatus.DELIVERED])
+
         # Daily revenue trend
+        order_facts = self.rollups.order_facts(start_date, end_date)
         daily_query = (
             select(
-                func.date(Order.created_at).label("date"),
-                func.sum(Order.total_amount).label("amount"),
+                order_facts.c.rollup_date.label("date"),
+                func.sum(order_facts.c.revenue).label("amount"),
             )
-            .where(
-                and_(
-                    Order.created_at >= start_date,
-                    Order.created_at <= end_date,
-                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
-                )
-            )
-            .group_by(func.date(Order.created_at))
+            .where(order_facts.c.status.in_(revenue_statuses))
+            .group_by(order_facts.c.rollup_date)
             .order_by("date")
         )
 
         daily_result = await self.db.execute(daily_query)
         daily_revenue = [
-            {"date": row.date.isoformat(), "amount": float(row.amount or 0)}
+            {
+                "date": self.rollups.as_date(row.date).isoformat(),
+                "amount": float(row.amount or 0),
+            }
             for row in daily_result
         ]
 
         # Revenue by product
+        product_facts = self.rollups.product_facts(start_date, end_date)
         product_query = (
             select(
-                GasProduct.name,
-                func.sum(OrderItem.subtotal).label("amount"),
-                func.sum(OrderItem.quantity).label("quantity"),
+                GasProduct.name_zh.label("name"),
+                func.sum(product_facts.c.amount).label("amount"),
+                func.sum(product_facts.c.quantity).label("quantity"),
             )
-            .select_from(OrderItem)
-            .join(Order, OrderItem.order_id == Order.id)
-            .join(GasProduct, OrderItem.product_id == GasProduct.id)
-            .where(
-                and_(
-                    Order.created_at >= start_date,
-                    Order.created_at <= end_date,
-                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
-                )
-            )
-            .group_by(GasProduct.id, GasProduct.name)
+            .select_from(product_facts)
+            .join(GasProduct, product_facts.c.product_id == GasProduct.id)
+            .where(product_facts.c.status.in_(revenue_statuses))
+            .group_by(GasProduct.id, GasProduct.name_zh)
         )
 
         product_result = await self.db.execute(product_query)
@@ -190,49 +226,46 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Get order metrics for dashboards."""
+        facts = self.rollups.order_facts(start_date, end_date)
+
         # Order status breakdown
-        status_query = (
-            select(Order.status, func.count(Order.id).label("count"))
-            .where(and_(Order.created_at >= start_date, Order.created_at <= end_date))
-            .group_by(Order.status)
-        )
+        status_query = select(
+            facts.c.status, func.sum(facts.c.order_count).label("count")
+        ).group_by(facts.c.status)
 
         status_result = await self.db.execute(status_query)
-        status_breakdown = {row.status: row.count for row in status_result}
+        status_breakdown = {
+            status_from_key(row.status): int(row.count or 0) for row in status_result
+        }
 
         # Total orders
         total_orders = sum(status_breakdown.values())
 
         # Hourly distribution
         hourly_query = (
-            select(
-                func.extract("hour", Order.created_at).label("hour"),
-                func.count(Order.id).label("count"),
-            )
-            .where(and_(Order.created_at >= start_date, Order.created_at <= end_date))
-            .group_by("hour")
-            .order_by("hour")
+            select(facts.c.hour, func.sum(facts.c.order_count).label("count"))
+            .group_by(facts.c.hour)
+            .order_by(facts.c.hour)
         )
 
         hourly_result = await self.db.execute(hourly_query)
         hourly_distribution = [
-            {"hour": int(row.hour), "count": row.count} for row in hourly_result
+            {"hour": int(row.hour), "count": int(row.count or 0)}
+            for row in hourly_result
         ]
 
-        # Order type distribution
-        type_query = (
-            select(Order.order_type, func.count(Order.id).label("count"))
-            .where(and_(Order.created_at >= start_date, Order.created_at <= end_date))
-            .group_by(Order.order_type)
-        )
+        # Order type distribution (urgent / regular)
+        type_query = select(
+            facts.c.order_type, func.sum(facts.c.order_count).label("count")
+        ).group_by(facts.c.order_type)
 
         type_result = await self.db.execute(type_query)
-        order_types = {row.order_type: row.count for row in type_result}
+        order_types = {row.order_type: int(row.count or 0) for row in type_result}
 
         return {
             "total": total_orders,
             "statusBreakdown": status_breakdown,
-            "completed": status_breakdown.get(OrderStatus.COMPLETED, 0),
+            "completed": status_breakdown.get(OrderStatus.DELIVERED, 0),
             "pending": status_breakdown.get(OrderStatus.PENDING, 0),
             "cancelled": status_breakdown.get(OrderStatus.CANCELLED, 0),
             "hourlyDistribution": hourly_distribution,
@@ -240,7 +273,7 @@ class AnalyticsService:
             "completionRate": round(
                 (
                     (
-                        status_breakdown.get(OrderStatus.COMPLETED, 0)
+                        status_breakdown.get(OrderStatus.DELIVERED, 0)
                         / total_orders
                         * 100
                     )
@@ -259,19 +292,29 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Get customer metrics for dashboards."""
-        # Calculate basic customer counts
-        total_customers, new_customers, active_customers = await self._calculate_customer_counts(
-            start_date, end_date
+        (
+            (total_customers, new_customers, active_customers),
+            (top_customers, customer_segments),
+            retained_customers,
+        ) = await self._query_fanout().run(
+            lambda session: self._bound_to(session)._calculate_customer_counts(
+                start_date, end_date
+            ),
+            lambda session: self._bound_to(session)._calculate_customer_activity(
+                start_date, end_date
+            ),
+            lambda session: self._bound_to(session)._count_retained_customers(
+                start_date, end_date
+            ),
         )
-        
-        # Calculate customer activity and segments
-        top_customers, customer_segments = await self._calculate_customer_activity(
-            start_date, end_date
+
+        retention_rate = round(
+            (retained_customers / active_customers * 100) if active_customers > 0 else 0,
+            2,
         )
-        
-        # Calculate retention and trends
-        retention_rate, churn_rate = await self._calculate_customer_trends(
-            start_date, end_date, active_customers
+        churn_rate = round(
+            100 - retention_rate if active_customers > 0 else 0,
+            2,
         )
 
         return {
@@ -301,13 +344,10 @@ class AnalyticsService:
         new_customers = new_result.scalar() or 0
 
         # Active customers (with orders in period)
-        active_query = select(func.count(func.distinct(Order.customer_id))).where(
-            and_(
-                Order.created_at >= start_date,
-                Order.created_at <= end_date,
-                Order.status != OrderStatus.CANCELLED,
-            )
-        )
+        customer_facts = self.rollups.customer_facts(start_date, end_date)
+        active_query = select(
+            func.count(func.distinct(customer_facts.c.customer_id))
+        ).where(customer_facts.c.status.notin_(status_keys([OrderStatus.CANCELLED])))
         active_result = await self.db.execute(active_query)
         active_customers = active_result.scalar() or 0
         
@@ -318,25 +358,24 @@ class AnalyticsService:
     ) -> tuple[List[Dict[str, Any]], Dict[str, int]]:
         """Calculate top customers and customer segments."""
         # Top customers by revenue
+        facts = self.rollups.customer_facts(start_date, end_date)
         top_customers_query = (
             select(
                 Customer.id,
                 Customer.name,
                 Customer.business_name,
-                func.sum(Order.total_amount).label("revenue"),
-                func.count(Order.id).label("order_count"),
+                func.sum(facts.c.revenue).label("revenue"),
+                func.sum(facts.c.order_count).label("order_count"),
             )
-            .select_from(Order)
-            .join(Customer, Order.customer_id == Customer.id)
+            .select_from(facts)
+            .join(Customer, facts.c.customer_id == Customer.id)
             .where(
-                and_(
-                    Order.created_at >= start_date,
-                    Order.created_at <= end_date,
-                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
+                facts.c.status.in_(
+                    status_keys([OrderStatus.DELIVERED])
                 )
             )
             .group_by(Customer.id, Customer.name, Customer.business_name)
-            .order_by(func.sum(Order.total_amount).desc())
+            .order_by(func.sum(facts.c.revenue).desc())
             .limit(10)
         )
 
@@ -363,10 +402,10 @@ class AnalyticsService:
         
         return top_customers, customer_segments
 
-    async def _calculate_customer_trends(
-        self, start_date: datetime, end_date: datetime, active_customers: int
-    ) -> tuple[float, float]:
-        """Calculate customer retention and churn rates."""
+    async def _count_retained_customers(
+        self, start_date: datetime, end_date: datetime
+    ) -> int:
+        """Count customers who ordered in both the current and previous period."""
         # Retention rate (customers who ordered in both current and previous period)
         period_days = (end_date - start_date).days
         prev_start = start_date - timedelta(days=period_days)
@@ -399,18 +438,7 @@ class AnalyticsService:
                 "prev_start": prev_start,
             },
         )
-        retained_customers = retention_result.scalar() or 0
-        
-        retention_rate = round(
-            (retained_customers / active_customers * 100) if active_customers > 0 else 0,
-            2,
-        )
-        churn_rate = round(
-            100 - retention_rate if active_customers > 0 else 0,
-            2,
-        )
-        
-        return retention_rate, churn_rate
+        return retention_result.scalar() or 0
 
     @handle_service_errors(operation="計算現金流指標")
     @validate_date_range(max_days=365, allow_future=False)
@@ -545,19 +573,26 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Get month - over - month performance comparison."""
-        # Current month metrics
-        current_metrics = await self._get_period_metrics(start_date, end_date)
-
         # Previous month
         period_days = (end_date - start_date).days
         prev_end = start_date - timedelta(days=1)
         prev_start = prev_end - timedelta(days=period_days)
-        prev_metrics = await self._get_period_metrics(prev_start, prev_end)
 
         # Year - over - year comparison
         year_ago_end = end_date - timedelta(days=365)
         year_ago_start = start_date - timedelta(days=365)
-        year_ago_metrics = await self._get_period_metrics(year_ago_start, year_ago_end)
+
+        current_metrics, prev_metrics, year_ago_metrics = await self._query_fanout().run(
+            lambda session: self._bound_to(session)._get_period_metrics(
+                start_date, end_date
+            ),
+            lambda session: self._bound_to(session)._get_period_metrics(
+                prev_start, prev_end
+            ),
+            lambda session: self._bound_to(session)._get_period_metrics(
+                year_ago_start, year_ago_end
+            ),
+        )
 
         def calculate_change(current, previous):
             if previous == 0:
@@ -597,36 +632,31 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Helper to get metrics for a specific period."""
-        # Revenue
-        revenue_query = select(func.sum(Order.total_amount)).where(
-            and_(
-                Order.created_at >= start_date,
-                Order.created_at <= end_date,
-                Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
-            )
-        )
-        revenue_result = await self.db.execute(revenue_query)
-        revenue = revenue_result.scalar() or 0
-
-        # Orders
-        orders_query = select(func.count(Order.id)).where(
-            and_(
-                Order.created_at >= start_date,
-                Order.created_at <= end_date,
-                Order.status != OrderStatus.CANCELLED,
+        order_facts = self.rollups.order_facts(start_date, end_date)
+        cancelled = status_keys([OrderStatus.CANCELLED])
+
+        # Revenue and orders in one pass over the rollups
+        totals_query = select(
+            func.sum(order_facts.c.revenue)
+            .filter(
+                order_facts.c.status.in_(
+                    status_keys([OrderStatus.DELIVERED])
+                )
             )
+            .label("revenue"),
+            func.sum(order_facts.c.order_count)
+            .filter(order_facts.c.status.notin_(cancelled))
+            .label("orders"),
         )
-        orders_result = await self.db.execute(orders_query)
-        orders = orders_result.scalar() or 0
+        totals = (await self.db.execute(totals_query)).first()
+        revenue = totals.revenue or 0
+        orders = int(totals.orders or 0)
 
         # Active customers
-        customers_query = select(func.count(func.distinct(Order.customer_id))).where(
-            and_(
-                Order.created_at >= start_date,
-                Order.created_at <= end_date,
-                Order.status != OrderStatus.CANCELLED,
-            )
-        )
+        customer_facts = self.rollups.customer_facts(start_date, end_date)
+        customers_query = select(
+            func.count(func.distinct(customer_facts.c.customer_id))
+        ).where(customer_facts.c.status.notin_(cancelled))
         customers_result = await self.db.execute(customers_query)
         active_customers = customers_result.scalar() or 0
 
@@ -645,14 +675,11 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Get top performing routes, drivers, and products."""
-        # Get top performing routes
-        top_routes = await self._get_top_routes(start_date, end_date)
-        
-        # Get top performing drivers
-        top_drivers = await self._get_top_drivers(start_date, end_date)
-        
-        # Get top performing products
-        top_products = await self._get_top_products(start_date, end_date)
+        top_routes, top_drivers, top_products = await self._query_fanout().run(
+            lambda session: self._bound_to(session)._get_top_routes(start_date, end_date),
+            lambda session: self._bound_to(session)._get_top_drivers(start_date, end_date),
+            lambda session: self._bound_to(session)._get_top_products(start_date, end_date),
+        )
 
         return {"routes": top_routes, "drivers": top_drivers, "products": top_products}
 
@@ -1315,19 +1342,16 @@ class AnalyticsService:
 
     async def get_operational_alerts(self) -> List[Dict[str, Any]]:
         """Get operational alerts and warnings."""
-        alerts = []
+        fanout = self._query_fanout()
+        now = fanout.snapshot_at
 
-        # Check for delayed routes
-        delayed_routes_query = select(func.count(Route.id)).where(
-            and_(
-                Route.date == datetime.now().date(),
-                Route.status == RouteStatus.IN_PROGRESS,
-                Route.planned_end_time < datetime.now(),
-            )
+        delayed_routes, low_inventory, failed_deliveries = await fanout.run(
+            lambda session: self._bound_to(session)._count_delayed_routes(now),
+            lambda session: self._bound_to(session)._get_low_inventory(),
+            lambda session: self._bound_to(session)._count_failed_deliveries(now),
         )
 
-        delayed_result = await self.db.execute(delayed_routes_query)
-        delayed_routes = delayed_result.scalar() or 0
+        alerts = []
 
         if delayed_routes > 0:
             alerts.append(
@@ -1335,54 +1359,70 @@ class AnalyticsService:
                     "type": "warning",
                     "category": "route",
                     "message": f"{delayed_routes} 條路線延遲",
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": now.isoformat(),
                 }
             )
 
-        # Check for low inventory
-        low_inventory_query = (
-            select(GasProduct.name, func.sum(CustomerInventory.quantity).label("total"))
-            .select_from(GasProduct)
-            .outerjoin(CustomerInventory, GasProduct.id == CustomerInventory.product_id)
-            .group_by(GasProduct.id, GasProduct.name)
-            .having(func.sum(CustomerInventory.quantity) < 50)  # Threshold
-        )
-
-        low_inventory_result = await self.db.execute(low_inventory_query)
-
-        for row in low_inventory_result:
+        for row in low_inventory:
             alerts.append(
                 {
                     "type": "info",
                     "category": "inventory",
                     "message": f"{row.name} 庫存偏低 (剩餘 {row.total or 0} 個)",
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": now.isoformat(),
                 }
             )
 
-        # Check for failed deliveries today
-        failed_deliveries_query = select(func.count(DeliveryHistory.id)).where(
-            and_(
-                func.date(DeliveryHistory.created_at) == datetime.now().date(),
-                DeliveryHistory.status == DeliveryStatus.FAILED,
-            )
-        )
-
-        failed_result = await self.db.execute(failed_deliveries_query)
-        failed_deliveries = failed_result.scalar() or 0
-
         if failed_deliveries > 5:  # Threshold
             alerts.append(
                 {
                     "type": "error",
                     "category": "delivery",
                     "message": f"今日有 {failed_deliveries} 筆配送失敗",
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": now.isoformat(),
                 }
             )
 
         return alerts
 
+    async def _count_delayed_routes(self, now: datetime) -> int:
+        """Count in-progress routes past their planned end time."""
+        delayed_routes_query = select(func.count(Route.id)).where(
+            and_(
+                Route.date == now.date(),
+                Route.status == RouteStatus.IN_PROGRESS,
+                Route.planned_end_time < now,
+            )
+        )
+
+        delayed_result = await self.db.execute(delayed_routes_query)
+        return delayed_result.scalar() or 0
+
+    async def _get_low_inventory(self) -> List[Any]:
+        """Get products whose total customer inventory is below the threshold."""
+        low_inventory_query = (
+            select(GasProduct.name, func.sum(CustomerInventory.quantity).label("total"))
+            .select_from(GasProduct)
+            .outerjoin(CustomerInventory, GasProduct.id == CustomerInventory.product_id)
+            .group_by(GasProduct.id, GasProduct.name)
+            .having(func.sum(CustomerInventory.quantity) < 50)  # Threshold
+        )
+
+        low_inventory_result = await self.db.execute(low_inventory_query)
+        return low_inventory_result.all()
+
+    async def _count_failed_deliveries(self, now: datetime) -> int:
+        """Count failed deliveries recorded today."""
+        failed_deliveries_query = select(func.count(DeliveryHistory.id)).where(
+            and_(
+                func.date(DeliveryHistory.created_at) == now.date(),
+                DeliveryHistory.status == DeliveryStatus.FAILED,
+            )
+        )
+
+        failed_result = await self.db.execute(failed_deliveries_query)
+        return failed_result.scalar() or 0
+
     async def get_accounts_receivable_aging(self) -> Dict[str, Any]:
         """Get accounts receivable aging report."""
         today = datetime.now().date()
@@ -1642,23 +1682,20 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Get revenue breakdown by customer segment."""
+        facts = self.rollups.customer_facts(start_date, end_date)
+        revenue_statuses = status_keys([OrderStatus.DELIVERED])
+
         # Revenue by customer type
         segment_query = (
             select(
                 Customer.customer_type,
                 func.count(func.distinct(Customer.id)).label("customer_count"),
-                func.sum(Order.total_amount).label("revenue"),
-                func.count(Order.id).label("order_count"),
-            )
-            .select_from(Order)
-            .join(Customer, Order.customer_id == Customer.id)
-            .where(
-                and_(
-                    Order.created_at >= start_date,
-                    Order.created_at <= end_date,
-                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
-                )
+                func.sum(facts.c.revenue).label("revenue"),
+                func.sum(facts.c.order_count).label("order_count"),
             )
+            .select_from(facts)
+            .join(Customer, facts.c.customer_id == Customer.id)
+            .where(facts.c.status.in_(revenue_statuses))
             .group_by(Customer.customer_type)
         )
 
@@ -1697,21 +1734,19 @@ class AnalyticsService:
         area_query = (
             select(
                 Customer.area,
-                func.sum(Order.total_amount).label("revenue"),
+                func.sum(facts.c.revenue).label("revenue"),
                 func.count(func.distinct(Customer.id)).label("customer_count"),
             )
-            .select_from(Order)
-            .join(Customer, Order.customer_id == Customer.id)
+            .select_from(facts)
+            .join(Customer, facts.c.customer_id == Customer.id)
             .where(
                 and_(
-                    Order.created_at >= start_date,
-                    Order.created_at <= end_date,
-                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
+                    facts.c.status.in_(revenue_statuses),
                     Customer.area.isnot(None),
                 )
             )
             .group_by(Customer.area)
-            .order_by(func.sum(Order.total_amount).desc())
+            .order_by(func.sum(facts.c.revenue).desc())
             .limit(10)
         )
 
@@ -1735,36 +1770,23 @@ class AnalyticsService:
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
         """Get profit margin analysis."""
-        # Product - wise profit margins
-        product_margin_query = (
-            select(
-                GasProduct.id,
-                GasProduct.name,
-                GasProduct.size,
-                func.sum(OrderItem.quantity).label("quantity_sold"),
-                func.sum(OrderItem.subtotal).label("revenue"),
-                func.avg(OrderItem.unit_price).label("avg_price"),
-            )
-            .select_from(OrderItem)
-            .join(Order, OrderItem.order_id == Order.id)
-            .join(GasProduct, OrderItem.product_id == GasProduct.id)
-            .where(
-                and_(
-                    Order.created_at >= start_date,
-                    Order.created_at <= end_date,
-                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
+        # Product - wise profit margins (archived months + live remainder)
+        product_sales = await self._get_product_sales(start_date, end_date)
+
+        products = {}
+        if not product_sales.empty:
+            products_result = await self.db.execute(
+                select(GasProduct).where(
+                    GasProduct.id.in_(product_sales["product_id"].tolist())
                 )
             )
-            .group_by(GasProduct.id, GasProduct.name, GasProduct.size)
-        )
-
-        product_result = await self.db.execute(product_margin_query)
+            products = {product.id: product for product in products_result.scalars()}
 
         product_margins = []
         total_revenue = 0
         total_cost = 0
 
-        for row in product_result:
+        for row in product_sales.itertuples(index=False):
             revenue = row.revenue or 0
             # Simplified cost calculation (70% of revenue as cost)
             # In production, this would come from actual cost data
@@ -1775,15 +1797,22 @@ class AnalyticsService:
             total_revenue += revenue
             total_cost += cost
 
+            product = products.get(row.product_id)
             product_margins.append(
                 {
-                    "product": f"{row.name} ({row.size})",
-                    "quantitySold": row.quantity_sold or 0,
+                    "product": (
+                        f"{product.name_zh} ({product.size_kg}kg)"
+                        if product
+                        else str(row.product_id)
+                    ),
+                    "quantitySold": int(row.quantity_sold or 0),
                     "revenue": float(revenue),
                     "cost": float(cost),
                     "profit": float(profit),
                     "margin": round(margin, 2),
-                    "avgPrice": float(row.avg_price or 0),
+                    "avgPrice": (
+                        float(row.price_sum / row.line_count) if row.line_count else 0
+                    ),
                 }
             )
 
@@ -1793,26 +1822,12 @@ class AnalyticsService:
         )
 
         # Monthly margin trend
-        monthly_margin_query = (
-            select(
-                func.date_trunc("month", Order.created_at).label("month"),
-                func.sum(Order.total_amount).label("revenue"),
-            )
-            .where(
-                and_(
-                    Order.created_at >= start_date.replace(day=1) - timedelta(days=180),
-                    Order.created_at <= end_date,
-                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
-                )
-            )
-            .group_by("month")
-            .order_by("month")
+        monthly_revenue = await self._get_monthly_revenue(
+            start_date.replace(day=1) - timedelta(days=180), end_date
         )
 
-        monthly_result = await self.db.execute(monthly_margin_query)
-
         monthly_margins = []
-        for row in monthly_result:
+        for row in monthly_revenue.itertuples(index=False):
             revenue = row.revenue or 0
             cost = revenue * 0.7  # Simplified
             profit = revenue - cost
@@ -1820,7 +1835,7 @@ class AnalyticsService:
 
             monthly_margins.append(
                 {
-                    "month": row.month.strftime("%Y-%m"),
+                    "month": row.month,
                     "revenue": float(revenue),
                     "profit": float(profit),
                     "margin": round(margin, 2),
@@ -1836,6 +1851,137 @@ class AnalyticsService:
             "monthlyTrend": monthly_margins,
         }
 
+    async def _get_product_sales(
+        self, start_date: datetime, end_date: datetime
+    ) -> pd.DataFrame:
+        """Sold quantity / revenue per product, archived months read from Parquet."""
+        revenue_statuses = status_keys([OrderStatus.DELIVERED])
+        window = self.archive.split("order_items", start_date.date(), end_date.date())
+        frames = []
+
+        if window.has_archive:
+            frames.append(
+                await self.archive.query_async(
+                    f"""
+                    SELECT gas_product_id AS product_id,
+                           SUM(quantity) AS quantity_sold,
+                           SUM(subtotal) AS revenue,
+                           SUM(unit_price) AS price_sum,
+                           COUNT(*) AS line_count
+                    FROM order_items
+                    WHERE month >= ? AND month < ?
+                      AND order_created_at >= ? AND order_created_at <= ?
+                      AND order_status IN ({", ".join("?" * len(revenue_statuses))})
+                    GROUP BY gas_product_id
+                    """,
+                    [
+                        f"{window.archive_start:%Y-%m}",
+                        f"{window.archive_end:%Y-%m}",
+                        start_date,
+                        end_date,
+                        *revenue_statuses,
+                    ],
+                )
+            )
+
+        live_query = (
+            select(
+                OrderItem.gas_product_id.label("product_id"),
+                func.sum(OrderItem.quantity).label("quantity_sold"),
+                func.sum(OrderItem.subtotal).label("revenue"),
+                func.sum(OrderItem.unit_price).label("price_sum"),
+                func.count(OrderItem.id).label("line_count"),
+            )
+            .join(Order, OrderItem.order_id == Order.id)
+            .where(
+                and_(
+                    Order.created_at >= start_date,
+                    Order.created_at <= end_date,
+                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
+                )
+            )
+            .group_by(OrderItem.gas_product_id)
+        )
+        if window.has_archive:
+            live_query = live_query.where(live_filter(Order.created_at, window))
+
+        live_result = await self.db.execute(live_query)
+        frames.append(pd.DataFrame(live_result.all(), columns=list(live_result.keys())))
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(
+                columns=["product_id", "quantity_sold", "revenue", "price_sum", "line_count"]
+            )
+        return pd.concat(frames, ignore_index=True).groupby(
+            "product_id", as_index=False
+        ).sum()
+
+    async def _get_monthly_revenue(
+        self, start_date: datetime, end_date: datetime
+    ) -> pd.DataFrame:
+        """Revenue per month (YYYY-MM), archived months read from Parquet."""
+        revenue_statuses = status_keys([OrderStatus.DELIVERED])
+        window = self.archive.split("orders", start_date.date(), end_date.date())
+        frames = []
+
+        if window.has_archive:
+            frames.append(
+                await self.archive.query_async(
+                    f"""
+                    SELECT month, SUM(total_amount) AS revenue
+                    FROM orders
+                    WHERE month >= ? AND month < ?
+                      AND created_at >= ? AND created_at <= ?
+                      AND status IN ({", ".join("?" * len(revenue_statuses))})
+                    GROUP BY month
+                    """,
+                    [
+                        f"{window.archive_start:%Y-%m}",
+                        f"{window.archive_end:%Y-%m}",
+                        start_date,
+                        end_date,
+                        *revenue_statuses,
+                    ],
+                )
+            )
+
+        live_query = (
+            select(
+                func.date_trunc("month", Order.created_at).label("month"),
+                func.sum(Order.total_amount).label("revenue"),
+            )
+            .where(
+                and_(
+                    Order.created_at >= start_date,
+                    Order.created_at <= end_date,
+                    Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED]),
+                )
+            )
+            .group_by("month")
+        )
+        if window.has_archive:
+            live_query = live_query.where(live_filter(Order.created_at, window))
+
+        live_result = await self.db.execute(live_query)
+        frames.append(
+            pd.DataFrame(
+                [
+                    {"month": row.month.strftime("%Y-%m"), "revenue": row.revenue}
+                    for row in live_result
+                ],
+                columns=["month", "revenue"],
+            )
+        )
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=["month", "revenue"])
+        monthly = pd.concat(frames, ignore_index=True)
+        return monthly.groupby("month", as_index=False)["revenue"].sum().sort_values(
+            "month"
+        )
+
     async def get_cash_position_trend(
         self, start_date: datetime, end_date: datetime
     ) -> Dict[str, Any]:
@@ -2163,104 +2309,160 @@ class AnalyticsService:
             "groupBy": group_by,
         }
 
-    async def generate_report(
-        self,
-        report_type: str,
-        format: str,
-        start_date: datetime,
-        end_date: datetime,
-        user_id: str,
-    ) -> str:
-        """Generate report and return URL."""
-        # Fetch data based on report type
-        data = {}
+    async def collect_report_data(
+        self, report_type: str, start_date: datetime, end_date: datetime
+    ) -> Dict[str, Any]:
+        """
+        Fetch all sections of a report concurrently.
 
+        Every section shares one fanout, so the whole report is bounded by
+        ANALYTICS_QUERY_CONCURRENCY and uses a single snapshot timestamp.
+        """
         if report_type == "executive":
-            data = {
-                "revenue": await self.get_revenue_metrics(start_date, end_date),
-                "orders": await self.get_order_metrics(start_date, end_date),
-                "customers": await self.get_customer_metrics(start_date, end_date),
-                "performance": await self.get_performance_comparison(
+            sections = {
+                "revenue": lambda: self.get_revenue_metrics(start_date, end_date),
+                "orders": lambda: self._on_own_session(
+                    lambda service: service.get_order_metrics(start_date, end_date)
+                ),
+                "customers": lambda: self.get_customer_metrics(start_date, end_date),
+                "performance": lambda: self.get_performance_comparison(
                     start_date, end_date
                 ),
             }
         elif report_type == "financial":
-            data = {
-                "receivables": await self.get_accounts_receivable_aging(),
-                "collections": await self.get_payment_collection_metrics(
-                    start_date, end_date
+            sections = {
+                "receivables": lambda: self._on_own_session(
+                    lambda service: service.get_accounts_receivable_aging()
+                ),
+                "collections": lambda: self._on_own_session(
+                    lambda service: service.get_payment_collection_metrics(
+                        start_date, end_date
+                    )
+                ),
+                "revenue": lambda: self._on_own_session(
+                    lambda service: service.get_revenue_by_segment(start_date, end_date)
+                ),
+                "margins": lambda: self._on_own_session(
+                    lambda service: service.get_profit_margin_analysis(
+                        start_date, end_date
+                    )
                 ),
-                "revenue": await self.get_revenue_by_segment(start_date, end_date),
-                "margins": await self.get_profit_margin_analysis(start_date, end_date),
             }
-        # Add more report types
+        else:
+            # Add more report types
+            return {}
 
-        # Generate file based on format
-        if format == "excel":
-            file_path = await self._generate_excel_report(data, report_type)
-        elif format == "pd":
-            file_path = await self._generate_pdf_report(data, report_type)
-        else:  # csv
-            file_path = await self._generate_csv_report(data, report_type)
+        fanout = QueryFanout(self.db, max_concurrency=ANALYTICS_QUERY_CONCURRENCY)
+        token = _report_fanout.set(fanout)
+        try:
+            results = await fanout.gather(*sections.values())
+        finally:
+            _report_fanout.reset(token)
 
-        # Upload to storage and return URL
-        url = await self.storage_service.upload_file(file_path, f"reports/{user_id}/")
+        data = dict(zip(sections.keys(), results))
+        data["snapshotAt"] = fanout.snapshot_at.isoformat()
+        return data
 
-        return url
+    async def _on_own_session(self, call) -> Any:
+        """Run a single-query metric on its own session of the current fanout."""
+        (result,) = await self._query_fanout().run(
+            lambda session: call(self._bound_to(session))
+        )
+        return result
 
-    async def generate_and_email_report(
+    async def generate_report(
         self,
         report_type: str,
         format: str,
         start_date: datetime,
         end_date: datetime,
-        email: str,
         user_id: str,
-    ):
-        """Generate report and email to user."""
-        # Generate report
-        report_url = await self.generate_report(
+    ) -> ReportJob:
+        """
+        Queue a report for background generation.
+
+        The user is notified over the websocket when the file is ready; the
+        returned job can also be polled for progress.
+        """
+        return await report_job_queue.submit(
             report_type, format, start_date, end_date, user_id
         )
 
-        # Send email
-        subject = f"LuckyGas {report_type.title()} Report - {start_date.date()} to {end_date.date()}"
-        body = """
-        您好，
-
-        您要求的報表已經產生完成。
-
-        報表類型: {report_type.title()}
-        期間: {start_date.date()} 至 {end_date.date()}
-        格式: {format.upper()}
-
-        請點擊以下連結下載報表:
-        {report_url}
-
-        此連結將在 7 天後失效。
+    async def generate_and_email_report(
+        self,
+        report_type: str,
+        format: str,
+        start_date: datetime,
+        end_date: datetime,
+        email: str,
+        user_id: str,
+    ) -> ReportJob:
+        """Queue a report and email the download link when it is ready."""
+        return await report_job_queue.submit(
+            report_type, format, start_date, end_date, user_id, email=email
+        )
 
-        謝謝，
-        LuckyGas 系統
+    async def render_report(
+        self, data: Dict[str, Any], report_type: str, format: str, path: Path
+    ) -> Path:
+        """Write collected report data to ``path`` as Excel or CSV."""
+        tables = self._report_tables(data)
+        if format == "excel":
+            await asyncio.to_thread(self._write_excel_report, tables, path)
+        elif format == "csv":
+            await asyncio.to_thread(self._write_csv_report, tables, path)
+        else:
+            raise ValueError(f"不支援的報表格式: {format}")
+        logger.info(f"Rendered {report_type} report ({format}) to {path}")
+        return path
+
+    @staticmethod
+    def _report_tables(data: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
         """
+        Split report data into tables.
 
-        await self.email_service.send_email(email, subject, body)
-
-    async def _generate_excel_report(
-        self, data: Dict[str, Any], report_type: str
-    ) -> str:
-        """Generate Excel report."""
-        # Implementation would use pandas / openpyxl to create Excel file
-        # This is a placeholder
-        return f"/tmp/{report_type}_report_{datetime.now().strftime('%Y % m % d_ % H % M % S')}.xlsx"
-
-    async def _generate_pdf_report(self, data: Dict[str, Any], report_type: str) -> str:
-        """Generate PDF report."""
-        # Implementation would use reportlab or similar to create PDF
-        # This is a placeholder
-        return f"/tmp/{report_type}_report_{datetime.now().strftime('%Y % m % d_ % H % M % S')}.pd"
-
-    async def _generate_csv_report(self, data: Dict[str, Any], report_type: str) -> str:
-        """Generate CSV report."""
-        # Implementation would use pandas to create CSV
-        # This is a placeholder
-        return f"/tmp/{report_type}_report_{datetime.now().strftime('%Y % m % d_ % H % M % S')}.csv"
+        Scalar metrics go into one 摘要 table keyed by their dotted path; every
+        list of records (trends, rankings, ...) becomes a table of its own.
+        """
+        summary = []
+        tables = {}
+
+        def walk(path: str, value: Any):
+            if isinstance(value, dict):
+                for key, item in value.items():
+                    walk(f"{path}.{key}" if path else str(key), item)
+            elif isinstance(value, list) and value and all(
+                isinstance(item, dict) for item in value
+            ):
+                tables[path] = pd.json_normalize(value)
+            else:
+                if isinstance(value, (list, tuple)):
+                    value = json.dumps(value, ensure_ascii=False, default=str)
+                summary.append({"指標": path, "數值": value})
+
+        walk("", data)
+        return {"摘要": pd.DataFrame(summary, columns=["指標", "數值"]), **tables}
+
+    @staticmethod
+    def _write_excel_report(tables: Dict[str, pd.DataFrame], path: Path):
+        used = set()
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            for name, frame in tables.items():
+                # Excel sheet names: max 31 characters, unique, no []:*?/\
+                sheet = re.sub(r"[\[\]:*?/\\]", "_", name)[:31]
+                suffix = 1
+                while sheet in used:
+                    suffix += 1
+                    sheet = f"{sheet[:28]}~{suffix}"
+                used.add(sheet)
+                frame.to_excel(writer, sheet_name=sheet, index=False)
+
+    @staticmethod
+    def _write_csv_report(tables: Dict[str, pd.DataFrame], path: Path):
+        # BOM so Excel opens the Chinese headers correctly
+        with open(path, "w", encoding="utf-8-sig", newline="") as output:
+            for index, (name, frame) in enumerate(tables.items()):
+                if index:
+                    output.write("\n")
+                output.write(f"[{name}]\n")
+                frame.to_csv(output, index=False)
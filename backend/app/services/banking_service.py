@@ -6,15 +6,15 @@ import io
 import logging
 import os
 import re
-import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
 
-import paramiko
-from sqlalchemy import func
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
@@ -30,9 +30,67 @@ from app.models.banking import (
 )
 from app.models.customer import Customer
 from app.models.invoice import Invoice, InvoicePaymentStatus
+from app.services.file_generators.fixed_width import (
+    FILLER,
+    Field,
+    FileLayout,
+    RecordLayout,
+    encode_field,
+)
+from app.services.reconciliation_engine import ReconciliationLines, reconcile_lines
+from app.services.sftp_pool import download_files, get_bank_sftp_pool
 
 logger = logging.getLogger(__name__)
 
+# Payment collection file (fixed_width banks)
+PAYMENT_FILE_LAYOUT = FileLayout(
+    RecordLayout(
+        "H",
+        [
+            Field("batch_number", 20),
+            Field("file_date", 8),
+            Field("bank_code", 3),
+            Field("version", 3, default="001"),
+            Field(FILLER, 165),
+        ],
+    ),
+    RecordLayout(
+        "D",
+        [
+            Field("sequence_number", 6, "R", "0"),
+            Field("transaction_id", 20),
+            Field("account_number", 14),
+            Field("account_holder", 30),
+            Field("amount", 13, "R", "0"),  # Cents, no decimals
+            Field("payment_date", 8),
+            Field(FILLER, 108),
+        ],
+    ),
+    RecordLayout(
+        "T",
+        [
+            Field("total_records", 6, "R", "0"),
+            Field("total_amount", 15, "R", "0"),
+            Field(FILLER, 178),
+        ],
+    ),
+)
+
+# Reconciliation file returned by fixed_width banks (detail records)
+RECONCILIATION_FILE_LAYOUT = FileLayout(
+    RecordLayout(
+        "D",
+        [
+            Field("sequence_number", 6),
+            Field("transaction_id", 20),
+            Field("bank_reference", 20),
+            Field("response_code", 3),
+            Field("response_message", 100),
+            Field("processed_date", 8),
+        ],
+    ),
+)
+
 
 class BankingFormatError(Exception):
     """Raised when there's an error in banking file format."""
@@ -42,6 +100,60 @@ class SFTPConnectionError(Exception):
     """Raised when SFTP connection fails."""
 
 
+class _HashingWriter:
+    """Passes writes through while counting and hashing them."""
+
+    def __init__(self, destination: BinaryIO):
+        self.destination = destination
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.destination.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _banking_metrics() -> Optional[Dict[str, Any]]:
+    """Prometheus metrics, registered once per process and shared by services"""
+    try:
+        from prometheus_client import Counter, Gauge, Histogram
+
+        return {
+            "sftp_connections": Gauge(
+                "banking_sftp_connections", "Active SFTP connections", ["bank_code"]
+            ),
+            "sftp_failures": Counter(
+                "banking_sftp_failures_total",
+                "SFTP connection failures",
+                ["bank_code", "error_type"],
+            ),
+            "file_transfers": Counter(
+                "banking_file_transfers_total",
+                "File transfer operations",
+                ["bank_code", "direction", "status"],
+            ),
+            "transfer_duration": Histogram(
+                "banking_transfer_duration_seconds",
+                "File transfer duration",
+                ["bank_code", "direction"],
+            ),
+            "reconciliation_accuracy": Gauge(
+                "banking_reconciliation_accuracy",
+                "Reconciliation match rate",
+                ["bank_code"],
+            ),
+        }
+    except ImportError:
+        logger.warning("Prometheus client not available, metrics disabled")
+        return None
+
+
 class BankingService:
     """Service for handling banking operations including SFTP file exchange."""
 
@@ -49,45 +161,13 @@ class BankingService:
         self.db = db
         self._sftp_clients = {}
         self._circuit_breaker_states = {}
-        self._connection_pool = {}
-        self._pool_lock = threading.Lock()
         self._executor = ThreadPoolExecutor(max_workers=5)
         self._init_metrics()
         self._load_production_credentials()
 
     def _init_metrics(self):
         """Initialize Prometheus metrics for monitoring"""
-        try:
-            from prometheus_client import Counter, Gauge, Histogram
-
-            self.metrics = {
-                "sftp_connections": Gauge(
-                    "banking_sftp_connections", "Active SFTP connections", ["bank_code"]
-                ),
-                "sftp_failures": Counter(
-                    "banking_sftp_failures_total",
-                    "SFTP connection failures",
-                    ["bank_code", "error_type"],
-                ),
-                "file_transfers": Counter(
-                    "banking_file_transfers_total",
-                    "File transfer operations",
-                    ["bank_code", "direction", "status"],
-                ),
-                "transfer_duration": Histogram(
-                    "banking_transfer_duration_seconds",
-                    "File transfer duration",
-                    ["bank_code", "direction"],
-                ),
-                "reconciliation_accuracy": Gauge(
-                    "banking_reconciliation_accuracy",
-                    "Reconciliation match rate",
-                    ["bank_code"],
-                ),
-            }
-        except ImportError:
-            logger.warning("Prometheus client not available, metrics disabled")
-            self.metrics = None
+        self.metrics = _banking_metrics()
 
     def _load_production_credentials(self):
         """Load bank credentials from Secret Manager"""
@@ -136,7 +216,10 @@ class BankingService:
     @contextmanager
     def get_sftp_client(self, bank_config: BankConfiguration):
         """
-        Get SFTP client with connection pooling and circuit breaker.
+        Get a pooled SFTP client with circuit breaker.
+
+        Sessions come from the bank's process-wide pool and go back to it
+        afterwards, so consecutive operations reuse one SSH transport.
 
         Args:
             bank_config: Bank configuration with SFTP details
@@ -153,101 +236,9 @@ class BankingService:
         if self._is_circuit_open(bank_code):
             raise SFTPConnectionError(f"Circuit breaker open for {bank_code}")
 
+        pool = get_bank_sftp_pool(bank_config, self._get_credentials(bank_code))
         try:
-            # Try to get from connection pool
-            with self._pool_lock:
-                if bank_code in self._connection_pool:
-                    pool = self._connection_pool[bank_code]
-                    if pool and len(pool) > 0:
-                        transport, sftp = pool.pop()
-                        # Test if connection is still alive
-                        try:
-                            sftp.stat(".")
-                            if self.metrics:
-                                self.metrics["sftp_connections"].labels(
-                                    bank_code=bank_code
-                                ).inc()
-                            yield sftp
-                            # Return to pool
-                            with self._pool_lock:
-                                pool.append((transport, sftp))
-                            return
-                        except Exception:
-                            # Connection dead, close it
-                            try:
-                                transport.close()
-                            except Exception:
-                                pass
-
-            # Create new connection with production settings
-            transport = paramiko.Transport(
-                (bank_config.sftp_host, bank_config.sftp_port)
-            )
-            transport.set_keepalive(30)  # Send keepalive every 30 seconds
-
-            # Get production credentials
-            creds = self._get_credentials(bank_config.bank_code)
-            username = creds.get("username") or bank_config.sftp_username
-            password = creds.get("password") or bank_config.sftp_password
-            private_key_data = creds.get("private_key") or bank_config.sftp_private_key
-
-            # Use password or private key authentication
-            if private_key_data:
-                # Key - based authentication (preferred for production)
-                try:
-                    # Try different key types
-                    key = None
-                    key_types = [
-                        (paramiko.RSAKey, "RSA"),
-                        (paramiko.Ed25519Key, "Ed25519"),
-                        (paramiko.ECDSAKey, "ECDSA"),
-                    ]
-
-                    for key_class, key_type in key_types:
-                        try:
-                            key = key_class.from_private_key(
-                                io.StringIO(private_key_data),
-                                password=creds.get("passphrase"),
-                            )
-                            logger.info(f"Using {key_type} key for {bank_code}")
-                            break
-                        except Exception:
-                            continue
-
-                    if not key:
-                        raise ValueError("Could not parse private key")
-
-                    transport.connect(username=username, pkey=key)
-                except Exception as e:
-                    logger.error(f"Key authentication failed for {bank_code}: {e}")
-                    raise
-            else:
-                # Password authentication (fallback)
-                transport.connect(username=username, password=password)
-
-            # Configure SFTP client
-            sftp = paramiko.SFTPClient.from_transport(transport)
-            sftp.get_channel().settimeout(30.0)  # 30 second timeout
-
-            # Add to connection pool
-            with self._pool_lock:
-                if bank_code not in self._connection_pool:
-                    self._connection_pool[bank_code] = []
-                # Keep max 5 connections per bank
-                if len(self._connection_pool[bank_code]) < 5:
-                    self._connection_pool[bank_code].append((transport, sftp))
-
-            # Reset circuit breaker on successful connection
-            self._reset_circuit_breaker(bank_code)
-
-            # Update metrics
-            if self.metrics:
-                self.metrics["sftp_connections"].labels(bank_code=bank_code).inc()
-
-            logger.info(f"Established SFTP connection to {bank_code}")
-
-            yield sftp
-
+            session = pool.acquire()
         except Exception as e:
             logger.error(f"SFTP connection failed for {bank_code}: {str(e)}")
             self._record_circuit_failure(bank_code)
@@ -261,6 +252,23 @@ class BankingService:
 
             raise SFTPConnectionError(f"Failed to connect to {bank_code}: {str(e)}")
 
+        # Reset circuit breaker on successful connection
+        self._reset_circuit_breaker(bank_code)
+
+        if self.metrics:
+            self.metrics["sftp_connections"].labels(bank_code=bank_code).set(
+                pool.open_sessions
+            )
+
+        try:
+            yield session.sftp
+        except BaseException:
+            # A session that failed mid-operation is closed, not pooled
+            pool.release(session, discard=True)
+            raise
+        # Dead sessions are closed instead of pooled
+        pool.release(session)
+
     def _is_circuit_open(self, bank_code: str) -> bool:
         """Check if circuit breaker is open for a bank."""
         if bank_code not in self._circuit_breaker_states:
@@ -331,64 +339,43 @@ class BankingService:
         self, batch: PaymentBatch, bank_config: BankConfiguration
     ) -> str:
         """Generate fixed - width format payment file (Taiwan banking standard)."""
-        lines = []
-
-        # Header record
-        header = self._format_fixed_width(
-            [
-                ("H", 1),  # Record type
-                (batch.batch_number, 20),  # Batch number
-                (datetime.now().strftime("%Y % m % d"), 8),  # File date
-                (bank_config.bank_code, 3),  # Bank code
-                ("001", 3),  # Version
-                ("", 174),  # Filler
-            ]
-        )
-        lines.append(header)
-
-        # Detail records
-        total_amount = Decimal("0")
-        for idx, transaction in enumerate(batch.transactions, 1):
-            detail = self._format_fixed_width(
-                [
-                    ("D", 1),  # Record type
-                    (str(idx).zfill(6), 6),  # Sequence number
-                    (transaction.transaction_id, 20),  # Transaction ID
-                    (transaction.account_number, 14),  # Bank account
-                    (transaction.account_holder[:30], 30),  # Account holder name
-                    (
-                        self._format_amount(transaction.amount),
-                        13,
-                    ),  # Amount (no decimals)
-                    (
-                        transaction.scheduled_date.strftime("%Y % m % d"),
-                        8,
-                    ),  # Payment date
-                    ("", 108),  # Filler
-                ]
-            )
-            lines.append(detail)
-            total_amount += transaction.amount
-
-        # Trailer record
-        trailer = self._format_fixed_width(
-            [
-                ("T", 1),  # Record type
-                (str(len(batch.transactions)).zfill(6), 6),  # Total count
-                (self._format_amount(total_amount), 15),  # Total amount
-                ("", 178),  # Filler
-            ]
-        )
-        lines.append(trailer)
+        encoding = bank_config.encoding or "UTF - 8"
+        buffer = io.BytesIO()
+        self._write_fixed_width_file(batch, buffer, encoding)
+        return buffer.getvalue().decode(encoding)
+
+    def _write_fixed_width_file(
+        self, batch: PaymentBatch, fp: BinaryIO, encoding: str
+    ) -> int:
+        """Stream a fixed - width payment file to a binary file object."""
+
+        def records():
+            yield "H", {
+                "batch_number": batch.batch_number,
+                "file_date": datetime.now().strftime("%Y%m%d"),
+                "bank_code": batch.bank_code,
+            }
 
-        # Join with appropriate line ending for Taiwan banks
-        content = "\r\n".join(lines)
+            count = 0
+            total_amount = Decimal("0")
+            for count, transaction in enumerate(batch.transactions, 1):
+                yield "D", {
+                    "sequence_number": count,
+                    "transaction_id": transaction.transaction_id,
+                    "account_number": transaction.account_number,
+                    "account_holder": transaction.account_holder,
+                    "amount": self._format_amount(transaction.amount),
+                    "payment_date": transaction.scheduled_date.strftime("%Y%m%d"),
+                }
+                total_amount += transaction.amount
 
-        # Handle encoding
-        if bank_config.encoding.upper() == "BIG5":
-            content = content.encode("big5", errors="replace").decode("big5")
+            yield "T", {
+                "total_records": count,
+                "total_amount": self._format_amount(total_amount),
+            }
 
-        return content
+        # Records separated with CRLF for Taiwan banks
+        return PAYMENT_FILE_LAYOUT.write(fp, records(), encoding, terminate=False)
 
     def _generate_csv_file(
         self, batch: PaymentBatch, bank_config: BankConfiguration
@@ -407,7 +394,7 @@ class BankingService:
         ]
 
         writer = csv.DictWriter(
-            output, fieldnames=headers, delimiter=bank_config.delimiter or ", "
+            output, fieldnames=headers, delimiter=bank_config.delimiter or ","
         )
         writer.writeheader()
 
@@ -437,16 +424,10 @@ class BankingService:
 
     def _format_fixed_width(self, fields: List[Tuple[str, int]]) -> str:
         """Format fields into fixed - width string."""
-        result = ""
-        for value, width in fields:
-            # Convert to string and handle encoding
-            str_value = str(value)
-            # Pad or truncate to fit width
-            if len(str_value) > width:
-                result += str_value[:width]
-            else:
-                result += str_value.ljust(width)
-        return result
+        return "".join(
+            encode_field(value, width, encoding="utf-8").decode("utf-8")
+            for value, width in fields
+        )
 
     def _format_amount(self, amount: Decimal) -> str:
         """Format amount for banking files (no decimals, in cents)."""
@@ -480,7 +461,6 @@ class BankingService:
             raise ValueError(f"No active configuration for bank {batch.bank_code}")
 
         start_time = time.time()
-        temp_file = None
 
         try:
             # Generate file name from pattern
@@ -494,76 +474,32 @@ class BankingService:
             if not batch.file_content:
                 batch.file_content = self.generate_payment_file(batch_id)
 
-            # Calculate checksum for verification
             content_bytes = batch.file_content.encode(bank_config.encoding or "UTF - 8")
-            checksum = hashlib.sha256(content_bytes).hexdigest()
-
-            # Create temporary file for atomic upload
-            import tempfile
-
-            temp_file = tempfile.NamedTemporaryFile(delete=False)
-            temp_file.write(content_bytes)
-            temp_file.close()
 
             # Upload via SFTP with retry
             max_retries = 3
             for attempt in range(max_retries):
                 try:
                     with self.get_sftp_client(bank_config) as sftp:
-                        # Create remote paths
-                        remote_path = os.path.join(bank_config.upload_path, file_name)
-                        temp_remote_path = f"{remote_path}.tmp"
-
-                        # Ensure remote directory exists
-                        try:
-                            sftp.stat(bank_config.upload_path)
-                        except FileNotFoundError:
-                            # Create directory if it doesn't exist
-                            sftp.makedirs(bank_config.upload_path)
-
-                        # Upload to temporary location first
-                        sftp.put(temp_file.name, temp_remote_path)
-
-                        # Verify file size
-                        local_size = os.path.getsize(temp_file.name)
-                        remote_size = sftp.stat(temp_remote_path).st_size
-
-                        if local_size != remote_size:
-                            raise ValueError(
-                                f"File size mismatch: local={local_size}, remote={remote_size}"
-                            )
-
-                        # Atomic rename to final location
-                        sftp.rename(temp_remote_path, remote_path)
-
-                        # Set file permissions (read - only for security)
-                        sftp.chmod(remote_path, 0o444)
-
-                        logger.info(
-                            f"Successfully uploaded payment file {file_name} to {bank_config.bank_code}"
+                        upload = self._upload_atomically(
+                            sftp,
+                            bank_config,
+                            file_name,
+                            lambda remote_path: sftp.putfo(
+                                io.BytesIO(content_bytes), remote_path
+                            ),
                         )
 
-                        # Update batch status
-                        batch.status = PaymentBatchStatus.UPLOADED
-                        batch.uploaded_at = datetime.utcnow()
-                        batch.sftp_upload_path = remote_path
-                        batch.file_name = file_name
-                        batch.file_checksum = checksum
-
-                        # Update metrics
-                        duration = time.time() - start_time
-                        if self.metrics:
-                            self.metrics["file_transfers"].labels(
-                                bank_code=bank_config.bank_code,
-                                direction="upload",
-                                status="success",
-                            ).inc()
-                            self.metrics["transfer_duration"].labels(
-                                bank_code=bank_config.bank_code, direction="upload"
-                            ).observe(duration)
-
-                        self.db.commit()
-                        return True
+                    # Update batch status
+                    batch.status = PaymentBatchStatus.UPLOADED
+                    batch.uploaded_at = datetime.utcnow()
+                    batch.sftp_upload_path = upload["remote_path"]
+                    batch.file_name = file_name
+                    batch.file_checksum = hashlib.sha256(content_bytes).hexdigest()
+
+                    self._record_upload(bank_config, "success", start_time)
+                    self.db.commit()
+                    return True
 
                 except Exception as e:
                     if attempt < max_retries - 1:
@@ -580,21 +516,131 @@ class BankingService:
             batch.error_message = str(e)
             batch.retry_count += 1
 
-            # Update failure metrics
-            if self.metrics:
-                self.metrics["file_transfers"].labels(
-                    bank_code=bank_config.bank_code,
-                    direction="upload",
-                    status="failure",
-                ).inc()
-
+            self._record_upload(bank_config, "failure")
             self.db.commit()
             return False
 
-        finally:
-            # Clean up temporary file
-            if temp_file and os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
+    def upload_stream(
+        self,
+        bank_config: BankConfiguration,
+        file_name: str,
+        write: Callable[[BinaryIO], Any],
+        max_retries: int = 3,
+    ) -> Dict[str, Any]:
+        """
+        Stream a file into the bank's upload directory.
+
+        ``write`` receives the remote file opened for writing and produces
+        the content into it, e.g. the ACH generator writing through
+        ``PGPHandler.encrypting_writer``. Nothing is staged locally, so
+        memory stays bounded by the SFTP write buffer. ``write`` is called
+        again for each retry.
+
+        Args:
+            bank_config: Bank configuration
+            file_name: Remote file name
+            write: Callable producing the file content
+            max_retries: Upload attempts
+
+        Returns:
+            Dict: remote_path, size and sha256 checksum of the uploaded file
+
+        Raises:
+            Exception: The last upload error once retries are exhausted
+        """
+        start_time = time.time()
+
+        def transfer(sftp: Any, remote_path: str) -> _HashingWriter:
+            with sftp.open(remote_path, "wb") as remote_file:
+                # Writes are pipelined; the server acknowledges them on close
+                remote_file.set_pipelined(True)
+                hashing = _HashingWriter(remote_file)
+                write(hashing)
+            return hashing
+
+        for attempt in range(max_retries):
+            try:
+                with self.get_sftp_client(bank_config) as sftp:
+                    upload = self._upload_atomically(
+                        sftp,
+                        bank_config,
+                        file_name,
+                        lambda remote_path: transfer(sftp, remote_path),
+                    )
+                self._record_upload(bank_config, "success", start_time)
+                return upload
+
+            except Exception as e:
+                if attempt < max_retries - 1:
+                    logger.warning(f"Upload attempt {attempt + 1} failed, retrying: {e}")
+                    time.sleep(2**attempt)  # Exponential backoff
+                else:
+                    logger.error(f"Failed to upload {file_name}: {e}")
+                    self._record_upload(bank_config, "failure")
+                    raise
+
+    def _upload_atomically(
+        self,
+        sftp: Any,
+        bank_config: BankConfiguration,
+        file_name: str,
+        transfer: Callable[[str], Any],
+    ) -> Dict[str, Any]:
+        """Upload to a temporary name, verify, then rename into place."""
+        remote_path = os.path.join(bank_config.upload_path, file_name)
+        temp_remote_path = f"{remote_path}.tmp"
+
+        # Ensure remote directory exists
+        try:
+            sftp.stat(bank_config.upload_path)
+        except FileNotFoundError:
+            # Create directory if it doesn't exist
+            sftp.makedirs(bank_config.upload_path)
+
+        # Upload to temporary location first
+        sent = transfer(temp_remote_path)
+
+        # Verify file size (putfo confirms it itself)
+        upload = {"remote_path": remote_path, "size": None, "checksum": None}
+        if isinstance(sent, _HashingWriter):
+            upload["size"] = sent.size
+            upload["checksum"] = sent.hexdigest()
+            remote_size = sftp.stat(temp_remote_path).st_size
+            if sent.size != remote_size:
+                raise ValueError(
+                    f"File size mismatch: local={sent.size}, remote={remote_size}"
+                )
+
+        # Atomic rename to final location
+        sftp.rename(temp_remote_path, remote_path)
+
+        # Set file permissions (read - only for security)
+        sftp.chmod(remote_path, 0o444)
+
+        logger.info(
+            f"Successfully uploaded payment file {file_name} to {bank_config.bank_code}"
+        )
+        return upload
+
+    def _record_upload(
+        self,
+        bank_config: BankConfiguration,
+        status: str,
+        start_time: Optional[float] = None,
+    ) -> None:
+        """Update upload metrics."""
+        if not self.metrics:
+            return
+
+        self.metrics["file_transfers"].labels(
+            bank_code=bank_config.bank_code,
+            direction="upload",
+            status=status,
+        ).inc()
+        if start_time is not None:
+            self.metrics["transfer_duration"].labels(
+                bank_code=bank_config.bank_code, direction="upload"
+            ).observe(time.time() - start_time)
 
     def check_reconciliation_files(self, bank_code: str) -> List[str]:
         """
@@ -649,8 +695,93 @@ class BankingService:
 
         return new_files
 
+    def download_reconciliation_files(
+        self, bank_code: str, file_names: List[str]
+    ) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+        """
+        Download reconciliation files over one SFTP session.
+
+        Reads are pipelined across files. A file that cannot be downloaded
+        does not stop the others; files stay in the download directory until
+        ``process_reconciliation_file`` has logged them.
+
+        Args:
+            bank_code: Bank code
+            file_names: File names in the download directory
+
+        Returns:
+            Tuple[Dict[str, bytes], Dict[str, str]]: Raw content by file name,
+            and the download error of each file that failed
+        """
+        bank_config = (
+            self.db.query(BankConfiguration)
+            .filter_by(bank_code=bank_code, is_active=True)
+            .first()
+        )
+
+        if not bank_config:
+            raise ValueError(f"No active configuration for bank {bank_code}")
+
+        if not file_names:
+            return {}, {}
+
+        start_time = time.time()
+        remote_paths = {
+            file_name: os.path.join(bank_config.download_path, file_name)
+            for file_name in file_names
+        }
+
+        errors: Dict[str, str] = {}
+        with self.get_sftp_client(bank_config) as sftp:
+            downloaded = download_files(
+                sftp, list(remote_paths.values()), errors=errors
+            )
+
+        if self.metrics:
+            for status, count in (
+                ("success", len(downloaded)),
+                ("failed", len(errors)),
+            ):
+                if count:
+                    self.metrics["file_transfers"].labels(
+                        bank_code=bank_code, direction="download", status=status
+                    ).inc(count)
+            self.metrics["transfer_duration"].labels(
+                bank_code=bank_code, direction="download"
+            ).observe(time.time() - start_time)
+
+        return (
+            {
+                file_name: downloaded[remote_path]
+                for file_name, remote_path in remote_paths.items()
+                if remote_path in downloaded
+            },
+            {
+                file_name: errors[remote_path]
+                for file_name, remote_path in remote_paths.items()
+                if remote_path in errors
+            },
+        )
+
+    def _archive_reconciliation_file(
+        self, bank_config: BankConfiguration, file_name: str
+    ) -> None:
+        """Move a logged reconciliation file to the archive directory, if any"""
+        if not bank_config.archive_path:
+            return
+
+        try:
+            with self.get_sftp_client(bank_config) as sftp:
+                sftp.rename(
+                    os.path.join(bank_config.download_path, file_name),
+                    os.path.join(bank_config.archive_path, file_name),
+                )
+        except Exception as e:
+            # The file has a log, so later listings skip it anyway
+            logger.warning(f"Failed to archive reconciliation file {file_name}: {e}")
+
     def process_reconciliation_file(
-        self, bank_code: str, file_name: str
+        self, bank_code: str, file_name: str, content: Optional[bytes] = None
     ) -> ReconciliationLog:
         """
         Download and process a reconciliation file.
@@ -658,6 +789,8 @@ class BankingService:
         Args:
             bank_code: Bank code
             file_name: File name to process
+            content: Raw file content already fetched with
+                ``download_reconciliation_files``; downloaded if omitted
 
         Returns:
             ReconciliationLog: Processing result
@@ -679,76 +812,42 @@ class BankingService:
         )
 
         try:
-            # Download file
-            with self.get_sftp_client(bank_config) as sftp:
-                remote_path = os.path.join(bank_config.download_path, file_name)
-
-                # Download to memory
-                file_obj = io.BytesIO()
-                sftp.getfo(remote_path, file_obj)
-                file_obj.seek(0)
-
-                # Decode content
-                content = file_obj.read().decode(bank_config.encoding or "UTF - 8")
-                log.file_content = content
+            if content is None:
+                contents, errors = self.download_reconciliation_files(
+                    bank_code, [file_name]
+                )
+                if errors:
+                    raise SFTPConnectionError(errors[file_name])
+                content = contents[file_name]
 
-                # Move to archive if configured
-                if bank_config.archive_path:
-                    archive_path = os.path.join(bank_config.archive_path, file_name)
-                    sftp.rename(remote_path, archive_path)
+            # Decoded copy kept for audit
+            log.file_content = content.decode(bank_config.encoding or "UTF - 8")
 
             # Parse and process the file
             if bank_config.file_format == "fixed_width":
-                results = self._process_fixed_width_reconciliation(content, bank_config)
+                # Fields are cut by byte offset, then decoded
+                results = self._process_fixed_width_reconciliation(
+                    io.BytesIO(content), bank_config
+                )
             elif bank_config.file_format == "csv":
-                results = self._process_csv_reconciliation(content, bank_config)
+                results = self._process_csv_reconciliation(
+                    log.file_content, bank_config
+                )
             else:
                 raise BankingFormatError(
                     f"Unsupported file format: {bank_config.file_format}"
                 )
 
-            # Update transactions based on results
-            matched = 0
-            failed = 0
-
-            for result in results:
-                transaction = (
-                    self.db.query(PaymentTransaction)
-                    .filter_by(transaction_id=result["transaction_id"])
-                    .first()
-                )
-
-                if transaction:
-                    transaction.bank_reference = result.get("bank_reference")
-                    transaction.bank_response_code = result.get("response_code")
-                    transaction.bank_response_message = result.get("response_message")
-                    transaction.processed_date = result.get("processed_date")
-
-                    if result["success"]:
-                        transaction.status = TransactionStatus.SUCCESS
-                        matched += 1
-
-                        # Update related invoice if exists
-                        if transaction.invoice_id:
-                            invoice = (
-                                self.db.query(Invoice)
-                                .filter_by(id=transaction.invoice_id)
-                                .first()
-                            )
-                            if invoice:
-                                invoice.payment_status = InvoicePaymentStatus.PAID
-                                invoice.paid_at = transaction.processed_date
-                    else:
-                        transaction.status = TransactionStatus.FAILED
-                        failed += 1
-                else:
-                    logger.warning(f"Transaction {result['transaction_id']} not found")
+            # Match and apply all lines with set-based statements
+            outcome = reconcile_lines(self.db, ReconciliationLines.from_results(results))
+            matched = len(outcome.matched)
+            failed = len(outcome.failed)
 
             # Update log statistics
             log.total_records = len(results)
             log.matched_records = matched
             log.failed_records = failed
-            log.unmatched_records = log.total_records - matched - failed
+            log.unmatched_records = len(outcome.unmatched)
             log.status = (
                 ReconciliationStatus.MATCHED
                 if log.unmatched_records == 0
@@ -756,21 +855,19 @@ class BankingService:
             )
             log.processed_at = datetime.utcnow()
 
-            # Find and update related batch
-            if results:
-                # Get batch from first transaction
-                first_transaction = (
-                    self.db.query(PaymentTransaction)
-                    .filter_by(transaction_id=results[0]["transaction_id"])
-                    .first()
+            # Mark the batch of the first matched transaction reconciled
+            if outcome.batch_id is not None:
+                self.db.execute(
+                    update(PaymentBatch)
+                    .where(PaymentBatch.id == outcome.batch_id)
+                    .values(
+                        status=PaymentBatchStatus.RECONCILED,
+                        reconciled_at=datetime.utcnow(),
+                        reconciliation_file_name=file_name,
+                    )
+                    .execution_options(synchronize_session=False)
                 )
-
-                if first_transaction:
-                    batch = first_transaction.batch
-                    batch.status = PaymentBatchStatus.RECONCILED
-                    batch.reconciled_at = datetime.utcnow()
-                    batch.reconciliation_file_name = file_name
-                    log.batch_id = batch.id
+                log.batch_id = outcome.batch_id
 
             self.db.add(log)
             self.db.commit()
@@ -780,37 +877,48 @@ class BankingService:
                 f"{matched} matched, {failed} failed, {log.unmatched_records} unmatched"
             )
 
-            return log
-
         except Exception as e:
             logger.error(f"Failed to process reconciliation file: {str(e)}")
-            log.status = ReconciliationStatus.FAILED
+            self.db.rollback()
+            # The file needs a person to look at it before it is retried
+            log.status = ReconciliationStatus.MANUAL_REVIEW
             log.error_details = str(e)
             self.db.add(log)
             self.db.commit()
             raise
 
+        # Only once the log is committed: a crash before this leaves the file
+        # in the download directory to be processed again
+        self._archive_reconciliation_file(bank_config, file_name)
+        return log
+
     def _process_fixed_width_reconciliation(
-        self, content: str, bank_config: BankConfiguration
+        self, fp: BinaryIO, bank_config: BankConfiguration
     ) -> List[Dict]:
         """Parse fixed - width reconciliation file."""
         results = []
-        lines = content.strip().split("\n")
-
-        for line in lines:
-            if not line or line[0] == "H" or line[0] == "T":  # Skip header / trailer
+        encoding = bank_config.encoding or "UTF - 8"
+
+        # Header / trailer records have no layout and are skipped
+        records = RECONCILIATION_FILE_LAYOUT.read(fp, encoding)
+        for record_number, (_, fields) in enumerate(records, 1):
+            try:
+                processed_date = datetime.strptime(fields["processed_date"], "%Y%m%d")
+            except ValueError as e:
+                # One bad line must not hold up the rest of the file
+                logger.error(f"Skipping reconciliation record {record_number}: {e}")
                 continue
 
-            if line[0] == "D":  # Detail record
-                result = {
-                    "transaction_id": line[7:27].strip(),
-                    "bank_reference": line[27:47].strip(),
-                    "response_code": line[47:50].strip(),
-                    "response_message": line[50:150].strip(),
-                    "processed_date": datetime.strptime(line[150:158], "%Y % m % d"),
-                    "success": line[47:50].strip() == "000",  # Success code
+            results.append(
+                {
+                    "transaction_id": fields["transaction_id"],
+                    "bank_reference": fields["bank_reference"],
+                    "response_code": fields["response_code"],
+                    "response_message": fields["response_message"],
+                    "processed_date": processed_date,
+                    "success": fields["response_code"] == "000",  # Success code
                 }
-                results.append(result)
+            )
 
         return results
 
@@ -821,7 +929,7 @@ class BankingService:
         results = []
 
         reader = csv.DictReader(
-            io.StringIO(content), delimiter=bank_config.delimiter or ", "
+            io.StringIO(content), delimiter=bank_config.delimiter or ","
         )
 
         for row in reader:
@@ -847,7 +955,7 @@ class BankingService:
             "{YYYY}": date.strftime("%Y"),
             "{MM}": date.strftime("%m"),
             "{DD}": date.strftime("%d"),
-            "{YYYYMMDD}": date.strftime("%Y % m % d"),
+            "{YYYYMMDD}": date.strftime("%Y%m%d"),
             "{BATCH}": batch_number,
             "{TIMESTAMP}": str(int(time.time())),
         }
@@ -905,7 +1013,7 @@ class BankingService:
             .scalar()
         )
 
-        batch_number = f"{bank_code}{processing_date.strftime('%Y % m % d')}{str(batch_count + 1).zfill(3)}"
+        batch_number = f"{bank_code}{processing_date.strftime('%Y%m%d')}{str(batch_count + 1).zfill(3)}"
 
         # Create batch
         batch = PaymentBatch(
@@ -0,0 +1,144 @@
+"""
+Bulk loader for large backfills
+
+Streams rows from Excel / CSV sources in fixed-size chunks and writes them with
+PostgreSQL ``COPY ... FROM STDIN``. Primary keys are pre-allocated from the
+table sequences so parent and child rows (e.g. delivery history and its items)
+can be linked before anything is written, instead of flushing per row to learn
+the generated IDs.
+
+On databases without COPY (SQLite in tests and local development) the same
+rows are written with a single executemany INSERT per chunk.
+"""
+
+import csv
+import io
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import Table, func, select, text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# Source rows per chunk (bounds memory regardless of file size)
+LOAD_CHUNK_SIZE = 20000
+
+
+def iter_source_chunks(
+    path: str, chunk_size: int = LOAD_CHUNK_SIZE, sheet_name: Optional[str] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the rows of an Excel or CSV file as DataFrames of ``chunk_size`` rows
+
+    Excel files are read with openpyxl in read-only mode, which streams the
+    sheet XML instead of building the whole workbook in memory. The first row
+    is used as the header.
+    """
+    if Path(path).suffix.lower() == ".csv":
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str)
+        return
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name).strip() if name is not None else "" for name in header]
+
+        width = len(columns)
+        chunk: List[tuple] = []
+        for row in rows:
+            # Read-only sheets drop trailing empty cells
+            chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+class BulkLoader:
+    """Allocates primary keys and copies rows into tables on one connection"""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.is_postgres = connection.dialect.name == "postgresql"
+
+    def allocate_ids(self, table: Table, count: int) -> List[int]:
+        """
+        Reserve ``count`` primary keys for ``table``
+
+        PostgreSQL draws them from the column's sequence in one round trip, so
+        concurrent writers never collide. Elsewhere the keys continue from the
+        current maximum, which assumes the loader is the only writer.
+        """
+        if count <= 0:
+            return []
+
+        if self.is_postgres:
+            result = self.connection.execute(
+                text(
+                    "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                    "FROM generate_series(1, :count)"
+                ),
+                {"table": table.name, "count": count},
+            )
+            return [row[0] for row in result]
+
+        start = self.connection.execute(
+            select(func.coalesce(func.max(table.c.id), 0))
+        ).scalar()
+        return list(range(start + 1, start + count + 1))
+
+    def copy_rows(
+        self, table: Table, columns: Sequence[str], rows: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Write ``rows`` (dicts keyed by ``columns``) into ``table``
+
+        Returns:
+            Number of rows written
+        """
+        if not rows:
+            return 0
+
+        cursor = self._copy_cursor()
+        if cursor is None:
+            self.connection.execute(
+                table.insert(), [{key: row[key] for key in columns} for row in rows]
+            )
+            return len(rows)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if row[key] is None else row[key] for key in columns])
+        buffer.seek(0)
+
+        column_list = ", ".join(columns)
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
+        return len(rows)
+
+    def _copy_cursor(self):
+        """DBAPI cursor supporting ``copy_expert`` (psycopg2), if available"""
+        if not self.is_postgres:
+            return None
+        cursor = self.connection.connection.dbapi_connection.cursor()
+        if not hasattr(cursor, "copy_expert"):
+            logger.warning("Database driver has no COPY support, using INSERT")
+            return None
+        return cursor
@@ -3,14 +3,19 @@ Credit limit management and validation service
 """
 
 from datetime import datetime, timedelta
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import get_logger
 from app.models.customer import Customer
+from app.models.customer_ledger import CustomerBalanceLedger
 from app.models.order import Order, OrderStatus
+from app.services.customer_ledger_service import (
+    OUTSTANDING_PAYMENT_STATUSES,
+    CustomerLedgerService,
+)
 
 logger = get_logger(__name__)
 
@@ -37,11 +42,65 @@ class CreditService:
         Returns:
             Dict with validation result and details
         """
-        # Get customer
-        customer = await db.get(Customer, customer_id)
-        if not customer:
+        results = await CreditService.check_credit_limits(
+            db, {customer_id: order_amount}, skip_check
+        )
+        return results[customer_id]
+
+    @staticmethod
+    async def check_credit_limits(
+        db: AsyncSession,
+        order_amounts: Dict[int, float],
+        skip_check: bool = False,
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Check several customers at once, each for the total of their new orders
+
+        Reads the customers' ledger rows with one query regardless of the
+        number of customers.
+
+        Args:
+            db: Database session
+            order_amounts: Customer ID -> total amount of the new orders
+            skip_check: Skip credit check (for manager override)
+
+        Returns:
+            Customer ID -> result as returned by ``check_credit_limit``
+        """
+        if not order_amounts:
+            return {}
+
+        balances = await CustomerLedgerService(db).get_balances(list(order_amounts))
+
+        return {
+            customer_id: CreditService._evaluate_credit(
+                customer_id,
+                customer_id in balances,
+                balances.get(customer_id),
+                order_amount,
+                skip_check,
+            )
+            for customer_id, order_amount in order_amounts.items()
+        }
+
+    @staticmethod
+    def _evaluate_credit(
+        customer_id: int,
+        customer_exists: bool,
+        ledger: Optional[CustomerBalanceLedger],
+        order_amount: float,
+        skip_check: bool,
+    ) -> Dict[str, Any]:
+        """Credit decision for one customer from its ledger row"""
+        if not customer_exists:
             return {"approved": False, "reason": "Customer not found", "details": {}}
 
+        credit_limit = ledger.credit_limit if ledger else None
+        outstanding_balance = ledger.unpaid_order_amount if ledger else 0.0
+        available_credit = (
+            credit_limit - outstanding_balance if credit_limit is not None else None
+        )
+
         # If credit check is skipped (manager override)
         if skip_check:
             logger.info(f"Credit check skipped for customer {customer_id}")
@@ -49,35 +108,36 @@ class CreditService:
                 "approved": True,
                 "reason": "Manager override",
                 "details": {
-                    "credit_limit": customer.credit_limit,
-                    "current_balance": customer.current_balance,
-                    "available_credit": customer.credit_limit
-                    - customer.current_balance,
+                    "credit_limit": credit_limit,
+                    "current_balance": outstanding_balance,
+                    "available_credit": available_credit,
                 },
             }
 
         # If customer is credit blocked
-        if customer.is_credit_blocked:
+        if ledger and ledger.is_credit_blocked:
             return {
                 "approved": False,
                 "reason": "Customer credit is blocked",
                 "details": {
-                    "credit_limit": customer.credit_limit,
-                    "current_balance": customer.current_balance,
+                    "credit_limit": credit_limit,
+                    "current_balance": outstanding_balance,
                     "is_blocked": True,
                 },
             }
 
-        # Calculate outstanding balance from unpaid orders
-        outstanding_balance = await CreditService._calculate_outstanding_balance(
-            db, customer_id
-        )
-
-        # Update current balance in customer record
-        customer.current_balance = outstanding_balance
-
-        # Calculate available credit
-        available_credit = customer.credit_limit - outstanding_balance
+        # No credit limit configured for this customer
+        if credit_limit is None:
+            return {
+                "approved": True,
+                "reason": "No credit limit",
+                "details": {
+                    "credit_limit": None,
+                    "current_balance": outstanding_balance,
+                    "available_credit": None,
+                    "requested_amount": order_amount,
+                },
+            }
 
         # Check if new order would exceed credit limit
         if order_amount > available_credit:
@@ -85,7 +145,7 @@ class CreditService:
                 "approved": False,
                 "reason": "Credit limit exceeded",
                 "details": {
-                    "credit_limit": customer.credit_limit,
+                    "credit_limit": credit_limit,
                     "current_balance": outstanding_balance,
                     "available_credit": available_credit,
                     "requested_amount": order_amount,
@@ -97,7 +157,7 @@ class CreditService:
             "approved": True,
             "reason": "Within credit limit",
             "details": {
-                "credit_limit": customer.credit_limit,
+                "credit_limit": credit_limit,
                 "current_balance": outstanding_balance,
                 "available_credit": available_credit,
                 "requested_amount": order_amount,
@@ -105,38 +165,18 @@ class CreditService:
             },
         }
 
-    @staticmethod
-    async def _calculate_outstanding_balance(
-        db: AsyncSession, customer_id: int
-    ) -> float:
-        """Calculate total outstanding balance from unpaid orders"""
-        # Query for unpaid orders
-        stmt = select(func.sum(Order.total_amount)).where(
-            Order.customer_id == customer_id,
-            Order.payment_status.in_(["pending", "partial"]),
-            Order.status != OrderStatus.CANCELLED,
-        )
-
-        result = await db.execute(stmt)
-        outstanding = result.scalar() or 0.0
-
-        return outstanding
-
     @staticmethod
     async def update_customer_balance(db: AsyncSession, customer_id: int) -> float:
-        """Update customer's current balance based on unpaid orders"""
-        customer = await db.get(Customer, customer_id)
-        if not customer:
-            return 0.0
-
-        outstanding_balance = await CreditService._calculate_outstanding_balance(
-            db, customer_id
-        )
+        """
+        Reconcile a customer's ledger balance against its unpaid orders
 
-        customer.current_balance = outstanding_balance
-        await db.commit()
+        Runs in the caller's transaction; the caller commits.
+        """
+        ledger_service = CustomerLedgerService(db)
+        await ledger_service.reconcile([customer_id], commit=False)
 
-        return outstanding_balance
+        ledger = await ledger_service.get_balance(customer_id)
+        return ledger.unpaid_order_amount if ledger else 0.0
 
     @staticmethod
     async def get_credit_summary(db: AsyncSession, customer_id: int) -> Dict[str, Any]:
@@ -145,15 +185,15 @@ class CreditService:
         if not customer:
             return {}
 
-        outstanding_balance = await CreditService._calculate_outstanding_balance(
-            db, customer_id
-        )
+        ledger = await CustomerLedgerService(db).get_balance(customer_id)
+        credit_limit = ledger.credit_limit if ledger else None
+        outstanding_balance = ledger.unpaid_order_amount if ledger else 0.0
 
         # Get overdue amount (orders older than 30 days)
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
         stmt = select(func.sum(Order.total_amount)).where(
             Order.customer_id == customer_id,
-            Order.payment_status.in_(["pending", "partial"]),
+            Order.payment_status.in_(OUTSTANDING_PAYMENT_STATUSES),
             Order.status != OrderStatus.CANCELLED,
             Order.created_at < thirty_days_ago,
         )
@@ -164,14 +204,16 @@ class CreditService:
         return {
             "customer_id": customer_id,
             "customer_name": customer.short_name,
-            "credit_limit": customer.credit_limit,
+            "credit_limit": credit_limit,
             "current_balance": outstanding_balance,
-            "available_credit": customer.credit_limit - outstanding_balance,
+            "available_credit": (
+                credit_limit - outstanding_balance if credit_limit is not None else None
+            ),
             "overdue_amount": overdue_amount,
-            "is_credit_blocked": customer.is_credit_blocked,
+            "is_credit_blocked": bool(ledger and ledger.is_credit_blocked),
             "credit_utilization": (
-                (outstanding_balance / customer.credit_limit * 100)
-                if customer.credit_limit > 0
+                (outstanding_balance / credit_limit * 100)
+                if credit_limit
                 else 0
             ),
         }
@@ -185,7 +227,9 @@ class CreditService:
         if not customer:
             return False
 
-        customer.is_credit_blocked = True
+        await CustomerLedgerService(db).set_credit_settings(
+            customer_id, is_credit_blocked=True
+        )
         await db.commit()
 
         logger.info(f"Credit blocked for customer {customer_id}: {reason}")
@@ -200,7 +244,9 @@ class CreditService:
         if not customer:
             return False
 
-        customer.is_credit_blocked = False
+        await CustomerLedgerService(db).set_credit_settings(
+            customer_id, is_credit_blocked=False
+        )
         await db.commit()
 
         logger.info(f"Credit unblocked for customer {customer_id}: {reason}")
@@ -0,0 +1,302 @@
+"""
+Customer balance ledger maintenance
+
+Keeps one row of running balances per customer (customer_balance_ledger):
+- adjusted incrementally, in the caller's transaction, whenever an order,
+  invoice or payment change moves a customer's exposure
+- reconciled periodically against the full sums by the reconciliation job
+
+Adjustments are relative (``balance = balance + delta``) upserts, so
+concurrent transactions never overwrite each other's changes. Credit checks
+read the ledger row instead of summing the customer's orders.
+"""
+
+import logging
+import math
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.customer import Customer
+from app.models.customer_ledger import CustomerBalanceLedger
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.order import Order, OrderStatus, PaymentStatus
+
+logger = logging.getLogger(__name__)
+
+# Order payment states that still count against the customer's credit
+OUTSTANDING_PAYMENT_STATUSES = [PaymentStatus.UNPAID, PaymentStatus.PARTIAL]
+
+# Customers reconciled per transaction
+RECONCILE_BATCH_SIZE = 500
+
+# Drift below this (TWD) is float noise, not an error
+BALANCE_TOLERANCE = 0.01
+
+
+def order_exposure(order: Order) -> float:
+    """Amount an order contributes to the customer's unpaid order balance"""
+    payment_status = order.payment_status or PaymentStatus.UNPAID
+    if (
+        order.status == OrderStatus.CANCELLED
+        or payment_status not in OUTSTANDING_PAYMENT_STATUSES
+    ):
+        return 0.0
+    return float(order.total_amount or 0.0)
+
+
+def invoice_exposure(invoice: Invoice) -> float:
+    """Amount an invoice contributes to the customer's receivables"""
+    if invoice.status != InvoiceStatus.ISSUED:
+        return 0.0
+    return float((invoice.total_amount or 0.0) - (invoice.paid_amount or 0.0))
+
+
+class CustomerLedgerService:
+    """Incremental maintenance, reads and reconciliation of customer balances"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _insert(self):
+        bind = self.db.bind
+        dialect = bind.dialect.name if bind is not None else "postgresql"
+        insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        return insert(CustomerBalanceLedger)
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    async def _adjust(self, column: str, deltas: Dict[int, float]) -> None:
+        """Add ``deltas`` to one balance column, creating missing rows"""
+        rows = [
+            {"customer_id": customer_id, column: delta}
+            for customer_id, delta in deltas.items()
+            if delta
+        ]
+        if not rows:
+            return
+
+        stmt = self._insert().values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["customer_id"],
+            set_={
+                column: getattr(CustomerBalanceLedger, column)
+                + getattr(stmt.excluded, column),
+                "updated_at": func.now(),
+            },
+        )
+        await self.db.execute(stmt)
+
+    async def record_order_changes(
+        self, changes: Sequence[Tuple[Order, float]]
+    ) -> None:
+        """
+        Apply several order changes with one statement
+
+        Args:
+            changes: (order after the change, its ``order_exposure`` before
+                the change - 0 for new orders)
+        """
+        deltas: Dict[int, float] = {}
+        for order, previous_exposure in changes:
+            delta = order_exposure(order) - previous_exposure
+            deltas[order.customer_id] = deltas.get(order.customer_id, 0.0) + delta
+
+        await self._adjust("unpaid_order_amount", deltas)
+
+    async def record_order_change(
+        self, order: Order, previous_exposure: float = 0.0
+    ) -> None:
+        """Apply a created / updated order to its customer's balance"""
+        await self.record_order_changes([(order, previous_exposure)])
+
+    async def record_invoice_change(
+        self, invoice: Invoice, previous_exposure: float = 0.0
+    ) -> None:
+        """
+        Apply an invoice issue / void / amount or payment change
+
+        Args:
+            invoice: Invoice after the change
+            previous_exposure: Its ``invoice_exposure`` before the change
+        """
+        delta = invoice_exposure(invoice) - previous_exposure
+        await self._adjust("receivable_amount", {invoice.customer_id: delta})
+
+    async def set_credit_settings(self, customer_id: int, **settings) -> None:
+        """Set credit_limit and / or is_credit_blocked for a customer"""
+        stmt = self._insert().values(customer_id=customer_id, **settings)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["customer_id"],
+            set_={**settings, "updated_at": func.now()},
+        )
+        await self.db.execute(stmt)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    async def get_balances(
+        self, customer_ids: List[int]
+    ) -> Dict[int, Optional[CustomerBalanceLedger]]:
+        """
+        Ledger rows of existing customers (one query)
+
+        Returns:
+            Customer ID -> ledger row, or None when the customer has no
+            balance yet; unknown customers are left out
+        """
+        if not customer_ids:
+            return {}
+
+        result = await self.db.execute(
+            select(Customer.id, CustomerBalanceLedger)
+            .outerjoin(
+                CustomerBalanceLedger,
+                CustomerBalanceLedger.customer_id == Customer.id,
+            )
+            .where(Customer.id.in_(customer_ids))
+            # Rows are changed by bulk upserts; never serve stale identities
+            .execution_options(populate_existing=True)
+        )
+        return {customer_id: ledger for customer_id, ledger in result}
+
+    async def get_balance(self, customer_id: int) -> Optional[CustomerBalanceLedger]:
+        """Ledger row of one customer, None if it has none"""
+        return await self.db.get(
+            CustomerBalanceLedger, customer_id, populate_existing=True
+        )
+
+    # ------------------------------------------------------------------
+    # Reconciliation
+    # ------------------------------------------------------------------
+
+    async def order_balances(self, customer_ids: List[int]) -> Dict[int, float]:
+        """Unpaid order balances computed from the orders table"""
+        result = await self.db.execute(
+            select(Order.customer_id, func.sum(Order.total_amount))
+            .where(
+                Order.customer_id.in_(customer_ids),
+                Order.payment_status.in_(OUTSTANDING_PAYMENT_STATUSES),
+                Order.status != OrderStatus.CANCELLED,
+            )
+            .group_by(Order.customer_id)
+        )
+        return {customer_id: float(total or 0.0) for customer_id, total in result}
+
+    async def receivable_balances(self, customer_ids: List[int]) -> Dict[int, float]:
+        """Receivables computed from issued invoices"""
+        result = await self.db.execute(
+            select(
+                Invoice.customer_id,
+                func.sum(Invoice.total_amount - func.coalesce(Invoice.paid_amount, 0)),
+            )
+            .where(
+                Invoice.customer_id.in_(customer_ids),
+                Invoice.status == InvoiceStatus.ISSUED,
+            )
+            .group_by(Invoice.customer_id)
+        )
+        return {customer_id: float(total or 0.0) for customer_id, total in result}
+
+    async def reconcile(
+        self,
+        customer_ids: Optional[List[int]] = None,
+        batch_size: int = RECONCILE_BATCH_SIZE,
+        commit: bool = True,
+    ) -> Dict[str, int]:
+        """
+        Recompute balances from the source tables and fix any drift
+
+        Each batch locks its ledger rows before summing, so adjustments from
+        transactions committing meanwhile are applied on top of the
+        corrected values. Commits after every batch unless ``commit`` is
+        False, in which case it only flushes and the caller commits.
+
+        Args:
+            customer_ids: Customers to reconcile (default: all)
+            batch_size: Customers per transaction
+            commit: Commit each batch (False to run in the caller's transaction)
+
+        Returns:
+            Number of customers checked and rows corrected
+        """
+        if customer_ids is None:
+            result = await self.db.execute(select(Customer.id).order_by(Customer.id))
+            customer_ids = list(result.scalars())
+
+        stats = {"checked": 0, "corrected": 0}
+        for i in range(0, len(customer_ids), batch_size):
+            batch = customer_ids[i : i + batch_size]
+
+            result = await self.db.execute(
+                select(
+                    CustomerBalanceLedger.customer_id,
+                    CustomerBalanceLedger.unpaid_order_amount,
+                    CustomerBalanceLedger.receivable_amount,
+                )
+                .where(CustomerBalanceLedger.customer_id.in_(batch))
+                .with_for_update()
+            )
+            ledgers = {row.customer_id: row for row in result}
+            orders = await self.order_balances(batch)
+            receivables = await self.receivable_balances(batch)
+
+            now = datetime.utcnow()
+            rows = []
+            for customer_id in batch:
+                expected = {
+                    "unpaid_order_amount": orders.get(customer_id, 0.0),
+                    "receivable_amount": receivables.get(customer_id, 0.0),
+                }
+                ledger = ledgers.get(customer_id)
+                if ledger is None and not any(expected.values()):
+                    continue
+
+                stats["checked"] += 1
+                drift = {
+                    column: value - (getattr(ledger, column) if ledger else 0.0)
+                    for column, value in expected.items()
+                }
+                if any(not math.isclose(d, 0.0, abs_tol=BALANCE_TOLERANCE) for d in drift.values()):
+                    stats["corrected"] += 1
+                    logger.warning(f"Customer {customer_id} balance drift corrected: {drift}")
+
+                rows.append({"customer_id": customer_id, "reconciled_at": now, **expected})
+
+            if rows:
+                stmt = self._insert().values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["customer_id"],
+                    set_={
+                        column: getattr(stmt.excluded, column)
+                        for column in ("unpaid_order_amount", "receivable_amount", "reconciled_at")
+                    },
+                )
+                await self.db.execute(stmt)
+            if commit:
+                await self.db.commit()
+            else:
+                await self.db.flush()
+
+        logger.info(f"Reconciled customer balances: {stats}")
+        return stats
+
+
+async def reconcile_customer_balances() -> Dict[str, int]:
+    """
+    Reconciliation job entry point
+
+    Run nightly (``python manage.py reconcile-balances``); the first run after
+    the migration backfills the ledger.
+    """
+    from app.core.database_async import get_async_session
+
+    async for session in get_async_session():
+        return await CustomerLedgerService(session).reconcile()
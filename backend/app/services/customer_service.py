@@ -3,21 +3,71 @@ Customer service layer for business logic
 Handles customer - related operations and coordinates with repositories
 """
 
+import copy
 import logging
 from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+import pandas as pd
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.customer import Customer
 from app.repositories.customer_repository import CustomerRepository
 from app.repositories.order_repository import OrderRepository
 from app.schemas.customer import CustomerCreate, CustomerUpdate
+from app.core.cache import SimpleCache
 from app.core.metrics import cache_operations_counter
 
 # from app.api.v1.socketio_handler import send_notification  # Removed during compaction
 
 logger = logging.getLogger(__name__)
 
+# Order history considered when scoring delivery candidates
+CANDIDATE_HISTORY_DAYS = 60
+
+# (commercial, household) cylinders suggested to customers without recent orders
+DEFAULT_SUGGESTIONS = {
+    "50kg": (2, 0),
+    "20kg": (2, 1),
+    "16kg": (0, 0),
+    "10kg": (0, 0),
+    "4kg": (0, 1),
+}
+
+# Event types (websocket_service.EventType values) that change candidates
+CANDIDATE_INVALIDATING_EVENTS = {
+    "order.created",
+    "order.updated",
+    "order.delivered",
+    "order.cancelled",
+}
+
+_candidate_cache = SimpleCache(ttl_seconds=900, max_size=200)
+
+
+def invalidate_delivery_candidates(event_type: Optional[str] = None) -> None:
+    """
+    Drop cached delivery candidates
+
+    Args:
+        event_type: Domain event that triggered the call; events that cannot
+            affect candidates are ignored
+    """
+    if event_type is not None:
+        event_type = getattr(event_type, "value", event_type)
+        if event_type not in CANDIDATE_INVALIDATING_EVENTS:
+            return
+    _candidate_cache.clear()
+
+
+def _local_dates(values: pd.Series) -> pd.Series:
+    """Order timestamps as Taiwan calendar dates (NaT when missing)"""
+    dates = pd.to_datetime(values)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert("Asia/Taipei").dt.tz_localize(None)
+    return dates.dt.normalize()
+
 
 class CustomerService:
     """
@@ -190,113 +240,113 @@ class CustomerService:
         """
         Get customers that may need delivery on target date
 
+        Candidates and their latest orders come from a single query and are
+        scored in one vectorized pass. Results are cached per date and area
+        until an order changes.
+
         Args:
             target_date: Target delivery date
             area: Optional area filter
 
         Returns:
-            List of customer delivery recommendations
+            List of customer delivery recommendations, best first
         """
-        # Get customers needing delivery
-        customers = await self.customer_repo.get_customers_needing_delivery(
-            target_date, area
-        )
-
-        recommendations = []
-        for customer in customers:
-            # Get last order
-            last_orders = await self.order_repo.get_customer_order_history(
-                customer.id, days=60, limit=1
-            )
-
-            last_order = last_orders[0] if last_orders else None
-            days_since_last = (
-                (target_date - last_order.scheduled_date.date()).days
-                if last_order
-                else 999
-            )
+        cache_key = f"{target_date.isoformat()}:{area or ''}"
+        cached = _candidate_cache.get(cache_key)
+        if cached is not None:
+            cache_operations_counter.labels(
+                operation="delivery_candidates", status="hit", api_type="general"
+            ).inc()
+            return copy.deepcopy(cached)
 
-            # Calculate recommendation score
-            score = self._calculate_delivery_score(customer, days_since_last)
-
-            recommendations.append(
-                {
-                    "customer": customer,
-                    "last_order": last_order,
-                    "days_since_last": days_since_last,
-                    "recommendation_score": score,
-                    "suggested_products": self._suggest_products(customer, last_order),
-                }
-            )
+        cache_operations_counter.labels(
+            operation="delivery_candidates", status="miss", api_type="general"
+        ).inc()
 
-        # Sort by recommendation score
-        recommendations.sort(key=lambda x: x["recommendation_score"], reverse=True)
+        rows = await self.customer_repo.get_delivery_candidate_rows(
+            target_date, area, days=CANDIDATE_HISTORY_DAYS
+        )
+        recommendations = self._score_candidates(pd.DataFrame(rows), target_date)
 
-        return recommendations
+        _candidate_cache.set(cache_key, recommendations)
+        return copy.deepcopy(recommendations)
 
-    def _calculate_delivery_score(
-        self, customer: Customer, days_since_last: int
-    ) -> float:
+    @staticmethod
+    def _score_candidates(
+        candidates: pd.DataFrame, target_date: date
+    ) -> List[Dict[str, Any]]:
         """
-        Calculate delivery recommendation score
+        Score candidates (0 - 100) and suggest products
 
-        Args:
-            customer: Customer object
-            days_since_last: Days since last order
+        Score components:
+        - order cycle: 50 when the usual reorder interval has passed, otherwise
+          up to 30 in proportion to the time elapsed
+        - subscription: 20
+        - commercial customer: 10
+        - usage above 5 kg / day over the look-back window: 10
 
-        Returns:
-            Score from 0 - 100
+        Suggested products repeat the last order, or fall back to a default
+        by customer type.
         """
-        score = 0.0
-
-        # Base score from days since last order
-        if customer.max_cycle_days and days_since_last >= customer.max_cycle_days:
-            score += 50
-        elif customer.max_cycle_days:
-            score += (days_since_last / customer.max_cycle_days) * 30
-
-        # Subscription bonus
-        if customer.is_subscription:
-            score += 20
-
-        # Customer type bonus
-        if customer.customer_type == "commercial":
-            score += 10
-
-        # Consumption rate bonus
-        if customer.avg_daily_usage and customer.avg_daily_usage > 5:
-            score += 10
-
-        return min(score, 100.0)
+        if candidates.empty:
+            return []
+
+        last_date = _local_dates(candidates["last_date"])
+        first_date = _local_dates(candidates["first_date"])
+        has_order = last_date.notna()
+        days_since_last = (
+            (pd.Timestamp(target_date) - last_date).dt.days.fillna(999).astype(int)
+        )
 
-    def _suggest_products(
-        self, customer: Customer, last_order: Optional[Any]
-    ) -> Dict[str, int]:
-        """
-        Suggest products based on history
+        # Usual interval between orders; needs at least two orders
+        order_count = candidates["order_count"].fillna(0)
+        cycle_days = ((last_date - first_date).dt.days / (order_count - 1)).where(
+            order_count >= 2
+        )
 
-        Args:
-            customer: Customer object
-            last_order: Last order if available
+        score = np.where(
+            cycle_days.notna() & (days_since_last >= cycle_days),
+            50.0,
+            (days_since_last / cycle_days * 30).fillna(0.0),
+        )
+        score += np.where(candidates["is_subscription"].fillna(False).astype(bool), 20, 0)
+        is_commercial = candidates["customer_type"].fillna("").str.lower() == "commercial"
+        score += np.where(is_commercial, 10, 0)
+        daily_usage = candidates["total_kg"].fillna(0) / CANDIDATE_HISTORY_DAYS
+        score += np.where(daily_usage > 5, 10, 0)
+        score = np.minimum(score, 100.0)
+
+        suggestions = {}
+        for size, (commercial_default, household_default) in DEFAULT_SUGGESTIONS.items():
+            default = np.where(is_commercial, commercial_default, household_default)
+            suggestions[size] = np.where(
+                has_order,
+                candidates[f"qty_{size}"].fillna(0),
+                default,
+            ).astype(int)
+
+        result = pd.DataFrame(
+            {
+                "customer_id": candidates["customer_id"],
+                "customer_code": candidates["customer_code"],
+                "short_name": candidates["short_name"],
+                "area": candidates["area"],
+                "customer_type": candidates["customer_type"],
+                "last_order_date": last_date.dt.date.where(has_order, None),
+                "days_since_last": days_since_last,
+                "recommendation_score": score.round(2),
+            }
+        )
+        result = result.sort_values(
+            "recommendation_score", ascending=False, kind="stable"
+        )
 
-        Returns:
-            Suggested product quantities
-        """
-        if last_order:
-            # Suggest same as last order
-            return {
-                "50kg": last_order.qty_50kg,
-                "20kg": last_order.qty_20kg,
-                "16kg": last_order.qty_16kg,
-                "10kg": last_order.qty_10kg,
-                "4kg": last_order.qty_4kg,
+        records = result.to_dict("records")
+        for record, index in zip(records, result.index):
+            record["suggested_products"] = {
+                size: int(suggestions[size][index]) for size in DEFAULT_SUGGESTIONS
             }
-        else:
-            # Default suggestion based on customer type
-            if customer.customer_type == "commercial":
-                return {"50kg": 2, "20kg": 2, "16kg": 0, "10kg": 0, "4kg": 0}
-            else:
-                return {"50kg": 0, "20kg": 1, "16kg": 0, "10kg": 0, "4kg": 1}
+        return records
 
     async def update_inventory(
         self, customer_id: int, cylinder_updates: Dict[str, int]
@@ -0,0 +1,218 @@
+"""
+Dashboard summary engine
+
+Builds the office dashboard summary with a fixed number of queries:
+- one round trip of conditional aggregates for all headline stats
+- one joined route / driver query
+- one joined recent-order / customer query
+
+The result is kept as a short-lived snapshot shared by every user, so the
+cost per poll stays constant no matter how many people watch the dashboard.
+Order / route domain events drop the snapshot so changes show up promptly.
+"""
+
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import SimpleCache
+from app.models import Customer, Driver, Order, OrderStatus, Route
+from app.models.route import RouteStatus
+
+logger = logging.getLogger(__name__)
+
+# Snapshot lifetime - short enough that polling users see near-live data
+SNAPSHOT_TTL_SECONDS = 10
+SNAPSHOT_KEY = "dashboard_summary"
+
+# Event types (websocket_service.EventType values) that make the snapshot stale
+INVALIDATING_EVENTS = {
+    "order.created",
+    "order.updated",
+    "order.assigned",
+    "order.delivered",
+    "order.cancelled",
+    "route.created",
+    "route.updated",
+    "route.assigned",
+    "route.started",
+    "route.completed",
+    "delivery.update",
+}
+
+_snapshot_cache = SimpleCache(ttl_seconds=SNAPSHOT_TTL_SECONDS, max_size=1)
+_snapshot_lock = threading.Lock()
+
+
+def invalidate_dashboard_summary(event_type: Optional[str] = None) -> None:
+    """
+    Drop the shared dashboard snapshot
+
+    Args:
+        event_type: Domain event that triggered the call; events that cannot
+            affect the dashboard are ignored
+    """
+    if event_type is not None:
+        event_type = getattr(event_type, "value", event_type)
+        if event_type not in INVALIDATING_EVENTS:
+            return
+    _snapshot_cache.clear()
+    logger.debug(f"Dashboard snapshot invalidated ({event_type or 'manual'})")
+
+
+class DashboardSummaryService:
+    """Computes the dashboard summary in a constant number of queries"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_summary(self, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Get the shared dashboard summary snapshot
+
+        Concurrent callers that miss the cache wait for a single rebuild
+        instead of all hitting the database.
+        """
+        if use_cache:
+            cached = _snapshot_cache.get(SNAPSHOT_KEY)
+            if cached is not None:
+                return cached
+
+        with _snapshot_lock:
+            if use_cache:
+                cached = _snapshot_cache.get(SNAPSHOT_KEY)
+                if cached is not None:
+                    return cached
+
+            summary = self.build_summary()
+            _snapshot_cache.set(SNAPSHOT_KEY, summary)
+            return summary
+
+    def build_summary(self) -> Dict[str, Any]:
+        """Build the summary from the database (no caching)"""
+        today = date.today()
+        today_start = datetime.combine(today, datetime.min.time())
+        today_end = datetime.combine(today, datetime.max.time())
+
+        stats = self._get_stats(today_start, today_end)
+        routes = self._get_routes(today_start, today_end)
+        activities = self._get_recent_activities()
+
+        return {
+            "stats": stats,
+            "routes": routes,
+            "activities": activities,
+            "lastUpdated": datetime.utcnow().isoformat(),
+        }
+
+    def _get_stats(self, today_start: datetime, today_end: datetime) -> Dict[str, Any]:
+        """All headline numbers in a single SELECT with conditional aggregates"""
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        is_today = and_(Order.order_date >= today_start, Order.order_date <= today_end)
+        delivered = Order.status == OrderStatus.DELIVERED
+
+        order_stats = (
+            select(
+                func.count(Order.id).filter(is_today).label("today_orders"),
+                func.count(Order.id)
+                .filter(and_(is_today, delivered))
+                .label("delivered_today"),
+                func.coalesce(
+                    func.sum(Order.total_amount).filter(and_(is_today, delivered)), 0
+                ).label("today_revenue"),
+                func.count(Order.id)
+                .filter(and_(Order.updated_at >= seven_days_ago, delivered))
+                .label("recent_deliveries"),
+                func.count(Order.id)
+                .filter(Order.status.in_([OrderStatus.PENDING, OrderStatus.CONFIRMED]))
+                .label("urgent_orders"),
+            )
+            .select_from(Order)
+            .subquery()
+        )
+
+        customer_count = select(func.count(Customer.id)).scalar_subquery()
+        active_drivers = (
+            select(func.count(Driver.id)).where(Driver.is_active == True).scalar_subquery()
+        )
+
+        row = self.db.execute(
+            select(
+                order_stats,
+                customer_count.label("active_customers"),
+                active_drivers.label("drivers_on_route"),
+            )
+        ).one()
+
+        today_orders = row.today_orders or 0
+        completion_rate = (
+            (row.delivered_today / today_orders) * 100 if today_orders > 0 else 0
+        )
+
+        return {
+            "todayOrders": today_orders,
+            "todayRevenue": round(float(row.today_revenue or 0), 2),
+            "activeCustomers": row.active_customers or 0,
+            "driversOnRoute": row.drivers_on_route or 0,
+            "recentDeliveries": row.recent_deliveries or 0,
+            "urgentOrders": row.urgent_orders or 0,
+            "completionRate": round(completion_rate, 1),
+        }
+
+    def _get_routes(
+        self, today_start: datetime, today_end: datetime, limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Today's routes with driver names from one joined query"""
+        rows = self.db.execute(
+            select(Route, Driver.name.label("driver_name"))
+            .outerjoin(Driver, Driver.id == Route.driver_id)
+            .where(and_(Route.route_date >= today_start, Route.route_date <= today_end))
+            .limit(limit)
+        ).all()
+
+        routes = []
+        for route, driver_name in rows:
+            total_stops = route.total_stops or 0
+            completed_stops = route.completed_stops or 0
+            progress = (completed_stops / total_stops * 100) if total_stops > 0 else 0
+            routes.append(
+                {
+                    "id": route.id,
+                    "routeNumber": route.route_number,
+                    "status": "完成" if route.status == RouteStatus.COMPLETED else "進行中",
+                    "totalOrders": total_stops,
+                    "completedOrders": completed_stops,
+                    "driverName": driver_name or "未指派",
+                    "progressPercentage": round(progress),
+                }
+            )
+
+        return routes
+
+    def _get_recent_activities(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Latest orders with customer names from one joined query"""
+        rows = self.db.execute(
+            select(Order.id, Order.created_at, Customer.short_name)
+            .outerjoin(Customer, Customer.id == Order.customer_id)
+            .order_by(Order.created_at.desc())
+            .limit(limit)
+        ).all()
+
+        return [
+            {
+                "id": f"order-{row.id}",
+                "type": "order",
+                "message": f"新訂單來自 {row.short_name or '未知客戶'}",
+                "timestamp": (
+                    row.created_at.isoformat()
+                    if row.created_at
+                    else datetime.utcnow().isoformat()
+                ),
+                "status": "info",
+            }
+            for row in rows
+        ]
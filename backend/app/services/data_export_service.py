@@ -1,32 +1,74 @@
 """
 Data export service for Lucky Gas.
 Handles exporting data to various formats (CSV, Excel, JSON).
+
+Large order exports use the streaming mode (``stream_orders``): rows are read
+through a server-side cursor and written out as they arrive, so memory stays
+bounded and the first bytes can be sent immediately.
 """
 
+import asyncio
+import csv
 import io
 import json
 import logging
+import tempfile
 import zipfile
-from datetime import date
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional
 
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from sqlalchemy import and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, selectinload
 
-# Payment model imported from order module if needed
 from app.models.customer import Customer
 from app.models.delivery import Delivery
-from app.models.invoice import Invoice, InvoiceItem
-from app.models.order import Order
+from app.models.gas_product import GasProduct
+from app.models.invoice import Invoice, InvoiceItem, Payment
+from app.models.order import Order, OrderStatus
 from app.models.order_item import OrderItem
-from app.models.payment import Payment
 from app.models.route import Route, RouteStop
+from app.models.user import User
 from app.utils.datetime_utils import format_taiwan_date
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round trip by streaming exports
+EXPORT_STREAM_BATCH_SIZE = 1000
+
+# Bytes buffered before a streaming export emits a chunk
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "json": "application/json",
+}
+
+EXPORT_FILE_EXTENSIONS = {"csv": "csv", "excel": "xlsx", "json": "json"}
+
+ORDER_EXPORT_COLUMNS = [
+    "訂單編號",
+    "客戶名稱",
+    "配送日期",
+    "配送地址",
+    "狀態",
+    "總金額",
+    "折扣",
+    "應付金額",
+    "付款方式",
+    "司機",
+    "路線",
+    "建立時間",
+    "備註",
+]
+
+ORDER_ITEM_EXPORT_COLUMNS = ["訂單編號", "產品名稱", "數量", "單價", "小計", "折扣", "總計"]
+
 
 class DataExportService:
     """Service for exporting data in various formats."""
@@ -199,6 +241,255 @@ class DataExportService:
         else:
             raise ValueError(f"Unsupported format: {format}")
 
+    async def stream_orders(
+        self,
+        format: str = "csv",
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        status: Optional[OrderStatus] = None,
+        customer_id: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream order data with items.
+
+        Orders and items are read in one joined query through a server-side
+        cursor. CSV is written as one line per order item (order columns
+        repeated), Excel as a write-only workbook with an order sheet and an
+        item sheet, JSON as an array of orders with nested items.
+
+        Yields:
+            Chunks of the export file
+        """
+        if format not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"Unsupported format: {format}")
+
+        orders = self._stream_order_groups(start_date, end_date, status, customer_id)
+        if format == "csv":
+            chunks = self._stream_orders_csv(orders)
+        elif format == "excel":
+            chunks = self._stream_orders_excel(orders)
+        else:
+            chunks = self._stream_orders_json(orders)
+
+        async for chunk in chunks:
+            yield chunk
+
+    def _order_export_query(
+        self,
+        start_date: Optional[date],
+        end_date: Optional[date],
+        status: Optional[OrderStatus],
+        customer_id: Optional[int],
+    ):
+        """Orders joined with customer, driver and items, in export order"""
+        driver = aliased(User)
+        query = (
+            select(
+                Order.id,
+                Order.order_number,
+                Customer.short_name.label("customer_name"),
+                Order.scheduled_date,
+                Order.delivery_address,
+                Order.status,
+                Order.total_amount,
+                Order.discount_amount,
+                Order.final_amount,
+                Order.payment_method,
+                driver.full_name.label("driver_name"),
+                Order.route_id,
+                Order.created_at,
+                Order.delivery_notes,
+                OrderItem.id.label("item_id"),
+                GasProduct.name_zh.label("product_name"),
+                OrderItem.quantity,
+                OrderItem.unit_price,
+                OrderItem.subtotal,
+                OrderItem.discount_amount.label("item_discount"),
+                OrderItem.final_amount.label("item_total"),
+            )
+            .join(Customer, Order.customer_id == Customer.id)
+            .outerjoin(driver, Order.driver_id == driver.id)
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(GasProduct, OrderItem.gas_product_id == GasProduct.id)
+            .order_by(Order.id, OrderItem.id)
+            .execution_options(yield_per=EXPORT_STREAM_BATCH_SIZE)
+        )
+
+        conditions = []
+        if start_date:
+            conditions.append(Order.scheduled_date >= datetime.combine(start_date, time.min))
+        if end_date:
+            conditions.append(
+                Order.scheduled_date < datetime.combine(end_date + timedelta(days=1), time.min)
+            )
+        if status:
+            conditions.append(Order.status == status)
+        if customer_id:
+            conditions.append(Order.customer_id == customer_id)
+
+        if conditions:
+            query = query.where(and_(*conditions))
+        return query
+
+    async def _stream_order_groups(
+        self,
+        start_date: Optional[date],
+        end_date: Optional[date],
+        status: Optional[OrderStatus],
+        customer_id: Optional[int],
+    ) -> AsyncIterator[tuple]:
+        """Yield (order row, item rows) pairs from the joined result stream"""
+        query = self._order_export_query(start_date, end_date, status, customer_id)
+        result = await self.db.stream(query)
+
+        current = None
+        items = []
+        async for row in result:
+            if current is None or row.id != current.id:
+                if current is not None:
+                    yield current, items
+                current, items = row, []
+            if row.item_id is not None:
+                items.append(row)
+        if current is not None:
+            yield current, items
+
+    def _order_export_row(self, order) -> List[Any]:
+        return [
+            order.order_number or order.id,
+            order.customer_name,
+            format_taiwan_date(order.scheduled_date),
+            order.delivery_address,
+            self._translate_order_status(order.status.value),
+            order.total_amount,
+            order.discount_amount,
+            order.final_amount,
+            order.payment_method,
+            order.driver_name or "",
+            order.route_id,
+            format_taiwan_date(order.created_at),
+            order.delivery_notes,
+        ]
+
+    def _order_item_export_row(self, item) -> List[Any]:
+        return [
+            item.order_number or item.id,
+            item.product_name,
+            item.quantity,
+            item.unit_price,
+            item.subtotal,
+            item.item_discount,
+            item.item_total,
+        ]
+
+    async def _stream_orders_csv(self, orders: AsyncIterator[tuple]) -> AsyncIterator[bytes]:
+        """One CSV line per order item; orders without items get one line"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ORDER_EXPORT_COLUMNS + ORDER_ITEM_EXPORT_COLUMNS[1:])
+        # Write BOM for Excel compatibility with Chinese characters
+        yield b"\xef\xbb\xbf" + self._drain(buffer)
+
+        async for order, items in orders:
+            order_row = self._order_export_row(order)
+            if not items:
+                writer.writerow(order_row)
+            for item in items:
+                writer.writerow(order_row + self._order_item_export_row(item)[1:])
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield self._drain(buffer)
+
+        if buffer.tell():
+            yield self._drain(buffer)
+
+    async def _stream_orders_excel(
+        self, orders: AsyncIterator[tuple]
+    ) -> AsyncIterator[bytes]:
+        """
+        Write-only workbook spooled to a temporary file, then streamed
+
+        xlsx is a zip archive that can only be sent once complete; rows go
+        straight to disk so memory stays bounded, and the finished file is
+        sent in chunks.
+        """
+        workbook = Workbook(write_only=True)
+        order_sheet = workbook.create_sheet("訂單")
+        item_sheet = workbook.create_sheet("訂單明細")
+        order_sheet.append(self._excel_header(order_sheet, ORDER_EXPORT_COLUMNS))
+        item_sheet.append(self._excel_header(item_sheet, ORDER_ITEM_EXPORT_COLUMNS))
+
+        async for order, items in orders:
+            order_sheet.append(self._order_export_row(order))
+            for item in items:
+                item_sheet.append(self._order_item_export_row(item))
+
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as output:
+            await asyncio.to_thread(workbook.save, output)
+            output.seek(0)
+            while True:
+                chunk = await asyncio.to_thread(output.read, EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def _stream_orders_json(
+        self, orders: AsyncIterator[tuple]
+    ) -> AsyncIterator[bytes]:
+        """JSON array of orders with nested items, one object at a time"""
+        buffer = io.StringIO()
+        buffer.write("[")
+        separator = "\n"
+        async for order, items in orders:
+            order_dict = {
+                "id": order.id,
+                "order_number": order.order_number,
+                "customer": order.customer_name,
+                "delivery_date": (
+                    order.scheduled_date.isoformat() if order.scheduled_date else None
+                ),
+                "status": order.status.value,
+                "total_amount": float(order.total_amount or 0),
+                "items": [
+                    {
+                        "product": item.product_name,
+                        "quantity": item.quantity,
+                        "unit_price": float(item.unit_price),
+                        "total": float(item.item_total),
+                    }
+                    for item in items
+                ],
+            }
+            buffer.write(separator)
+            buffer.write(json.dumps(order_dict, ensure_ascii=False, default=str))
+            separator = ",\n"
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield self._drain(buffer)
+
+        buffer.write("\n]")
+        yield self._drain(buffer)
+
+    @staticmethod
+    def _drain(buffer: io.StringIO) -> bytes:
+        """Take the buffered text as UTF-8 bytes and reset the buffer"""
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    @staticmethod
+    def _excel_header(worksheet, columns: List[str]) -> List[WriteOnlyCell]:
+        """Header cells styled like the in-memory Excel exports"""
+        cells = []
+        for title in columns:
+            cell = WriteOnlyCell(worksheet, value=title)
+            cell.font = Font(bold=True, color="FFFFFF")
+            cell.fill = PatternFill(
+                start_color="366092", end_color="366092", fill_type="solid"
+            )
+            cell.alignment = Alignment(horizontal="center", vertical="center")
+            cells.append(cell)
+        return cells
+
     async def export_routes(
         self,
         format: str = "csv",
@@ -458,7 +749,7 @@ class DataExportService:
         output = io.BytesIO()
 
         # Write BOM for Excel compatibility with Chinese characters
-        output.write(b"\xef\xbb\xb")
+        output.write(b"\xef\xbb\xbf")
 
         # Convert to CSV
         csv_data = df.to_csv(index=False, encoding="utf - 8")
@@ -480,7 +771,7 @@ class DataExportService:
                 csv_data = csv_buffer.getvalue()
 
                 # Add BOM for Excel compatibility
-                csv_bytes = b"\xef\xbb\xb" + csv_data.encode("utf - 8")
+                csv_bytes = b"\xef\xbb\xbf" + csv_data.encode("utf - 8")
                 zf.writestr(f"{name}.csv", csv_bytes)
 
         output.seek(0)
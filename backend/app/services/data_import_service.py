@@ -1,26 +1,51 @@
 """
 Data import service for Lucky Gas.
 Handles importing data from CSV, Excel files with validation.
+
+Imports are vectorized: columns are cleaned and validated with pandas, existing
+records are resolved with one IN query per chunk of keys, and rows are written
+with multi-row INSERT / bulk UPDATE statements in large batches. Per-row error
+and warning reports are produced from the validation masks.
 """
 
 import io
 import logging
 from datetime import date, datetime
-from decimal import Decimal
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional
 
+import numpy as np
 import pandas as pd
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.customer import Customer
 from app.models.gas_product import GasProduct as Product
-from app.models.order import Order
+from app.models.order import Order, OrderStatus
 from app.models.order_item import OrderItem
+from app.services.analytics_rollup_service import AnalyticsRollupService
+from app.services.customer_ledger_service import CustomerLedgerService
 from app.utils.validators import validate_email, validate_phone_number
 
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT / UPDATE statement
+IMPORT_BATCH_SIZE = 5000
+
+# Keys per IN (...) lookup
+LOOKUP_CHUNK_SIZE = 1000
+
+# Accepted date formats (sheets are read as text, Excel dates included)
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%d/%m/%Y",
+    "%Y年%m月%d日",
+]
+
 
 class DataImportError(Exception):
     """Custom exception for data import errors."""
@@ -60,6 +85,7 @@ class DataImportService:
         # Validate and map columns
         required_columns = ["客戶名稱", "電話"]
         optional_columns = [
+            "客戶代碼",
             "地址",
             "區域",
             "客戶類型",
@@ -76,94 +102,75 @@ class DataImportService:
         if missing_columns:
             raise ValidationError(f"Missing required columns: {missing_columns}")
 
-        # Process each row
-        created_count = 0
-        updated_count = 0
-        skipped_count = 0
+        # Clean and validate data, one column at a time
+        rows = pd.DataFrame(
+            {
+                "_row": df.index + 2,
+                "customer_code": self._optional_text(df, "客戶代碼"),
+                "short_name": self._text(df, "客戶名稱"),
+                "phone": self._clean_phones(self._text(df, "電話")),
+                "address": self._optional_text(df, "地址"),
+                "area": self._optional_text(df, "區域"),
+                "customer_type": self._text(df, "客戶類型")
+                .map(self._map_customer_type),
+                "credit_limit": self._parse_decimals(df, "信用額度"),
+                "payment_terms": self._parse_ints(df, "付款條件"),
+                "contact_person": self._optional_text(df, "聯絡人"),
+                "contact_phone": self._clean_phones(self._text(df, "聯絡人電話"))
+                .replace("", None),
+                "email": self._optional_text(df, "電子郵件"),
+                "tax_id": self._optional_text(df, "統一編號"),
+                "notes": self._optional_text(df, "備註"),
+                "is_active": True,
+            },
+            index=df.index,
+        )
 
-        for index, row in df.iterrows():
-            try:
-                # Clean and validate data
-                customer_data = {
-                    "name": str(row["客戶名稱"]).strip(),
-                    "phone": self._clean_phone(str(row["電話"])),
-                    "address": str(row.get("地址", "")).strip() or None,
-                    "district": str(row.get("區域", "")).strip() or None,
-                    "customer_type": self._map_customer_type(
-                        row.get("客戶類型", "individual")
-                    ),
-                    "credit_limit": self._parse_decimal(row.get("信用額度", 0)),
-                    "payment_terms": self._parse_int(row.get("付款條件", 0)),
-                    "contact_person": str(row.get("聯絡人", "")).strip() or None,
-                    "contact_phone": self._clean_phone(str(row.get("聯絡人電話", "")))
-                    or None,
-                    "email": str(row.get("電子郵件", "")).strip() or None,
-                    "tax_id": str(row.get("統一編號", "")).strip() or None,
-                    "notes": str(row.get("備註", "")).strip() or None,
-                    "is_active": True,
-                }
+        # Validate phone
+        invalid_phone = ~rows["phone"].map(validate_phone_number)
+        self._add_errors(df, invalid_phone, "電話", "Invalid phone number format")
+        rows = rows[~invalid_phone]
 
-                # Validate phone
-                if not validate_phone_number(customer_data["phone"]):
-                    self.errors.append(
-                        {
-                            "row": index + 2,
-                            "field": "電話",
-                            "value": row["電話"],
-                            "error": "Invalid phone number format",
-                        }
-                    )
-                    continue
-
-                # Validate email if provided
-                if customer_data["email"] and not validate_email(
-                    customer_data["email"]
-                ):
-                    self.errors.append(
-                        {
-                            "row": index + 2,
-                            "field": "電子郵件",
-                            "value": row["電子郵件"],
-                            "error": "Invalid email format",
-                        }
-                    )
-                    customer_data["email"] = None
+        # Validate email if provided
+        invalid_email = rows["email"].notna() & ~rows["email"].map(
+            lambda email: validate_email(email) if email else True
+        )
+        self._add_errors(df, invalid_email, "電子郵件", "Invalid email format")
+        rows.loc[invalid_email, "email"] = None
+
+        # Later rows with a phone already seen in this file are skipped
+        duplicate = rows["phone"].duplicated()
+        self._add_warnings(
+            rows[duplicate],
+            lambda row: f"Customer with phone {row['phone']} appears more than once in file",
+        )
+        rows = rows[~duplicate]
 
-                if validate_only:
-                    continue
+        created_count = 0
+        updated_count = 0
+        skipped_count = int(duplicate.sum())
 
-                # Check if customer exists
-                existing = await self.db.execute(
-                    select(Customer).where(Customer.phone == customer_data["phone"])
+        if not validate_only:
+            # Check which customers exist in one pass
+            existing_ids = await self._lookup_ids(Customer.phone, rows["phone"])
+            rows["id"] = rows["phone"].map(existing_ids)
+            is_existing = rows["id"].notna()
+
+            if update_existing:
+                updates = self._records(
+                    Customer, rows[is_existing].astype({"id": int}), keep_nulls=False
                 )
-                existing_customer = existing.scalar_one_or_none()
-
-                if existing_customer:
-                    if update_existing:
-                        # Update existing customer
-                        for key, value in customer_data.items():
-                            if value is not None:
-                                setattr(existing_customer, key, value)
-                        updated_count += 1
-                    else:
-                        self.warnings.append(
-                            {
-                                "row": index + 2,
-                                "message": f"Customer with phone {customer_data['phone']} already exists",
-                                "action": "skipped",
-                            }
-                        )
-                        skipped_count += 1
-                else:
-                    # Create new customer
-                    customer = Customer(**customer_data)
-                    self.db.add(customer)
-                    created_count += 1
+                updated_count = await self._bulk_update(Customer, updates)
+            else:
+                self._add_warnings(
+                    rows[is_existing],
+                    lambda row: f"Customer with phone {row['phone']} already exists",
+                )
+                skipped_count += int(is_existing.sum())
 
-            except Exception as e:
-                self.errors.append({"row": index + 2, "error": str(e)})
+            new_rows = self._records(Customer, rows[~is_existing].drop(columns="id"))
+            created_count = await self._bulk_insert(Customer, new_rows)
 
-        if not validate_only:
             try:
                 await self.db.commit()
             except IntegrityError as e:
@@ -215,72 +222,64 @@ class DataImportService:
         if missing_columns:
             raise ValidationError(f"Missing required columns: {missing_columns}")
 
-        # Process each row
-        created_count = 0
-        updated_count = 0
-        skipped_count = 0
+        # Product code is the unique SKU
+        rows = pd.DataFrame(
+            {
+                "_row": df.index + 2,
+                "sku": self._text(df, "產品代碼"),
+                "name_zh": self._text(df, "產品名稱"),
+                "category": self._text(df, "類別", default="gas"),
+                "specification": self._optional_text(df, "規格"),
+                "unit": self._text(df, "單位", default="桶"),
+                "unit_price": self._parse_decimals(df, "單價"),
+                "cost": self._parse_decimals(df, "成本"),
+                "stock_quantity": self._parse_ints(df, "庫存量"),
+                "minimum_stock": self._parse_ints(df, "最低庫存"),
+                "description": self._optional_text(df, "描述"),
+                "is_active": True,
+            },
+            index=df.index,
+        )
 
-        for index, row in df.iterrows():
-            try:
-                product_data = {
-                    "code": str(row["產品代碼"]).strip(),
-                    "name": str(row["產品名稱"]).strip(),
-                    "category": str(row.get("類別", "gas")).strip(),
-                    "specification": str(row.get("規格", "")).strip() or None,
-                    "unit": str(row.get("單位", "桶")).strip(),
-                    "unit_price": self._parse_decimal(row["單價"]),
-                    "cost": self._parse_decimal(row.get("成本", 0)),
-                    "stock_quantity": self._parse_int(row.get("庫存量", 0)),
-                    "minimum_stock": self._parse_int(row.get("最低庫存", 0)),
-                    "description": str(row.get("描述", "")).strip() or None,
-                    "is_active": True,
-                }
+        # Validate price
+        invalid_price = rows["unit_price"] <= 0
+        self._add_errors(df, invalid_price, "單價", "Price must be greater than 0")
+        rows = rows[~invalid_price]
 
-                # Validate price
-                if product_data["unit_price"] <= 0:
-                    self.errors.append(
-                        {
-                            "row": index + 2,
-                            "field": "單價",
-                            "value": row["單價"],
-                            "error": "Price must be greater than 0",
-                        }
-                    )
-                    continue
+        duplicate = rows["sku"].duplicated()
+        self._add_warnings(
+            rows[duplicate],
+            lambda row: f"Product with code {row['sku']} appears more than once in file",
+        )
+        rows = rows[~duplicate]
 
-                if validate_only:
-                    continue
+        created_count = 0
+        updated_count = 0
+        skipped_count = int(duplicate.sum())
+
+        if not validate_only:
+            existing_ids = await self._lookup_ids(Product.sku, rows["sku"])
+            rows["id"] = rows["sku"].map(existing_ids)
+            is_existing = rows["id"].notna()
 
-                # Check if product exists
-                existing = await self.db.execute(
-                    select(Product).where(Product.code == product_data["code"])
+            if update_existing:
+                updates = self._records(
+                    Product, rows[is_existing].astype({"id": int}), keep_nulls=False
+                )
+                updated_count = await self._bulk_update(Product, updates)
+            else:
+                self._add_warnings(
+                    rows[is_existing],
+                    lambda row: f"Product with code {row['sku']} already exists",
                 )
-                existing_product = existing.scalar_one_or_none()
-
-                if existing_product:
-                    if update_existing:
-                        for key, value in product_data.items():
-                            if value is not None:
-                                setattr(existing_product, key, value)
-                        updated_count += 1
-                    else:
-                        self.warnings.append(
-                            {
-                                "row": index + 2,
-                                "message": f"Product with code {product_data['code']} already exists",
-                                "action": "skipped",
-                            }
-                        )
-                        skipped_count += 1
-                else:
-                    product = Product(**product_data)
-                    self.db.add(product)
-                    created_count += 1
+                skipped_count += int(is_existing.sum())
 
-            except Exception as e:
-                self.errors.append({"row": index + 2, "error": str(e)})
+            # ON CONFLICT guards against products created since the lookup
+            new_rows = self._records(Product, rows[~is_existing].drop(columns="id"))
+            created_count = await self._bulk_insert(
+                Product, new_rows, conflict_keys=["sku"]
+            )
 
-        if not validate_only:
             try:
                 await self.db.commit()
             except IntegrityError as e:
@@ -340,171 +339,160 @@ class DataImportService:
                 f"Missing required columns in items sheet: {missing_columns}"
             )
 
-        # Process orders
-        created_count = 0
-        order_map = {}  # Map row number to order ID
-
-        for index, row in orders_df.iterrows():
-            try:
-                # Find customer by phone
-                phone = self._clean_phone(str(row["客戶電話"]))
-                customer_result = await self.db.execute(
-                    select(Customer).where(Customer.phone == phone)
-                )
-                customer = customer_result.scalar_one_or_none()
-
-                if not customer:
-                    self.errors.append(
-                        {
-                            "row": index + 2,
-                            "sheet": "訂單",
-                            "error": f"Customer with phone {phone} not found",
-                        }
-                    )
-                    continue
-
-                # Parse delivery date
-                delivery_date = self._parse_date(row["配送日期"])
-                if not delivery_date:
-                    self.errors.append(
-                        {
-                            "row": index + 2,
-                            "sheet": "訂單",
-                            "field": "配送日期",
-                            "error": "Invalid date format",
-                        }
-                    )
-                    continue
-
-                order_data = {
-                    "customer_id": customer.id,
-                    "delivery_date": delivery_date,
-                    "delivery_address": str(row["配送地址"]).strip(),
-                    "payment_method": row.get("付款方式", "cash"),
-                    "notes": str(row.get("備註", "")).strip() or None,
-                    "priority": row.get("優先級", "normal"),
-                    "status": "pending",
-                    "items": [],
+        # Process orders - customers resolved with one lookup
+        orders = pd.DataFrame(
+            {
+                "_row": orders_df.index + 2,
+                "phone": self._clean_phones(self._text(orders_df, "客戶電話")),
+                "scheduled_date": self._parse_dates(orders_df["配送日期"]),
+                "delivery_address": self._text(orders_df, "配送地址"),
+                "payment_method": self._text(orders_df, "付款方式", default="cash"),
+                "delivery_notes": self._optional_text(orders_df, "備註"),
+            },
+            index=orders_df.index,
+        )
+        customer_ids = await self._lookup_ids(Customer.phone, orders["phone"])
+        orders["customer_id"] = orders["phone"].map(customer_ids)
+
+        no_customer = orders["customer_id"].isna()
+        for row_number, phone in zip(
+            orders.loc[no_customer, "_row"], orders.loc[no_customer, "phone"]
+        ):
+            self.errors.append(
+                {
+                    "row": int(row_number),
+                    "sheet": "訂單",
+                    "error": f"Customer with phone {phone} not found",
                 }
+            )
+        orders = orders[~no_customer]
+
+        bad_date = orders["scheduled_date"].isna()
+        for row_number in orders.loc[bad_date, "_row"]:
+            self.errors.append(
+                {
+                    "row": int(row_number),
+                    "sheet": "訂單",
+                    "field": "配送日期",
+                    "error": "Invalid date format",
+                }
+            )
+        orders = orders[~bad_date].set_index("_row", drop=False)
+
+        # Process order items - products resolved with one lookup
+        items = pd.DataFrame(
+            {
+                "_row": items_df.index + 2,
+                "order_row": pd.to_numeric(items_df["訂單編號"], errors="coerce"),
+                "code": self._text(items_df, "產品代碼"),
+                "quantity": self._parse_ints(items_df, "數量"),
+                "unit_price": pd.to_numeric(
+                    self._text(items_df, "單價").str.replace(",", ""), errors="coerce"
+                ),
+                "discount_amount": self._parse_decimals(items_df, "折扣"),
+            },
+            index=items_df.index,
+        )
 
-                # Store for later processing with items
-                order_map[index + 2] = order_data
-
-            except Exception as e:
-                self.errors.append({"row": index + 2, "sheet": "訂單", "error": str(e)})
-
-        # Process order items
-        for index, row in items_df.iterrows():
-            try:
-                order_row = int(row["訂單編號"])
-                if order_row not in order_map:
-                    self.warnings.append(
-                        {
-                            "row": index + 2,
-                            "sheet": "訂單明細",
-                            "message": f"Order row {order_row} not found or has errors",
-                            "action": "skipped",
-                        }
-                    )
-                    continue
+        orphan = ~items["order_row"].isin(orders.index)
+        for row_number, order_row in zip(
+            items.loc[orphan, "_row"], items.loc[orphan, "order_row"]
+        ):
+            self.warnings.append(
+                {
+                    "row": int(row_number),
+                    "sheet": "訂單明細",
+                    "message": f"Order row {order_row} not found or has errors",
+                    "action": "skipped",
+                }
+            )
+        items = items[~orphan]
 
-                # Find product
-                product_code = str(row["產品代碼"]).strip()
-                product_result = await self.db.execute(
-                    select(Product).where(Product.code == product_code)
-                )
-                product = product_result.scalar_one_or_none()
-
-                if not product:
-                    self.errors.append(
-                        {
-                            "row": index + 2,
-                            "sheet": "訂單明細",
-                            "error": f"Product with code {product_code} not found",
-                        }
-                    )
-                    continue
-
-                quantity = self._parse_int(row["數量"])
-                if quantity <= 0:
-                    self.errors.append(
-                        {
-                            "row": index + 2,
-                            "sheet": "訂單明細",
-                            "field": "數量",
-                            "error": "Quantity must be greater than 0",
-                        }
-                    )
-                    continue
-
-                item_data = {
-                    "product_id": product.id,
-                    "quantity": quantity,
-                    "unit_price": self._parse_decimal(
-                        row.get("單價", product.unit_price)
-                    ),
-                    "discount_amount": self._parse_decimal(row.get("折扣", 0)),
+        products = await self._lookup_products(items["code"])
+        items["gas_product_id"] = items["code"].map(
+            {code: product_id for code, (product_id, _) in products.items()}
+        )
+        no_product = items["gas_product_id"].isna()
+        for row_number, code in zip(
+            items.loc[no_product, "_row"], items.loc[no_product, "code"]
+        ):
+            self.errors.append(
+                {
+                    "row": int(row_number),
+                    "sheet": "訂單明細",
+                    "error": f"Product with code {code} not found",
+                }
+            )
+        items = items[~no_product]
+
+        bad_quantity = items["quantity"] <= 0
+        for row_number in items.loc[bad_quantity, "_row"]:
+            self.errors.append(
+                {
+                    "row": int(row_number),
+                    "sheet": "訂單明細",
+                    "field": "數量",
+                    "error": "Quantity must be greater than 0",
                 }
+            )
+        items = items[~bad_quantity].copy()
 
-                order_map[order_row]["items"].append(item_data)
+        # Default to the catalogue price when the sheet has none
+        catalogue_price = items["code"].map(
+            {code: price for code, (_, price) in products.items()}
+        )
+        items["unit_price"] = items["unit_price"].fillna(catalogue_price).astype(float)
+        items["order_row"] = items["order_row"].astype(int)
+        items["subtotal"] = items["quantity"] * items["unit_price"]
+        items["final_amount"] = items["subtotal"] - items["discount_amount"]
+
+        # Orders without any valid item are not created
+        total_orders = len(orders)
+        has_items = orders.index.isin(items["order_row"])
+        for customer_id in orders.loc[~has_items, "customer_id"]:
+            self.warnings.append(
+                {
+                    "message": f"Order for customer {int(customer_id)} has no items",
+                    "action": "skipped",
+                }
+            )
+        orders = orders[has_items].copy()
 
-            except Exception as e:
-                self.errors.append(
-                    {"row": index + 2, "sheet": "訂單明細", "error": str(e)}
-                )
+        created_count = 0
 
         # Create orders if not validate only
-        if not validate_only:
-            for order_data in order_map.values():
-                if not order_data["items"]:
-                    self.warnings.append(
-                        {
-                            "message": f"Order for customer {order_data['customer_id']} has no items",
-                            "action": "skipped",
-                        }
-                    )
-                    continue
-
-                try:
-                    # Calculate totals
-                    total_amount = sum(
-                        item["quantity"] * item["unit_price"] - item["discount_amount"]
-                        for item in order_data["items"]
-                    )
+        if not validate_only and not orders.empty:
+            totals = items.groupby("order_row")["final_amount"].sum()
+            orders["total_amount"] = totals.reindex(orders.index).astype(float)
+            orders["final_amount"] = orders["total_amount"]  # Can be adjusted later
+            orders["customer_id"] = orders["customer_id"].astype(int)
+            orders["status"] = OrderStatus.PENDING
+            orders["order_number"] = self._import_order_numbers(len(orders))
+
+            order_ids = await self._insert_orders(
+                self._records(Order, orders.drop(columns=["phone"]))
+            )
+            items["order_id"] = items["order_row"].map(order_ids)
+            items = items[items["order_id"].notna()].astype(
+                {"order_id": int, "gas_product_id": int}
+            )
 
-                    # Create order
-                    order = Order(
-                        customer_id=order_data["customer_id"],
-                        delivery_date=order_data["delivery_date"],
-                        delivery_address=order_data["delivery_address"],
-                        payment_method=order_data["payment_method"],
-                        notes=order_data["notes"],
-                        priority=order_data["priority"],
-                        status=order_data["status"],
-                        total_amount=total_amount,
-                        final_amount=total_amount,  # Can be adjusted later
-                    )
-                    self.db.add(order)
-                    await self.db.flush()
-
-                    # Create order items
-                    for item_data in order_data["items"]:
-                        item = OrderItem(
-                            order_id=order.id,
-                            product_id=item_data["product_id"],
-                            quantity=item_data["quantity"],
-                            unit_price=item_data["unit_price"],
-                            discount_amount=item_data["discount_amount"],
-                            subtotal=item_data["quantity"] * item_data["unit_price"],
-                            total_amount=item_data["quantity"] * item_data["unit_price"]
-                            - item_data["discount_amount"],
-                        )
-                        self.db.add(item)
-
-                    created_count += 1
-
-                except Exception as e:
-                    self.errors.append({"error": f"Failed to create order: {str(e)}"})
+            item_columns = [
+                "_row",
+                "order_id",
+                "gas_product_id",
+                "quantity",
+                "unit_price",
+                "subtotal",
+                "discount_amount",
+                "final_amount",
+            ]
+            await self._bulk_insert(OrderItem, self._records(OrderItem, items[item_columns]))
+            created_count = len(order_ids)
+
+            # Fold the new orders into the analytics rollups and customer
+            # balances, committed with them
+            await self._record_created_orders(list(order_ids.values()))
 
             try:
                 await self.db.commit()
@@ -513,13 +501,281 @@ class DataImportService:
                 raise DataImportError(f"Database integrity error: {str(e)}")
 
         return {
-            "total_orders": len(order_map),
+            "total_orders": total_orders,
             "created": created_count,
             "errors": self.errors,
             "warnings": self.warnings,
             "validate_only": validate_only,
         }
 
+    # Bulk database helpers
+
+    async def _record_created_orders(self, order_ids: List[int]) -> None:
+        """Apply imported orders to the rollups and ledger, one chunk at a time"""
+        rollups = AnalyticsRollupService(self.db)
+        ledger = CustomerLedgerService(self.db)
+
+        for start in range(0, len(order_ids), LOOKUP_CHUNK_SIZE):
+            chunk = order_ids[start : start + LOOKUP_CHUNK_SIZE]
+            result = await self.db.scalars(select(Order).where(Order.id.in_(chunk)))
+            created = result.all()
+            await rollups.record_order_changes(
+                [(order, None, None) for order in created]
+            )
+            await ledger.record_order_changes([(order, 0.0) for order in created])
+
+    def _insert(self, model):
+        """Dialect-specific INSERT supporting ON CONFLICT"""
+        bind = self.db.bind
+        dialect = bind.dialect.name if bind is not None else "postgresql"
+        return sqlite_insert(model) if dialect == "sqlite" else pg_insert(model)
+
+    async def _lookup_ids(self, key_column, keys: pd.Series) -> Dict[Any, int]:
+        """Map key values to primary keys with one IN query per chunk"""
+        model = key_column.class_
+        unique_keys = [key for key in keys.dropna().unique().tolist() if key != ""]
+        found: Dict[Any, int] = {}
+
+        for start in range(0, len(unique_keys), LOOKUP_CHUNK_SIZE):
+            chunk = unique_keys[start : start + LOOKUP_CHUNK_SIZE]
+            result = await self.db.execute(
+                select(key_column, model.id).where(key_column.in_(chunk))
+            )
+            for key, record_id in result:
+                # Keep the first match when the key is not unique
+                found.setdefault(key, record_id)
+
+        return found
+
+    async def _lookup_products(self, codes: pd.Series) -> Dict[str, tuple]:
+        """Map product codes to (id, unit_price) with one IN query per chunk"""
+        unique_codes = [code for code in codes.dropna().unique().tolist() if code]
+        found: Dict[str, tuple] = {}
+
+        for start in range(0, len(unique_codes), LOOKUP_CHUNK_SIZE):
+            chunk = unique_codes[start : start + LOOKUP_CHUNK_SIZE]
+            result = await self.db.execute(
+                select(Product.sku, Product.id, Product.unit_price).where(
+                    Product.sku.in_(chunk)
+                )
+            )
+            for code, product_id, unit_price in result:
+                found[code] = (product_id, unit_price)
+
+        return found
+
+    async def _bulk_insert(
+        self,
+        model,
+        records: List[Dict[str, Any]],
+        conflict_keys: Optional[List[str]] = None,
+    ) -> int:
+        """
+        Insert records in batches
+
+        A batch that violates a constraint is retried row by row inside
+        savepoints, so only the offending rows are reported and skipped.
+
+        Returns:
+            Number of rows inserted
+        """
+        inserted = 0
+        for batch in self._batches(records):
+            try:
+                async with self.db.begin_nested():
+                    await self.db.execute(
+                        self._insert_statement(model, conflict_keys),
+                        [self._strip(record) for record in batch],
+                    )
+                inserted += len(batch)
+            except IntegrityError:
+                inserted += await self._insert_rows(model, batch, conflict_keys)
+
+        return inserted
+
+    async def _insert_rows(
+        self, model, batch: List[Dict[str, Any]], conflict_keys: Optional[List[str]]
+    ) -> int:
+        inserted = 0
+        for record in batch:
+            try:
+                async with self.db.begin_nested():
+                    await self.db.execute(
+                        self._insert_statement(model, conflict_keys),
+                        [self._strip(record)],
+                    )
+                inserted += 1
+            except IntegrityError as e:
+                self.errors.append(
+                    {"row": record.get("_row"), "error": str(e.orig)}
+                )
+        return inserted
+
+    def _insert_statement(self, model, conflict_keys: Optional[List[str]]):
+        if conflict_keys:
+            return self._insert(model).on_conflict_do_nothing(
+                index_elements=conflict_keys
+            )
+        return insert(model)
+
+    async def _bulk_update(self, model, records: List[Dict[str, Any]]) -> int:
+        """Bulk UPDATE by primary key in batches"""
+        for batch in self._batches(records):
+            await self.db.execute(
+                update(model), [self._strip(record) for record in batch]
+            )
+        return len(records)
+
+    async def _insert_orders(self, records: List[Dict[str, Any]]) -> Dict[int, int]:
+        """Insert orders in batches and map sheet row numbers to new order IDs"""
+        order_ids: Dict[int, int] = {}
+        for batch in self._batches(records):
+            result = await self.db.execute(
+                insert(Order).returning(Order.id, sort_by_parameter_order=True),
+                [self._strip(record) for record in batch],
+            )
+            for record, order_id in zip(batch, result.scalars().all()):
+                order_ids[record["_row"]] = order_id
+        return order_ids
+
+    @staticmethod
+    def _batches(records: List[Dict[str, Any]]) -> Iterable[List[Dict[str, Any]]]:
+        for start in range(0, len(records), IMPORT_BATCH_SIZE):
+            yield records[start : start + IMPORT_BATCH_SIZE]
+
+    @staticmethod
+    def _strip(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Drop bookkeeping keys before sending a record to the database"""
+        return {key: value for key, value in record.items() if not key.startswith("_")}
+
+    def _records(
+        self, model, rows: pd.DataFrame, keep_nulls: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Convert a frame to insert / update parameter dicts
+
+        Fields the table does not have are dropped (reported once as a
+        warning); with ``keep_nulls=False`` empty values are left out so
+        updates do not overwrite existing data.
+        """
+        table_columns = set(model.__table__.columns.keys())
+        unknown = [
+            column
+            for column in rows.columns
+            if column not in table_columns and not column.startswith("_")
+        ]
+        if unknown and not rows.empty:
+            self.warnings.append(
+                {
+                    "message": f"Fields not stored for {model.__tablename__}: {', '.join(unknown)}",
+                    "action": "ignored",
+                }
+            )
+
+        frame = rows.drop(columns=unknown).astype(object)
+        frame = frame.where(frame.notna(), None)
+        records = frame.to_dict("records")
+        if not keep_nulls:
+            records = [
+                {key: value for key, value in record.items() if value is not None}
+                for record in records
+            ]
+        return [self._to_python(record) for record in records]
+
+    @staticmethod
+    def _to_python(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert numpy scalars to plain Python values for the DB driver"""
+        return {
+            key: value.item() if isinstance(value, np.generic) else value
+            for key, value in record.items()
+        }
+
+    @staticmethod
+    def _import_order_numbers(count: int) -> List[str]:
+        """Order numbers for one import run"""
+        prefix = f"IMP-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        return [f"{prefix}-{sequence:05d}" for sequence in range(1, count + 1)]
+
+    # Validation report helpers
+
+    def _add_errors(
+        self, df: pd.DataFrame, mask: pd.Series, field: str, message: str
+    ) -> None:
+        """Report one error per row selected by ``mask``"""
+        for index in mask[mask].index:
+            self.errors.append(
+                {
+                    "row": int(index) + 2,
+                    "field": field,
+                    "value": df.at[index, field],
+                    "error": message,
+                }
+            )
+
+    def _add_warnings(self, rows: pd.DataFrame, message) -> None:
+        """Report one skipped-row warning per row"""
+        for row in rows.to_dict("records"):
+            self.warnings.append(
+                {"row": int(row["_row"]), "message": message(row), "action": "skipped"}
+            )
+
+    # Vectorized column parsers
+
+    @staticmethod
+    def _text(df: pd.DataFrame, column: str, default: str = "") -> pd.Series:
+        """Column as stripped strings ("" / ``default`` when missing)"""
+        if column not in df.columns:
+            return pd.Series(default, index=df.index, dtype=object)
+        values = df[column].astype(object).where(df[column].notna(), default)
+        return values.astype(str).str.strip()
+
+    def _optional_text(self, df: pd.DataFrame, column: str) -> pd.Series:
+        """Column as stripped strings with empty values as None"""
+        return self._text(df, column).replace("", None)
+
+    @staticmethod
+    def _clean_phones(phones: pd.Series) -> pd.Series:
+        """Clean phone numbers."""
+        # Remove common separators
+        phones = phones.str.replace(r"[-\s()]", "", regex=True)
+
+        # Add country code if missing
+        mobile = phones.str.startswith("09") & (phones.str.len() == 10)
+        landline = phones.str.startswith("0") & (phones.str.len() == 9)
+        return phones.mask(mobile, "+886" + phones.str[1:]).mask(
+            landline, "+886" + phones
+        )
+
+    def _parse_decimals(self, df: pd.DataFrame, column: str) -> pd.Series:
+        """Parse numeric column; blanks and unparsable values become 0."""
+        values = pd.to_numeric(
+            self._text(df, column).str.replace(",", ""), errors="coerce"
+        )
+        return values.fillna(0).astype(float)
+
+    def _parse_ints(self, df: pd.DataFrame, column: str) -> pd.Series:
+        """Parse integer column; blanks and unparsable values become 0."""
+        return self._parse_decimals(df, column).astype(int)
+
+    @staticmethod
+    def _parse_dates(values: pd.Series) -> pd.Series:
+        """Parse date column; unparsable values become None."""
+        parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+
+        # Native Excel dates / datetimes
+        is_date = values.map(lambda value: isinstance(value, (date, datetime)))
+        if is_date.any():
+            parsed[is_date] = pd.to_datetime(values[is_date], errors="coerce")
+
+        text = values.astype(str).str.strip()
+        for fmt in DATE_FORMATS:
+            missing = parsed.isna()
+            if not missing.any():
+                break
+            parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors="coerce")
+
+        return parsed.dt.date.astype(object).where(parsed.notna(), None)
+
     def _read_csv(self, file: BinaryIO) -> pd.DataFrame:
         """Read CSV file into DataFrame."""
         # Detect encoding
@@ -528,12 +784,13 @@ class DataImportService:
         file.seek(0)
 
         # Try different encodings
-        encodings = ["utf - 8 - sig", "utf - 8", "big5", "gb2312"]
+        encodings = ["utf-8-sig", "utf-8", "big5", "gb2312"]
 
         for encoding in encodings:
             try:
                 file.seek(0)
-                df = pd.read_csv(io.BytesIO(raw_data), encoding=encoding)
+                # Read as text so phone numbers keep their leading zero
+                df = pd.read_csv(io.BytesIO(raw_data), encoding=encoding, dtype=str)
                 return df
             except UnicodeDecodeError:
                 continue
@@ -546,65 +803,11 @@ class DataImportService:
         """Read Excel file into DataFrame."""
         file.seek(0)
         try:
-            df = pd.read_excel(file, sheet_name=sheet_name)
+            df = pd.read_excel(file, sheet_name=sheet_name, dtype=str)
             return df
         except Exception as e:
             raise ValidationError(f"Error reading Excel file: {str(e)}")
 
-    def _clean_phone(self, phone: str) -> str:
-        """Clean phone number."""
-        # Remove common separators
-        phone = (
-            phone.replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
-        )
-
-        # Add country code if missing
-        if phone.startswith("09") and len(phone) == 10:
-            phone = "+886" + phone[1:]
-        elif phone.startswith("0") and len(phone) == 9:
-            phone = "+886" + phone
-
-        return phone
-
-    def _parse_decimal(self, value: Any) -> Decimal:
-        """Parse decimal value."""
-        if pd.isna(value) or value == "":
-            return Decimal("0")
-        try:
-            return Decimal(str(value).replace(", ", ""))
-        except Exception:
-            return Decimal("0")
-
-    def _parse_int(self, value: Any) -> int:
-        """Parse integer value."""
-        if pd.isna(value) or value == "":
-            return 0
-        try:
-            return int(float(str(value).replace(", ", "")))
-        except Exception:
-            return 0
-
-    def _parse_date(self, value: Any) -> Optional[date]:
-        """Parse date value."""
-        if pd.isna(value):
-            return None
-
-        # If it's already a date
-        if isinstance(value, (date, datetime)):
-            return value.date() if isinstance(value, datetime) else value
-
-        # Try to parse string
-        date_str = str(value).strip()
-        formats = ["%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%Y年 % m月 % d日"]
-
-        for fmt in formats:
-            try:
-                return datetime.strptime(date_str, fmt).date()
-            except Exception:
-                continue
-
-        return None
-
     def _map_customer_type(self, value: str) -> str:
         """Map customer type to valid enum value."""
         mapping = {
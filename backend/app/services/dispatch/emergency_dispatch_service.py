@@ -11,6 +11,7 @@ from app.models.route_plan import RoutePlan, RouteStop
 from app.models.user import User
 from app.services.dispatch.route_optimizer import RouteOptimizer
 from app.services.notification_service import NotificationService
+from app.services.order_service import OrderService
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +72,9 @@ class EmergencyDispatchService:
 
             db.add(emergency_order)
             await db.flush()
+            # Load server defaults (created_at) before rolling the order up
+            await db.refresh(emergency_order)
+            await OrderService(db).record_order_edits([emergency_order], {})
 
             # If driver is assigned, create immediate route
             if emergency_data.get("driverId"):
@@ -257,12 +261,16 @@ class EmergencyDispatchService:
         if status not in status_mapping:
             raise ValidationException(f"Invalid status: {status}")
 
+        order_service = OrderService(db)
+        snapshot = order_service.snapshot_orders([order])
         order.status = status_mapping[status]
         if notes:
             order.delivery_notes += (
                 f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M')}] {notes}"
             )
 
+        # Rollups and customer balance move with the status, in this commit
+        await order_service.record_order_edits([order], snapshot)
         await db.commit()
 
         return {
@@ -1,18 +1,26 @@
 """PGP encryption handler for secure banking file transfers."""
 
-import base64
-import hashlib
+import copy
+import io
 import logging
 import os
-from datetime import datetime
-from typing import Dict, Tuple
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
 
 import gnupg
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 from app.core.config import settings
 from app.core.secrets_manager import get_secrets_manager
+from app.services.encryption.pgp_stream import (
+    FALLBACK_VERSION,
+    FallbackDecryptor,
+    FallbackEncryptor,
+    FallbackSigner,
+    GPGPipeWriter,
+    SigningWriter,
+    SniffingWriter,
+    copy_stream,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -117,27 +125,11 @@ class PGPHandler:
     def _encrypt_gpg(self, data: bytes, recipient_bank: str) -> bytes:
         """Encrypt using GPG."""
         try:
-            # Find recipient key
-            keys = self.gpg.list_keys()
-            recipient_key = None
-
-            for key in keys:
-                if recipient_bank.lower() in str(key.get("uids", [])).lower():
-                    recipient_key = key["keyid"]
-                    break
-
-            if not recipient_key:
-                raise ValueError(f"No public key found for {recipient_bank}")
-
-            # Encrypt data
-            encrypted = self.gpg.encrypt(
-                data, recipients=[recipient_key], armor=True, always_trust=True
-            )
-
-            if encrypted.ok:
-                return str(encrypted).encode("utf - 8")
-            else:
-                raise ValueError(f"Encryption failed: {encrypted.status}")
+            output = io.BytesIO()
+            writer = self._gpg_encryptor(output, self._find_recipient_key(recipient_bank))
+            writer.write(data)
+            writer.close()
+            return output.getvalue()
 
         except Exception as e:
             logger.error(f"GPG encryption failed: {e}")
@@ -147,28 +139,11 @@ class PGPHandler:
     def _encrypt_fallback(self, data: bytes, recipient_bank: str) -> bytes:
         """Fallback encryption using cryptography library."""
         try:
-            # Generate session key
-            session_key = os.urandom(32)  # 256 - bit key
-            iv = os.urandom(16)  # 128 - bit IV
-
-            # Encrypt data with AES
-            cipher = Cipher(
-                algorithms.AES(session_key), modes.CBC(iv), backend=default_backend()
-            )
-            encryptor = cipher.encryptor()
-
-            # Pad data to AES block size
-            pad_length = 16 - (len(data) % 16)
-            padded_data = data + (bytes([pad_length]) * pad_length)
-
-            encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
-
-            # Create PGP - like message structure
-            message = self._create_pgp_message(
-                encrypted_data, session_key, iv, recipient_bank
-            )
-
-            return message
+            output = io.BytesIO()
+            writer = FallbackEncryptor(output, recipient_bank)
+            writer.write(data)
+            writer.close()
+            return output.getvalue()
 
         except Exception as e:
             logger.error(f"Fallback encryption failed: {e}")
@@ -184,7 +159,7 @@ class PGPHandler:
         Returns:
             Decrypted data
         """
-        if self.use_gpg:
+        if self.use_gpg and FALLBACK_VERSION not in data[:512]:
             return self._decrypt_gpg(data)
         else:
             return self._decrypt_fallback(data)
@@ -192,19 +167,11 @@ class PGPHandler:
     def _decrypt_gpg(self, data: bytes) -> bytes:
         """Decrypt using GPG."""
         try:
-            # Get passphrase from secure storage
-            passphrase = None
-            if settings.ENVIRONMENT == "production":
-                sm = get_secrets_manager()
-                passphrase = sm.get_secret_value("banking - pgp - passphrase")
-
-            # Decrypt data
-            decrypted = self.gpg.decrypt(data, passphrase=passphrase)
-
-            if decrypted.ok:
-                return bytes(str(decrypted), "utf - 8")
-            else:
-                raise ValueError(f"Decryption failed: {decrypted.status}")
+            output = io.BytesIO()
+            writer = self._gpg_decryptor(output)
+            writer.write(data)
+            writer.close()
+            return output.getvalue()
 
         except Exception as e:
             logger.error(f"GPG decryption failed: {e}")
@@ -214,20 +181,11 @@ class PGPHandler:
     def _decrypt_fallback(self, data: bytes) -> bytes:
         """Fallback decryption using cryptography library."""
         try:
-            # Parse PGP - like message
-            session_key, iv, encrypted_data = self._parse_pgp_message(data)
-
-            # Decrypt with AES
-            cipher = Cipher(
-                algorithms.AES(session_key), modes.CBC(iv), backend=default_backend()
-            )
-            decryptor = cipher.decryptor()
-
-            padded_data = decryptor.update(encrypted_data) + decryptor.finalize()
-
-            # Remove padding
-            pad_length = padded_data[-1]
-            return padded_data[:-pad_length]
+            output = io.BytesIO()
+            writer = FallbackDecryptor(output)
+            writer.write(data)
+            writer.close()
+            return output.getvalue()
 
         except Exception as e:
             logger.error(f"Fallback decryption failed: {e}")
@@ -251,14 +209,8 @@ class PGPHandler:
     def _sign_gpg(self, data: bytes) -> bytes:
         """Sign using GPG."""
         try:
-            # Get passphrase
-            passphrase = None
-            if settings.ENVIRONMENT == "production":
-                sm = get_secrets_manager()
-                passphrase = sm.get_secret_value("banking - pgp - passphrase")
-
             # Sign data
-            signed = self.gpg.sign(data, passphrase=passphrase, detach=True)
+            signed = self.gpg.sign(data, passphrase=self._passphrase(), detach=True)
 
             return str(signed).encode("utf - 8")
 
@@ -270,20 +222,183 @@ class PGPHandler:
         """Fallback signing using cryptography library."""
         try:
             # For fallback, just create a SHA256 HMAC
-            key = self.key_cache.get("private", {}).get("key", b"")
-            if isinstance(key, str):
-                key = key.encode("utf - 8")
-
-            h = hashlib.sha256()
-            h.update(key)
-            h.update(data)
-
-            return base64.b64encode(h.digest())
+            signer = FallbackSigner(self._fallback_signing_key())
+            signer.write(data)
+            return signer.close()
 
         except Exception as e:
             logger.error(f"Fallback signing failed: {e}")
             raise
 
+    @contextmanager
+    def encrypting_writer(
+        self, destination: BinaryIO, recipient_bank: str
+    ) -> Iterator[Any]:
+        """
+        Encrypt everything written inside the block into ``destination``.
+
+        Ciphertext is passed on as the plaintext arrives, so the writer can
+        sit between a file generator and an SFTP upload. A stream cannot be
+        replayed, so GPG is used when it has a key for the bank and the
+        fallback format otherwise; failures are raised, not retried.
+
+        Args:
+            destination: Binary file object receiving the ciphertext
+            recipient_bank: Bank code to encrypt for
+
+        Yields:
+            Writable file-like object taking the plaintext
+        """
+        recipient_key = None
+        if self.use_gpg:
+            try:
+                recipient_key = self._find_recipient_key(recipient_bank)
+            except ValueError as e:
+                logger.warning(f"{e}, using fallback encryption")
+
+        if recipient_key:
+            writer = self._gpg_encryptor(destination, recipient_key)
+        else:
+            writer = FallbackEncryptor(destination, recipient_bank)
+
+        with self._closing(writer):
+            yield writer
+
+    @contextmanager
+    def decrypting_writer(self, destination: BinaryIO) -> Iterator[Any]:
+        """
+        Decrypt everything written inside the block into ``destination``.
+
+        Pass the writer to ``sftp.getfo`` to decrypt while downloading. The
+        message format is detected from its first bytes.
+        """
+
+        def choose(head: bytes) -> Any:
+            if self.use_gpg and FALLBACK_VERSION not in head:
+                return self._gpg_decryptor(destination)
+            return FallbackDecryptor(destination)
+
+        with self._closing(SniffingWriter(choose)) as writer:
+            yield writer
+
+    @contextmanager
+    def signing_writer(self, destination: Optional[BinaryIO] = None) -> Iterator[Any]:
+        """
+        Sign everything written inside the block, passing it on unchanged.
+
+        The detached signature is on the writer's ``signature`` attribute
+        once the block exits.
+        """
+        if self.use_gpg:
+            gpg = copy.copy(self.gpg)
+            passphrase = self._passphrase()
+
+            def sign(source: BinaryIO) -> bytes:
+                signed = gpg.sign_file(source, passphrase=passphrase, detach=True)
+                if not signed.data:
+                    raise ValueError(f"Signing failed: {signed.status}")
+                return str(signed).encode("utf - 8")
+
+            signer = GPGPipeWriter(sign)
+        else:
+            signer = FallbackSigner(self._fallback_signing_key())
+
+        with self._closing(SigningWriter(destination, signer)) as writer:
+            yield writer
+
+    def encrypt_stream(
+        self, source: BinaryIO, destination: BinaryIO, recipient_bank: str
+    ) -> int:
+        """Encrypt a readable binary stream; returns plaintext bytes read."""
+        with self.encrypting_writer(destination, recipient_bank) as writer:
+            return copy_stream(source, writer)
+
+    def decrypt_stream(self, source: BinaryIO, destination: BinaryIO) -> int:
+        """Decrypt a readable binary stream; returns ciphertext bytes read."""
+        with self.decrypting_writer(destination) as writer:
+            return copy_stream(source, writer)
+
+    def sign_stream(self, source: BinaryIO) -> bytes:
+        """Detached signature of a readable binary stream."""
+        with self.signing_writer() as writer:
+            copy_stream(source, writer)
+        return writer.signature
+
+    @contextmanager
+    def _closing(self, writer: Any) -> Iterator[Any]:
+        """Close a stream writer after the block, or abort it on error."""
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+    def _gpg_encryptor(self, destination: BinaryIO, recipient_key: str) -> GPGPipeWriter:
+        """GPG encryption writing armored ciphertext to ``destination``."""
+        gpg = self._streaming_gpg(destination)
+
+        def encrypt(source: BinaryIO) -> Any:
+            encrypted = gpg.encrypt_file(
+                source, recipients=[recipient_key], armor=True, always_trust=True
+            )
+            return self._check_gpg_result(encrypted, "Encryption")
+
+        return GPGPipeWriter(encrypt)
+
+    def _gpg_decryptor(self, destination: BinaryIO) -> GPGPipeWriter:
+        """GPG decryption writing plaintext to ``destination``."""
+        gpg = self._streaming_gpg(destination)
+        passphrase = self._passphrase()
+
+        def decrypt(source: BinaryIO) -> Any:
+            decrypted = gpg.decrypt_file(source, passphrase=passphrase)
+            return self._check_gpg_result(decrypted, "Decryption")
+
+        return GPGPipeWriter(decrypt)
+
+    def _streaming_gpg(self, destination: BinaryIO) -> gnupg.GPG:
+        """GPG instance handing its output to ``destination`` chunk by chunk."""
+        # on_data is per instance; a copy keeps concurrent streams apart
+        gpg = copy.copy(self.gpg)
+
+        def on_data(chunk: bytes) -> bool:
+            if chunk:
+                destination.write(chunk)
+            return False  # Don't also collect it in memory
+
+        gpg.on_data = on_data
+        return gpg
+
+    def _check_gpg_result(self, result: Any, action: str) -> Any:
+        failure = getattr(result, "on_data_failure", None)
+        if failure is not None:
+            raise failure
+        if not result.ok:
+            raise ValueError(f"{action} failed: {result.status}")
+        return result
+
+    def _find_recipient_key(self, recipient_bank: str) -> str:
+        """Key id of a bank's public key in the GPG keyring."""
+        for key in self.gpg.list_keys():
+            if recipient_bank.lower() in str(key.get("uids", [])).lower():
+                return key["keyid"]
+
+        raise ValueError(f"No public key found for {recipient_bank}")
+
+    def _passphrase(self) -> Optional[str]:
+        """Passphrase of our private key from secure storage."""
+        if settings.ENVIRONMENT == "production":
+            sm = get_secrets_manager()
+            return sm.get_secret_value("banking - pgp - passphrase")
+        return None
+
+    def _fallback_signing_key(self) -> bytes:
+        key = self.key_cache.get("private", {}).get("key", b"")
+        if isinstance(key, str):
+            key = key.encode("utf - 8")
+        return key
+
     def verify(self, data: bytes, signature: bytes, sender_bank: str) -> bool:
         """
         Verify signature on data.
@@ -335,62 +450,6 @@ class PGPHandler:
         # This is just a placeholder
         return True
 
-    def _create_pgp_message(
-        self, encrypted_data: bytes, session_key: bytes, iv: bytes, recipient_bank: str
-    ) -> bytes:
-        """Create PGP - like message structure."""
-        # Simple structure: base64 encode everything
-        message = {
-            "version": "1.0",
-            "recipient": recipient_bank,
-            "algorithm": "AES256 - CBC",
-            "session_key": base64.b64encode(session_key).decode("utf - 8"),
-            "iv": base64.b64encode(iv).decode("utf - 8"),
-            "data": base64.b64encode(encrypted_data).decode("utf - 8"),
-            "timestamp": datetime.utcnow().isoformat(),
-        }
-
-        # Create ASCII - armored format
-        import json
-
-        json_data = json.dumps(message, indent=2)
-
-        pgp_message = """-----BEGIN PGP MESSAGE-----
-Version: LuckyGas PGP 1.0
-
-{base64.b64encode(json_data.encode('utf - 8')).decode('utf - 8')}
------END PGP MESSAGE-----"""
-
-        return pgp_message.encode("utf - 8")
-
-    def _parse_pgp_message(self, data: bytes) -> Tuple[bytes, bytes, bytes]:
-        """Parse PGP - like message structure."""
-        try:
-            # Extract base64 content
-            message_str = data.decode("utf - 8")
-            start = message_str.find("\n\n") + 2
-            end = message_str.find("\n-----END")
-
-            if start < 2 or end < 0:
-                raise ValueError("Invalid PGP message format")
-
-            base64_content = message_str[start:end].strip()
-            json_data = base64.b64decode(base64_content).decode("utf - 8")
-
-            import json
-
-            message = json.loads(json_data)
-
-            session_key = base64.b64decode(message["session_key"])
-            iv = base64.b64decode(message["iv"])
-            encrypted_data = base64.b64decode(message["data"])
-
-            return session_key, iv, encrypted_data
-
-        except Exception as e:
-            logger.error(f"Failed to parse PGP message: {e}")
-            raise
-
     def generate_key_pair(self, name: str, email: str) -> Tuple[str, str]:
         """
         Generate a new PGP key pair.
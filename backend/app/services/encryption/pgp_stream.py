@@ -0,0 +1,307 @@
+"""
+Streaming building blocks for PGP file encryption.
+
+The writers here accept data in arbitrary chunks and pass the transformed
+bytes on to another binary file object as they go. A payment file can flow
+from the ACH generator through encryption into an SFTP upload, or from an
+SFTP download through decryption into the parser, without the whole file
+being held in memory or written to a temporary file.
+
+``GPGPipeWriter`` feeds a python-gnupg call running in a thread through an
+OS pipe. ``FallbackEncryptor`` / ``FallbackDecryptor`` implement the
+built-in AES256-CBC message format used when GPG is unavailable.
+"""
+
+import base64
+import hashlib
+import os
+import threading
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# Bytes moved per read / write
+CHUNK_SIZE = 64 * 1024
+
+BEGIN_MESSAGE = b"-----BEGIN PGP MESSAGE-----"
+END_MESSAGE = b"-----END PGP MESSAGE-----"
+FALLBACK_VERSION = b"Version: LuckyGas PGP 1.0"
+
+# Raw bytes per armored line (64 base64 characters)
+ARMOR_LINE_BYTES = 48
+
+
+def copy_stream(source: BinaryIO, writer: Any, chunk_size: int = CHUNK_SIZE) -> int:
+    """Copy a readable binary stream into a writer; returns bytes copied."""
+    copied = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return copied
+        writer.write(chunk)
+        copied += len(chunk)
+
+
+class GPGPipeWriter:
+    """
+    Writable end of an OS pipe read by a gpg call in a background thread.
+
+    ``call`` receives the readable end and runs until it reaches end of
+    file, which happens on ``close()``. ``close()`` returns the call's result
+    and re-raises its exception.
+    """
+
+    def __init__(self, call: Callable[[BinaryIO], Any]):
+        read_fd, write_fd = os.pipe()
+        self._source = os.fdopen(read_fd, "rb")
+        self._sink = os.fdopen(write_fd, "wb", buffering=CHUNK_SIZE)
+        self._result = None
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, args=(call,), daemon=True)
+        self._thread.start()
+
+    def _run(self, call: Callable[[BinaryIO], Any]) -> None:
+        try:
+            self._result = call(self._source)
+        except BaseException as e:
+            self._error = e
+        finally:
+            # Unblocks the writer if gpg stopped reading early
+            self._source.close()
+
+    def write(self, data: bytes) -> int:
+        try:
+            return self._sink.write(data)
+        except BrokenPipeError:
+            # The call ended early; report its error rather than the pipe's
+            self._thread.join()
+            if self._error:
+                raise self._error
+            raise
+
+    def close(self) -> Any:
+        if not self._sink.closed:
+            try:
+                self._sink.close()
+            except BrokenPipeError:
+                pass
+            self._thread.join()
+        if self._error:
+            raise self._error
+        return self._result
+
+    def abort(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class FallbackEncryptor:
+    """AES256-CBC encryption into the built-in armored message format."""
+
+    def __init__(self, destination: BinaryIO, recipient_bank: str):
+        self.destination = destination
+        session_key = os.urandom(32)  # 256 - bit key
+        iv = os.urandom(16)  # 128 - bit IV
+        self._encryptor = Cipher(
+            algorithms.AES(session_key), modes.CBC(iv), backend=default_backend()
+        ).encryptor()
+        self._padder = padding.PKCS7(algorithms.AES.block_size).padder()
+        self._pending = b""
+
+        headers = [
+            BEGIN_MESSAGE,
+            FALLBACK_VERSION,
+            b"Recipient: " + recipient_bank.encode("ascii"),
+            b"Algorithm: AES256-CBC",
+            b"Session-Key: " + base64.b64encode(session_key),
+            b"IV: " + base64.b64encode(iv),
+            b"Timestamp: " + datetime.utcnow().isoformat().encode("ascii"),
+            b"",
+            b"",
+        ]
+        destination.write(b"\n".join(headers))
+
+    def write(self, data: bytes) -> int:
+        self._armor(self._encryptor.update(self._padder.update(bytes(data))))
+        return len(data)
+
+    def _armor(self, data: bytes, final: bool = False) -> None:
+        data = self._pending + data
+        cut = len(data) if final else len(data) - len(data) % ARMOR_LINE_BYTES
+        self._pending = data[cut:]
+        if cut:
+            self.destination.write(
+                b"".join(
+                    base64.b64encode(data[start : start + ARMOR_LINE_BYTES]) + b"\n"
+                    for start in range(0, cut, ARMOR_LINE_BYTES)
+                )
+            )
+
+    def close(self) -> None:
+        final = self._encryptor.update(self._padder.finalize())
+        self._armor(final + self._encryptor.finalize(), final=True)
+        self.destination.write(END_MESSAGE + b"\n")
+
+    def abort(self) -> None:
+        pass
+
+
+class FallbackDecryptor:
+    """Decrypts the built-in armored message format as it is written."""
+
+    def __init__(self, destination: BinaryIO):
+        self.destination = destination
+        self._buffer = b""
+        self._state = "begin"
+        self._headers: Dict[str, bytes] = {}
+        self._decryptor = None
+        self._unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        lines = self._buffer.split(b"\n")
+        self._buffer = lines.pop()
+        self._process(lines)
+        return len(data)
+
+    def _process(self, lines) -> None:
+        body = []
+        for raw in lines:
+            line = raw.strip()
+            if self._state == "body":
+                if line.startswith(b"-----END"):
+                    self._decrypt(body)
+                    body = []
+                    self._state = "end"
+                elif line:
+                    body.append(line)
+            elif self._state == "begin":
+                if line == BEGIN_MESSAGE:
+                    self._state = "headers"
+                elif line:
+                    raise ValueError("Invalid PGP message format")
+            elif self._state == "headers":
+                if line:
+                    key, _, value = line.partition(b":")
+                    self._headers[key.strip().decode("ascii")] = value.strip()
+                else:
+                    self._start_body()
+        self._decrypt(body)
+
+    def _start_body(self) -> None:
+        try:
+            session_key = base64.b64decode(self._headers["Session-Key"])
+            iv = base64.b64decode(self._headers["IV"])
+        except KeyError as e:
+            raise ValueError(f"Invalid PGP message format: missing {e}") from None
+        self._decryptor = Cipher(
+            algorithms.AES(session_key), modes.CBC(iv), backend=default_backend()
+        ).decryptor()
+        self._state = "body"
+
+    def _decrypt(self, lines) -> None:
+        if lines:
+            encrypted = base64.b64decode(b"".join(lines))
+            self.destination.write(
+                self._unpadder.update(self._decryptor.update(encrypted))
+            )
+
+    def close(self) -> None:
+        # Without an end line the message was cut off anyway
+        tail, self._buffer = self._buffer.strip(), b""
+        if tail.startswith(b"-----END"):
+            self._process([tail])
+        if self._state != "end":
+            raise ValueError("Invalid PGP message format: truncated message")
+        final = self._decryptor.finalize()
+        self.destination.write(self._unpadder.update(final) + self._unpadder.finalize())
+
+    def abort(self) -> None:
+        pass
+
+
+class SniffingWriter:
+    """
+    Picks the real writer once the start of the stream is known.
+
+    ``choose`` is called with the first ``sniff_size`` bytes (or everything,
+    if the stream is shorter) and returns the writer to pass them to.
+    """
+
+    def __init__(self, choose: Callable[[bytes], Any], sniff_size: int = 512):
+        self._choose = choose
+        self._sniff_size = sniff_size
+        self._head = b""
+        self._writer = None
+
+    def write(self, data: bytes) -> int:
+        if self._writer is not None:
+            return self._writer.write(data)
+        self._head += data
+        if len(self._head) >= self._sniff_size:
+            self._open()
+        return len(data)
+
+    def _open(self) -> None:
+        head, self._head = self._head, b""
+        self._writer = self._choose(head)
+        self._writer.write(head)
+
+    def close(self) -> Any:
+        if self._writer is None:
+            self._open()
+        return self._writer.close()
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.abort()
+
+
+class FallbackSigner:
+    """SHA256 over key and data, the fallback signature."""
+
+    def __init__(self, key: bytes):
+        self._hash = hashlib.sha256()
+        self._hash.update(key)
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        return len(data)
+
+    def close(self) -> bytes:
+        return base64.b64encode(self._hash.digest())
+
+    def abort(self) -> None:
+        pass
+
+
+class SigningWriter:
+    """
+    Passes data through to ``destination`` while ``signer`` signs it.
+
+    The detached signature is available as ``signature`` after ``close()``.
+    """
+
+    def __init__(self, destination: Optional[BinaryIO], signer: Any):
+        self.destination = destination
+        self._signer = signer
+        self.signature: Optional[bytes] = None
+
+    def write(self, data: bytes) -> int:
+        if self.destination is not None:
+            self.destination.write(data)
+        self._signer.write(data)
+        return len(data)
+
+    def close(self) -> bytes:
+        if self.signature is None:
+            self.signature = self._signer.close()
+        return self.signature
+
+    def abort(self) -> None:
+        self._signer.abort()
@@ -1,5 +1,12 @@
 """File format generators for banking operations."""
 
 from .ach_format import ACHReconciliationParser, TaiwanACHGenerator
+from .fixed_width import Field, FileLayout, RecordLayout
 
-__all__ = ["TaiwanACHGenerator", "ACHReconciliationParser"]
+__all__ = [
+    "TaiwanACHGenerator",
+    "ACHReconciliationParser",
+    "Field",
+    "FileLayout",
+    "RecordLayout",
+]
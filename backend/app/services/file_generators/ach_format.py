@@ -1,137 +1,97 @@
 """Taiwan ACH (Automated Clearing House) format generator for banking transactions."""
 
+import io
 import logging
 import re
-from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from app.models.banking import PaymentBatch, PaymentTransaction
+from app.services.file_generators.fixed_width import (
+    FILLER,
+    Field,
+    FileLayout,
+    RecordLayout,
+)
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class ACHRecord:
-    """Base class for ACH record types."""
-
-    record_type: str
-
-    def to_fixed_width(self, field_definitions: List[tuple]) -> str:
-        """Convert record to fixed - width format."""
-        result = ""
-        for field_name, width, alignment, padding in field_definitions:
-            value = str(getattr(self, field_name, ""))
-
-            # Handle encoding for Chinese characters
-            if any(ord(char) > 127 for char in value):
-                # For Chinese characters, we need to consider byte length in Big5
-                encoded = value.encode("big5", errors="replace")
-                if len(encoded) > width:
-                    # Truncate by bytes, then decode back
-                    encoded = encoded[:width]
-                    value = encoded.decode("big5", errors="ignore")
-                else:
-                    # Pad with spaces
-                    space_count = width - len(encoded)
-                    value = value + " " * space_count
-                result += value
-            else:
-                # ASCII characters
-                if alignment == "L":
-                    result += value[:width].ljust(width, padding)
-                else:
-                    result += value[:width].rjust(width, padding)
-
-        return result
-
-
-@dataclass
-class ACHHeader(ACHRecord):
-    """ACH file header record."""
-
-    record_type: str = "H"
-    batch_number: str = ""
-    creation_date: str = ""
-    creation_time: str = ""
-    company_code: str = ""
-    company_name: str = ""
-    bank_code: str = ""
-    file_sequence: str = "001"
-    format_version: str = "1.0"
-
-    def get_field_definitions(self) -> List[tuple]:
-        """Field definitions for header record."""
-        return [
-            ("record_type", 1, "L", " "),
-            ("batch_number", 20, "L", " "),
-            ("creation_date", 8, "L", "0"),
-            ("creation_time", 6, "L", "0"),
-            ("company_code", 10, "L", " "),
-            ("company_name", 40, "L", " "),
-            ("bank_code", 3, "L", "0"),
-            ("file_sequence", 3, "L", "0"),
-            ("format_version", 3, "L", " "),
-            ("filler", 106, "L", " "),
-        ]
-
-
-@dataclass
-class ACHDetail(ACHRecord):
-    """ACH payment detail record."""
-
-    record_type: str = "D"
-    sequence_number: str = ""
-    transaction_id: str = ""
-    transaction_type: str = "27"  # 27 = ACH debit
-    bank_code: str = ""
-    branch_code: str = ""
-    account_number: str = ""
-    account_holder: str = ""
-    amount: str = ""
-    payment_date: str = ""
-    id_number: str = ""  # Taiwan ID or company tax number
-    payment_description: str = ""
-    customer_reference: str = ""
-
-    def get_field_definitions(self) -> List[tuple]:
-        """Field definitions for detail record."""
-        return [
-            ("record_type", 1, "L", " "),
-            ("sequence_number", 6, "R", "0"),
-            ("transaction_id", 20, "L", " "),
-            ("transaction_type", 2, "L", "0"),
-            ("bank_code", 3, "L", "0"),
-            ("branch_code", 4, "L", "0"),
-            ("account_number", 14, "L", " "),
-            ("account_holder", 30, "L", " "),
-            ("amount", 13, "R", "0"),
-            ("payment_date", 8, "L", "0"),
-            ("id_number", 10, "L", " "),
-            ("payment_description", 40, "L", " "),
-            ("customer_reference", 20, "L", " "),
-            ("filler", 29, "L", " "),
-        ]
-
-
-@dataclass
-class ACHTrailer(ACHRecord):
-    """ACH file trailer record."""
-
-    record_type: str = "T"
-    total_records: str = ""
-    total_amount: str = ""
-    hash_total: str = ""  # Sum of all account numbers for validation
-
-    def get_field_definitions(self) -> List[tuple]:
-        """Field definitions for trailer record."""
-        return [
-            ("record_type", 1, "L", " "),
-            ("total_records", 6, "R", "0"),
-            ("total_amount", 15, "R", "0"),
-            ("hash_total", 15, "R", "0"),
-            ("filler", 163, "L", " "),
-        ]
+ACH_HEADER = RecordLayout(
+    "H",
+    [
+        Field("batch_number", 20),
+        Field("creation_date", 8, pad="0"),
+        Field("creation_time", 6, pad="0"),
+        Field("company_code", 10),
+        Field("company_name", 40),
+        Field("bank_code", 3, pad="0"),
+        Field("file_sequence", 3, pad="0", default="001"),
+        Field("format_version", 3, default="1.0"),
+        Field(FILLER, 106),
+    ],
+)
+
+ACH_DETAIL = RecordLayout(
+    "D",
+    [
+        Field("sequence_number", 6, "R", "0"),
+        Field("transaction_id", 20),
+        Field("transaction_type", 2, pad="0", default="27"),  # 27 = ACH debit
+        Field("bank_code", 3, pad="0"),
+        Field("branch_code", 4, pad="0"),
+        Field("account_number", 14),
+        Field("account_holder", 30),
+        Field("amount", 13, "R", "0"),
+        Field("payment_date", 8, pad="0"),
+        Field("id_number", 10),  # Taiwan ID or company tax number
+        Field("payment_description", 40),
+        Field("customer_reference", 20),
+        Field(FILLER, 29),
+    ],
+)
+
+ACH_TRAILER = RecordLayout(
+    "T",
+    [
+        Field("total_records", 6, "R", "0"),
+        Field("total_amount", 15, "R", "0"),
+        Field("hash_total", 15, "R", "0"),  # Sum of account numbers for validation
+        Field(FILLER, 163),
+    ],
+)
+
+ACH_PAYMENT_FILE = FileLayout(ACH_HEADER, ACH_DETAIL, ACH_TRAILER)
+
+# Bank result of a debit
+ACH_RESULT = RecordLayout(
+    "D",
+    [
+        Field("sequence_number", 6, "R", "0"),
+        Field("transaction_id", 20),
+        Field("bank_reference", 20),
+        Field("response_code", 3),
+        Field("processed_date", 8),
+        Field("processed_amount", 13, "R", "0"),
+        Field(FILLER, 129),
+    ],
+)
+
+# Debit returned or rejected by the bank
+ACH_RETURN = RecordLayout(
+    "R",
+    [
+        Field("sequence_number", 6, "R", "0"),
+        Field("transaction_id", 20),
+        Field("return_reason_code", 3),
+        Field("return_date", 8),
+        Field("original_amount", 13, "R", "0"),
+        Field(FILLER, 149),
+    ],
+)
+
+ACH_RECONCILIATION_FILE = FileLayout(ACH_RESULT, ACH_RETURN)
 
 
 class TaiwanACHGenerator:
@@ -168,19 +128,52 @@ class TaiwanACHGenerator:
         Returns:
             bytes: Encoded file content
         """
-        lines = []
+        buffer = io.BytesIO()
+        self.write_payment_file(batch, buffer, encoding)
+        return buffer.getvalue()
+
+    def write_payment_file(
+        self,
+        batch: PaymentBatch,
+        fp: BinaryIO,
+        encoding: str = "big5",
+        transactions: Optional[Iterable[PaymentTransaction]] = None,
+    ) -> int:
+        """
+        Stream an ACH payment file to a binary file object.
+
+        Records are encoded one at a time and the trailer totals are kept
+        while writing, so the file never exists as one string.
+
+        Args:
+            batch: Payment batch
+            fp: Destination opened in binary mode
+            encoding: File encoding (big5 or utf - 8)
+            transactions: Transactions to write, e.g. a ``yield_per`` query;
+                defaults to ``batch.transactions``
 
-        # Generate header
-        header = self._create_header(batch)
-        lines.append(header.to_fixed_width(header.get_field_definitions()))
+        Returns:
+            int: Bytes written
+        """
+        if transactions is None:
+            transactions = batch.transactions
+        # CRLF line endings (Windows line ending for banks)
+        return ACH_PAYMENT_FILE.write(
+            fp, self._payment_records(batch, transactions), encoding
+        )
 
-        # Generate detail records
+    def _payment_records(
+        self, batch: PaymentBatch, transactions: Iterable[PaymentTransaction]
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Header, one detail per transaction and the trailer."""
+        yield "H", self._create_header(batch)
+
+        count = 0
         total_amount = Decimal("0")
         hash_total = 0
 
-        for idx, transaction in enumerate(batch.transactions, 1):
-            detail = self._create_detail(transaction, idx)
-            lines.append(detail.to_fixed_width(detail.get_field_definitions()))
+        for count, transaction in enumerate(transactions, 1):
+            yield "D", self._create_detail(transaction, count)
 
             total_amount += transaction.amount
             # Hash total is sum of account numbers (numeric part only)
@@ -188,36 +181,22 @@ class TaiwanACHGenerator:
             if account_numeric:
                 hash_total += int(account_numeric[-8:])  # Use last 8 digits
 
-        # Generate trailer
-        trailer = self._create_trailer(
-            len(batch.transactions), total_amount, hash_total
-        )
-        lines.append(trailer.to_fixed_width(trailer.get_field_definitions()))
-
-        # Join lines with CRLF (Windows line ending for banks)
-        content = "\r\n".join(lines) + "\r\n"
-
-        # Encode to specified encoding
-        return content.encode(encoding, errors="replace")
+        yield "T", self._create_trailer(count, total_amount, hash_total)
 
-    def _create_header(self, batch: PaymentBatch) -> ACHHeader:
+    def _create_header(self, batch: PaymentBatch) -> Dict:
         """Create ACH header record."""
         now = datetime.utcnow()
 
-        return ACHHeader(
-            batch_number=batch.batch_number,
-            creation_date=now.strftime("%Y % m % d"),
-            creation_time=now.strftime("%H % M % S"),
-            company_code=self.company_code,
-            company_name=self.company_name,
-            bank_code=self.BANK_CODES.get(batch.bank_code, "000"),
-            file_sequence="001",
-            format_version="1.0",
-        )
+        return {
+            "batch_number": batch.batch_number,
+            "creation_date": now.strftime("%Y%m%d"),
+            "creation_time": now.strftime("%H%M%S"),
+            "company_code": self.company_code,
+            "company_name": self.company_name,
+            "bank_code": self.BANK_CODES.get(batch.bank_code, "000"),
+        }
 
-    def _create_detail(
-        self, transaction: PaymentTransaction, sequence: int
-    ) -> ACHDetail:
+    def _create_detail(self, transaction: PaymentTransaction, sequence: int) -> Dict:
         """Create ACH detail record."""
         # Extract bank and branch code from account number if needed
         bank_code, branch_code = self._parse_account_codes(
@@ -225,9 +204,6 @@ class TaiwanACHGenerator:
             transaction.customer.bank_code if transaction.customer else None,
         )
 
-        # Format amount (in cents, no decimal)
-        amount_cents = int(transaction.amount * 100)
-
         # Get customer ID number
         id_number = ""
         if transaction.customer:
@@ -235,39 +211,35 @@ class TaiwanACHGenerator:
                 transaction.customer.tax_id or transaction.customer.national_id or ""
             )
 
-        return ACHDetail(
-            sequence_number=str(sequence).zfill(6),
-            transaction_id=transaction.transaction_id,
-            transaction_type="27",  # ACH debit
-            bank_code=bank_code,
-            branch_code=branch_code,
-            account_number=transaction.account_number,
-            account_holder=self._format_name(transaction.account_holder),
-            amount=str(amount_cents).zfill(13),
-            payment_date=transaction.scheduled_date.strftime("%Y % m % d"),
-            id_number=id_number,
-            payment_description=(
+        return {
+            "sequence_number": sequence,
+            "transaction_id": transaction.transaction_id,
+            "bank_code": bank_code,
+            "branch_code": branch_code,
+            "account_number": transaction.account_number,
+            "account_holder": self._format_name(transaction.account_holder),
+            # Amount in cents, no decimal
+            "amount": int(transaction.amount * 100),
+            "payment_date": transaction.scheduled_date.strftime("%Y%m%d"),
+            "id_number": id_number,
+            "payment_description": (
                 f"Gas Bill {transaction.invoice_id}"
                 if transaction.invoice_id
                 else "Gas Payment"
             ),
-            customer_reference=(
-                str(transaction.customer_id) if transaction.customer_id else ""
-            ),
-        )
+            "customer_reference": transaction.customer_id or "",
+        }
 
     def _create_trailer(
         self, record_count: int, total_amount: Decimal, hash_total: int
-    ) -> ACHTrailer:
+    ) -> Dict:
         """Create ACH trailer record."""
-        # Format total amount in cents
-        total_cents = int(total_amount * 100)
-
-        return ACHTrailer(
-            total_records=str(record_count).zfill(6),
-            total_amount=str(total_cents).zfill(15),
-            hash_total=str(hash_total % 10**15).zfill(15),  # Keep within 15 digits
-        )
+        return {
+            "total_records": record_count,
+            # Total amount in cents
+            "total_amount": int(total_amount * 100),
+            "hash_total": hash_total % 10**15,  # Keep within 15 digits
+        }
 
     def _parse_account_codes(
         self, account_number: str, bank_code: Optional[str]
@@ -362,59 +334,54 @@ class ACHReconciliationParser:
         Returns:
             List of reconciliation records
         """
-        lines = content.decode(encoding, errors="replace").split("\n")
-        results = []
-
-        for line in lines:
-            if not line.strip():
-                continue
+        return list(self.iter_reconciliation_file(io.BytesIO(content), encoding))
 
-            record_type = line[0] if line else ""
+    def iter_reconciliation_file(
+        self, fp: Iterable[bytes], encoding: str = "big5"
+    ) -> Iterator[Dict]:
+        """
+        Stream reconciliation records from a binary file object.
 
+        Fields are cut by byte offset before decoding, so Big5 text in a
+        record does not shift the fields after it.
+        """
+        for record_type, fields in ACH_RECONCILIATION_FILE.read(fp, encoding):
             if record_type == "D":  # Detail record
-                result = self._parse_detail_record(line)
-                if result:
-                    results.append(result)
-            elif record_type == "R":  # Return / reject record
-                result = self._parse_return_record(line)
-                if result:
-                    results.append(result)
+                result = self._parse_detail_record(fields)
+            else:  # Return / reject record
+                result = self._parse_return_record(fields)
+            if result:
+                yield result
 
-        return results
-
-    def _parse_detail_record(self, line: str) -> Optional[Dict]:
+    def _parse_detail_record(self, fields: Dict[str, str]) -> Optional[Dict]:
         """Parse detail reconciliation record."""
-        if len(line) < 200:
-            return None
-
         try:
             return {
                 "record_type": "detail",
-                "transaction_id": line[7:27].strip(),
-                "bank_reference": line[27:47].strip(),
-                "response_code": line[47:50].strip(),
-                "response_message": self._get_response_message(line[47:50]),
-                "processed_date": datetime.strptime(line[50:58], "%Y % m % d"),
-                "processed_amount": Decimal(line[58:71]) / 100,
-                "success": line[47:50].strip() == "000",
+                "transaction_id": fields["transaction_id"],
+                "bank_reference": fields["bank_reference"],
+                "response_code": fields["response_code"],
+                "response_message": self._get_response_message(
+                    fields["response_code"]
+                ),
+                "processed_date": datetime.strptime(fields["processed_date"], "%Y%m%d"),
+                "processed_amount": Decimal(fields["processed_amount"]) / 100,
+                "success": fields["response_code"] == "000",
             }
         except Exception as e:
             logger.error(f"Error parsing detail record: {e}")
             return None
 
-    def _parse_return_record(self, line: str) -> Optional[Dict]:
+    def _parse_return_record(self, fields: Dict[str, str]) -> Optional[Dict]:
         """Parse return / reject record."""
-        if len(line) < 200:
-            return None
-
         try:
             return {
                 "record_type": "return",
-                "transaction_id": line[7:27].strip(),
-                "return_reason_code": line[27:30].strip(),
-                "return_reason": self._get_return_reason(line[27:30]),
-                "return_date": datetime.strptime(line[30:38], "%Y % m % d"),
-                "original_amount": Decimal(line[38:51]) / 100,
+                "transaction_id": fields["transaction_id"],
+                "return_reason_code": fields["return_reason_code"],
+                "return_reason": self._get_return_reason(fields["return_reason_code"]),
+                "return_date": datetime.strptime(fields["return_date"], "%Y%m%d"),
+                "original_amount": Decimal(fields["original_amount"]) / 100,
                 "success": False,
             }
         except Exception as e:
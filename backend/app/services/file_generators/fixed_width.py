@@ -0,0 +1,158 @@
+"""
+Compiled fixed-width record layouts for banking files.
+
+A ``RecordLayout`` is compiled once into a plan of byte widths, alignments
+and padding plus a ``struct`` format for slicing records apart. Widths are
+counted in encoded bytes, so a Big5 account holder name takes two bytes per
+character and is never cut through the middle of a character. ``FileLayout``
+groups the record types of one file and streams records to and from binary
+file objects, one line at a time.
+"""
+
+import struct
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Tuple,
+)
+
+FILLER = "filler"
+
+
+class Field(NamedTuple):
+    """One fixed-width field: width in bytes, L / R alignment, pad character."""
+
+    name: str
+    width: int
+    align: str = "L"
+    pad: str = " "
+    default: str = ""
+
+
+def encode_field(
+    value: object, width: int, align: str = "L", pad: str = " ", encoding: str = "big5"
+) -> bytes:
+    """
+    Encode a value into exactly ``width`` bytes.
+
+    Longer values are truncated on a character boundary of ``encoding``;
+    characters the encoding lacks are replaced.
+    """
+    text = "" if value is None else str(value)
+    if text.isascii():
+        data = text.encode("ascii")[:width]
+    else:
+        data = text.encode(encoding, errors="replace")
+        if len(data) > width:
+            # Drop a trailing half character left by the byte cut
+            data = data[:width].decode(encoding, errors="ignore").encode(encoding)
+
+    missing = width - len(data)
+    if missing > 0:
+        fill = pad.encode("ascii") * missing
+        data = fill + data if align == "R" else data + fill
+    return data
+
+
+class RecordLayout:
+    """A record type compiled into a formatting and parsing plan."""
+
+    def __init__(self, record_type: str, fields: List[Field]):
+        self.record_type = record_type
+        self.fields = [Field("record_type", 1, default=record_type)] + list(fields)
+        self.size = sum(field.width for field in self.fields)
+        self._struct = struct.Struct("".join(f"{field.width}s" for field in self.fields))
+        self._names = [field.name for field in self.fields]
+        self._ascii_defaults = {
+            field.name: encode_field(field.default, field.width, field.align, field.pad)
+            for field in self.fields
+            if field.default.isascii()
+        }
+
+    def format(self, values: Mapping[str, object], encoding: str = "big5") -> bytes:
+        """Encode one record; fields missing from ``values`` take their default."""
+        parts = []
+        for field in self.fields:
+            if field.name not in values and field.name in self._ascii_defaults:
+                parts.append(self._ascii_defaults[field.name])
+                continue
+            value = values.get(field.name, field.default)
+            parts.append(encode_field(value, field.width, field.align, field.pad, encoding))
+        return b"".join(parts)
+
+    def parse(self, line: bytes, encoding: str = "big5") -> Dict[str, str]:
+        """
+        Split one record into stripped field values (fillers are dropped).
+
+        Banks often trim trailing blanks, so a line shorter than the layout
+        is padded with spaces rather than rejected.
+        """
+        if len(line) < self.size:
+            line = line.ljust(self.size)
+        return {
+            name: chunk.decode(encoding, errors="replace").strip()
+            for name, chunk in zip(self._names, self._struct.unpack_from(line))
+            if name != FILLER
+        }
+
+
+class FileLayout:
+    """The record layouts of one file type, keyed by record type."""
+
+    def __init__(self, *records: RecordLayout, newline: bytes = b"\r\n"):
+        self.records = {record.record_type: record for record in records}
+        self.newline = newline
+
+    def write(
+        self,
+        fp: BinaryIO,
+        records: Iterable[Tuple[str, Mapping[str, object]]],
+        encoding: str = "big5",
+        terminate: bool = True,
+    ) -> int:
+        """
+        Stream records to a binary file object.
+
+        Args:
+            fp: Destination opened in binary mode
+            records: ``(record_type, values)`` pairs, consumed lazily
+            encoding: File encoding
+            terminate: End the last record with a newline too
+
+        Returns:
+            int: Bytes written
+        """
+        written = 0
+        separator = b""
+        for record_type, values in records:
+            data = separator + self.records[record_type].format(values, encoding)
+            fp.write(data)
+            written += len(data)
+            separator = self.newline
+        if terminate and written:
+            fp.write(self.newline)
+            written += len(self.newline)
+        return written
+
+    def read(
+        self, fp: Iterable[bytes], encoding: str = "big5"
+    ) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """
+        Stream ``(record_type, fields)`` from a binary file object.
+
+        Blank lines and record types without a layout are skipped.
+        """
+        for raw in fp:
+            line = raw.rstrip(b"\r\n")
+            if not line.strip():
+                continue
+
+            layout = self.records.get(line[:1].decode("ascii", errors="replace"))
+            if layout is None:
+                continue
+            yield layout.record_type, layout.parse(line, encoding)
@@ -1,26 +1,52 @@
 """
 Incremental sync service for Lucky Gas data migration
 Handles real - time synchronization between legacy and new systems
+
+Changes are applied a batch at a time: legacy → new ID mappings are read with
+one HMGET, existing rows are resolved with one IN query, rows are written with
+bulk UPDATE / INSERT statements and new mappings are stored in one pipelined
+round trip. The legacy database is read through a long-lived connection with
+a cached schema, so a cycle costs a few round trips regardless of batch size.
 """
 
 import asyncio
 import json
 import logging
+import re
 import sqlite3
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
 
 import pandas as pd
 import redis.asyncio as redis
-from sqlalchemy import select
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_async_session
+from app.core.database_async import get_async_session
+from app.core.security import get_password_hash
 from app.models import Customer, Order, User, Vehicle
+from app.models.customer import CustomerType
 from app.models.user import UserRole
+from app.models.vehicle import VehicleType
 from app.utils.encoding_converter import Big5ToUTF8Converter
 
 logger = logging.getLogger(__name__)
 
+# Legacy vehicle type labels → VehicleType
+VEHICLE_TYPE_MAPPING = {
+    "機車": VehicleType.MOTORCYCLE,
+    "motorcycle": VehicleType.MOTORCYCLE,
+    "廂型車": VehicleType.VAN,
+    "van": VehicleType.VAN,
+    "中型貨車": VehicleType.TRUCK_MEDIUM,
+    "truck_medium": VehicleType.TRUCK_MEDIUM,
+    "大貨車": VehicleType.TRUCK_LARGE,
+    "truck_large": VehicleType.TRUCK_LARGE,
+}
+
 
 class IncrementalSyncService:
     """
@@ -32,8 +58,8 @@ class IncrementalSyncService:
         self,
         legacy_db_path: str,
         redis_url: str = "redis://localhost:6379",
-        sync_interval_minutes: int = 5,
-        batch_size: int = 100,
+        sync_interval_minutes: float = 5,
+        batch_size: int = 500,
     ):
         self.legacy_db_path = legacy_db_path
         self.redis_url = redis_url
@@ -43,6 +69,10 @@ class IncrementalSyncService:
         self.redis: Optional[redis.Redis] = None
         self.is_running = False
 
+        # Long-lived read connection and PRAGMA table_info cache
+        self._legacy_conn: Optional[sqlite3.Connection] = None
+        self._legacy_columns: Dict[str, Set[str]] = {}
+
         # Table sync configuration
         self.sync_config = {
             "clients": {
@@ -63,7 +93,17 @@ class IncrementalSyncService:
                 ],
                 "conflict_resolution": "newest_wins",
                 "new_model": Customer,
-                "sync_method": self.sync_customer_record,
+                "key_field": "customer_code",
+                "to_values": self._customer_values,
+                "update_fields": [
+                    "invoice_title",
+                    "short_name",
+                    "address",
+                    "area",
+                    "phone",
+                    "is_active",
+                ],
+                "sync_method": self.sync_batch,
             },
             "deliveries": {
                 "legacy_to_new": True,
@@ -73,7 +113,7 @@ class IncrementalSyncService:
                 "text_fields": ["notes"],
                 "conflict_resolution": "newest_wins",
                 "new_model": Order,
-                "sync_method": self.sync_order_record,
+                "sync_method": self.sync_order_batch,
             },
             "drivers": {
                 "legacy_to_new": True,
@@ -83,7 +123,11 @@ class IncrementalSyncService:
                 "text_fields": ["name", "familiar_areas"],
                 "conflict_resolution": "newest_wins",
                 "new_model": User,
-                "sync_method": self.sync_driver_record,
+                "key_field": "email",
+                "to_values": self._driver_values,
+                "prepare_insert": self._with_temporary_password,
+                "update_fields": ["full_name", "is_active"],
+                "sync_method": self.sync_batch,
             },
             "vehicles": {
                 "legacy_to_new": True,
@@ -93,7 +137,10 @@ class IncrementalSyncService:
                 "text_fields": ["plate_number", "vehicle_type"],
                 "conflict_resolution": "newest_wins",
                 "new_model": Vehicle,
-                "sync_method": self.sync_vehicle_record,
+                "key_field": "license_plate",
+                "to_values": self._vehicle_values,
+                "update_fields": ["is_available", "assigned_driver_id"],
+                "sync_method": self.sync_vehicle_batch,
             },
         }
 
@@ -116,16 +163,21 @@ class IncrementalSyncService:
         """Clean up resources."""
         if self.redis:
             await self.redis.close()
+        if self._legacy_conn is not None:
+            self._legacy_conn.close()
+            self._legacy_conn = None
+            self._legacy_columns.clear()
 
     async def start_sync_loop(self):
         """Start the continuous sync loop."""
         self.is_running = True
-        logger.info(f"Starting sync loop with {self.sync_interval.seconds}s interval")
+        interval = self.sync_interval.total_seconds()
+        logger.info(f"Starting sync loop with {interval}s interval")
 
         while self.is_running:
             try:
                 await self.run_sync_cycle()
-                await asyncio.sleep(self.sync_interval.seconds)
+                await asyncio.sleep(interval)
             except asyncio.CancelledError:
                 logger.info("Sync loop cancelled")
                 break
@@ -165,7 +217,7 @@ class IncrementalSyncService:
 
                 duration = datetime.now() - cycle_start
                 logger.info(
-                    f"Sync cycle completed in {duration.seconds}s. "
+                    f"Sync cycle completed in {duration.total_seconds():.1f}s. "
                     f"Synced {self.stats['records_synced']} records"
                 )
 
@@ -194,32 +246,37 @@ class IncrementalSyncService:
 
         # Convert encoding
         legacy_changes = self.converter.convert_dataframe(
-            legacy_changes, columns=config["text_fields"]
+            legacy_changes,
+            columns=[
+                column
+                for column in config["text_fields"]
+                if column in legacy_changes.columns
+            ],
         )
 
-        # Process in batches
+        # Process in batches; a failing batch is rolled back on its own
         for start_idx in range(0, len(legacy_changes), self.batch_size):
             batch = legacy_changes.iloc[start_idx : start_idx + self.batch_size]
 
-            for _, record in batch.iterrows():
-                try:
-                    await config["sync_method"](record, config, session)
-                    self.stats["records_synced"] += 1
-                except Exception as e:
-                    logger.error(
-                        f"Failed to sync {table_name} record {record.get('id')}: {e}"
-                    )
-                    self.stats["errors"] += 1
+            try:
+                async with session.begin_nested():
+                    synced = await config["sync_method"](batch, config, session)
+                self.stats["records_synced"] += synced
+            except Exception as e:
+                logger.error(
+                    f"Failed to sync {table_name} records "
+                    f"{batch['id'].min()}-{batch['id'].max()}: {e}"
+                )
+                self.stats["errors"] += len(batch)
 
             # Commit batch
             await session.commit()
 
         # Update sync timestamp
-        if not legacy_changes.empty:
-            max_timestamp = legacy_changes["updated_at"].max()
-            await self.set_last_sync_time(
-                config["timestamp_key"], pd.to_datetime(max_timestamp)
-            )
+        max_timestamp = legacy_changes["updated_at"].max()
+        await self.set_last_sync_time(
+            config["timestamp_key"], pd.to_datetime(max_timestamp)
+        )
 
     async def sync_new_to_legacy(
         self, table_name: str, config: Dict[str, Any], session: AsyncSession
@@ -241,38 +298,34 @@ class IncrementalSyncService:
 
         logger.info(f"Found {len(orders)} changes in new system for {table_name}")
 
+        legacy_ids = await self.get_reverse_id_mappings(
+            config["id_mapping_key"], [order.id for order in orders]
+        )
+        now = datetime.now().isoformat()
+        updates = [
+            (
+                order.status.value,
+                order.delivered_at.isoformat() if order.delivered_at else None,
+                order.delivery_notes,
+                now,
+                legacy_ids[order.id],
+            )
+            for order in orders
+            if order.id in legacy_ids
+        ]
+
         # Update legacy system
         conn = sqlite3.connect(self.legacy_db_path)
-        cursor = conn.cursor()
 
         try:
-            for order in orders:
-                # Get legacy ID from mapping
-                legacy_id = await self.get_reverse_id_mapping(
-                    config["id_mapping_key"], order.id
-                )
-
-                if legacy_id:
-                    # Update existing legacy record
-                    cursor.execute(
-                        """
-                        UPDATE deliveries
-                        SET status = ?, actual_delivery_time = ?, notes = ?, updated_at = ?
-                        WHERE id = ?
-                    """,
-                        (
-                            order.status.value,
-                            (
-                                order.delivered_at.isoformat()
-                                if order.delivered_at
-                                else None
-                            ),
-                            order.delivery_notes,
-                            datetime.now().isoformat(),
-                            legacy_id,
-                        ),
-                    )
-
+            conn.executemany(
+                """
+                UPDATE deliveries
+                SET status = ?, actual_delivery_time = ?, notes = ?, updated_at = ?
+                WHERE id = ?
+            """,
+                updates,
+            )
             conn.commit()
 
             # Update reverse sync timestamp
@@ -292,285 +345,265 @@ class IncrementalSyncService:
         self, table_name: str, last_sync: datetime
     ) -> pd.DataFrame:
         """Fetch changed records from legacy database."""
-        conn = sqlite3.connect(self.legacy_db_path)
-
-        # Check if table has updated_at column
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = {col[1] for col in cursor.fetchall()}
+        columns = self._get_legacy_columns(table_name)
 
         if "updated_at" in columns:
-            query = """
+            query = f"""
             SELECT * FROM {table_name}
             WHERE updated_at > ?
             ORDER BY updated_at ASC
             LIMIT ?
             """
             params = (last_sync.isoformat(), self.batch_size)
+        elif "created_at" in columns:
+            # For tables without updated_at, use created_at
+            query = f"""
+            SELECT * FROM {table_name}
+            WHERE created_at > ?
+            ORDER BY created_at ASC
+            LIMIT ?
+            """
+            params = (last_sync.isoformat(), self.batch_size)
         else:
-            # For tables without updated_at, use created_at or id
-            if "created_at" in columns:
-                query = """
-                SELECT * FROM {table_name}
-                WHERE created_at > ?
-                ORDER BY created_at ASC
-                LIMIT ?
-                """
-                params = (last_sync.isoformat(), self.batch_size)
-            else:
-                # Fallback: get all records (for initial sync)
-                query = f"SELECT * FROM {table_name} LIMIT ?"
-                params = (self.batch_size,)
+            # Fallback: get all records (for initial sync)
+            query = f"SELECT * FROM {table_name} LIMIT ?"
+            params = (self.batch_size,)
 
-        df = pd.read_sql_query(query, conn, params=params)
+        df = pd.read_sql_query(query, self._get_legacy_connection(), params=params)
 
         # Add updated_at if missing (for tracking)
         if "updated_at" not in df.columns:
             df["updated_at"] = datetime.now()
 
-        conn.close()
         return df
 
-    async def sync_customer_record(
-        self, record: pd.Series, config: Dict[str, Any], session: AsyncSession
-    ):
-        """Sync a customer record."""
-        # Get ID mapping
-        legacy_id = record["id"]
-        new_id = await self.get_id_mapping(config["id_mapping_key"], legacy_id)
-
-        if new_id:
-            # Check if customer exists
-            customer = await session.get(Customer, new_id)
-            if customer:
-                # Check for conflicts using updated_at
-                if hasattr(customer, "updated_at") and customer.updated_at:
-                    record_updated = pd.to_datetime(
-                        record.get("updated_at", datetime.min)
-                    )
-                    if customer.updated_at > record_updated:
-                        logger.debug(
-                            f"Skipping customer {record['client_code']} - newer version exists"
-                        )
-                        self.stats["conflicts_resolved"] += 1
-                        return
-
-                # Update existing customer
-                customer.name = record.get("invoice_title") or record.get("short_name")
-                customer.short_name = record.get("short_name")
-                customer.address = record.get("address")
-                customer.phone = self._extract_phone(record.get("contact_person", ""))
-                customer.contact_person = record.get("contact_person")
-                customer.notes = record.get("notes")
-                customer.is_active = bool(record.get("is_active", True))
-                customer.is_terminated = bool(record.get("is_terminated", False))
-                customer.updated_at = datetime.now()
-
-                logger.debug(f"Updated customer {customer.customer_code}")
-                return
-
-        # Check if customer with this code already exists
-        stmt = select(Customer).where(Customer.customer_code == record["client_code"])
-        result = await session.execute(stmt)
-        existing = result.scalar_one_or_none()
-
-        if existing:
-            # Store mapping for existing customer
-            await self.set_id_mapping(config["id_mapping_key"], legacy_id, existing.id)
-            return
+    def _get_legacy_connection(self) -> sqlite3.Connection:
+        """Read-only legacy connection, opened once and reused across cycles."""
+        if self._legacy_conn is None:
+            uri = f"{Path(self.legacy_db_path).resolve().as_uri()}?mode=ro"
+            self._legacy_conn = sqlite3.connect(uri, uri=True)
+        return self._legacy_conn
+
+    def _get_legacy_columns(self, table_name: str) -> Set[str]:
+        """Column names of a legacy table (cached after the first lookup)."""
+        if table_name not in self._legacy_columns:
+            cursor = self._get_legacy_connection().execute(
+                f"PRAGMA table_info({table_name})"
+            )
+            self._legacy_columns[table_name] = {col[1] for col in cursor.fetchall()}
+        return self._legacy_columns[table_name]
 
-        # Create new customer
-        customer = Customer(
-            customer_code=record["client_code"],
-            name=record.get("invoice_title") or record.get("short_name"),
-            short_name=record.get("short_name"),
-            address=record.get("address"),
-            phone=self._extract_phone(record.get("contact_person", "")),
-            contact_person=record.get("contact_person"),
-            tax_id=record.get("tax_id") if pd.notna(record.get("tax_id")) else None,
-            customer_type="corporate" if record.get("is_corporate") else "residential",
-            district=record.get("district"),
-            area=record.get("area"),
-            latitude=(
-                float(record["latitude"]) if pd.notna(record.get("latitude")) else None
-            ),
-            longitude=(
-                float(record["longitude"])
-                if pd.notna(record.get("longitude"))
-                else None
-            ),
-            is_active=bool(record.get("is_active", True)),
-            is_terminated=bool(record.get("is_terminated", False)),
-            payment_method=self._map_payment_method(record.get("payment_method")),
-            pricing_type=record.get("pricing_method", "standard"),
-            delivery_time_preference=record.get("delivery_time_preference"),
-            needs_same_day_delivery=bool(record.get("needs_same_day_delivery")),
-            has_flow_meter=bool(record.get("has_flow_meter")),
-            has_switch=bool(record.get("has_switch")),
-            cylinder_inventory={
-                "50kg": int(record.get("cylinder_50kg", 0)),
-                "20kg": int(record.get("cylinder_20kg", 0)),
-                "16kg": int(record.get("cylinder_16kg", 0)),
-                "10kg": int(record.get("cylinder_10kg", 0)),
-                "4kg": int(record.get("cylinder_4kg", 0)),
-            },
-            monthly_delivery_volume=(
-                float(record.get("monthly_delivery_volume", 0))
-                if pd.notna(record.get("monthly_delivery_volume"))
-                else None
-            ),
-            daily_usage_avg=(
-                float(record.get("daily_usage_avg", 0))
-                if pd.notna(record.get("daily_usage_avg"))
-                else None
-            ),
-            notes=record.get("notes"),
-            created_at=pd.to_datetime(record.get("created_at", datetime.now())),
-            updated_at=pd.to_datetime(record.get("updated_at", datetime.now())),
+    async def sync_batch(
+        self,
+        batch: pd.DataFrame,
+        config: Dict[str, Any],
+        session: AsyncSession,
+        references: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """
+        Sync a batch of legacy records into ``config["new_model"]``
+
+        Mapped records are bulk updated (unless the new system holds a newer
+        version), records matching an existing row by natural key are only
+        mapped, and the rest are bulk inserted.
+
+        Returns:
+            Number of records updated, mapped or created
+        """
+        model = config["new_model"]
+        key_field = config["key_field"]
+        key_column = getattr(model, key_field)
+        resolve = getattr(ConflictResolver, config["conflict_resolution"])
+
+        records = batch.to_dict("records")
+        legacy_ids = [int(record["id"]) for record in records]
+        rows = [config["to_values"](record, references or {}) for record in records]
+
+        mapped = await self.get_id_mappings(config["id_mapping_key"], legacy_ids)
+        result = await session.execute(
+            select(model.id, key_column, model.updated_at).where(
+                or_(
+                    model.id.in_(list(mapped.values())),
+                    key_column.in_([row[key_field] for row in rows]),
+                )
+            )
         )
-
-        session.add(customer)
-        await session.flush()
-
-        # Store ID mapping
-        await self.set_id_mapping(config["id_mapping_key"], legacy_id, customer.id)
-        logger.debug(f"Created new customer {customer.customer_code}")
-
-    async def sync_order_record(
-        self, record: pd.Series, config: Dict[str, Any], session: AsyncSession
-    ):
-        """Sync an order / delivery record."""
-        # Similar implementation to sync_customer_record
-        # but for orders with order items
-
-    async def sync_driver_record(
-        self, record: pd.Series, config: Dict[str, Any], session: AsyncSession
-    ):
-        """Sync a driver record as user."""
-        legacy_id = record["id"]
-        new_id = await self.get_id_mapping(config["id_mapping_key"], legacy_id)
-
-        email = f"{record['employee_id']}@luckygas.tw"
-
-        if new_id:
-            # Update existing driver
-            user = await session.get(User, new_id)
-            if user:
-                user.full_name = record["name"]
-                user.phone = record.get("phone")
-                user.is_active = bool(record.get("is_active", True))
-                user.driver_license_type = record.get("license_type")
-                user.driver_experience_years = (
-                    int(record.get("experience_years", 0))
-                    if pd.notna(record.get("experience_years"))
-                    else None
+        current_by_id = {}
+        id_by_key = {}
+        for current in result:
+            current_by_id[current.id] = current
+            id_by_key[current[1]] = current.id
+
+        updates: List[Dict[str, Any]] = []
+        new_mappings: Dict[int, int] = {}
+        inserts: Dict[Any, Dict[str, Any]] = {}
+        pending: Dict[Any, List[int]] = {}
+        for legacy_id, record, row in zip(legacy_ids, records, rows):
+            new_id = mapped.get(legacy_id)
+            if new_id in current_by_id:
+                if resolve(record, current_by_id[new_id]) == "new":
+                    logger.debug(f"Skipping {row[key_field]} - newer version exists")
+                    self.stats["conflicts_resolved"] += 1
+                    continue
+                values = {field: row[field] for field in config["update_fields"]}
+                updates.append({"id": new_id, **values, "updated_at": datetime.now()})
+            elif row[key_field] in id_by_key:
+                # Store mapping for existing record
+                new_mappings[legacy_id] = id_by_key[row[key_field]]
+            else:
+                inserts[row[key_field]] = row
+                pending.setdefault(row[key_field], []).append(legacy_id)
+
+        if updates:
+            await session.execute(update(model), updates)
+
+        if inserts:
+            prepare = config.get("prepare_insert")
+            insert_rows = [
+                prepare(row) if prepare else row for row in inserts.values()
+            ]
+            created = await self._insert_missing(session, model, key_field, insert_rows)
+            for key, legacy_ids_for_key in pending.items():
+                for legacy_id in legacy_ids_for_key:
+                    new_mappings[legacy_id] = created[key]
+
+        await self.set_id_mappings(config["id_mapping_key"], new_mappings)
+        return len(updates) + len(new_mappings)
+
+    async def _insert_missing(
+        self,
+        session: AsyncSession,
+        model,
+        key_field: str,
+        rows: List[Dict[str, Any]],
+    ) -> Dict[Any, int]:
+        """
+        Bulk INSERT rows, skipping keys created concurrently
+
+        Returns:
+            New system ID per natural key, for every row
+        """
+        table = model.__table__
+        insert = sqlite_insert if session.bind.dialect.name == "sqlite" else pg_insert
+        stmt = (
+            insert(table)
+            .on_conflict_do_nothing(index_elements=[key_field])
+            .returning(table.c.id, table.c[key_field])
+        )
+        result = await session.execute(stmt, rows)
+        ids = {key: new_id for new_id, key in result}
+
+        missing = [row[key_field] for row in rows if row[key_field] not in ids]
+        if missing:
+            result = await session.execute(
+                select(table.c.id, table.c[key_field]).where(
+                    table.c[key_field].in_(missing)
                 )
-                user.is_available = bool(record.get("is_available", True))
-                user.updated_at = datetime.now()
-                return
-
-        # Check if user with this email exists
-        stmt = select(User).where(User.email == email)
-        result = await session.execute(stmt)
-        existing = result.scalar_one_or_none()
-
-        if existing:
-            await self.set_id_mapping(config["id_mapping_key"], legacy_id, existing.id)
-            return
-
-        # Create new driver user
-        user = User(
-            email=email,
-            full_name=record["name"],
-            phone=record.get("phone"),
-            employee_id=record["employee_id"],
-            role=UserRole.DRIVER,
-            is_active=bool(record.get("is_active", True)),
-            driver_license_type=record.get("license_type"),
-            driver_experience_years=(
-                int(record.get("experience_years", 0))
-                if pd.notna(record.get("experience_years"))
-                else None
-            ),
-            driver_familiar_areas=self._parse_familiar_areas(
-                record.get("familiar_areas")
-            ),
-            is_available=bool(record.get("is_available", True)),
-            created_at=pd.to_datetime(record.get("created_at", datetime.now())),
-            updated_at=pd.to_datetime(record.get("updated_at", datetime.now())),
+            )
+            ids.update({key: new_id for new_id, key in result})
+        return ids
+
+    async def sync_order_batch(
+        self, batch: pd.DataFrame, config: Dict[str, Any], session: AsyncSession
+    ) -> int:
+        """Sync a batch of order / delivery records."""
+        # Similar implementation to sync_batch
+        # but for orders with order items
+        return 0
+
+    async def sync_vehicle_batch(
+        self, batch: pd.DataFrame, config: Dict[str, Any], session: AsyncSession
+    ) -> int:
+        """Sync a batch of vehicles, resolving assigned drivers in one lookup."""
+        driver_ids = []
+        if "driver_id" in batch.columns:
+            driver_ids = [int(value) for value in batch["driver_id"].dropna()]
+        drivers = await self.get_id_mappings(
+            self.sync_config["drivers"]["id_mapping_key"], driver_ids
+        )
+        return await self.sync_batch(
+            batch, config, session, references={"drivers": drivers}
         )
 
-        # Set temporary password
-        user.set_password(f"LuckyGas@{record['employee_id']}")
-
-        session.add(user)
-        await session.flush()
-
-        await self.set_id_mapping(config["id_mapping_key"], legacy_id, user.id)
-        logger.debug(f"Created new driver user {user.email}")
-
-    async def sync_vehicle_record(
-        self, record: pd.Series, config: Dict[str, Any], session: AsyncSession
-    ):
-        """Sync a vehicle record."""
-        legacy_id = record["id"]
-        new_id = await self.get_id_mapping(config["id_mapping_key"], legacy_id)
-
-        if new_id:
-            vehicle = await session.get(Vehicle, new_id)
-            if vehicle:
-                vehicle.is_active = bool(record.get("is_active", True))
-                vehicle.is_available = bool(record.get("is_available", True))
-                vehicle.updated_at = datetime.now()
-                return
-
-        # Check if vehicle with this plate exists
-        stmt = select(Vehicle).where(Vehicle.plate_number == record["plate_number"])
-        result = await session.execute(stmt)
-        existing = result.scalar_one_or_none()
+    # Record mapping
+
+    def _customer_values(
+        self, record: Dict[str, Any], references: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Customer columns for a legacy client record."""
+        customer_code = str(record["client_code"]).strip()
+        return {
+            "customer_code": customer_code,
+            "invoice_title": self._text(record.get("invoice_title")),
+            "short_name": self._text(record.get("short_name")) or customer_code,
+            "address": self._text(record.get("address")) or "待補充",
+            "area": self._text(record.get("area")),
+            "phone": self._extract_phone(record.get("contact_person")),
+            "customer_type": (
+                CustomerType.COMMERCIAL.value
+                if self._flag(record.get("is_corporate"), False)
+                else CustomerType.RESIDENTIAL.value
+            ),
+            "cylinders_50kg": self._int(record.get("cylinder_50kg")),
+            "cylinders_20kg": self._int(record.get("cylinder_20kg")),
+            "cylinders_16kg": self._int(record.get("cylinder_16kg")),
+            "cylinders_10kg": self._int(record.get("cylinder_10kg")),
+            "is_active": self._flag(record.get("is_active"), True)
+            and not self._flag(record.get("is_terminated"), False),
+            "created_at": self._timestamp(record.get("created_at")) or datetime.now(),
+            "updated_at": self._timestamp(record.get("updated_at")) or datetime.now(),
+        }
 
-        if existing:
-            await self.set_id_mapping(config["id_mapping_key"], legacy_id, existing.id)
-            return
+    def _driver_values(
+        self, record: Dict[str, Any], references: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """User columns for a legacy driver record."""
+        employee_id = str(record["employee_id"]).strip()
+        return {
+            "email": f"{employee_id}@luckygas.tw",
+            "username": employee_id,
+            "full_name": self._text(record.get("name")) or employee_id,
+            "role": UserRole.DRIVER,
+            "is_active": self._flag(record.get("is_active"), True),
+            "created_at": self._timestamp(record.get("created_at")) or datetime.now(),
+            "updated_at": self._timestamp(record.get("updated_at")) or datetime.now(),
+        }
 
-        # Map driver ID if assigned
-        driver_id = None
-        if pd.notna(record.get("driver_id")):
-            driver_id = await self.get_id_mapping(
-                self.sync_config["drivers"]["id_mapping_key"], int(record["driver_id"])
-            )
+    def _with_temporary_password(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Set the temporary password on a driver that is about to be created."""
+        return {
+            **row,
+            "hashed_password": get_password_hash(f"LuckyGas@{row['username']}"),
+        }
 
-        # Create new vehicle
-        vehicle = Vehicle(
-            plate_number=record["plate_number"],
-            vehicle_type=record["vehicle_type"],
-            is_active=bool(record.get("is_active", True)),
-            is_available=bool(record.get("is_available", True)),
-            assigned_driver_id=driver_id,
-            capacity_50kg=int(record.get("max_cylinders_50kg", 0)),
-            capacity_20kg=int(record.get("max_cylinders_20kg", 0)),
-            capacity_16kg=int(record.get("max_cylinders_16kg", 0)),
-            capacity_10kg=int(record.get("max_cylinders_10kg", 0)),
-            capacity_4kg=int(record.get("max_cylinders_4kg", 0)),
-            last_maintenance_date=(
-                pd.to_datetime(record.get("last_maintenance"))
-                if pd.notna(record.get("last_maintenance"))
-                else None
+    def _vehicle_values(
+        self, record: Dict[str, Any], references: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Vehicle columns for a legacy vehicle record."""
+        plate_number = str(record["plate_number"]).strip()
+        driver_id = record.get("driver_id")
+        return {
+            "license_plate": plate_number,
+            "vehicle_number": plate_number,
+            "vehicle_type": VEHICLE_TYPE_MAPPING.get(
+                str(record.get("vehicle_type")).strip(), VehicleType.TRUCK_SMALL
             ),
-            next_maintenance_date=(
-                pd.to_datetime(record.get("next_maintenance"))
-                if pd.notna(record.get("next_maintenance"))
+            "is_available": self._flag(record.get("is_available"), True),
+            "assigned_driver_id": (
+                references["drivers"].get(int(driver_id))
+                if pd.notna(driver_id)
                 else None
             ),
-            created_at=pd.to_datetime(record.get("created_at", datetime.now())),
-            updated_at=pd.to_datetime(record.get("updated_at", datetime.now())),
-        )
-
-        session.add(vehicle)
-        await session.flush()
-
-        await self.set_id_mapping(config["id_mapping_key"], legacy_id, vehicle.id)
-        logger.debug(f"Created new vehicle {vehicle.plate_number}")
+            "max_cylinders_50kg": self._int(record.get("max_cylinders_50kg")),
+            "max_cylinders_20kg": self._int(record.get("max_cylinders_20kg")),
+            "max_cylinders_16kg": self._int(record.get("max_cylinders_16kg")),
+            "max_cylinders_10kg": self._int(record.get("max_cylinders_10kg")),
+            "max_cylinders_4kg": self._int(record.get("max_cylinders_4kg")),
+            "last_maintenance_date": self._timestamp(record.get("last_maintenance")),
+            "next_maintenance_date": self._timestamp(record.get("next_maintenance")),
+            "created_at": self._timestamp(record.get("created_at")) or datetime.now(),
+            "updated_at": self._timestamp(record.get("updated_at")) or datetime.now(),
+        }
 
     # Redis helper methods
 
@@ -585,25 +618,42 @@ class IncrementalSyncService:
         """Set last sync timestamp in Redis."""
         await self.redis.set(key, timestamp.isoformat())
 
-    async def get_id_mapping(self, key: str, legacy_id: int) -> Optional[int]:
-        """Get new system ID for a legacy ID."""
-        new_id = await self.redis.hget(key, str(legacy_id))
-        return int(new_id) if new_id else None
-
-    async def get_reverse_id_mapping(self, key: str, new_id: int) -> Optional[int]:
-        """Get legacy ID for a new system ID (for reverse sync)."""
-        # Store reverse mappings with :reverse suffix
-        reverse_key = f"{key}:reverse"
-        legacy_id = await self.redis.hget(reverse_key, str(new_id))
-        return int(legacy_id) if legacy_id else None
-
-    async def set_id_mapping(self, key: str, legacy_id: int, new_id: int):
-        """Store ID mapping between systems (bidirectional)."""
-        # Store forward mapping
-        await self.redis.hset(key, str(legacy_id), str(new_id))
-        # Store reverse mapping
-        reverse_key = f"{key}:reverse"
-        await self.redis.hset(reverse_key, str(new_id), str(legacy_id))
+    async def get_id_mappings(self, key: str, legacy_ids: List[int]) -> Dict[int, int]:
+        """Get new system IDs for legacy IDs in one round trip."""
+        if not legacy_ids:
+            return {}
+        new_ids = await self.redis.hmget(key, [str(legacy_id) for legacy_id in legacy_ids])
+        return {
+            legacy_id: int(new_id)
+            for legacy_id, new_id in zip(legacy_ids, new_ids)
+            if new_id
+        }
+
+    async def get_reverse_id_mappings(
+        self, key: str, new_ids: List[int]
+    ) -> Dict[int, int]:
+        """Get legacy IDs for new system IDs (for reverse sync)."""
+        # Reverse mappings are stored with :reverse suffix
+        return await self.get_id_mappings(f"{key}:reverse", new_ids)
+
+    async def set_id_mappings(self, key: str, mappings: Dict[int, int]):
+        """Store legacy → new ID mappings (bidirectional) in one round trip."""
+        if not mappings:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(
+            key,
+            mapping={
+                str(legacy_id): str(new_id) for legacy_id, new_id in mappings.items()
+            },
+        )
+        pipe.hset(
+            f"{key}:reverse",
+            mapping={
+                str(new_id): str(legacy_id) for legacy_id, new_id in mappings.items()
+            },
+        )
+        await pipe.execute()
 
     async def save_sync_stats(self):
         """Save sync statistics to Redis."""
@@ -620,42 +670,47 @@ class IncrementalSyncService:
 
     # Helper methods
 
-    def _extract_phone(self, contact_info: str) -> Optional[str]:
+    @staticmethod
+    def _text(value: Any) -> Optional[str]:
+        """Stripped string, or None for missing / blank values."""
+        if value is None or pd.isna(value):
+            return None
+        return str(value).strip() or None
+
+    @staticmethod
+    def _flag(value: Any, default: bool) -> bool:
+        """Boolean from a legacy 0 / 1 column."""
+        if value is None or pd.isna(value):
+            return default
+        return bool(value)
+
+    @staticmethod
+    def _int(value: Any) -> int:
+        """Integer from a legacy numeric column (0 when missing)."""
+        if value is None or pd.isna(value):
+            return 0
+        return int(float(value))
+
+    @staticmethod
+    def _timestamp(value: Any) -> Optional[datetime]:
+        """Datetime from a legacy timestamp column (None when missing)."""
+        if value is None:
+            return None
+        parsed = pd.to_datetime(value, errors="coerce")
+        return None if pd.isna(parsed) else parsed.to_pydatetime()
+
+    def _extract_phone(self, contact_info: Any) -> Optional[str]:
         """Extract phone number from contact info."""
+        contact_info = self._text(contact_info)
         if not contact_info:
             return None
 
-        import re
-
         phone_pattern = (
             r"(09\d{2}[-\s]?\d{3}[-\s]?\d{3}|0[2 - 8][-\s]?\d{4}[-\s]?\d{4})"
         )
         match = re.search(phone_pattern, contact_info)
         return match.group(1).replace(" ", "").replace("-", "") if match else None
 
-    def _map_payment_method(self, legacy_method: str) -> str:
-        """Map legacy payment method to new enum."""
-        if pd.isna(legacy_method):
-            return "cash"
-
-        mapping = {
-            "cash": "cash",
-            "credit": "monthly",
-            "transfer": "transfer",
-            "現金": "cash",
-            "月結": "monthly",
-            "轉帳": "transfer",
-        }
-        return mapping.get(str(legacy_method).lower(), "cash")
-
-    def _parse_familiar_areas(self, areas_str: str) -> List[str]:
-        """Parse comma - separated areas into list."""
-        if pd.isna(areas_str) or not areas_str:
-            return []
-
-        areas = [area.strip() for area in str(areas_str).split(", ")]
-        return [area for area in areas if area]
-
 
 # Conflict resolution strategies
 
@@ -667,9 +722,16 @@ class ConflictResolver:
     def newest_wins(legacy_record: Dict, new_record: Any) -> str:
         """Resolution: Keep the record with the latest timestamp."""
         legacy_time = pd.to_datetime(legacy_record.get("updated_at", datetime.min))
-        new_time = getattr(new_record, "updated_at", datetime.min)
-
-        return "legacy" if legacy_time > new_time else "new"
+        new_time = getattr(new_record, "updated_at", None)
+        if new_time is None:
+            return "legacy"
+
+        # Compare wall-clock times; the legacy system has no time zones
+        return (
+            "legacy"
+            if legacy_time.replace(tzinfo=None) > new_time.replace(tzinfo=None)
+            else "new"
+        )
 
     @staticmethod
     def legacy_wins(legacy_record: Dict, new_record: Any) -> str:
@@ -0,0 +1,458 @@
+"""
+Block-allocated invoice numbers
+
+Taiwan e - invoice numbers come from government-allocated ranges
+(``InvoiceSequence``). Instead of locking the sequence row for every invoice,
+each worker reserves a contiguous block (``DEFAULT_BLOCK_SIZE`` numbers) in a
+short transaction of its own and hands numbers out from memory. Issuing an
+invoice therefore never waits on another worker's transaction.
+
+Numbers a worker does not use are handed back to the sequence when its block
+is still the sequence tail; otherwise the block records how far it was used
+and the remainder is reported as blank numbers (空白字軌) for the period, as
+the platform requires. The forecast job predicts when each sequence runs out
+from recent block allocations and raises alerts before it does.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.invoice import Invoice
+from app.models.invoice_number_block import InvoiceNumberBlock
+from app.models.invoice_sequence import InvoiceSequence
+
+logger = logging.getLogger(__name__)
+
+# Numbers reserved per block
+DEFAULT_BLOCK_SIZE = 100
+
+# Recent allocations used to predict exhaustion
+FORECAST_WINDOW = timedelta(days=7)
+
+# Alert when a sequence is this full ...
+USAGE_WARNING_PERCENTAGE = 90
+
+# ... or is predicted to run out within this many days
+EXHAUSTION_WARNING_DAYS = 3
+
+
+@dataclass
+class ReservedBlock:
+    """A block held in memory by the allocator"""
+
+    id: int
+    sequence_id: int
+    prefix: str
+    next_number: int
+    range_end: int
+    used_until: Optional[int] = None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.next_number > self.range_end
+
+
+def format_invoice_number(prefix: str, number: int) -> str:
+    """PREFIX + 8 - digit number (e.g., "AA10000001")"""
+    return f"{prefix}{str(number).zfill(8)}"
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _default_session_factory() -> AsyncIterator[AsyncSession]:
+    from app.core.database_async import get_async_session
+
+    async for session in get_async_session():
+        yield session
+
+
+class InvoiceNumberAllocator:
+    """Hands out invoice numbers from blocks reserved by this worker"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncIterator[AsyncSession]] = _default_session_factory,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        worker_id: Optional[str] = None,
+    ):
+        self.session_factory = session_factory
+        self.block_size = block_size
+        self.worker_id = worker_id or _worker_id()
+        self._blocks: Dict[Tuple[str, Optional[str]], ReservedBlock] = {}
+        # asyncio locks belong to one event loop, and the process-wide
+        # allocator is used from several (the app's, and one per
+        # ``asyncio.run`` in tasks), so each loop gets its own lock. Loops
+        # running in different threads are serialized by the thread lock.
+        self._loop_locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._loop_locks_guard = threading.Lock()
+        self._thread_lock = threading.Lock()
+
+    def _loop_lock(self) -> asyncio.Lock:
+        """The lock of the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._loop_locks_guard:
+            lock = self._loop_locks.get(loop)
+            if lock is None:
+                lock = self._loop_locks[loop] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def _held(self) -> AsyncIterator[None]:
+        """Hold the thread lock without blocking the loop while waiting"""
+        while not self._thread_lock.acquire(blocking=False):
+            await asyncio.sleep(0.001)
+        try:
+            yield
+        finally:
+            self._thread_lock.release()
+
+    async def next_number(
+        self, year_month: Optional[str] = None, prefix: Optional[str] = None
+    ) -> str:
+        """
+        Get the next invoice number
+
+        Args:
+            year_month: YYYYMM format (e.g., "202501"). If None, uses current month
+            prefix: Invoice prefix (e.g., "AA"). If None, uses first available
+
+        Returns:
+            str: Invoice number (e.g., "AA10000001")
+
+        Raises:
+            ValueError: If no active sequence has numbers left
+        """
+        year_month = year_month or datetime.now().strftime("%Y%m")
+        key = (year_month, prefix)
+
+        async with self._loop_lock(), self._held():
+            block = self._blocks.get(key)
+            if block is None or block.exhausted:
+                block = await self._reserve(year_month, prefix, finished=block)
+                self._blocks[key] = block
+
+            number = block.next_number
+            block.next_number += 1
+            block.used_until = number
+
+        return format_invoice_number(block.prefix, number)
+
+    async def release(self) -> None:
+        """Give back the unused part of every held block (shutdown / period end)"""
+        async with self._loop_lock(), self._held():
+            blocks = list(self._blocks.values())
+            self._blocks.clear()
+            if not blocks:
+                return
+
+            async for session in self.session_factory():
+                for block in blocks:
+                    await self._release_block(session, block)
+                await session.commit()
+
+    async def _reserve(
+        self,
+        year_month: str,
+        prefix: Optional[str],
+        finished: Optional[ReservedBlock] = None,
+    ) -> ReservedBlock:
+        """Reserve a new block in a short transaction of its own"""
+        async for session in self.session_factory():
+            if finished is not None:
+                await self._close_block(session, finished)
+
+            query = (
+                select(InvoiceSequence)
+                .where(
+                    InvoiceSequence.year_month == year_month,
+                    InvoiceSequence.is_active.is_(True),
+                    InvoiceSequence.current_number <= InvoiceSequence.range_end,
+                )
+                .order_by(InvoiceSequence.id)
+                .limit(1)
+                # Held only for this transaction, not the invoice's
+                .with_for_update()
+            )
+            if prefix:
+                query = query.where(InvoiceSequence.prefix == prefix)
+
+            sequence = (await session.execute(query)).scalar_one_or_none()
+            if sequence is None:
+                await session.commit()
+                raise ValueError(
+                    f"No active invoice sequence found for {year_month}"
+                    f"{f' with prefix {prefix}' if prefix else ''}. "
+                    "Please configure invoice number ranges in the system."
+                )
+
+            start = sequence.current_number
+            end = min(start + self.block_size - 1, sequence.range_end)
+            sequence.current_number = end + 1
+
+            block = InvoiceNumberBlock(
+                sequence_id=sequence.id,
+                year_month=sequence.year_month,
+                prefix=sequence.prefix,
+                range_start=start,
+                range_end=end,
+                status="active",
+                worker_id=self.worker_id,
+            )
+            session.add(block)
+            await session.commit()
+
+            if sequence.usage_percentage > USAGE_WARNING_PERCENTAGE:
+                logger.warning(
+                    f"Invoice sequence {sequence.year_month}-{sequence.prefix} "
+                    f"is {sequence.usage_percentage:.1f}% used. "
+                    f"Only {sequence.available_count} numbers remaining."
+                )
+
+            return ReservedBlock(
+                id=block.id,
+                sequence_id=sequence.id,
+                prefix=sequence.prefix,
+                next_number=start,
+                range_end=end,
+            )
+
+    @staticmethod
+    async def _close_block(session: AsyncSession, block: ReservedBlock) -> None:
+        """Mark a fully used block as released"""
+        await session.execute(
+            update(InvoiceNumberBlock)
+            .where(InvoiceNumberBlock.id == block.id)
+            .values(
+                status="released",
+                used_until=block.used_until,
+                released_at=datetime.now(),
+            )
+        )
+
+    async def _release_block(self, session: AsyncSession, block: ReservedBlock) -> None:
+        """Return a block's unused numbers, or leave them recorded as blank"""
+        if block.exhausted:
+            await self._close_block(session, block)
+            return
+
+        sequence = await session.get(
+            InvoiceSequence, block.sequence_id, with_for_update=True
+        )
+        if sequence.current_number != block.range_end + 1:
+            # Numbers after this block are already reserved: the unused
+            # ones stay in the block as blank numbers for the period report
+            await self._close_block(session, block)
+            logger.info(
+                f"Invoice numbers {format_invoice_number(block.prefix, block.next_number)}"
+                f"-{format_invoice_number(block.prefix, block.range_end)} left blank"
+            )
+            return
+
+        # Still the tail of the sequence: hand the unused numbers back
+        sequence.current_number = block.next_number
+        if block.used_until is None:
+            await session.execute(
+                delete(InvoiceNumberBlock).where(InvoiceNumberBlock.id == block.id)
+            )
+        else:
+            await session.execute(
+                update(InvoiceNumberBlock)
+                .where(InvoiceNumberBlock.id == block.id)
+                .values(
+                    status="released",
+                    range_end=block.used_until,
+                    used_until=block.used_until,
+                    released_at=datetime.now(),
+                )
+            )
+
+
+async def blank_number_ranges(
+    db: AsyncSession, year_month: str
+) -> List[Dict[str, Any]]:
+    """
+    Reserved numbers of a period that no invoice used (空白字軌)
+
+    Covers numbers left at the end of released blocks, blocks orphaned by a
+    worker that stopped without releasing, and numbers whose invoice was
+    never created. Run after the period closes and report the ranges to the
+    e - invoice platform.
+
+    Returns:
+        [{"prefix", "range_start", "range_end", "count"}] in number order
+    """
+    result = await db.execute(
+        select(InvoiceNumberBlock)
+        .where(InvoiceNumberBlock.year_month == year_month)
+        .order_by(InvoiceNumberBlock.prefix, InvoiceNumberBlock.range_start)
+    )
+    blocks = list(result.scalars())
+    if not blocks:
+        return []
+
+    low = min(block.range_start for block in blocks)
+    high = max(block.range_end for block in blocks)
+    result = await db.execute(
+        select(Invoice.invoice_track, Invoice.invoice_no).where(
+            Invoice.invoice_track.in_({block.prefix for block in blocks}),
+            Invoice.invoice_no >= str(low).zfill(8),
+            Invoice.invoice_no <= str(high).zfill(8),
+        )
+    )
+    used = {(track, int(number)) for track, number in result}
+
+    ranges: List[Dict[str, Any]] = []
+    for block in blocks:
+        start = None
+        for number in range(block.range_start, block.range_end + 2):
+            blank = number <= block.range_end and (block.prefix, number) not in used
+            if blank and start is None:
+                start = number
+            elif not blank and start is not None:
+                ranges.append(
+                    {
+                        "prefix": block.prefix,
+                        "range_start": start,
+                        "range_end": number - 1,
+                        "count": number - start,
+                    }
+                )
+                start = None
+    return ranges
+
+
+async def forecast_exhaustion(
+    db: AsyncSession, year_month: Optional[str] = None, now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Predict when each active sequence of a period runs out
+
+    The daily usage rate is the numbers reserved over the last
+    ``FORECAST_WINDOW`` (or since the first block, if more recent).
+
+    Returns:
+        One entry per sequence with usage, daily rate, days remaining,
+        predicted exhaustion time and whether it needs an alert
+    """
+    now = now or datetime.now()
+    year_month = year_month or now.strftime("%Y%m")
+
+    result = await db.execute(
+        select(InvoiceSequence)
+        .where(
+            InvoiceSequence.year_month == year_month,
+            InvoiceSequence.is_active.is_(True),
+        )
+        .order_by(InvoiceSequence.id)
+    )
+    sequences = list(result.scalars())
+    if not sequences:
+        return []
+
+    result = await db.execute(
+        select(
+            InvoiceNumberBlock.sequence_id,
+            func.sum(InvoiceNumberBlock.range_end - InvoiceNumberBlock.range_start + 1),
+            func.min(InvoiceNumberBlock.allocated_at),
+        )
+        .where(
+            InvoiceNumberBlock.sequence_id.in_([s.id for s in sequences]),
+            InvoiceNumberBlock.allocated_at >= now - FORECAST_WINDOW,
+        )
+        .group_by(InvoiceNumberBlock.sequence_id)
+    )
+    recent = {sequence_id: (used, first) for sequence_id, used, first in result}
+
+    forecasts = []
+    for sequence in sequences:
+        available = max(sequence.available_count, 0)
+        used, first = recent.get(sequence.id, (0, None))
+        elapsed_days = max((now - first).total_seconds() / 86400, 1.0) if first else 0
+        daily_usage = used / elapsed_days if elapsed_days else 0.0
+        days_remaining = available / daily_usage if daily_usage else None
+
+        forecasts.append(
+            {
+                "year_month": sequence.year_month,
+                "prefix": sequence.prefix,
+                "available": available,
+                "usage_percentage": round(sequence.usage_percentage, 1),
+                "daily_usage": round(daily_usage, 1),
+                "days_remaining": (
+                    round(days_remaining, 1) if days_remaining is not None else None
+                ),
+                "exhausts_at": (
+                    (now + timedelta(days=days_remaining)).isoformat()
+                    if days_remaining is not None
+                    else None
+                ),
+                "alert": sequence.usage_percentage >= USAGE_WARNING_PERCENTAGE
+                or (
+                    days_remaining is not None
+                    and days_remaining <= EXHAUSTION_WARNING_DAYS
+                ),
+            }
+        )
+    return forecasts
+
+
+async def check_invoice_sequences() -> List[Dict[str, Any]]:
+    """
+    Exhaustion alert job entry point (``python manage.py check-invoice-sequences``)
+
+    Logs and publishes an alert for every sequence running low.
+    """
+    from app.core.database_async import get_async_session
+    from app.services.websocket_service import EventType, websocket_manager
+
+    async for session in get_async_session():
+        forecasts = await forecast_exhaustion(session)
+
+    alerts = [forecast for forecast in forecasts if forecast["alert"]]
+    for forecast in alerts:
+        logger.warning(
+            f"Invoice sequence {forecast['year_month']}-{forecast['prefix']} running low: "
+            f"{forecast['available']} numbers left, "
+            f"{forecast['days_remaining']} days at {forecast['daily_usage']}/day"
+        )
+        try:
+            await websocket_manager.publish_event(
+                "invoices",
+                {"type": EventType.INVOICE_SEQUENCE_ALERT.value, **forecast},
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish invoice sequence alert: {e}")
+    return alerts
+
+
+# Process-wide allocator (one set of blocks per worker process)
+_allocator: Optional[InvoiceNumberAllocator] = None
+
+
+def get_invoice_number_allocator() -> InvoiceNumberAllocator:
+    """Get the worker's invoice number allocator"""
+    global _allocator
+    if _allocator is None:
+        _allocator = InvoiceNumberAllocator()
+    return _allocator
+
+
+async def close_invoice_number_allocator() -> None:
+    """Hand back the worker's unused numbers (app / worker shutdown)"""
+    global _allocator
+    if _allocator is not None:
+        allocator, _allocator = _allocator, None
+        await allocator.release()
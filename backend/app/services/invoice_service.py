@@ -5,9 +5,9 @@ Invoice service for business logic
 import random
 import string
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from sqlalchemy import and_, desc, select
+from sqlalchemy import and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -18,6 +18,8 @@ from app.models import (
     InvoiceStatus,
 )
 from app.schemas.invoice import InvoiceCreate, InvoiceStats, InvoiceUpdate
+from app.services.customer_ledger_service import CustomerLedgerService, invoice_exposure
+from app.services.invoice_number_allocator import get_invoice_number_allocator
 
 
 class InvoiceService:
@@ -25,42 +27,27 @@ class InvoiceService:
 
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.ledger = CustomerLedgerService(db)
 
     async def generate_invoice_number(self, invoice_date: date) -> Dict[str, str]:
-        """Generate unique invoice number for Taiwan e - invoice format"""
-        # Get current period
-        period = invoice_date.strftime("%Y % m")
+        """
+        Generate unique invoice number for Taiwan e - invoice format
 
-        # For production, these would come from government allocation
-        # For now, use test prefixes
-        tracks = ["AB", "CD", "EF", "GH"]
-        track = random.choice(tracks)
+        Raises:
+            ValueError: If no active invoice sequence covers the period
+        """
+        period = invoice_date.strftime("%Y%m")
 
-        # Find the last invoice number for this track and period
-        query = (
-            select(Invoice)
-            .where(and_(Invoice.invoice_track == track, Invoice.period == period))
-            .order_by(desc(Invoice.invoice_no))
-        )
-
-        result = await self.db.execute(query)
-        last_invoice = result.scalar_one_or_none()
-
-        if last_invoice:
-            # Increment the number
-            last_no = int(last_invoice.invoice_no)
-            new_no = str(last_no + 1).zfill(8)
-        else:
-            # Start from 00000001
-            new_no = "00000001"
+        # Next number from the government-allocated ranges for the period
+        invoice_number = await get_invoice_number_allocator().next_number(period)
 
         # Generate random code (4 digits)
         random_code = "".join(random.choices(string.digits, k=4))
 
         return {
-            "invoice_number": f"{track}{new_no}",
-            "invoice_track": track,
-            "invoice_no": new_no,
+            "invoice_number": invoice_number,
+            "invoice_track": invoice_number[:2],
+            "invoice_no": invoice_number[2:],
             "random_code": random_code,
             "period": period,
         }
@@ -121,6 +108,7 @@ class InvoiceService:
     ) -> Invoice:
         """Update an invoice"""
         invoice = await self.db.get(Invoice, invoice_id)
+        previous_exposure = invoice_exposure(invoice)
 
         # Update fields
         update_data = invoice_update.model_dump(exclude_unset=True, exclude={"items"})
@@ -140,6 +128,7 @@ class InvoiceService:
                 self.db.add(item)
 
         invoice.updated_at = datetime.now()
+        await self.ledger.record_invoice_change(invoice, previous_exposure)
         await self.db.commit()
         await self.db.refresh(invoice)
 
@@ -153,14 +142,23 @@ class InvoiceService:
             options=[selectinload(Invoice.items), selectinload(Invoice.customer)],
         )
 
+        # Submit to e - invoice platform
+        result = await einvoice_service.submit_invoice(invoice)
+
+        await self._apply_issue_result(invoice, result)
+        await self.db.commit()
+        await self.db.refresh(invoice)
+
+        return invoice
+
+    async def _apply_issue_result(self, invoice: Invoice, result: Dict[str, Any]) -> None:
+        """Mark a submitted invoice as issued"""
         # Generate QR codes and barcode
         qr_left, qr_right = self._generate_qr_codes(invoice)
         barcode = self._generate_barcode(invoice)
 
-        # Submit to e - invoice platform
-        result = await einvoice_service.submit_invoice(invoice)
-
         # Update invoice
+        previous_exposure = invoice_exposure(invoice)
         invoice.status = InvoiceStatus.ISSUED
         invoice.einvoice_id = result.get("einvoice_id")
         invoice.qr_code_left = qr_left
@@ -169,10 +167,8 @@ class InvoiceService:
         invoice.submitted_at = datetime.now()
         invoice.submission_response = result
 
-        await self.db.commit()
-        await self.db.refresh(invoice)
-
-        return invoice
+        # Issued invoices become receivables
+        await self.ledger.record_invoice_change(invoice, previous_exposure)
 
     async def void_invoice(
         self, invoice_id: int, reason: str, einvoice_service: Any
@@ -186,11 +182,13 @@ class InvoiceService:
         )
 
         # Update invoice
+        previous_exposure = invoice_exposure(invoice)
         invoice.status = InvoiceStatus.VOID
         invoice.void_reason = reason
         invoice.void_date = date.today()
         invoice.payment_status = InvoicePaymentStatus.CANCELLED
 
+        await self.ledger.record_invoice_change(invoice, previous_exposure)
         await self.db.commit()
         await self.db.refresh(invoice)
 
@@ -265,21 +263,76 @@ class InvoiceService:
 
         return InvoiceStats(**stats)
 
+    async def iter_bulk_issue(
+        self,
+        invoice_ids: List[int],
+        einvoice_service: Any,
+        max_in_flight: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Issue invoices concurrently, yielding each invoice's result
+
+        Invoices are loaded with one query and submitted to the platform
+        concurrently (see ``EInvoiceService.submit_invoices``). Results are
+        written back one at a time, as they arrive, because the session is
+        not safe for concurrent use; each issued invoice is committed
+        immediately so a platform-accepted invoice is never lost.
+
+        Yields:
+            {"invoice_id", "status": "success" | "failed", "einvoice_id" | "error"}
+        """
+        result = await self.db.execute(
+            select(Invoice)
+            .where(Invoice.id.in_(invoice_ids))
+            .options(selectinload(Invoice.items), selectinload(Invoice.customer))
+        )
+        invoices = {invoice.id: invoice for invoice in result.scalars()}
+
+        for invoice_id in invoice_ids:
+            if invoice_id not in invoices:
+                yield {"invoice_id": invoice_id, "status": "failed", "error": "發票不存在"}
+
+        async for invoice, response, error in einvoice_service.submit_invoices(
+            list(invoices.values()), max_in_flight
+        ):
+            if error is None:
+                try:
+                    await self._apply_issue_result(invoice, response)
+                    await self.db.commit()
+                except Exception as e:
+                    await self.db.rollback()
+                    error = e
+
+            if error is None:
+                yield {
+                    "invoice_id": invoice.id,
+                    "status": "success",
+                    "einvoice_id": invoice.einvoice_id,
+                }
+            else:
+                yield {"invoice_id": invoice.id, "status": "failed", "error": str(error)}
+
     async def bulk_issue_invoices(
-        self, invoice_ids: List[int], einvoice_service: Any
+        self,
+        invoice_ids: List[int],
+        einvoice_service: Any,
+        max_in_flight: Optional[int] = None,
     ) -> Dict[str, Any]:
         """Bulk issue invoices"""
         success_count = 0
         failed_count = 0
         errors = []
 
-        for invoice_id in invoice_ids:
-            try:
-                await self.issue_invoice(invoice_id, einvoice_service)
+        async for outcome in self.iter_bulk_issue(
+            invoice_ids, einvoice_service, max_in_flight
+        ):
+            if outcome["status"] == "success":
                 success_count += 1
-            except Exception as e:
+            else:
                 failed_count += 1
-                errors.append({"invoice_id": invoice_id, "error": str(e)})
+                errors.append(
+                    {"invoice_id": outcome["invoice_id"], "error": outcome["error"]}
+                )
 
         return {
             "success_count": success_count,
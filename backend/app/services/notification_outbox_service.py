@@ -0,0 +1,350 @@
+"""
+Notification outbox
+
+Request handlers never talk to SMS gateways or SMTP servers. They insert
+``NotificationOutbox`` rows, preferably in the same transaction as the change
+that triggers the notification, and return. Outbox workers claim due rows in
+batches with ``SELECT ... FOR UPDATE SKIP LOCKED`` and a short lease, deliver
+them with per-channel concurrency limits (SMS through the provider batch
+endpoints, email over pooled SMTP sessions) and reschedule failures with
+exponential backoff until ``max_attempts`` is reached.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.notification import NotificationChannel, NotificationOutbox, OutboxStatus
+from app.services.notification_service import NotificationService
+from app.services.template_registry import sms_template_registry
+
+logger = logging.getLogger(__name__)
+
+# Entries claimed per transaction
+OUTBOX_BATCH_SIZE = 200
+
+# Seconds between sweeps of the long-running worker
+OUTBOX_POLL_INTERVAL = 5
+
+# A claimed entry is handed to another worker if not settled within the lease
+OUTBOX_LEASE = timedelta(minutes=5)
+
+# Retry backoff: base * 2^(attempt - 1), capped
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(hours=1)
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Deliveries in flight per channel (SMS: provider batch requests)
+DEFAULT_CHANNEL_LIMITS = {
+    NotificationChannel.SMS: 5,
+    NotificationChannel.EMAIL: 5,
+    NotificationChannel.PUSH: 20,
+    NotificationChannel.IN_APP: 50,
+}
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next attempt after ``attempts`` failed ones"""
+    return min(RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), RETRY_MAX_DELAY)
+
+
+async def _default_session_factory() -> AsyncIterator[AsyncSession]:
+    from app.core.database_async import get_async_session
+
+    async for session in get_async_session():
+        yield session
+
+
+async def enqueue_notifications(
+    notifications: List[Dict[str, Any]],
+    db: Optional[AsyncSession] = None,
+) -> int:
+    """
+    Queue notifications for the outbox workers
+
+    Args:
+        notifications: Dicts with ``channel``, ``recipient``,
+            ``notification_type`` and ``payload``
+        db: Session of the calling request. The rows join its transaction
+            and are committed with it; without a session they are committed
+            right away in a session of their own.
+
+    Returns:
+        Number of queued notifications
+    """
+    if not notifications:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "channel": NotificationChannel(notification["channel"]),
+            "recipient": str(notification["recipient"]),
+            "notification_type": notification["notification_type"],
+            "payload": notification.get("payload") or {},
+            "status": OutboxStatus.PENDING,
+            "attempts": 0,
+            "max_attempts": notification.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            "next_attempt_at": notification.get("send_at") or now,
+        }
+        for notification in notifications
+    ]
+
+    if db is not None:
+        await db.execute(insert(NotificationOutbox), rows)
+        return len(rows)
+
+    async for session in _default_session_factory():
+        await session.execute(insert(NotificationOutbox), rows)
+        await session.commit()
+    return len(rows)
+
+
+class NotificationOutboxWorker:
+    """Delivers due outbox entries"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncIterator[AsyncSession]] = _default_session_factory,
+        notifier: Optional[NotificationService] = None,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        channel_limits: Optional[Dict[NotificationChannel, int]] = None,
+        worker_id: Optional[str] = None,
+    ):
+        self.session_factory = session_factory
+        self._notifier = notifier
+        self.batch_size = batch_size
+        self.channel_limits = {**DEFAULT_CHANNEL_LIMITS, **(channel_limits or {})}
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._semaphores: Dict[NotificationChannel, asyncio.Semaphore] = {}
+
+    @property
+    def notifier(self) -> NotificationService:
+        if self._notifier is None:
+            from app.services.notification_service import notification_service
+
+            self._notifier = notification_service
+        return self._notifier
+
+    def _semaphore(self, channel: NotificationChannel) -> asyncio.Semaphore:
+        if channel not in self._semaphores:
+            self._semaphores[channel] = asyncio.Semaphore(self.channel_limits[channel])
+        return self._semaphores[channel]
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Deliver every entry due at ``now``, one batch at a time
+
+        Returns:
+            Entries claimed, sent, rescheduled for retry and given up on
+        """
+        now = now or datetime.utcnow()
+        stats = {"claimed": 0, "sent": 0, "retried": 0, "failed": 0}
+
+        async for session in self.session_factory():
+            while True:
+                try:
+                    batch = await self._run_batch(session, now)
+                except Exception as e:
+                    # Claimed entries are picked up again once their lease expires
+                    await session.rollback()
+                    logger.error(f"Notification outbox batch failed: {e}")
+                    break
+
+                for key, value in batch.items():
+                    stats[key] += value
+                if batch["claimed"] < self.batch_size:
+                    break
+
+            # Template statistics buffered by this run's sends
+            try:
+                await sms_template_registry.flush_stats(session)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Template stats flush failed: {e}")
+
+        if stats["claimed"]:
+            logger.info(f"Notification outbox run: {stats}")
+        return stats
+
+    async def run_forever(self, poll_interval: int = OUTBOX_POLL_INTERVAL) -> None:
+        """Long-running worker loop"""
+        try:
+            while True:
+                try:
+                    await self.run_once()
+                except Exception as e:
+                    logger.error(f"Notification outbox run failed: {e}")
+                await asyncio.sleep(poll_interval)
+        finally:
+            await self.notifier.smtp_pool.close()
+
+    async def _claim(self, session: AsyncSession, now: datetime) -> List[NotificationOutbox]:
+        """Lease a batch of due entries; rows locked elsewhere are skipped"""
+        result = await session.execute(
+            select(NotificationOutbox)
+            .where(
+                or_(
+                    and_(
+                        NotificationOutbox.status == OutboxStatus.PENDING,
+                        NotificationOutbox.next_attempt_at <= now,
+                    ),
+                    # Lease of a crashed worker expired
+                    and_(
+                        NotificationOutbox.status == OutboxStatus.PROCESSING,
+                        NotificationOutbox.locked_until <= now,
+                    ),
+                )
+            )
+            .order_by(NotificationOutbox.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        entries = list(result.scalars())
+
+        for entry in entries:
+            entry.status = OutboxStatus.PROCESSING
+            entry.attempts += 1
+            entry.locked_by = self.worker_id
+            entry.locked_until = now + OUTBOX_LEASE
+        # Release the row locks while delivering; the lease keeps others off
+        await session.commit()
+        return entries
+
+    async def _run_batch(self, session: AsyncSession, now: datetime) -> Dict[str, int]:
+        entries = await self._claim(session, now)
+        stats = {"claimed": len(entries), "sent": 0, "retried": 0, "failed": 0}
+        if not entries:
+            return stats
+
+        errors = await self._deliver(session, entries)
+
+        settled_at = datetime.utcnow()
+        for entry in entries:
+            error = errors.get(entry.id)
+            entry.locked_by = None
+            entry.locked_until = None
+            if error is None:
+                entry.status = OutboxStatus.SENT
+                entry.sent_at = settled_at
+                entry.last_error = None
+                stats["sent"] += 1
+            elif entry.attempts >= entry.max_attempts:
+                entry.status = OutboxStatus.FAILED
+                entry.last_error = error
+                stats["failed"] += 1
+                logger.error(
+                    f"Giving up on {entry.channel.value} notification to "
+                    f"{entry.recipient} after {entry.attempts} attempts: {error}"
+                )
+            else:
+                entry.status = OutboxStatus.PENDING
+                entry.next_attempt_at = settled_at + retry_delay(entry.attempts)
+                entry.last_error = error
+                stats["retried"] += 1
+        await session.commit()
+        return stats
+
+    async def _deliver(
+        self, session: AsyncSession, entries: List[NotificationOutbox]
+    ) -> Dict[Any, str]:
+        """Send a batch; returns the error of every entry that failed"""
+        errors: Dict[Any, str] = {}
+
+        sms_groups: Dict[str, List[NotificationOutbox]] = defaultdict(list)
+        single = []
+        for entry in entries:
+            if entry.channel == NotificationChannel.SMS:
+                sms_groups[entry.notification_type].append(entry)
+            else:
+                single.append(entry)
+
+        async def send_sms_groups() -> None:
+            # One bulk send per message type; they share the session, so in turn
+            for notification_type, group in sms_groups.items():
+                errors.update(await self._send_sms_group(session, notification_type, group))
+
+        async def send_one(entry: NotificationOutbox) -> None:
+            async with self._semaphore(entry.channel):
+                try:
+                    await self.notifier.send_notification(
+                        entry.recipient,
+                        entry.notification_type,
+                        entry.channel.value,
+                        entry.payload,
+                    )
+                except Exception as e:
+                    errors[entry.id] = str(e) or type(e).__name__
+
+        await asyncio.gather(send_sms_groups(), *(send_one(entry) for entry in single))
+        return errors
+
+    async def _send_sms_group(
+        self,
+        session: AsyncSession,
+        notification_type: str,
+        entries: List[NotificationOutbox],
+    ) -> Dict[Any, str]:
+        """Send same-type SMS entries through the provider batch endpoints"""
+        from app.services.sms_service import enhanced_sms_service
+
+        errors: Dict[Any, str] = {}
+        recipients = []
+        sendable = []
+        for entry in entries:
+            try:
+                message = self.notifier.render_sms(notification_type, entry.payload)
+            except (KeyError, IndexError, ValueError) as e:
+                errors[entry.id] = f"SMS template error: {e}"
+                continue
+            sendable.append(entry)
+            recipients.append(
+                {
+                    "phone": entry.recipient,
+                    "message": message,
+                    "metadata": {
+                        "notification_type": notification_type,
+                        "order_id": entry.payload.get("order_number"),
+                        "customer_id": entry.payload.get("customer_id"),
+                        "outbox_id": str(entry.id),
+                    },
+                }
+            )
+
+        if not sendable:
+            return errors
+
+        try:
+            result = await enhanced_sms_service.send_bulk_sms(
+                recipients=recipients,
+                message_type=notification_type,
+                db=session,
+                max_concurrent_requests=self.channel_limits[NotificationChannel.SMS],
+            )
+        except Exception as e:
+            logger.error(f"Outbox SMS batch failed: {e}")
+            errors.update({entry.id: str(e) for entry in sendable})
+            return errors
+
+        # Bulk results report failures by recipient index; several entries
+        # may share a phone number
+        for error in result["errors"]:
+            errors[sendable[error["index"]].id] = error["error"]
+        return errors
+
+
+async def run_notification_worker() -> Dict[str, int]:
+    """Worker entry point (``python manage.py notification-worker``)"""
+    worker = NotificationOutboxWorker()
+    try:
+        return await worker.run_once()
+    finally:
+        await worker.notifier.smtp_pool.close()
@@ -4,16 +4,33 @@ import smtplib
 from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.services.template_registry import EmailTemplateCache
 
 # from app.services.message_queue_service import message_queue, QueuePriority  # Removed during compaction
 
 logger = logging.getLogger(__name__)
 
+# Email body for notification types without a template file
+DEFAULT_EMAIL_TEMPLATE = """
+<html>
+    <body style="font - family: Arial, sans - serif;">
+        <h2>{{ subject }}</h2>
+        <p>{{ message | default('您有一則新通知') }}</p>
+        <hr>
+        <p style="color: #666; font - size: 12px;">
+            此為系統自動發送的郵件，請勿直接回覆。<br>
+            如有任何問題，請聯繫客服：0800 - 123 - 456
+        </p>
+    </body>
+</html>
+"""
+
 
 class NotificationType:
     """Notification types"""
@@ -37,6 +54,87 @@ class NotificationChannel:
     IN_APP = "in_app"
 
 
+class SMTPConnectionPool:
+    """
+    Authenticated SMTP sessions reused across emails
+
+    At most ``size`` sessions exist; each is connected (STARTTLS + login) on
+    first use and returned to the pool after every message. A session the
+    server has dropped while idle is replaced transparently.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        size: int = 5,
+        timeout: float = 30,
+        smtp_factory: Callable[..., smtplib.SMTP] = smtplib.SMTP,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory
+        self._idle: List[smtplib.SMTP] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def send(self, msg: MIMEMultipart) -> None:
+        """Send one message on a pooled session"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+
+        async with self._slots:
+            server = self._idle.pop() if self._idle else None
+            loop = asyncio.get_running_loop()
+            server = await loop.run_in_executor(None, self._send_sync, server, msg)
+            self._idle.append(server)
+
+    async def close(self) -> None:
+        """Quit every idle session"""
+        idle, self._idle = self._idle, []
+        loop = asyncio.get_running_loop()
+        for server in idle:
+            await loop.run_in_executor(None, self._quit, server)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        if self.user and self.password:
+            server.starttls()
+            server.login(self.user, self.password)
+        return server
+
+    def _send_sync(
+        self, server: Optional[smtplib.SMTP], msg: MIMEMultipart
+    ) -> smtplib.SMTP:
+        """Send on ``server`` (connecting if needed); returns the live session"""
+        try:
+            if server is None:
+                server = self._connect()
+            try:
+                server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Idle session timed out on the server side
+                server = self._connect()
+                server.send_message(msg)
+            return server
+        except Exception:
+            if server is not None:
+                self._quit(server)
+            raise
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+
 class NotificationService:
     """Service for sending notifications via SMS, Email, and other channels"""
 
@@ -53,11 +151,23 @@ class NotificationService:
         self.smtp_user = settings.SMTP_USER
         self.smtp_password = settings.SMTP_PASSWORD
         self.email_from = settings.EMAIL_FROM or "noreply@luckygas.com.tw"
+        self.smtp_pool = SMTPConnectionPool(
+            self.smtp_host,
+            self.smtp_port,
+            self.smtp_user,
+            self.smtp_password,
+            size=settings.SMTP_POOL_SIZE,
+        )
 
         # Template engine for email
         self.template_env = Environment(
             loader=FileSystemLoader("app / templates / email"),
             autoescape=select_autoescape(["html", "xml"]),
+            # Templates are compiled once per process
+            auto_reload=False,
+        )
+        self.email_templates = EmailTemplateCache(
+            self.template_env, DEFAULT_EMAIL_TEMPLATE
         )
 
         # SMS templates (Traditional Chinese)
@@ -107,6 +217,11 @@ class NotificationService:
 
             raise
 
+    def render_sms(self, notification_type: str, data: Dict[str, Any]) -> str:
+        """Format the SMS template of a notification type"""
+        template = self.sms_templates.get(notification_type, "")
+        return template.format(**data)
+
     async def _send_sms(
         self, phone_number: str, notification_type: str, data: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -114,8 +229,7 @@ class NotificationService:
         from app.services.sms_service import enhanced_sms_service
 
         # Get template and format message
-        template = self.sms_templates.get(notification_type, "")
-        message = template.format(**data)
+        message = self.render_sms(notification_type, data)
 
         # Use enhanced SMS service
         result = await enhanced_sms_service.send_sms(
@@ -145,7 +259,22 @@ class NotificationService:
     async def _send_email(
         self, email_address: str, notification_type: str, data: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Send email notification"""
+        """Send email notification over a pooled SMTP session"""
+        msg = self._build_email(email_address, notification_type, data)
+
+        try:
+            await self.smtp_pool.send(msg)
+        except Exception as e:
+            logger.error(f"Email send failed: {e}")
+            raise
+
+        logger.info(f"Email sent successfully to {email_address}")
+        return {"success": True, "channel": NotificationChannel.EMAIL}
+
+    def _build_email(
+        self, email_address: str, notification_type: str, data: Dict[str, Any]
+    ) -> MIMEMultipart:
+        """Render the email message of a notification"""
 
         # Email subjects in Traditional Chinese
         subjects = {
@@ -160,28 +289,9 @@ class NotificationService:
 
         subject = subjects.get(notification_type, "幸福氣通知")
 
-        # Load email template
-        try:
-            template = self.template_env.get_template(f"{notification_type}.html")
-            html_content = template.render(**data)
-        except Exception:
-            logger.warning(
-                f"Email template not found for {notification_type}, using default"
-            )
-            # Use default template
-            html_content = """
-            <html>
-                <body style="font - family: Arial, sans - serif;">
-                    <h2>{subject}</h2>
-                    <p>{data.get('message', '您有一則新通知')}</p>
-                    <hr>
-                    <p style="color: #666; font - size: 12px;">
-                        此為系統自動發送的郵件，請勿直接回覆。<br>
-                        如有任何問題，請聯繫客服：0800 - 123 - 456
-                    </p>
-                </body>
-            </html>
-            """
+        # Compiled template (or the default one) from the cache
+        template = self.email_templates.get(notification_type)
+        html_content = template.render({"subject": subject, **data})
 
         # Create message
         msg = MIMEMultipart("alternative")
@@ -192,29 +302,7 @@ class NotificationService:
         # Attach HTML content
         msg.attach(MIMEText(html_content, "html", "utf - 8"))
 
-        # Send email
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None, self._send_email_sync, msg, email_address
-        )
-
-        return result
-
-    def _send_email_sync(self, msg: MIMEMultipart, recipient: str) -> Dict[str, Any]:
-        """Synchronous email sending (for executor)"""
-        try:
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                if self.smtp_user and self.smtp_password:
-                    server.starttls()
-                    server.login(self.smtp_user, self.smtp_password)
-
-                server.send_message(msg)
-
-            logger.info(f"Email sent successfully to {recipient}")
-            return {"success": True, "channel": NotificationChannel.EMAIL}
-        except Exception as e:
-            logger.error(f"Email send failed: {e}")
-            raise
+        return msg
 
     async def _send_push_notification(
         self, user_id: str, notification_type: str, data: Dict[str, Any]
@@ -248,8 +336,20 @@ class NotificationService:
 
         return {"success": True, "channel": NotificationChannel.IN_APP}
 
-    async def send_order_notifications(self, order: Dict[str, Any], event_type: str):
-        """Send notifications for order events"""
+    async def send_order_notifications(
+        self,
+        order: Dict[str, Any],
+        event_type: str,
+        db: Optional[AsyncSession] = None,
+    ) -> int:
+        """
+        Queue notifications for order events
+
+        The outbox workers deliver them; pass the request's ``db`` so they are
+        committed together with the order change.
+        """
+        from app.services.notification_outbox_service import enqueue_notifications
+
         customer_phone = order.get("customer_phone")
         customer_email = order.get("customer_email")
         customer_id = order.get("customer_id")
@@ -263,43 +363,42 @@ class NotificationService:
             "amount": order.get("total_amount", 0),
         }
 
-        # Send SMS if phone available
-        if customer_phone:
-            await self.send_notification(
-                customer_phone,
-                event_type,
-                NotificationChannel.SMS,
-                notification_data,
-            )
-
-        # Send email if available
-        if customer_email:
-            await self.send_notification(
-                customer_email,
-                event_type,
-                NotificationChannel.EMAIL,
-                notification_data,
-            )
-
-        # Send in - app notification
-        if customer_id:
-            await self.send_notification(
-                customer_id,
-                event_type,
-                NotificationChannel.IN_APP,
-                notification_data,
+        notifications = [
+            {
+                "channel": channel,
+                "recipient": recipient,
+                "notification_type": event_type,
+                "payload": notification_data,
+            }
+            for channel, recipient in (
+                (NotificationChannel.SMS, customer_phone),
+                (NotificationChannel.EMAIL, customer_email),
+                (NotificationChannel.IN_APP, customer_id),
             )
+            if recipient
+        ]
+        return await enqueue_notifications(notifications, db=db)
 
     async def send_driver_notification(
-        self, driver_id: str, notification_type: str, data: Dict[str, Any]
-    ):
-        """Send notification to driver"""
-        # Send in - app notification to driver
-        await self.send_notification(
-            driver_id,
-            notification_type,
-            NotificationChannel.IN_APP,
-            data
+        self,
+        driver_id: str,
+        notification_type: str,
+        data: Dict[str, Any],
+        db: Optional[AsyncSession] = None,
+    ) -> int:
+        """Queue an in - app notification to a driver"""
+        from app.services.notification_outbox_service import enqueue_notifications
+
+        return await enqueue_notifications(
+            [
+                {
+                    "channel": NotificationChannel.IN_APP,
+                    "recipient": driver_id,
+                    "notification_type": notification_type,
+                    "payload": data,
+                }
+            ],
+            db=db,
         )
 
     async def send_bulk_notifications(
@@ -308,35 +407,37 @@ class NotificationService:
         notification_type: str,
         data: Dict[str, Any],
         channels: List[str] = None,
-    ):
-        """Send notifications to multiple recipients"""
+        db: Optional[AsyncSession] = None,
+    ) -> Dict[str, int]:
+        """
+        Queue notifications to multiple recipients
+
+        Returns immediately; the outbox workers send them in provider batches
+        with bounded concurrency.
+        """
+        from app.services.notification_outbox_service import enqueue_notifications
+
         if channels is None:
             channels = [NotificationChannel.SMS, NotificationChannel.EMAIL]
 
-        tasks = []
-        for recipient in recipients:
-            for channel in channels:
-                if channel == NotificationChannel.SMS and recipient.get("phone"):
-                    tasks.append(
-                        self.send_notification(
-                            recipient["phone"], notification_type, channel, data
-                        )
-                    )
-                elif channel == NotificationChannel.EMAIL and recipient.get("email"):
-                    tasks.append(
-                        self.send_notification(
-                            recipient["email"], notification_type, channel, data
-                        )
-                    )
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        success_count = sum(
-            1 for r in results if isinstance(r, dict) and r.get("success")
-        )
-        error_count = sum(1 for r in results if isinstance(r, Exception))
+        address_keys = {
+            NotificationChannel.SMS: "phone",
+            NotificationChannel.EMAIL: "email",
+        }
+        notifications = [
+            {
+                "channel": channel,
+                "recipient": recipient[address_keys[channel]],
+                "notification_type": notification_type,
+                "payload": data,
+            }
+            for recipient in recipients
+            for channel in channels
+            if channel in address_keys and recipient.get(address_keys[channel])
+        ]
 
-        return {"total": len(results), "success": success_count, "errors": error_count}
+        queued = await enqueue_notifications(notifications, db=db)
+        return {"total": queued, "queued": queued}
 
 
 # Singleton instance
@@ -0,0 +1,247 @@
+"""
+Batch order engine
+
+Creates many orders (bulk entry, recurring templates) as one set operation:
+- customers validated with one query
+- every order priced in a single vectorized pass
+- credit checked once per customer for the total of that customer's orders
+- orders written with one multi-row INSERT ... RETURNING
+- analytics rollups, customer balances, caches and websocket listeners
+  updated once per batch
+
+Orders that fail validation or the credit check are reported back and do
+not stop the rest of the batch.
+"""
+
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import orders_created_counter
+from app.models.customer import Customer
+from app.models.order import Order, OrderStatus, PaymentStatus
+from app.repositories.order_repository import OrderRepository
+from app.schemas.order import OrderCreate
+from app.services.analytics_rollup_service import AnalyticsRollupService
+from app.services.credit_service import CreditService
+from app.services.customer_ledger_service import CustomerLedgerService
+from app.services.customer_service import invalidate_delivery_candidates
+from app.services.dashboard_summary_service import invalidate_dashboard_summary
+from app.services.websocket_service import EventType, websocket_manager
+
+logger = logging.getLogger(__name__)
+
+# Base prices per cylinder type (TWD)
+CYLINDER_PRICES = {"50kg": 2500, "20kg": 1200, "16kg": 1000, "10kg": 700, "4kg": 350}
+
+# Volume discount: 5% off for orders over 10,000 TWD
+VOLUME_DISCOUNT_THRESHOLD = 10000
+VOLUME_DISCOUNT_RATE = 0.05
+
+# Urgent order surcharge: 10%
+URGENT_SURCHARGE_RATE = 0.1
+
+QUANTITY_COLUMNS = [f"qty_{size}" for size in CYLINDER_PRICES]
+
+
+def price_orders(quantities: pd.DataFrame) -> pd.DataFrame:
+    """
+    Price many orders at once
+
+    Args:
+        quantities: One row per order with qty_* columns and is_urgent
+
+    Returns:
+        total_amount, discount_amount and final_amount per order
+    """
+    prices = np.array(list(CYLINDER_PRICES.values()), dtype=float)
+    base = quantities[QUANTITY_COLUMNS].fillna(0).to_numpy(dtype=float) @ prices
+
+    # Discount is based on the amount before the urgent surcharge
+    discount = np.where(base > VOLUME_DISCOUNT_THRESHOLD, base * VOLUME_DISCOUNT_RATE, 0.0)
+    urgent = quantities["is_urgent"].fillna(False).to_numpy(dtype=bool)
+    total = np.where(urgent, base * (1 + URGENT_SURCHARGE_RATE), base)
+
+    return pd.DataFrame(
+        {
+            "total_amount": total,
+            "discount_amount": discount,
+            "final_amount": total - discount,
+        },
+        index=quantities.index,
+    )
+
+
+@dataclass
+class BatchOrderResult:
+    """Outcome of a batch: created orders and the rejected inputs"""
+
+    created: List[Order] = field(default_factory=list)
+    # {"index": position in the input, "customer_id": ..., "error": message}
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class OrderBatchService:
+    """Creates orders in bulk with a constant number of round trips"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.order_repo = OrderRepository(session)
+        self.rollups = AnalyticsRollupService(session)
+        self.ledger = CustomerLedgerService(session)
+
+    async def create_orders(
+        self,
+        orders_data: List[OrderCreate],
+        created_by: int,
+        skip_credit_check: bool = False,
+        created_by_role: Optional[str] = None,
+        order_type: str = "bulk",
+    ) -> BatchOrderResult:
+        """
+        Create a batch of orders and commit them together
+
+        Args:
+            orders_data: Orders to create
+            created_by: User ID creating the orders
+            skip_credit_check: Skip credit check (for manager override)
+            created_by_role: Role of user creating the orders
+            order_type: Metrics label (bulk, template, ...)
+
+        Returns:
+            Created orders and per-order errors
+        """
+        result = BatchOrderResult()
+        if not orders_data:
+            return result
+
+        frame = pd.DataFrame([order.model_dump() for order in orders_data])
+        frame = frame.join(price_orders(frame))
+
+        customers = await self._load_customers(frame["customer_id"].unique().tolist())
+        valid = self._reject(
+            frame,
+            ~frame["customer_id"].isin(list(customers)),
+            "客戶不存在",
+            result,
+        )
+        inactive = {cid for cid, customer in customers.items() if customer.is_active is False}
+        valid &= self._reject(frame, frame["customer_id"].isin(inactive), "客戶已停用", result, valid)
+
+        # One credit decision per customer, for all of that customer's orders
+        amounts = frame[valid].groupby("customer_id")["final_amount"].sum()
+        credit = await CreditService.check_credit_limits(
+            self.session,
+            {int(cid): float(amount) for cid, amount in amounts.items()},
+            skip_check=skip_credit_check or created_by_role == "super_admin",
+        )
+        declined = {cid for cid, decision in credit.items() if not decision["approved"]}
+        for cid in declined:
+            logger.warning(f"Credit check failed for customer {cid}: {credit[cid]['reason']}")
+        valid &= self._reject(
+            frame, frame["customer_id"].isin(declined), "信用額度檢查失敗", result, valid
+        )
+
+        rows = self._order_rows(frame[valid], customers)
+        created = await self.order_repo.bulk_create(rows)
+
+        # Fold the new orders into the analytics rollups and customer balances
+        await self.rollups.record_order_changes([(order, None, None) for order in created])
+        await self.ledger.record_order_changes([(order, 0.0) for order in created])
+        await self.session.commit()
+
+        invalidate_dashboard_summary("order.created")
+        invalidate_delivery_candidates("order.created")
+        await self._publish_created(created)
+
+        customer_types = Counter(
+            customers[order.customer_id].customer_type or "regular" for order in created
+        )
+        for customer_type, count in customer_types.items():
+            orders_created_counter.labels(
+                order_type=order_type, customer_type=customer_type
+            ).inc(count)
+
+        logger.info(
+            f"Created {len(created)} orders in bulk ({len(result.errors)} rejected)"
+        )
+        result.created = created
+        return result
+
+    async def _load_customers(self, customer_ids: List[int]) -> Dict[int, Customer]:
+        query = select(Customer).where(Customer.id.in_(customer_ids))
+        customers = await self.session.execute(query)
+        return {customer.id: customer for customer in customers.scalars()}
+
+    @staticmethod
+    def _reject(
+        frame: pd.DataFrame,
+        failing: pd.Series,
+        message: str,
+        result: BatchOrderResult,
+        valid: Optional[pd.Series] = None,
+    ) -> pd.Series:
+        """Record errors for newly failing rows; returns the rows still valid"""
+        if valid is not None:
+            failing = failing & valid
+        for index in frame.index[failing]:
+            result.errors.append(
+                {
+                    "index": int(index),
+                    "customer_id": int(frame.at[index, "customer_id"]),
+                    "error": message,
+                }
+            )
+        return ~failing
+
+    @staticmethod
+    def _order_rows(
+        frame: pd.DataFrame, customers: Dict[int, Customer]
+    ) -> List[Dict[str, Any]]:
+        """Column values for the new orders"""
+        timestamp = datetime.now()
+        prefix = f"ORD-{timestamp:%Y%m%d}-{timestamp.microsecond:06d}"
+        columns = set(Order.__table__.columns.keys())
+
+        rows = []
+        for number, record in enumerate(frame.to_dict("records")):
+            row = {key: value for key, value in record.items() if key in columns}
+            row.update(
+                {
+                    "order_number": f"{prefix}-{number:04d}",
+                    "status": OrderStatus.PENDING,
+                    "payment_status": PaymentStatus.UNPAID,
+                    "total_amount": float(record["total_amount"]),
+                    "discount_amount": float(record["discount_amount"]),
+                    "final_amount": float(record["final_amount"]),
+                }
+            )
+            # Use delivery address from order or customer
+            if not row.get("delivery_address"):
+                row["delivery_address"] = customers[record["customer_id"]].address
+            rows.append(row)
+        return rows
+
+    async def _publish_created(self, orders: List[Order]) -> None:
+        """One websocket event for the whole batch"""
+        if not orders:
+            return
+
+        try:
+            await websocket_manager.publish_event(
+                "orders",
+                {
+                    "type": EventType.ORDER_CREATED.value,
+                    "order_ids": [order.id for order in orders],
+                    "count": len(orders),
+                },
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish bulk order event: {e}")
@@ -5,6 +5,7 @@ Handles order creation, updates, and route assignment
 
 import logging
 from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -17,7 +18,19 @@ from app.core.service_utils import (
 from app.models.order import Order, OrderStatus, PaymentStatus
 from app.repositories.customer_repository import CustomerRepository
 from app.repositories.order_repository import OrderRepository
+from app.services.analytics_rollup_service import AnalyticsRollupService
 from app.services.credit_service import CreditService
+from app.services.customer_ledger_service import CustomerLedgerService, order_exposure
+from app.services.customer_service import invalidate_delivery_candidates
+from app.services.dashboard_summary_service import invalidate_dashboard_summary
+from app.services.order_batch_service import (
+    CYLINDER_PRICES,
+    URGENT_SURCHARGE_RATE,
+    VOLUME_DISCOUNT_RATE,
+    VOLUME_DISCOUNT_THRESHOLD,
+    OrderBatchService,
+)
+from app.services.websocket_service import EventType, websocket_manager
 
 # Removed during compaction
 # from app.api.v1.socketio_handler import notify_order_update, notify_driver_assigned
@@ -38,6 +51,8 @@ class OrderService:
         self.session = session
         self.order_repo = OrderRepository(session)
         self.customer_repo = CustomerRepository(session)
+        self.rollups = AnalyticsRollupService(session)
+        self.ledger = CustomerLedgerService(session)
 
     @handle_service_errors(operation="建立訂單")
     @transactional()
@@ -110,6 +125,12 @@ class OrderService:
 
         order = await self.order_repo.create(**order_dict)
 
+        # Fold the new order into the analytics rollups and customer balance
+        await self.rollups.record_order_change(order)
+        await self.ledger.record_order_change(order)
+        invalidate_dashboard_summary("order.created")
+        invalidate_delivery_candidates("order.created")
+
         # Track metrics
         orders_created_counter.labels(
             order_type="manual", customer_type=customer.customer_type or "regular"
@@ -177,9 +198,45 @@ class OrderService:
             pricing = self._calculate_order_pricing(temp_order_data)
             update_data.update(pricing)
 
+        previous_status = order.status
+        previous_driver_id = order.driver_id
+        previous_amount = order.total_amount
+        previous_is_urgent = order.is_urgent
+        previous_exposure = order_exposure(order)
+        rollup_changed = (
+            "status" in update_data
+            or "driver_id" in update_data
+            or "total_amount" in update_data
+            or "is_urgent" in update_data
+        )
+        # Snapshot items before the update so the old bucket is reversed
+        # with the old figures
+        previous_items = await self.rollups.order_items(order) if rollup_changed else None
+
         # Update order
         updated_order = await self.order_repo.update(order_id, **update_data)
 
+        # Keep analytics rollups in step with status / driver / amount / urgency changes
+        if updated_order and rollup_changed:
+            await self.rollups.record_order_change(
+                updated_order,
+                previous_status,
+                previous_driver_id,
+                previous_amount,
+                previous_items,
+                previous_is_urgent,
+            )
+            invalidate_dashboard_summary("order.updated")
+            invalidate_delivery_candidates("order.updated")
+
+        # Keep the customer balance in step with amount / status / payment changes
+        if updated_order and (
+            "status" in update_data
+            or "payment_status" in update_data
+            or "total_amount" in update_data
+        ):
+            await self.ledger.record_order_change(updated_order, previous_exposure)
+
         # Removed during compaction
         # Notify if status changed
         # if "status" in update_data:
@@ -255,8 +312,15 @@ class OrderService:
             orders=unassigned_orders, drivers=drivers, date=scheduled_date
         )
 
-        # Create routes and assign orders
+        # Remember pre-assignment state for the analytics rollups
+        orders_by_id = {order.id: order for order in unassigned_orders}
+        previous_state = {
+            order.id: (order.status, order.driver_id) for order in unassigned_orders
+        }
+
+        # Create routes and assign orders in one transaction
         assigned_count = 0
+        changes = []
         for route_data in optimized_routes:
             # In production, would create Route records in database
             route_id = route_data["route_number"].split("-")[-1]  # Simplified
@@ -272,6 +336,12 @@ class OrderService:
             )
             assigned_count += count
 
+            for order_id in order_ids:
+                order = orders_by_id.get(order_id)
+                if order is not None:
+                    # The UPDATE above synchronizes the loaded orders
+                    changes.append((order, *previous_state[order_id]))
+
             # Removed during compaction
             # Notify driver
             # await notify_driver_assigned(
@@ -283,6 +353,23 @@ class OrderService:
             #     }
             # )
 
+        await self.rollups.record_order_changes(changes)
+        await self.session.commit()
+        invalidate_dashboard_summary("order.assigned")
+
+        # One event for the whole assignment run
+        try:
+            await websocket_manager.publish_event(
+                "orders",
+                {
+                    "type": EventType.ORDER_ASSIGNED.value,
+                    "order_ids": [order.id for order, _, _ in changes],
+                    "count": assigned_count,
+                },
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish route assignment event: {e}")
+
         logger.info(
             f"Assigned {assigned_count} orders to {len(optimized_routes)} routes"
         )
@@ -330,6 +417,12 @@ class OrderService:
             datetime.utcnow() if order_status == OrderStatus.DELIVERED else None
         )
 
+        existing = await self.order_repo.get(order_id)
+        if not existing:
+            return None
+        previous_status = existing.status
+        previous_exposure = order_exposure(existing)
+
         # Update order
         order = await self.order_repo.update_delivery_status(
             order_id=order_id,
@@ -339,6 +432,15 @@ class OrderService:
         )
 
         if order:
+            # Move the order between rollup buckets and adjust the customer
+            # balance from its final state (a delivered COD order is paid by
+            # the repository); committed with the status update
+            await self.rollups.record_order_change(order, previous_status)
+            await self.ledger.record_order_change(order, previous_exposure)
+
+            invalidate_dashboard_summary("order.updated")
+            invalidate_delivery_candidates("order.updated")
+
             # Removed during compaction
             # Notify updates
             # await notify_order_update(
@@ -354,6 +456,61 @@ class OrderService:
 
         return order
 
+    @staticmethod
+    def snapshot_orders(
+        orders: Iterable[Order],
+    ) -> Dict[int, Tuple[Any, Optional[int], float]]:
+        """
+        Status, driver and balance exposure of loaded orders before an edit
+
+        Take it before setting those fields directly and pass it to
+        ``record_order_edits`` afterwards.
+        """
+        # No driver is 0 here: a None previous driver means "unchanged" to
+        # the rollups
+        return {
+            order.id: (order.status, order.driver_id or 0, order_exposure(order))
+            for order in orders
+        }
+
+    async def record_order_edits(
+        self,
+        orders: Sequence[Order],
+        snapshot: Dict[int, Tuple[Any, Optional[int], float]],
+    ) -> None:
+        """
+        Fold direct edits of loaded orders into the rollups and balances
+
+        For callers that create orders or set their status / driver fields
+        themselves (driver app, route planning, dispatch). Orders missing
+        from ``snapshot`` are treated as new. Runs in the caller's
+        transaction; the caller commits.
+
+        Args:
+            orders: Orders in their new state (flushed if new)
+            snapshot: ``snapshot_orders`` taken before the edit
+        """
+        if not orders:
+            return
+
+        previous = [snapshot.get(order.id, (None, None, 0.0)) for order in orders]
+        await self.rollups.record_order_changes(
+            [
+                (order, previous_status, previous_driver_id)
+                for order, (previous_status, previous_driver_id, _) in zip(
+                    orders, previous
+                )
+            ]
+        )
+        await self.ledger.record_order_changes(
+            [
+                (order, previous_exposure)
+                for order, (_, _, previous_exposure) in zip(orders, previous)
+            ]
+        )
+        invalidate_dashboard_summary("order.updated")
+        invalidate_delivery_candidates("order.updated")
+
     async def get_order_statistics(
         self, start_date: date, end_date: date, area: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -431,27 +588,21 @@ class OrderService:
         Returns:
             Pricing dictionary
         """
-        # Base prices per cylinder type (TWD)
-        prices = {"50kg": 2500, "20kg": 1200, "16kg": 1000, "10kg": 700, "4kg": 350}
-
-        # Calculate total
-        total = 0
-        total += order_data.qty_50kg * prices["50kg"]
-        total += order_data.qty_20kg * prices["20kg"]
-        total += order_data.qty_16kg * prices["16kg"]
-        total += order_data.qty_10kg * prices["10kg"]
-        total += order_data.qty_4kg * prices["4kg"]
+        total = sum(
+            getattr(order_data, f"qty_{size}") * price
+            for size, price in CYLINDER_PRICES.items()
+        )
 
         # Apply discounts
         discount = 0
 
-        # Volume discount: 5% off for orders over 10, 000 TWD
-        if total > 10000:
-            discount = total * 0.05
+        # Volume discount on the amount before any surcharge
+        if total > VOLUME_DISCOUNT_THRESHOLD:
+            discount = total * VOLUME_DISCOUNT_RATE
 
         # Urgent order surcharge
         if order_data.is_urgent:
-            total *= 1.1  # 10% surcharge
+            total *= 1 + URGENT_SURCHARGE_RATE
 
         return {
             "total_amount": total,
@@ -465,31 +616,40 @@ class OrderService:
         return f"ORD-{timestamp.strftime('%Y % m % d')}-{timestamp.microsecond:06d}"
 
     @handle_service_errors(operation="批量建立訂單")
-    @transactional()
     async def create_bulk_orders(
-        self, orders_data: List[OrderCreate], created_by: int
+        self,
+        orders_data: List[OrderCreate],
+        created_by: int,
+        skip_credit_check: bool = False,
+        created_by_role: Optional[str] = None,
     ) -> List[Order]:
         """
-        Create multiple orders efficiently
+        Create multiple orders as one batch
+
+        Orders are priced together, credit is checked once per customer and
+        all orders are inserted in a single statement (see OrderBatchService).
+        Orders that fail validation are logged and skipped.
 
         Args:
             orders_data: List of order creation data
             created_by: User ID creating orders
+            skip_credit_check: Skip credit check (for manager override)
+            created_by_role: Role of user creating orders
 
         Returns:
             List of created orders
         """
-        created_orders = []
-
-        # Process each order
-        for order_data in orders_data:
-            try:
-                order = await self.create_order(order_data, created_by)
-                created_orders.append(order)
-            except Exception as e:
-                logger.error(f"Failed to create order: {e}")
-                # Continue with other orders
+        result = await OrderBatchService(self.session).create_orders(
+            orders_data,
+            created_by,
+            skip_credit_check=skip_credit_check,
+            created_by_role=created_by_role,
+        )
 
-        logger.info(f"Created {len(created_orders)} orders in bulk")
+        for error in result.errors:
+            logger.error(
+                f"Failed to create order #{error['index']} "
+                f"for customer {error['customer_id']}: {error['error']}"
+            )
 
-        return created_orders
+        return result.created
@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 from sqlalchemy import and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -16,6 +17,11 @@ from app.schemas.order_template import (
     OrderTemplateUpdate,
 )
 from app.services.order_service import OrderService
+from app.services.template_scheduler_service import (
+    advance_template,
+    next_occurrence,
+    schedule_template,
+)
 
 logger = get_logger(__name__)
 
@@ -65,12 +71,13 @@ class OrderTemplateService:
 
         # Calculate next scheduled date if recurring
         if template.is_recurring:
-            template.next_scheduled_date = (
+            schedule_template(
+                template,
                 OrderTemplateService._calculate_next_scheduled_date(
                     template.recurrence_pattern,
                     template.recurrence_interval,
                     template.recurrence_days,
-                )
+                ),
             )
 
         db.add(template)
@@ -104,7 +111,7 @@ class OrderTemplateService:
             return None
 
         # Enrich with product details
-        await OrderTemplateService._enrich_product_details(db, template)
+        await OrderTemplateService._enrich_product_details(db, [template])
 
         return template
 
@@ -151,8 +158,7 @@ class OrderTemplateService:
         templates = result.scalars().all()
 
         # Enrich with product details
-        for template in templates:
-            await OrderTemplateService._enrich_product_details(db, template)
+        await OrderTemplateService._enrich_product_details(db, templates)
 
         return {"templates": templates, "total": total, "skip": skip, "limit": limit}
 
@@ -179,15 +185,16 @@ class OrderTemplateService:
         # Recalculate next scheduled date if recurring settings changed
         if "is_recurring" in update_data or "recurrence_pattern" in update_data:
             if template.is_recurring:
-                template.next_scheduled_date = (
+                schedule_template(
+                    template,
                     OrderTemplateService._calculate_next_scheduled_date(
                         template.recurrence_pattern,
                         template.recurrence_interval,
                         template.recurrence_days,
-                    )
+                    ),
                 )
             else:
-                template.next_scheduled_date = None
+                schedule_template(template, None)
 
         await db.commit()
         await db.refresh(template)
@@ -263,14 +270,7 @@ class OrderTemplateService:
 
         # Update next scheduled date if recurring
         if template.is_recurring:
-            template.next_scheduled_date = (
-                OrderTemplateService._calculate_next_scheduled_date(
-                    template.recurrence_pattern,
-                    template.recurrence_interval,
-                    template.recurrence_days,
-                    base_date=template.next_scheduled_date,
-                )
-            )
+            advance_template(template)
 
         await db.commit()
 
@@ -283,12 +283,17 @@ class OrderTemplateService:
     async def get_templates_for_scheduling(
         db: AsyncSession, date: datetime
     ) -> List[OrderTemplate]:
-        """Get templates that need to be scheduled for a specific date"""
+        """
+        Get templates whose next order is due by a specific time
+
+        Served by the next_run_at index; TemplateScheduler is the worker
+        that claims and materializes these.
+        """
         query = select(OrderTemplate).where(
             and_(
                 OrderTemplate.is_active,
                 OrderTemplate.is_recurring,
-                OrderTemplate.next_scheduled_date <= date,
+                OrderTemplate.next_run_at <= date,
             )
         )
 
@@ -303,68 +308,42 @@ class OrderTemplateService:
         base_date: Optional[datetime] = None,
     ) -> datetime:
         """Calculate the next scheduled date for a recurring template"""
-        base = base_date or datetime.now()
-
-        if pattern == "daily":
-            return base + timedelta(days=interval)
-
-        elif pattern == "weekly":
-            if days:
-                # Find next occurrence based on specified days
-                current_weekday = base.weekday() + 1  # 1 - 7 (Mon - Sun)
-                next_days = [d for d in days if d > current_weekday]
-
-                if next_days:
-                    # Next occurrence is in the current week
-                    days_ahead = next_days[0] - current_weekday
-                else:
-                    # Next occurrence is in the next week interval
-                    days_ahead = (7 * interval) - current_weekday + days[0]
-
-                return base + timedelta(days=days_ahead)
-            else:
-                # Same day of week, every N weeks
-                return base + timedelta(weeks=interval)
-
-        elif pattern == "monthly":
-            # Same day of month, every N months
-            month = base.month + interval
-            year = base.year + (month - 1) // 12
-            month = ((month - 1) % 12) + 1
-
-            # Handle day overflow (e.g., Jan 31 -> Feb 28)
-            try:
-                return base.replace(year=year, month=month)
-            except ValueError:
-                # Day doesn't exist in target month, use last day
-                import calendar
-
-                last_day = calendar.monthrange(year, month)[1]
-                return base.replace(year=year, month=month, day=last_day)
-
-        else:
-            # Default to daily
-            return base + timedelta(days=1)
+        return next_occurrence(pattern, interval, days, base_date)
 
     @staticmethod
-    async def _enrich_product_details(db: AsyncSession, template: OrderTemplate):
-        """Enrich template with product details"""
-        product_details = []
-
-        for item in template.products:
-            product = await db.get(GasProduct, item["gas_product_id"])
-            if product:
-                product_details.append(
-                    {
-                        "gas_product_id": product.id,
-                        "product_name": product.display_name,
-                        "product_code": product.product_code,
-                        "quantity": item["quantity"],
-                        "unit_price": item.get("unit_price") or product.unit_price,
-                        "discount_percentage": item.get("discount_percentage", 0),
-                        "is_exchange": item.get("is_exchange", False),
-                        "empty_received": item.get("empty_received", 0),
-                    }
-                )
+    async def _enrich_product_details(
+        db: AsyncSession, templates: List[OrderTemplate]
+    ):
+        """Enrich templates with product details (one product query)"""
+        product_ids = {
+            item["gas_product_id"]
+            for template in templates
+            for item in template.products or []
+        }
+        products = {}
+        if product_ids:
+            result = await db.execute(
+                select(GasProduct).where(GasProduct.id.in_(product_ids))
+            )
+            products = {product.id: product for product in result.scalars()}
+
+        for template in templates:
+            product_details = []
+
+            for item in template.products or []:
+                product = products.get(item["gas_product_id"])
+                if product:
+                    product_details.append(
+                        {
+                            "gas_product_id": product.id,
+                            "product_name": product.display_name,
+                            "product_code": product.sku,
+                            "quantity": item["quantity"],
+                            "unit_price": item.get("unit_price") or product.unit_price,
+                            "discount_percentage": item.get("discount_percentage", 0),
+                            "is_exchange": item.get("is_exchange", False),
+                            "empty_received": item.get("empty_received", 0),
+                        }
+                    )
 
-        template.product_details = product_details
+            template.product_details = product_details
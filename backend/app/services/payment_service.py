@@ -16,6 +16,7 @@ from app.schemas.payment import (
     PaymentStats,
     PaymentUpdate,
 )
+from app.services.customer_ledger_service import CustomerLedgerService, invoice_exposure
 
 
 class PaymentService:
@@ -23,6 +24,7 @@ class PaymentService:
 
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.ledger = CustomerLedgerService(db)
 
     async def generate_payment_number(self) -> str:
         """Generate unique payment number"""
@@ -75,6 +77,7 @@ class PaymentService:
 
         # Update invoice paid amount and payment status
         invoice = await self.db.get(Invoice, payment_data.invoice_id)
+        previous_exposure = invoice_exposure(invoice)
         invoice.paid_amount += payment_data.amount
 
         # Update payment status
@@ -84,6 +87,7 @@ class PaymentService:
         elif invoice.paid_amount > 0:
             invoice.payment_status = InvoicePaymentStatus.PARTIAL
 
+        await self.ledger.record_invoice_change(invoice, previous_exposure)
         await self.db.commit()
         await self.db.refresh(payment)
 
@@ -115,6 +119,7 @@ class PaymentService:
         # If amount changed, update invoice
         if "amount" in update_data and update_data["amount"] != old_amount:
             invoice = payment.invoice
+            previous_exposure = invoice_exposure(invoice)
             amount_diff = update_data["amount"] - old_amount
             invoice.paid_amount += amount_diff
 
@@ -128,6 +133,8 @@ class PaymentService:
                 invoice.payment_status = InvoicePaymentStatus.PENDING
                 invoice.paid_date = None
 
+            await self.ledger.record_invoice_change(invoice, previous_exposure)
+
         await self.db.commit()
         await self.db.refresh(payment)
 
@@ -159,6 +166,7 @@ class PaymentService:
 
         # Update invoice paid amount
         invoice = payment.invoice
+        previous_exposure = invoice_exposure(invoice)
         invoice.paid_amount -= payment.amount
 
         # Update payment status
@@ -168,6 +176,8 @@ class PaymentService:
         elif invoice.paid_amount < invoice.total_amount:
             invoice.payment_status = InvoicePaymentStatus.PARTIAL
 
+        await self.ledger.record_invoice_change(invoice, previous_exposure)
+
         # Delete payment
         await self.db.delete(payment)
         await self.db.commit()
@@ -339,8 +349,14 @@ class PaymentService:
                 else:
                     aging["current"] += outstanding_amount
 
+        # Credit settings live in the customer balance ledger
+        ledger = await self.ledger.get_balance(customer_id)
+        credit_limit = ledger.credit_limit if ledger else None
+
         # Calculate available credit
-        available_credit = customer.credit_limit - outstanding_balance
+        available_credit = (
+            credit_limit - outstanding_balance if credit_limit is not None else None
+        )
 
         balance = {
             "customer_id": customer_id,
@@ -350,9 +366,9 @@ class PaymentService:
             "total_paid": total_paid,
             "outstanding_balance": outstanding_balance,
             **aging,
-            "credit_limit": customer.credit_limit,
+            "credit_limit": credit_limit,
             "available_credit": available_credit,
-            "is_credit_blocked": customer.is_credit_blocked,
+            "is_credit_blocked": bool(ledger and ledger.is_credit_blocked),
             "outstanding_invoice_count": len(outstanding_invoices),
             "oldest_unpaid_date": oldest_unpaid_date,
         }
@@ -0,0 +1,242 @@
+"""
+Set-based bank reconciliation
+
+A parsed reconciliation file is turned into column arrays and matched
+against ``payment_transactions`` with chunked ``IN`` lookups. Transaction
+results and paid invoices are then written with a few bulk UPDATEs instead
+of one query per line: ``UPDATE ... FROM (VALUES ...)`` on PostgreSQL and an
+executemany by primary key elsewhere. Statements scale with the number of
+chunks, not lines, so a file of thousands of lines fits in one short
+transaction.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, DateTime, Integer, String, Text, column, select, update, values
+from sqlalchemy.orm import Session
+
+from app.models.banking import PaymentTransaction, TransactionStatus
+from app.models.invoice import Invoice, InvoicePaymentStatus
+
+logger = logging.getLogger(__name__)
+
+# Transaction ids per IN lookup
+LOOKUP_CHUNK_SIZE = 5000
+
+# Rows per bulk UPDATE statement
+UPDATE_CHUNK_SIZE = 1000
+
+
+@dataclass
+class ReconciliationLines:
+    """Detail lines of a reconciliation file as column arrays"""
+
+    transaction_ids: List[str] = field(default_factory=list)
+    bank_references: List[Optional[str]] = field(default_factory=list)
+    response_codes: List[Optional[str]] = field(default_factory=list)
+    response_messages: List[Optional[str]] = field(default_factory=list)
+    processed_dates: List[Optional[datetime]] = field(default_factory=list)
+    success: List[bool] = field(default_factory=list)
+
+    @classmethod
+    def from_results(cls, results: List[Dict[str, Any]]) -> "ReconciliationLines":
+        """Columns from the parsers' per-line dicts"""
+        lines = cls()
+        for result in results:
+            lines.transaction_ids.append(result["transaction_id"])
+            lines.bank_references.append(result.get("bank_reference"))
+            lines.response_codes.append(result.get("response_code"))
+            lines.response_messages.append(result.get("response_message"))
+            lines.processed_dates.append(result.get("processed_date"))
+            lines.success.append(bool(result["success"]))
+        return lines
+
+    def __len__(self) -> int:
+        return len(self.transaction_ids)
+
+
+@dataclass
+class ReconciliationResult:
+    """Line numbers (0-based) by outcome"""
+
+    matched: List[int] = field(default_factory=list)  # Found and paid
+    failed: List[int] = field(default_factory=list)  # Found, rejected by the bank
+    unmatched: List[int] = field(default_factory=list)  # No such transaction
+    invoices_paid: int = 0
+    batch_id: Optional[int] = None  # Batch of the first matched line
+
+
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _lookup_transactions(
+    db: Session, transaction_ids: List[str]
+) -> Dict[str, Tuple[int, Optional[int], int]]:
+    """transaction_id -> (id, invoice_id, batch_id), one query per chunk"""
+    found = {}
+    unique_ids = list(dict.fromkeys(transaction_ids))
+    for chunk in _chunks(unique_ids, LOOKUP_CHUNK_SIZE):
+        rows = db.execute(
+            select(
+                PaymentTransaction.transaction_id,
+                PaymentTransaction.id,
+                PaymentTransaction.invoice_id,
+                PaymentTransaction.batch_id,
+            ).where(PaymentTransaction.transaction_id.in_(chunk))
+        )
+        for transaction_id, id_, invoice_id, batch_id in rows:
+            found[transaction_id] = (id_, invoice_id, batch_id)
+    return found
+
+
+def _update_transactions(
+    db: Session, status: TransactionStatus, rows: List[Dict[str, Any]]
+) -> None:
+    """Write bank results of transactions that end in ``status``"""
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name != "postgresql":
+        db.execute(
+            update(PaymentTransaction),
+            [{**row, "status": status} for row in rows],
+        )
+        return
+
+    for chunk in _chunks(rows, UPDATE_CHUNK_SIZE):
+        results = values(
+            column("id", Integer),
+            column("bank_reference", String(50)),
+            column("bank_response_code", String(10)),
+            column("bank_response_message", Text),
+            column("processed_date", DateTime),
+            name="bank_results",
+        ).data(
+            [
+                (
+                    row["id"],
+                    row["bank_reference"],
+                    row["bank_response_code"],
+                    row["bank_response_message"],
+                    row["processed_date"],
+                )
+                for row in chunk
+            ]
+        )
+        db.execute(
+            update(PaymentTransaction)
+            .where(PaymentTransaction.id == results.c.id)
+            .values(
+                status=status,
+                bank_reference=results.c.bank_reference,
+                bank_response_code=results.c.bank_response_code,
+                bank_response_message=results.c.bank_response_message,
+                processed_date=results.c.processed_date,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _mark_invoices_paid(db: Session, paid_dates: Dict[int, Optional[datetime]]) -> None:
+    """Set invoices paid with the bank's processing date"""
+    if not paid_dates:
+        return
+
+    rows = [
+        {"id": invoice_id, "paid_date": paid_at.date() if paid_at else None}
+        for invoice_id, paid_at in paid_dates.items()
+    ]
+
+    if db.get_bind().dialect.name != "postgresql":
+        db.execute(
+            update(Invoice),
+            [{**row, "payment_status": InvoicePaymentStatus.PAID} for row in rows],
+        )
+        return
+
+    for chunk in _chunks(rows, UPDATE_CHUNK_SIZE):
+        paid = values(
+            column("id", Integer),
+            column("paid_date", Date),
+            name="paid_invoices",
+        ).data([(row["id"], row["paid_date"]) for row in chunk])
+        db.execute(
+            update(Invoice)
+            .where(Invoice.id == paid.c.id)
+            .values(payment_status=InvoicePaymentStatus.PAID, paid_date=paid.c.paid_date)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def reconcile_lines(db: Session, lines: ReconciliationLines) -> ReconciliationResult:
+    """
+    Match bank results to payment transactions and apply them
+
+    Runs in the caller's transaction; the caller commits. When a file lists
+    a transaction more than once, its last line wins.
+
+    Args:
+        db: Database session
+        lines: Parsed detail lines
+
+    Returns:
+        ReconciliationResult: matched / failed / unmatched line numbers
+    """
+    result = ReconciliationResult()
+    found = _lookup_transactions(db, lines.transaction_ids)
+
+    updates: Dict[int, Dict[str, Any]] = {}
+    paid_dates: Dict[int, Optional[datetime]] = {}
+    for index, transaction_id in enumerate(lines.transaction_ids):
+        match = found.get(transaction_id)
+        if match is None:
+            result.unmatched.append(index)
+            continue
+
+        id_, invoice_id, batch_id = match
+        if result.batch_id is None:
+            result.batch_id = batch_id
+
+        success = lines.success[index]
+        updates[id_] = {
+            "id": id_,
+            "bank_reference": lines.bank_references[index],
+            "bank_response_code": lines.response_codes[index],
+            "bank_response_message": lines.response_messages[index],
+            "processed_date": lines.processed_dates[index],
+            "success": success,
+        }
+        if success:
+            result.matched.append(index)
+            if invoice_id:
+                paid_dates[invoice_id] = lines.processed_dates[index]
+        else:
+            result.failed.append(index)
+            paid_dates.pop(invoice_id, None)
+
+    for status, success in (
+        (TransactionStatus.SUCCESS, True),
+        (TransactionStatus.FAILED, False),
+    ):
+        _update_transactions(
+            db,
+            status,
+            [
+                {key: value for key, value in row.items() if key != "success"}
+                for row in updates.values()
+                if row["success"] is success
+            ],
+        )
+
+    _mark_invoices_paid(db, paid_dates)
+    result.invoices_paid = len(paid_dates)
+
+    for index in result.unmatched:
+        logger.warning(f"Transaction {lines.transaction_ids[index]} not found")
+
+    return result
@@ -0,0 +1,402 @@
+"""
+Background report jobs
+
+Reports are built outside the request: ``submit`` queues a job and returns at
+once, a small pool of workers builds it (collect data → render → store) while
+recording progress, and the requester is notified over the websocket when the
+artifact is ready.
+
+Jobs are identified by a hash of their parameters, so a duplicate request
+joins the job already in flight, and a report that has already been built is
+served from its stored artifact instead of being generated again. Artifacts
+are written to a temporary name and renamed into place, so an interrupted
+build never leaves a partial file behind.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from enum import Enum
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database_async import get_async_session
+
+logger = logging.getLogger(__name__)
+
+# Reports built concurrently per instance
+REPORT_WORKER_COUNT = 2
+
+# How long an artifact covering a still-open period is reused
+REPORT_ARTIFACT_TTL = timedelta(hours=1)
+
+# How long finished jobs stay queryable in memory (artifacts are kept)
+REPORT_JOB_RETENTION = timedelta(days=1)
+
+REPORT_DOWNLOAD_URL = os.getenv(
+    "REPORT_DOWNLOAD_URL", "http://localhost:8000/api/v1/analytics/reports"
+)
+
+REPORT_FILE_EXTENSIONS = {"excel": "xlsx", "csv": "csv"}
+
+# Keyed by file extension
+REPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class ReportJobStatus(str, Enum):
+    """Report job states"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class ReportJob:
+    """A requested report and its build progress"""
+
+    job_id: str
+    report_type: str
+    format: str
+    start_date: datetime
+    end_date: datetime
+    user_id: str
+    status: ReportJobStatus = ReportJobStatus.QUEUED
+    progress: float = 0.0
+    stage: str = "排隊中"
+    artifact_path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    # Requesters who joined this job and should also be notified
+    subscribers: List[str] = field(default_factory=list)
+    notify_emails: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for key in ("subscribers", "notify_emails", "artifact_path"):
+            data.pop(key)
+        data["status"] = self.status.value
+        data["download_url"] = (
+            f"{REPORT_DOWNLOAD_URL}/{self.job_id}/download"
+            if self.status == ReportJobStatus.COMPLETED
+            else None
+        )
+        for key in ("start_date", "end_date", "created_at", "finished_at"):
+            data[key] = data[key].isoformat() if data[key] else None
+        return data
+
+
+def report_job_id(
+    report_type: str, format: str, start_date: datetime, end_date: datetime
+) -> str:
+    """Stable job ID for a set of report parameters"""
+    params = json.dumps(
+        [report_type, format, start_date.isoformat(), end_date.isoformat()]
+    )
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()[:32]
+
+
+class ReportArtifactStore:
+    """
+    Stores finished report files by job ID
+
+    Local-filesystem stand-in for object storage; the layout (one object per
+    job ID, written atomically) maps directly onto a bucket.
+    """
+
+    def __init__(self, base_path: Optional[Path] = None):
+        self.base_path = Path(
+            base_path or Path(os.getenv("STORAGE_PATH", "/tmp/luckygas-storage")) / "reports"
+        )
+        self.base_path.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, job_id: str, format: str) -> Path:
+        return self.base_path / f"{job_id}.{REPORT_FILE_EXTENSIONS[format]}"
+
+    def temp_path_for(self, job_id: str, format: str) -> Path:
+        """Where a build writes before the artifact is published"""
+        return self.base_path / f".{job_id}.{os.getpid()}.{REPORT_FILE_EXTENSIONS[format]}"
+
+    def publish(self, temp_path: Path, job_id: str, format: str) -> Path:
+        path = self.path_for(job_id, format)
+        os.replace(temp_path, path)
+        return path
+
+    def find(self, job_id: str) -> Optional[Path]:
+        """Stored artifact for a job, whatever its format"""
+        for format in REPORT_FILE_EXTENSIONS:
+            path = self.path_for(job_id, format)
+            if path.exists():
+                return path
+        return None
+
+    def is_fresh(self, path: Path, end_date: datetime) -> bool:
+        """
+        Whether a stored artifact can be reused
+
+        Reports built after their period closed never change; reports of a
+        period that was still open are reused for REPORT_ARTIFACT_TTL.
+        """
+        built_at = datetime.fromtimestamp(path.stat().st_mtime)
+        return built_at > end_date or datetime.now() - built_at < REPORT_ARTIFACT_TTL
+
+
+async def _default_session_factory() -> AsyncIterator[AsyncSession]:
+    async for session in get_async_session():
+        yield session
+
+
+async def _notify_websocket(user_id: str, message: Dict[str, Any]) -> None:
+    from app.services.websocket_service import websocket_manager
+
+    await websocket_manager.send_to_user(user_id, message)
+
+
+async def _email_report(email: str, job: ReportJob) -> None:
+    from app.services.email_service import EmailService
+
+    subject = (
+        f"LuckyGas {job.report_type.title()} Report - "
+        f"{job.start_date.date()} to {job.end_date.date()}"
+    )
+    body = f"""
+    您好，
+
+    您要求的報表已經產生完成。
+
+    報表類型: {job.report_type.title()}
+    期間: {job.start_date.date()} 至 {job.end_date.date()}
+    格式: {job.format.upper()}
+
+    請點擊以下連結下載報表:
+    {job.to_dict()["download_url"]}
+
+    謝謝，
+    LuckyGas 系統
+    """
+    await EmailService().send_email(email, subject, body)
+
+
+class ReportJobQueue:
+    """Queue of report jobs served by a pool of asyncio workers"""
+
+    def __init__(
+        self,
+        store: Optional[ReportArtifactStore] = None,
+        session_factory: Callable[[], AsyncIterator[AsyncSession]] = _default_session_factory,
+        notify: Callable[[str, Dict[str, Any]], Any] = _notify_websocket,
+        email: Callable[[str, ReportJob], Any] = _email_report,
+        worker_count: int = REPORT_WORKER_COUNT,
+    ):
+        self._store = store
+        self.session_factory = session_factory
+        self.notify = notify
+        self.email = email
+        self.worker_count = worker_count
+        self.jobs: Dict[str, ReportJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def store(self) -> ReportArtifactStore:
+        if self._store is None:
+            self._store = ReportArtifactStore()
+        return self._store
+
+    async def submit(
+        self,
+        report_type: str,
+        format: str,
+        start_date: datetime,
+        end_date: datetime,
+        user_id: str,
+        email: Optional[str] = None,
+    ) -> ReportJob:
+        """
+        Queue a report, or return the job / artifact that already covers it
+
+        Returns:
+            The job; already COMPLETED when a fresh artifact exists
+        """
+        if format not in REPORT_FILE_EXTENSIONS:
+            raise ValueError(f"不支援的報表格式: {format}")
+
+        self._prune()
+        job_id = report_job_id(report_type, format, start_date, end_date)
+        job = self.jobs.get(job_id)
+        if job and job.status in (ReportJobStatus.QUEUED, ReportJobStatus.RUNNING):
+            # Same report already in flight: notify this requester too
+            if user_id not in job.subscribers:
+                job.subscribers.append(user_id)
+            if email and email not in job.notify_emails:
+                job.notify_emails.append(email)
+            return job
+
+        # Rebuilding a finished or failed job keeps its earlier requesters'
+        # access to the report
+        subscribers = list(job.subscribers) if job else []
+        if user_id not in subscribers:
+            subscribers.append(user_id)
+
+        job = ReportJob(
+            job_id=job_id,
+            report_type=report_type,
+            format=format,
+            start_date=start_date,
+            end_date=end_date,
+            user_id=user_id,
+            subscribers=subscribers,
+            notify_emails=[email] if email else [],
+        )
+        self.jobs[job_id] = job
+
+        path = self.store.path_for(job_id, format)
+        if path.exists() and self.store.is_fresh(path, end_date):
+            self._complete(job, path)
+            logger.info(f"Report {job_id} served from stored artifact")
+            await self._notify_done(job)
+            return job
+
+        self._ensure_workers()
+        await self._queue.put(job_id)
+        logger.info(f"Report {job_id} ({report_type}/{format}) queued")
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        return self.jobs.get(job_id)
+
+    def can_access(self, job_id: str, user_id: str) -> bool:
+        """
+        Whether a user requested or joined a job
+
+        Only jobs submitted to this instance are known; a user reaching an
+        artifact built elsewhere submits the report here first, which
+        subscribes them and serves the stored file.
+        """
+        job = self.jobs.get(job_id)
+        return job is not None and user_id in job.subscribers
+
+    def artifact_path(self, job_id: str) -> Optional[Path]:
+        """Finished artifact, including ones built by another instance"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return Path(job.artifact_path) if job.artifact_path else None
+        return self.store.find(job_id)
+
+    async def join(self) -> None:
+        """Wait until every queued job has been processed"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """Cancel the workers (queued jobs are dropped)"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def _prune(self) -> None:
+        cutoff = datetime.now() - REPORT_JOB_RETENTION
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(self.jobs[job_id])
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ReportJob) -> None:
+        # Deferred import: AnalyticsService enqueues through this module
+        from app.services.analytics_service import AnalyticsService
+
+        job.status = ReportJobStatus.RUNNING
+        temp_path = self.store.temp_path_for(job.job_id, job.format)
+        try:
+            async for session in self.session_factory():
+                service = AnalyticsService(session)
+
+                await self._progress(job, 0.1, "收集資料")
+                data = await service.collect_report_data(
+                    job.report_type, job.start_date, job.end_date
+                )
+
+                await self._progress(job, 0.6, "產生報表")
+                await service.render_report(data, job.report_type, job.format, temp_path)
+
+                await self._progress(job, 0.9, "儲存報表")
+                path = self.store.publish(temp_path, job.job_id, job.format)
+
+                self._complete(job, path)
+            logger.info(f"Report {job.job_id} completed")
+        except asyncio.CancelledError:
+            # Stopped on shutdown; no partial artifact is left behind
+            temp_path.unlink(missing_ok=True)
+            raise
+        except Exception as e:
+            logger.error(f"Report {job.job_id} failed: {e}")
+            temp_path.unlink(missing_ok=True)
+            job.status = ReportJobStatus.FAILED
+            job.error = str(e)
+            job.finished_at = datetime.now()
+
+        await self._notify_done(job)
+
+    def _complete(self, job: ReportJob, path: Path) -> None:
+        job.status = ReportJobStatus.COMPLETED
+        job.progress = 1.0
+        job.stage = "完成"
+        job.artifact_path = str(path)
+        job.finished_at = datetime.now()
+
+    async def _progress(self, job: ReportJob, progress: float, stage: str) -> None:
+        job.progress = progress
+        job.stage = stage
+        await self._send(job, "report.progress")
+
+    async def _notify_done(self, job: ReportJob) -> None:
+        # websocket_service.EventType.REPORT_READY / REPORT_FAILED
+        if job.status != ReportJobStatus.COMPLETED:
+            await self._send(job, "report.failed")
+            return
+
+        await self._send(job, "report.ready")
+        for email in job.notify_emails:
+            try:
+                await self.email(email, job)
+            except Exception as e:
+                logger.error(f"Failed to email report {job.job_id} to {email}: {e}")
+
+    async def _send(self, job: ReportJob, event: str) -> None:
+        message = {"type": event, "job": job.to_dict()}
+        for user_id in job.subscribers:
+            try:
+                await self.notify(user_id, message)
+            except Exception as e:
+                logger.warning(f"Failed to notify {user_id} about report {job.job_id}: {e}")
+
+
+# Global instance
+report_job_queue = ReportJobQueue()
@@ -0,0 +1,457 @@
+"""
+Per-bank SFTP session pool
+
+Each worker process keeps up to ``BANKING_SFTP_POOL_SIZE`` authenticated
+SFTP sessions per bank and hands them out for one operation at a time, so
+an upload retry or a day's reconciliation files reuse the same SSH
+transport instead of paying a key exchange per file. Transports send
+keep-alives while idle; a session idle for longer than
+``HEALTH_CHECK_AFTER`` seconds is probed before reuse and a session idle
+beyond ``MAX_IDLE`` is closed instead.
+
+``download_files`` opens a window of remote files at once and prefetches
+them all, so their read requests are pipelined on the one channel.
+
+Setting ``BANKING_SFTP_LOCAL_ROOT`` points every bank at a local directory
+(``<root>/<bank_code>``) through ``LocalSFTPClient``, a stand-in for
+``paramiko.SFTPClient`` used in development and tests.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import paramiko
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds between SSH keep-alive packets on idle transports
+KEEPALIVE_INTERVAL = 30
+
+# Idle seconds after which a session is probed before reuse
+HEALTH_CHECK_AFTER = 60
+
+# Idle seconds after which a session is closed instead of reused
+MAX_IDLE = 600
+
+# Seconds to wait for a free session when the pool is exhausted
+ACQUIRE_TIMEOUT = 120
+
+# Remote files prefetched at once on one session
+DOWNLOAD_WINDOW = 8
+
+# Per-request SFTP channel timeout
+CHANNEL_TIMEOUT = 30.0
+
+
+class PooledSession:
+    """An SSH transport with its SFTP client"""
+
+    def __init__(self, transport: Any, sftp: Any):
+        self.transport = transport
+        self.sftp = sftp
+        self.last_used = time.monotonic()
+
+    def is_active(self) -> bool:
+        try:
+            return bool(self.transport.is_active())
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        for closeable in (self.sftp, self.transport):
+            try:
+                closeable.close()
+            except Exception:
+                pass
+
+
+class SFTPSessionPool:
+    """Thread-safe pool of SFTP sessions to one server"""
+
+    def __init__(
+        self,
+        name: str,
+        connect: Callable[[], Tuple[Any, Any]],
+        max_size: int = 3,
+        health_check_after: float = HEALTH_CHECK_AFTER,
+        max_idle: float = MAX_IDLE,
+    ):
+        self.name = name
+        self._connect = connect
+        self.max_size = max_size
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+        self._idle: List[PooledSession] = []
+        self._open = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    @property
+    def open_sessions(self) -> int:
+        return self._open
+
+    def acquire(self, timeout: float = ACQUIRE_TIMEOUT) -> PooledSession:
+        """Take a healthy idle session or connect a new one"""
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No free SFTP session for {self.name}")
+
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    break
+                if self._healthy(session):
+                    return session
+                self._discard(session)
+
+            transport, sftp = self._connect()
+            with self._lock:
+                self._open += 1
+            logger.info(f"Established SFTP connection to {self.name}")
+            return PooledSession(transport, sftp)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, session: PooledSession, discard: bool = False) -> None:
+        """Return a session; dead, discarded or closed-pool sessions are closed"""
+        try:
+            if discard or self._closed or not session.is_active():
+                self._discard(session)
+            else:
+                session.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(session)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        """SFTP client for the duration of one operation"""
+        pooled = self.acquire()
+        try:
+            yield pooled.sftp
+        except BaseException:
+            # The session may be mid-request; never hand it out again
+            self.release(pooled, discard=True)
+            raise
+        self.release(pooled)
+
+    def download_many(
+        self, remote_paths: List[str], window: int = DOWNLOAD_WINDOW
+    ) -> Dict[str, bytes]:
+        """Download several files over one session"""
+        with self.session() as sftp:
+            return download_files(sftp, remote_paths, window)
+
+    def close(self) -> None:
+        """Close idle sessions (sessions in use are closed on release)"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._discard(session)
+
+    def _healthy(self, session: PooledSession) -> bool:
+        idle_for = time.monotonic() - session.last_used
+        if idle_for > self.max_idle or not session.is_active():
+            return False
+        if idle_for > self.health_check_after:
+            try:
+                session.sftp.stat(".")
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, session: PooledSession) -> None:
+        session.close()
+        with self._lock:
+            self._open -= 1
+
+
+def download_files(
+    sftp: Any,
+    remote_paths: List[str],
+    window: int = DOWNLOAD_WINDOW,
+    errors: Optional[Dict[str, str]] = None,
+) -> Dict[str, bytes]:
+    """
+    Download files with their reads pipelined
+
+    Up to ``window`` files are opened and prefetched before the first one is
+    read, so the server streams them back to back instead of one request /
+    response round trip per chunk and file.
+
+    When ``errors`` is given, a file that cannot be opened or read is
+    recorded there by path and left out of the result while the others are
+    still downloaded; otherwise the first such failure raises.
+    """
+    contents: Dict[str, bytes] = {}
+
+    def failed(path: str, error: Exception) -> None:
+        if errors is None:
+            raise error
+        logger.warning(f"Could not download {path}: {error}")
+        errors[path] = str(error)
+
+    for start in range(0, len(remote_paths), window):
+        handles = []
+        try:
+            for path in remote_paths[start : start + window]:
+                try:
+                    handle = sftp.open(path, "rb")
+                    handles.append((path, handle))
+                    size = handle.stat().st_size
+                    if size:
+                        handle.prefetch(size)
+                except Exception as e:
+                    failed(path, e)
+            for path, handle in handles:
+                if errors and path in errors:
+                    continue
+                try:
+                    contents[path] = handle.read()
+                except Exception as e:
+                    failed(path, e)
+        finally:
+            for _, handle in handles:
+                handle.close()
+    return contents
+
+
+class LocalTransport:
+    """Transport of a ``LocalSFTPClient``"""
+
+    def __init__(self):
+        self.active = True
+
+    def is_active(self) -> bool:
+        return self.active
+
+    def set_keepalive(self, interval: int) -> None:
+        pass
+
+    def close(self) -> None:
+        self.active = False
+
+
+class LocalSFTPFile:
+    """File handle of a ``LocalSFTPClient``"""
+
+    def __init__(self, path: str, mode: str):
+        self._file = open(path, mode if "b" in mode else mode + "b")
+
+    def prefetch(self, file_size: Optional[int] = None, max_concurrent_requests=None):
+        pass
+
+    def set_pipelined(self, pipelined: bool = True) -> None:
+        pass
+
+    def stat(self) -> os.stat_result:
+        return os.fstat(self._file.fileno())
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LocalSFTPClient:
+    """Directory-backed stand-in for ``paramiko.SFTPClient``"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, path: str) -> str:
+        local = os.path.normpath(os.path.join(self.root, path.lstrip("/")))
+        if local != self.root and not local.startswith(self.root + os.sep):
+            raise PermissionError(f"Path outside SFTP root: {path}")
+        return local
+
+    def stat(self, path: str) -> os.stat_result:
+        return os.stat(self._path(path))
+
+    def listdir(self, path: str = ".") -> List[str]:
+        return sorted(os.listdir(self._path(path)))
+
+    def open(self, path: str, mode: str = "r") -> LocalSFTPFile:
+        return LocalSFTPFile(self._path(path), mode)
+
+    def getfo(self, remotepath: str, fl: io.IOBase) -> int:
+        # Like paramiko, count the bytes instead of asking ``fl`` for them
+        size = 0
+        with open(self._path(remotepath), "rb") as source:
+            for chunk in iter(lambda: source.read(32768), b""):
+                fl.write(chunk)
+                size += len(chunk)
+        return size
+
+    def get(self, remotepath: str, localpath: str) -> None:
+        shutil.copyfile(self._path(remotepath), localpath)
+
+    def putfo(self, fl: io.IOBase, remotepath: str) -> os.stat_result:
+        with open(self._path(remotepath), "wb") as target:
+            shutil.copyfileobj(fl, target)
+        return self.stat(remotepath)
+
+    def put(self, localpath: str, remotepath: str) -> os.stat_result:
+        shutil.copyfile(localpath, self._path(remotepath))
+        return self.stat(remotepath)
+
+    def rename(self, oldpath: str, newpath: str) -> None:
+        os.rename(self._path(oldpath), self._path(newpath))
+
+    def chmod(self, path: str, mode: int) -> None:
+        os.chmod(self._path(path), mode)
+
+    def mkdir(self, path: str, mode: int = 0o777) -> None:
+        os.mkdir(self._path(path), mode)
+
+    def makedirs(self, path: str, mode: int = 0o777) -> None:
+        os.makedirs(self._path(path), mode, exist_ok=True)
+
+    def remove(self, path: str) -> None:
+        os.remove(self._path(path))
+
+    def close(self) -> None:
+        pass
+
+
+def connect_bank_sftp(params: Dict[str, Any]) -> Tuple[Any, Any]:
+    """
+    Open an authenticated SFTP session to a bank
+
+    Args:
+        params: bank_code, host, port, username, password, private_key and
+            passphrase (see ``get_bank_sftp_pool``)
+
+    Returns:
+        (transport, sftp client)
+    """
+    bank_code = params["bank_code"]
+    if settings.BANKING_SFTP_LOCAL_ROOT:
+        root = os.path.join(settings.BANKING_SFTP_LOCAL_ROOT, bank_code)
+        return LocalTransport(), LocalSFTPClient(root)
+
+    transport = paramiko.Transport((params["host"], params["port"]))
+    transport.set_keepalive(KEEPALIVE_INTERVAL)
+
+    try:
+        if params["private_key"]:
+            # Key - based authentication (preferred for production)
+            key = None
+            key_types = [
+                (paramiko.RSAKey, "RSA"),
+                (paramiko.Ed25519Key, "Ed25519"),
+                (paramiko.ECDSAKey, "ECDSA"),
+            ]
+            for key_class, key_type in key_types:
+                try:
+                    key = key_class.from_private_key(
+                        io.StringIO(params["private_key"]),
+                        password=params["passphrase"],
+                    )
+                    logger.info(f"Using {key_type} key for {bank_code}")
+                    break
+                except Exception:
+                    continue
+
+            if not key:
+                raise ValueError("Could not parse private key")
+
+            transport.connect(username=params["username"], pkey=key)
+        else:
+            # Password authentication (fallback)
+            transport.connect(username=params["username"], password=params["password"])
+
+        sftp = paramiko.SFTPClient.from_transport(transport)
+        sftp.get_channel().settimeout(CHANNEL_TIMEOUT)
+    except Exception:
+        transport.close()
+        raise
+
+    return transport, sftp
+
+
+_pools: Dict[str, Tuple[str, SFTPSessionPool]] = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+def get_bank_sftp_pool(
+    bank_config: Any, credentials: Optional[Dict[str, Any]] = None
+) -> SFTPSessionPool:
+    """
+    Session pool of a bank in this process
+
+    Connection parameters are copied from ``bank_config`` (secret manager
+    ``credentials`` take precedence); the pool is replaced when they change.
+    """
+    global _pools_pid
+    credentials = credentials or {}
+    params = {
+        "bank_code": bank_config.bank_code,
+        "host": bank_config.sftp_host,
+        "port": bank_config.sftp_port or 22,
+        "username": credentials.get("username") or bank_config.sftp_username,
+        "password": credentials.get("password") or bank_config.sftp_password,
+        "private_key": credentials.get("private_key") or bank_config.sftp_private_key,
+        "passphrase": credentials.get("passphrase"),
+    }
+    fingerprint = hashlib.sha256(
+        repr(sorted(params.items())).encode("utf-8")
+    ).hexdigest()
+
+    stale = None
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Forked worker: sessions of the parent process are not ours
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        entry = _pools.get(params["bank_code"])
+        if entry and entry[0] == fingerprint:
+            return entry[1]
+
+        stale = entry[1] if entry else None
+        pool = SFTPSessionPool(
+            params["bank_code"],
+            lambda: connect_bank_sftp(params),
+            max_size=settings.BANKING_SFTP_POOL_SIZE,
+        )
+        _pools[params["bank_code"]] = (fingerprint, pool)
+
+    if stale:
+        stale.close()
+    return pool
+
+
+def close_bank_sftp_pools() -> None:
+    """Close every idle session (worker shutdown)"""
+    with _pools_lock:
+        pools = [pool for _, pool in _pools.values()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -2,30 +2,81 @@
 
 import asyncio
 import logging
-import random
 import time
+from contextlib import aclosing
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiohttp
-from sqlalchemy import and_, select
+from sqlalchemy import and_, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_db
 from app.core.config import settings
+from app.core.database_async import get_async_session
 from app.models.notification import (
     NotificationStatus,
     ProviderConfig,
     SMSLog,
     SMSProvider,
-    SMSTemplate,
 )
+from app.services.template_registry import sms_template_registry
 
 logger = logging.getLogger(__name__)
 
+# Provider requests in flight at once during a bulk send
+BULK_MAX_CONCURRENT_REQUESTS = 5
+
+# Mitake bulk status codes meaning the message was accepted
+MITAKE_ACCEPTED_STATUS_CODES = {"0", "1", "2", "4"}
+
+
+def format_taiwan_phone(phone: str) -> str:
+    """Local Taiwan format (09xxxxxxxx) used by Every8d and Mitake"""
+    if phone.startswith("+886"):
+        return "0" + phone[4:]
+    if not phone.startswith("0"):
+        return "0" + phone
+    return phone
+
+
+class TokenBucket:
+    """
+    Token bucket pacing messages to a provider's rate limit
+
+    Holds up to ``capacity`` tokens and refills at ``rate`` tokens per
+    second; sending n messages takes n tokens, waiting only as long as the
+    refill requires.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1) -> None:
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
 
 class SMSProviderBase:
     """Base class for SMS providers"""
 
+    # Recipients per send_batch call
+    max_batch_size = 20
+
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.name = self.__class__.__name__
@@ -38,6 +89,22 @@ class SMSProviderBase:
         """Check message delivery status"""
         raise NotImplementedError
 
+    async def send_batch(
+        self, messages: List[Tuple[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Send several (phone, message) pairs
+
+        Providers with a multi-recipient endpoint override this; the default
+        sends the messages concurrently.
+
+        Returns:
+            One ``send_sms`` style result per message, in order
+        """
+        return await asyncio.gather(
+            *(self.send_sms(phone, message) for phone, message in messages)
+        )
+
     def calculate_segments(self, message: str) -> int:
         """Calculate number of SMS segments for message"""
         # Unicode (Chinese) messages have different limits
@@ -131,61 +198,94 @@ class TwilioProvider(SMSProviderBase):
 class Every8dProvider(SMSProviderBase):
     """Every8d (Taiwan) SMS provider"""
 
+    # DEST accepts a comma-separated recipient list for one message
+    max_batch_size = 100
+
     async def send_sms(self, phone: str, message: str, **kwargs) -> Dict[str, Any]:
         """Send SMS via Every8d"""
         try:
-            username = self.config.get("username")
-            password = self.config.get("password")
-            api_url = self.config.get("api_url", "https://api.e8d.tw / SMS / BulkSMS")
+            async with aiohttp.ClientSession() as session:
+                return await self._send(session, [format_taiwan_phone(phone)], message)
+        except Exception as e:
+            logger.error(f"Every8d SMS error: {e}")
+            return {"success": False, "error": str(e)}
 
-            # Format phone for Taiwan (remove country code if present)
-            if phone.startswith("+886"):
-                phone = "0" + phone[4:]
-            elif not phone.startswith("0"):
-                phone = "0" + phone
+    async def send_batch(
+        self, messages: List[Tuple[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """Send with one request per distinct message text"""
+        recipients: Dict[str, List[int]] = {}
+        for index, (_, message) in enumerate(messages):
+            recipients.setdefault(message, []).append(index)
 
-            params = {
-                "UID": username,
-                "PWD": password,
-                "SB": "",  # Subject (optional)
-                "MSG": message,
-                "DEST": phone,
-                "ST": "",  # Scheduled time (optional)
-                "RETRYTIME": 300,  # Retry time in seconds
-            }
+        results: List[Dict[str, Any]] = [{}] * len(messages)
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as response:
-                    text = await response.text()
+        async def send_group(session, message: str, indexes: List[int]):
+            phones = [format_taiwan_phone(messages[i][0]) for i in indexes]
+            try:
+                result = await self._send(session, phones, message)
+            except Exception as e:
+                logger.error(f"Every8d SMS error: {e}")
+                result = {"success": False, "error": str(e)}
+
+            if result["success"]:
+                # One batch ID and total cost for the whole request
+                result["cost"] = result["cost"] / len(indexes)
+            for i in indexes:
+                results[i] = dict(result)
+
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(
+                *(
+                    send_group(session, message, indexes)
+                    for message, indexes in recipients.items()
+                )
+            )
+        return results
 
-                    # Parse response (format: credit, sended, cost, unsend, batch_id)
-                    parts = text.strip().split(", ")
+    async def _send(
+        self, session: aiohttp.ClientSession, phones: List[str], message: str
+    ) -> Dict[str, Any]:
+        """One BulkSMS request for ``message`` to ``phones``"""
+        username = self.config.get("username")
+        password = self.config.get("password")
+        api_url = self.config.get("api_url", "https://api.e8d.tw / SMS / BulkSMS")
+
+        params = {
+            "UID": username,
+            "PWD": password,
+            "SB": "",  # Subject (optional)
+            "MSG": message,
+            "DEST": ",".join(phones),
+            "ST": "",  # Scheduled time (optional)
+            "RETRYTIME": 300,  # Retry time in seconds
+        }
 
-                    if len(parts) >= 5 and float(parts[1]) > 0:
-                        return {
-                            "success": True,
-                            "message_id": parts[4],  # batch_id
-                            "segments": self.calculate_segments(message),
-                            "cost": float(parts[2]),  # Cost in TWD
-                        }
-                    else:
-                        error_codes = {
-                            "-1": "Send time format error",
-                            "-2": "Send time expired",
-                            "-4": "Account error",
-                            "-5": "Password error",
-                            "-6": "Insufficient balance",
-                            "-20": "Source IP not authorized",
-                            "-99": "System error",
-                        }
-                        error_msg = error_codes.get(
-                            text.strip(), f"Unknown error: {text}"
-                        )
-                        return {"success": False, "error": error_msg}
+        async with session.get(api_url, params=params) as response:
+            text = await response.text()
 
-        except Exception as e:
-            logger.error(f"Every8d SMS error: {e}")
-            return {"success": False, "error": str(e)}
+            # Parse response (format: credit, sended, cost, unsend, batch_id)
+            parts = text.strip().split(", ")
+
+            if len(parts) >= 5 and float(parts[1]) > 0:
+                return {
+                    "success": True,
+                    "message_id": parts[4],  # batch_id
+                    "segments": self.calculate_segments(message),
+                    "cost": float(parts[2]),  # Cost in TWD
+                }
+            else:
+                error_codes = {
+                    "-1": "Send time format error",
+                    "-2": "Send time expired",
+                    "-4": "Account error",
+                    "-5": "Password error",
+                    "-6": "Insufficient balance",
+                    "-20": "Source IP not authorized",
+                    "-99": "System error",
+                }
+                error_msg = error_codes.get(text.strip(), f"Unknown error: {text}")
+                return {"success": False, "error": error_msg}
 
     async def check_status(self, message_id: str) -> Dict[str, Any]:
         """Check Every8d message status"""
@@ -197,6 +297,83 @@ class Every8dProvider(SMSProviderBase):
 class MitakeProvider(SMSProviderBase):
     """Mitake (三竹) SMS provider"""
 
+    # SmBulkSend accepts up to 500 messages per request
+    max_batch_size = 500
+
+    async def send_batch(
+        self, messages: List[Tuple[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """Send every message with one SmBulkSend request"""
+        username = self.config.get("username")
+        password = self.config.get("password")
+        api_url = self.config.get(
+            "bulk_api_url", "https://smsapi.mitake.com.tw/api/mtk/SmBulkSend"
+        )
+
+        # ClientID$$dstaddr$$dlvtime$$vldtime$$destname$$response$$smbody
+        lines = [
+            "$$".join(
+                [
+                    str(index),
+                    format_taiwan_phone(phone),
+                    "",
+                    "",
+                    "",
+                    "",
+                    # Line breaks in the body are sent as ASCII 6
+                    message.replace("\n", chr(6)),
+                ]
+            )
+            for index, (phone, message) in enumerate(messages)
+        ]
+        params = {"username": username, "password": password, "Encoding_PostIn": "UTF8"}
+        headers = {"Content-Type": "text/plain; charset=UTF-8"}
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    api_url,
+                    params=params,
+                    data="\r\n".join(lines).encode("utf-8"),
+                    headers=headers,
+                ) as response:
+                    text = await response.text()
+        except Exception as e:
+            logger.error(f"Mitake bulk SMS error: {e}")
+            return [{"success": False, "error": str(e)} for _ in messages]
+
+        # Parse INI response: one [ClientID] section per message
+        records: Dict[str, Dict[str, str]] = {}
+        section = None
+        for line in text.strip().splitlines():
+            line = line.strip()
+            if line.startswith("[") and line.endswith("]"):
+                section = records.setdefault(line[1:-1], {})
+            elif "=" in line and section is not None:
+                key, value = line.split("=", 1)
+                section[key.strip()] = value.strip()
+
+        results = []
+        for index, (_, message) in enumerate(messages):
+            record = records.get(str(index), {})
+            if record.get("statuscode") in MITAKE_ACCEPTED_STATUS_CODES:
+                results.append(
+                    {
+                        "success": True,
+                        "message_id": record.get("msgid", ""),
+                        "segments": self.calculate_segments(message),
+                    }
+                )
+            else:
+                results.append(
+                    {
+                        "success": False,
+                        "error": record.get("Error")
+                        or f"Mitake status {record.get('statuscode', 'missing')}",
+                    }
+                )
+        return results
+
     async def send_sms(self, phone: str, message: str, **kwargs) -> Dict[str, Any]:
         """Send SMS via Mitake"""
         try:
@@ -305,6 +482,7 @@ class EnhancedSMSService:
         }
         self._provider_instances = {}
         self._rate_limiters = {}
+        self._token_buckets: Dict[SMSProvider, TokenBucket] = {}
         self._circuit_breakers = {}
         self._delivery_callbacks = {}
         self._init_metrics()
@@ -587,28 +765,16 @@ class EnhancedSMSService:
     async def _get_template(
         self, template_code: str, db: AsyncSession
     ) -> Optional[str]:
-        """Get SMS template with A / B testing support"""
-        # Get all active templates for this code
-        result = await db.execute(
-            select(SMSTemplate).where(
-                and_(SMSTemplate.code == template_code, SMSTemplate.is_active)
-            )
-        )
-        templates = result.scalars().all()
-
-        if not templates:
+        """Get SMS template with A / B testing support (from the registry)"""
+        group = await sms_template_registry.get(template_code, db)
+        if not group:
             return None
 
         # Weighted random selection for A / B testing
-        if len(templates) > 1:
-            weights = [t.weight for t in templates]
-            selected = random.choices(templates, weights=weights)[0]
-        else:
-            selected = templates[0]
+        selected = group.pick()
 
-        # Update sent count
-        selected.sent_count += 1
-        await db.commit()
+        # Sent count is buffered and flushed periodically
+        sms_template_registry.record_sent(selected)
 
         return selected.content
 
@@ -845,7 +1011,7 @@ class EnhancedSMSService:
 
                 # Update template stats if applicable
                 if sms_log.message_type:
-                    await self._update_template_stats(sms_log.message_type, db)
+                    sms_template_registry.record_delivered(sms_log.message_type)
 
             elif result["status"] == NotificationStatus.FAILED:
                 sms_log.failed_at = datetime.utcnow()
@@ -864,22 +1030,73 @@ class EnhancedSMSService:
             logger.error(f"Status check error: {e}")
             return {"success": False, "error": str(e)}
 
-    async def _update_template_stats(self, template_code: str, db: AsyncSession):
-        """Update template delivery stats"""
+    def _get_token_bucket(
+        self, provider: SMSProvider, limit: Optional[int]
+    ) -> Optional[TokenBucket]:
+        """Token bucket for a provider's messages-per-minute limit"""
+        if not limit:
+            return None
+
+        bucket = self._token_buckets.get(provider)
+        if bucket is None or bucket.capacity != limit:
+            # A minute's allowance as burst, refilled continuously
+            bucket = TokenBucket(rate=limit / 60, capacity=limit)
+            self._token_buckets[provider] = bucket
+        return bucket
+
+    async def _resolve_bulk_provider(
+        self, provider: Optional[SMSProvider], db: AsyncSession
+    ) -> Optional[Tuple[ProviderConfig, SMSProviderBase]]:
+        """Pick the provider for a whole bulk send (one config query)"""
+        query = select(ProviderConfig).where(ProviderConfig.is_active)
+        if provider:
+            query = query.where(ProviderConfig.provider == provider)
         result = await db.execute(
-            select(SMSTemplate)
-            .where(SMSTemplate.code == template_code)
-            .order_by(SMSTemplate.updated_at.desc())
+            query.order_by(
+                ProviderConfig.priority.desc(), ProviderConfig.success_rate.desc()
+            )
         )
-        template = result.scalars().first()
 
-        if template:
-            template.delivered_count += 1
-            if template.sent_count > 0:
-                template.effectiveness_score = (
-                    template.delivered_count / template.sent_count
-                )
-            await db.commit()
+        for config in result.scalars().all():
+            if self._is_circuit_open(config.provider):
+                continue
+            instance = await self._get_provider_instance(config.provider, db)
+            if instance:
+                return config, instance
+        return None
+
+    async def _render_bulk_messages(
+        self,
+        recipients: List[Dict[str, Any]],
+        template_code: Optional[str],
+        db: AsyncSession,
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Message text of every recipient, from the cached template variants
+
+        Returns:
+            (message, None) or (None, error) per recipient
+        """
+        group = (
+            await sms_template_registry.get(template_code, db) if template_code else None
+        )
+
+        messages = []
+        for recipient in recipients:
+            message = recipient.get("message", "")
+            data = recipient.get("data")
+            if group and data:
+                # Weighted random selection for A / B testing
+                template = group.pick()
+                try:
+                    message = template.render(data)
+                except (KeyError, IndexError, ValueError) as e:
+                    messages.append((None, f"Template error: {e}"))
+                    continue
+                sms_template_registry.record_sent(template)
+            messages.append((message, None))
+
+        return messages
 
     async def send_bulk_sms(
         self,
@@ -887,57 +1104,183 @@ class EnhancedSMSService:
         message_type: str,
         template_code: Optional[str] = None,
         provider: Optional[SMSProvider] = None,
-        batch_size: int = 100,
+        batch_size: Optional[int] = None,
+        db: Optional[AsyncSession] = None,
+        max_concurrent_requests: int = BULK_MAX_CONCURRENT_REQUESTS,
     ) -> Dict[str, Any]:
-        """Send bulk SMS to multiple recipients"""
+        """
+        Send bulk SMS to multiple recipients
+
+        The provider and template are resolved once for the whole send.
+        Messages go out in provider batches (multi-recipient endpoints where
+        the provider has them, at most ``batch_size`` per request), paced by
+        the provider's token bucket. Logs are written with one bulk insert
+        and provider stats with one update.
+        """
         results = {"total": len(recipients), "success": 0, "failed": 0, "errors": []}
+        if not recipients:
+            return results
 
-        # Process in batches
-        for i in range(0, len(recipients), batch_size):
-            batch = recipients[i : i + batch_size]
-
-            # Send concurrently within batch
-            tasks = []
-            for recipient in batch:
-                task = self.send_sms(
-                    phone=recipient["phone"],
-                    message=recipient.get("message", ""),
-                    message_type=message_type,
-                    template_code=template_code,
-                    template_data=recipient.get("data", {}),
-                    provider=provider,
-                    metadata=recipient.get("metadata", {}),
-                    retry_on_failure=False,  # Don't retry in bulk mode
+        if not db:
+            # Own a session for the whole send and close it afterwards
+            async with aclosing(get_async_session()) as sessions:
+                async for session in sessions:
+                    return await self.send_bulk_sms(
+                        recipients,
+                        message_type,
+                        template_code=template_code,
+                        provider=provider,
+                        batch_size=batch_size,
+                        db=session,
+                        max_concurrent_requests=max_concurrent_requests,
+                    )
+
+        resolved = await self._resolve_bulk_provider(provider, db)
+        if not resolved:
+            results["failed"] = len(recipients)
+            results["errors"] = [
+                {
+                    "index": index,
+                    "recipient": recipient["phone"],
+                    "error": "No available SMS providers",
+                }
+                for index, recipient in enumerate(recipients)
+            ]
+            return results
+
+        config, instance = resolved
+        provider = config.provider
+        bucket = self._get_token_bucket(provider, config.rate_limit)
+        chunk_size = min(batch_size or instance.max_batch_size, instance.max_batch_size)
+        if bucket:
+            chunk_size = min(chunk_size, int(bucket.capacity))
+
+        rendered = await self._render_bulk_messages(recipients, template_code, db)
+
+        # Only rendered messages are sent
+        sendable = [i for i, (message, _) in enumerate(rendered) if message is not None]
+        outcomes: Dict[int, Dict[str, Any]] = {
+            i: {"success": False, "error": error}
+            for i, (message, error) in enumerate(rendered)
+            if message is None
+        }
+        limit = asyncio.Semaphore(max_concurrent_requests)
+
+        async def send_chunk(indexes: List[int]) -> None:
+            if bucket:
+                await bucket.acquire(len(indexes))
+            async with limit:
+                chunk_results = await self._send_bulk_chunk(
+                    provider,
+                    instance,
+                    [(recipients[i]["phone"], rendered[i][0]) for i in indexes],
                 )
-                tasks.append(task)
+            outcomes.update(zip(indexes, chunk_results))
 
-            # Wait for batch to complete
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(
+            *(
+                send_chunk(sendable[start : start + chunk_size])
+                for start in range(0, len(sendable), chunk_size)
+            )
+        )
 
-            for idx, result in enumerate(batch_results):
-                if isinstance(result, Exception):
-                    results["failed"] += 1
-                    results["errors"].append(
-                        {"recipient": batch[idx]["phone"], "error": str(result)}
-                    )
-                elif isinstance(result, dict):
-                    if result.get("success"):
-                        results["success"] += 1
-                    else:
-                        results["failed"] += 1
-                        results["errors"].append(
-                            {
-                                "recipient": batch[idx]["phone"],
-                                "error": result.get("error", "Unknown error"),
-                            }
-                        )
+        now = datetime.utcnow()
+        logs = []
+        for index, recipient in enumerate(recipients):
+            outcome = outcomes[index]
+            message = rendered[index][0] or recipient.get("message", "")
+            log = {
+                "recipient": recipient["phone"],
+                "message": message,
+                "message_type": message_type,
+                "notification_metadata": recipient.get("metadata", {}),
+                "unicode_message": any(ord(char) > 127 for char in message),
+                "provider": provider,
+                "retry_count": 0,
+            }
+            if outcome.get("success"):
+                results["success"] += 1
+                segments = outcome.get("segments", 1)
+                cost = outcome.get("cost")
+                if cost is None:
+                    cost = (config.cost_per_message or 0) + (
+                        config.cost_per_segment or 0
+                    ) * (segments - 1)
+                log.update(
+                    status=NotificationStatus.SENT,
+                    sent_at=now,
+                    provider_message_id=outcome.get("message_id"),
+                    segments=segments,
+                    cost=cost or 0,
+                )
+            else:
+                results["failed"] += 1
+                error = outcome.get("error", "Unknown error")
+                results["errors"].append(
+                    {"index": index, "recipient": recipient["phone"], "error": error}
+                )
+                log.update(status=NotificationStatus.FAILED, failed_at=now, error_message=error)
+            logs.append(log)
+
+        await db.execute(insert(SMSLog), logs)
+
+        # Provider stats for everything actually sent
+        if sendable:
+            sent = results["success"]
+            failed = len(sendable) - sent
+            total = ProviderConfig.total_sent + ProviderConfig.total_failed + sent + failed
+            await db.execute(
+                update(ProviderConfig)
+                .where(ProviderConfig.id == config.id)
+                .values(
+                    total_sent=ProviderConfig.total_sent + sent,
+                    total_failed=ProviderConfig.total_failed + failed,
+                    success_rate=(ProviderConfig.total_sent + sent) * 1.0 / total,
+                )
+            )
 
-            # Small delay between batches to avoid rate limits
-            if i + batch_size < len(recipients):
-                await asyncio.sleep(1)
+            if self.metrics:
+                for status, count in (("success", sent), ("failure", failed)):
+                    self.metrics["sms_sent"].labels(
+                        provider=provider.value, status=status, message_type=message_type
+                    ).inc(count)
 
+        await db.commit()
         return results
 
+    async def _send_bulk_chunk(
+        self,
+        provider: SMSProvider,
+        instance: SMSProviderBase,
+        messages: List[Tuple[str, str]],
+    ) -> List[Dict[str, Any]]:
+        """One provider batch request, guarded by the provider's circuit breaker"""
+        if self._is_circuit_open(provider):
+            error = f"Provider {provider.value} circuit breaker open"
+            return [{"success": False, "error": error} for _ in messages]
+
+        start_time = time.time()
+        try:
+            chunk_results = await instance.send_batch(messages)
+        except Exception as e:
+            logger.error(f"Bulk SMS batch error: {e}")
+            chunk_results = [{"success": False, "error": str(e)} for _ in messages]
+
+        if self.metrics:
+            self.metrics["provider_latency"].labels(
+                provider=provider.value, operation="send_batch"
+            ).observe(time.time() - start_time)
+
+        breaker = self._circuit_breakers.get(provider)
+        if any(result.get("success") for result in chunk_results):
+            if breaker and breaker["state"] == "half_open":
+                breaker["state"] = "closed"
+                breaker["failures"] = 0
+        else:
+            # The whole request failed
+            self._record_circuit_failure(provider)
+        return chunk_results
+
 
 # Singleton instance
 enhanced_sms_service = EnhancedSMSService()
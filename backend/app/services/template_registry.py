@@ -0,0 +1,256 @@
+"""
+In-memory registry of compiled notification templates
+
+SMS templates are loaded once per process with their A / B variants and
+precomputed cumulative weights, so picking and rendering a variant needs no
+query. The registry checks a cheap version stamp of ``sms_templates`` (row
+count and latest ``updated_at``) at most every ``TEMPLATE_REFRESH_INTERVAL``
+seconds and reloads when it changed; template endpoints invalidate it right
+away after an edit.
+
+Per-send template statistics (``sent_count`` / ``delivered_count``) are
+buffered in memory and written with one UPDATE per template when the buffer
+is flushed, instead of a row update per message.
+
+Email templates are compiled Jinja templates kept for the process lifetime,
+including the fallback used when a notification type has no template file.
+"""
+
+import bisect
+import itertools
+import logging
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from jinja2 import Environment, Template, TemplateNotFound
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.notification import SMSTemplate
+
+logger = logging.getLogger(__name__)
+
+# Seconds between version checks against the database
+TEMPLATE_REFRESH_INTERVAL = 30
+
+# Seconds between writes of buffered template statistics
+TEMPLATE_STATS_FLUSH_INTERVAL = 60
+
+
+@dataclass(frozen=True)
+class CompiledSMSTemplate:
+    """One SMS template variant ready to render"""
+
+    id: Any
+    code: str
+    variant: str
+    content: str
+    # Top-level keyword names the content expects in ``render`` data
+    fields: Tuple[str, ...]
+
+    @classmethod
+    def compile(cls, template: SMSTemplate) -> "CompiledSMSTemplate":
+        names = (
+            re.match(r"[^.\[]*", name).group()
+            for _, name, _, _ in Formatter().parse(template.content)
+            if name
+        )
+        fields = tuple(dict.fromkeys(name for name in names if not name.isdigit()))
+        return cls(
+            id=template.id,
+            code=template.code,
+            variant=template.variant or "A",
+            content=template.content,
+            fields=fields,
+        )
+
+    def render(self, data: Dict[str, Any]) -> str:
+        """
+        Raises:
+            ValueError: if ``data`` lacks any of the template's fields
+        """
+        missing = [name for name in self.fields if name not in data]
+        if missing:
+            raise ValueError(
+                f"Template {self.code} ({self.variant}) is missing fields: "
+                f"{', '.join(missing)}"
+            )
+        return self.content.format(**data)
+
+
+class SMSTemplateGroup:
+    """Active variants of a template code with precomputed selection weights"""
+
+    def __init__(self, code: str, variants: List[CompiledSMSTemplate], weights: List[int]):
+        self.code = code
+        self.variants = variants
+        self._cumulative = list(itertools.accumulate(max(w or 0, 0) for w in weights))
+        self._total = self._cumulative[-1] if self._cumulative else 0
+
+    def pick(self, rng: random.Random = random) -> CompiledSMSTemplate:
+        """Weighted random variant for A / B testing"""
+        if len(self.variants) == 1:
+            return self.variants[0]
+        if self._total <= 0:
+            return rng.choice(self.variants)
+        return self.variants[
+            bisect.bisect_right(self._cumulative, rng.random() * self._total)
+        ]
+
+
+class SMSTemplateRegistry:
+    """Process-wide cache of active SMS templates and buffered statistics"""
+
+    def __init__(
+        self,
+        refresh_interval: float = TEMPLATE_REFRESH_INTERVAL,
+        flush_interval: float = TEMPLATE_STATS_FLUSH_INTERVAL,
+    ):
+        self.refresh_interval = refresh_interval
+        self.flush_interval = flush_interval
+        self._groups: Dict[str, SMSTemplateGroup] = {}
+        self._version: Optional[Tuple[int, Any]] = None
+        self._checked_at = 0.0
+        self._flushed_at = time.monotonic()
+        self._sent: Counter = Counter()
+        self._delivered: Counter = Counter()
+
+    def invalidate(self) -> None:
+        """Reload on next use (call after creating / editing / deleting a template)"""
+        self._version = None
+        self._checked_at = 0.0
+
+    async def get(self, code: str, db: AsyncSession) -> Optional[SMSTemplateGroup]:
+        """Active variants of ``code``, or None if there are none"""
+        await self._refresh(db)
+        await self._maybe_flush(db)
+        return self._groups.get(code)
+
+    def record_sent(self, template: CompiledSMSTemplate, count: int = 1) -> None:
+        self._sent[template.id] += count
+
+    def record_delivered(self, code: str, count: int = 1) -> None:
+        self._delivered[code] += count
+
+    async def _refresh(self, db: AsyncSession) -> None:
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+
+        result = await db.execute(
+            select(func.count(SMSTemplate.id), func.max(SMSTemplate.updated_at))
+        )
+        version = tuple(result.one())
+        if version == self._version:
+            return
+
+        result = await db.execute(
+            select(SMSTemplate)
+            .where(SMSTemplate.is_active)
+            .order_by(SMSTemplate.code, SMSTemplate.variant)
+        )
+        groups = {}
+        for code, templates in itertools.groupby(result.scalars(), key=lambda t: t.code):
+            templates = list(templates)
+            groups[code] = SMSTemplateGroup(
+                code,
+                [CompiledSMSTemplate.compile(t) for t in templates],
+                [t.weight for t in templates],
+            )
+        self._groups = groups
+        self._version = version
+        logger.info(f"Loaded {len(groups)} SMS template codes")
+
+    async def _maybe_flush(self, db: AsyncSession) -> None:
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            await self.flush_stats(db)
+
+    async def flush_stats(self, db: AsyncSession) -> None:
+        """
+        Write buffered statistics in the caller's transaction
+
+        The caller commits. Counts are handed back to the buffer if the
+        updates fail.
+        """
+        self._flushed_at = time.monotonic()
+        sent, self._sent = self._sent, Counter()
+        delivered, self._delivered = self._delivered, Counter()
+        if not sent and not delivered:
+            return
+
+        try:
+            for template_id, count in sent.items():
+                await db.execute(
+                    update(SMSTemplate)
+                    .where(SMSTemplate.id == template_id)
+                    .values(
+                        sent_count=SMSTemplate.sent_count + count,
+                        # Statistics are not edits; keep the version stamp
+                        updated_at=SMSTemplate.updated_at,
+                    )
+                )
+            for code, count in delivered.items():
+                # Deliveries are credited to the most recently edited variant
+                latest = (
+                    select(SMSTemplate.id)
+                    .where(SMSTemplate.code == code)
+                    .order_by(SMSTemplate.updated_at.desc())
+                    .limit(1)
+                    .scalar_subquery()
+                )
+                await db.execute(
+                    update(SMSTemplate)
+                    .where(SMSTemplate.id == latest)
+                    .values(
+                        delivered_count=SMSTemplate.delivered_count + count,
+                        effectiveness_score=case(
+                            (
+                                SMSTemplate.sent_count > 0,
+                                (SMSTemplate.delivered_count + count)
+                                * 1.0
+                                / SMSTemplate.sent_count,
+                            ),
+                            else_=SMSTemplate.effectiveness_score,
+                        ),
+                        updated_at=SMSTemplate.updated_at,
+                    )
+                )
+        except Exception:
+            self._sent.update(sent)
+            self._delivered.update(delivered)
+            raise
+
+
+class EmailTemplateCache:
+    """Compiled Jinja email templates, looked up once per notification type"""
+
+    def __init__(self, env: Environment, fallback_source: str):
+        self.env = env
+        self.fallback = env.from_string(fallback_source)
+        self._templates: Dict[str, Optional[Template]] = {}
+
+    def get(self, notification_type: str) -> Template:
+        if notification_type not in self._templates:
+            try:
+                self._templates[notification_type] = self.env.get_template(
+                    f"{notification_type}.html"
+                )
+            except TemplateNotFound:
+                logger.warning(
+                    f"Email template not found for {notification_type}, using default"
+                )
+                self._templates[notification_type] = None
+        return self._templates[notification_type] or self.fallback
+
+    def clear(self) -> None:
+        self._templates.clear()
+
+
+# Singleton instance
+sms_template_registry = SMSTemplateRegistry()
@@ -0,0 +1,359 @@
+"""
+Recurring order template scheduler
+
+Every recurring template stores ``next_run_at`` (indexed), the time its next
+order should be materialized: ``TEMPLATE_LEAD_TIME`` before the delivery
+date held in ``next_scheduled_date``. The scheduler worker claims due
+templates in batches with ``SELECT ... FOR UPDATE SKIP LOCKED``, creates
+their orders through the batch order engine and advances the templates in
+the same transaction. Several instances can run side by side without
+creating an occurrence twice, and each run only touches due templates.
+"""
+
+import asyncio
+import calendar
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.gas_product import DeliveryMethod, GasProduct
+from app.models.order_template import OrderTemplate
+from app.schemas.order import OrderCreate
+from app.services.order_batch_service import CYLINDER_PRICES, OrderBatchService
+
+logger = logging.getLogger(__name__)
+
+# Orders are created this long before their delivery date
+TEMPLATE_LEAD_TIME = timedelta(days=1)
+
+# Templates claimed per transaction
+TEMPLATE_BATCH_SIZE = 200
+
+# Seconds between sweeps of the long-running worker
+TEMPLATE_POLL_INTERVAL = 60
+
+# Occurrences skipped at most when catching up after downtime
+MAX_CATCH_UP = 1000
+
+# A failing template is retried after this delay times its failure count ...
+TEMPLATE_RETRY_DELAY = timedelta(minutes=15)
+
+# ... but at least this often
+MAX_TEMPLATE_RETRY_DELAY = timedelta(hours=6)
+
+
+def next_occurrence(
+    pattern: str,
+    interval: int,
+    days: Optional[List[int]] = None,
+    base_date: Optional[datetime] = None,
+) -> datetime:
+    """Calculate the next scheduled date for a recurring template"""
+    base = base_date or datetime.now()
+    interval = interval or 1
+
+    if pattern == "daily":
+        return base + timedelta(days=interval)
+
+    elif pattern == "weekly":
+        if days:
+            # Find next occurrence based on specified days
+            days = sorted(days)
+            current_weekday = base.weekday() + 1  # 1 - 7 (Mon - Sun)
+            next_days = [d for d in days if d > current_weekday]
+
+            if next_days:
+                # Next occurrence is in the current week
+                days_ahead = next_days[0] - current_weekday
+            else:
+                # Next occurrence is in the next week interval
+                days_ahead = (7 * interval) - current_weekday + days[0]
+
+            return base + timedelta(days=days_ahead)
+        else:
+            # Same day of week, every N weeks
+            return base + timedelta(weeks=interval)
+
+    elif pattern == "monthly":
+        # Same day of month, every N months
+        month = base.month + interval
+        year = base.year + (month - 1) // 12
+        month = ((month - 1) % 12) + 1
+
+        # Handle day overflow (e.g., Jan 31 -> Feb 28)
+        last_day = calendar.monthrange(year, month)[1]
+        return base.replace(year=year, month=month, day=min(base.day, last_day))
+
+    else:
+        # Default to daily
+        return base + timedelta(days=1)
+
+
+def schedule_template(template: OrderTemplate, next_date: Optional[datetime]) -> None:
+    """Set a template's next delivery date and the time its order is due"""
+    template.next_scheduled_date = next_date
+    template.next_run_at = next_date - TEMPLATE_LEAD_TIME if next_date else None
+
+
+def advance_template(template: OrderTemplate) -> None:
+    """Move a recurring template to its following occurrence"""
+    schedule_template(
+        template,
+        next_occurrence(
+            template.recurrence_pattern,
+            template.recurrence_interval,
+            template.recurrence_days,
+            base_date=template.next_scheduled_date,
+        ),
+    )
+
+
+async def _default_session_factory() -> AsyncIterator[AsyncSession]:
+    from app.core.database_async import get_async_session
+
+    async for session in get_async_session():
+        yield session
+
+
+class TemplateScheduler:
+    """Materializes orders for due recurring templates"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncIterator[AsyncSession]] = _default_session_factory,
+        batch_size: int = TEMPLATE_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+
+    async def run_due(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Process every template due at ``now``, one batch per transaction
+
+        A batch that fails is rolled back and redone one template per
+        transaction, so a broken template is recorded as failed (and retried
+        with backoff) without holding back the rest of its batch.
+
+        Returns:
+            Templates claimed, orders created, occurrences skipped / rejected,
+            templates failed
+        """
+        now = now or datetime.now()
+        stats = {"claimed": 0, "created": 0, "skipped": 0, "rejected": 0, "failed": 0}
+
+        async for session in self.session_factory():
+            while True:
+                try:
+                    templates = await self._claim(session, now)
+                except Exception as e:
+                    await session.rollback()
+                    logger.error(f"Claiming due templates failed: {e}")
+                    break
+
+                template_ids = [template.id for template in templates]
+                try:
+                    batch = await self._run_batch(session, now, templates)
+                except Exception as e:
+                    await session.rollback()
+                    logger.error(
+                        f"Template scheduling batch failed, retrying templates one by one: {e}"
+                    )
+                    batch = await self._run_each(session, now, template_ids)
+
+                for key, value in batch.items():
+                    stats[key] += value
+                if len(template_ids) < self.batch_size:
+                    break
+
+        if stats["claimed"]:
+            logger.info(f"Template scheduler run: {stats}")
+        return stats
+
+    async def run_forever(self, poll_interval: int = TEMPLATE_POLL_INTERVAL) -> None:
+        """Long-running worker loop"""
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"Template scheduler run failed: {e}")
+            await asyncio.sleep(poll_interval)
+
+    async def _claim(
+        self,
+        session: AsyncSession,
+        now: datetime,
+        template_ids: Optional[List[int]] = None,
+    ) -> List[OrderTemplate]:
+        """Lock a batch of due templates; rows locked elsewhere are skipped"""
+        query = (
+            select(OrderTemplate)
+            .where(
+                OrderTemplate.is_active.is_(True),
+                OrderTemplate.is_recurring.is_(True),
+                OrderTemplate.next_run_at <= now,
+            )
+            .order_by(OrderTemplate.next_run_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if template_ids is not None:
+            query = query.where(OrderTemplate.id.in_(template_ids))
+        result = await session.execute(query)
+        return list(result.scalars())
+
+    async def _run_each(
+        self, session: AsyncSession, now: datetime, template_ids: List[int]
+    ) -> Dict[str, int]:
+        """Run the templates of a failed batch one per transaction"""
+        stats = {"claimed": 0, "created": 0, "skipped": 0, "rejected": 0, "failed": 0}
+        for template_id in template_ids:
+            try:
+                batch = await self._run_batch(
+                    session, now, await self._claim(session, now, [template_id])
+                )
+            except Exception as e:
+                await session.rollback()
+                await self._record_failure(session, template_id, now, e)
+                stats["claimed"] += 1
+                stats["failed"] += 1
+                continue
+
+            for key, value in batch.items():
+                stats[key] += value
+        return stats
+
+    @staticmethod
+    async def _record_failure(
+        session: AsyncSession, template_id: int, now: datetime, error: Exception
+    ) -> None:
+        """Store a template's error and push its next run back"""
+        template = await session.get(OrderTemplate, template_id)
+        if template is None:
+            return
+
+        template.failure_count = (template.failure_count or 0) + 1
+        template.last_error = str(error)[:1000]
+        template.last_failed_at = now
+        template.next_run_at = now + min(
+            TEMPLATE_RETRY_DELAY * template.failure_count, MAX_TEMPLATE_RETRY_DELAY
+        )
+        await session.commit()
+        logger.error(
+            f"Template {template.template_code} failed "
+            f"({template.failure_count} in a row), retrying at {template.next_run_at}: {error}"
+        )
+
+    async def _run_batch(
+        self, session: AsyncSession, now: datetime, templates: List[OrderTemplate]
+    ) -> Dict[str, int]:
+        stats = {"claimed": len(templates), "created": 0, "skipped": 0, "rejected": 0}
+        if not templates:
+            return stats
+
+        cylinder_sizes = await self._cylinder_sizes(session, templates)
+
+        orders: List[OrderCreate] = []
+        order_templates: List[OrderTemplate] = []
+        for template in templates:
+            stats["skipped"] += self._catch_up(template, now.date())
+            if template.next_run_at > now:
+                # Caught up to an occurrence that is not due yet
+                continue
+
+            order = self._order_for(template, cylinder_sizes)
+            if order is not None:
+                orders.append(order)
+                order_templates.append(template)
+                template.times_used = (template.times_used or 0) + 1
+                template.last_used_at = now
+            else:
+                stats["rejected"] += 1
+            advance_template(template)
+            template.failure_count = 0
+            template.last_error = None
+
+        # Orders and template advancement commit together
+        result = await OrderBatchService(session).create_orders(
+            orders, created_by=0, order_type="template"  # 0 = scheduler
+        )
+        for error in result.errors:
+            template = order_templates[error["index"]]
+            logger.warning(
+                f"Template {template.template_code} order rejected: {error['error']}"
+            )
+        await session.commit()
+
+        stats["created"] = len(result.created)
+        stats["rejected"] += len(result.errors)
+        return stats
+
+    @staticmethod
+    def _catch_up(template: OrderTemplate, today: date) -> int:
+        """Skip occurrences that passed while the scheduler was not running"""
+        skipped = 0
+        while (
+            template.next_scheduled_date
+            and template.next_scheduled_date.date() < today
+            and skipped < MAX_CATCH_UP
+        ):
+            advance_template(template)
+            skipped += 1
+        if skipped:
+            logger.warning(
+                f"Template {template.template_code} skipped {skipped} missed occurrences"
+            )
+        return skipped
+
+    @staticmethod
+    async def _cylinder_sizes(
+        session: AsyncSession, templates: List[OrderTemplate]
+    ) -> Dict[int, int]:
+        """Cylinder size of every product used by the batch (one query)"""
+        product_ids = {
+            item["gas_product_id"]
+            for template in templates
+            for item in template.products or []
+        }
+        if not product_ids:
+            return {}
+
+        result = await session.execute(
+            select(GasProduct.id, GasProduct.size_kg).where(
+                GasProduct.id.in_(product_ids),
+                GasProduct.delivery_method == DeliveryMethod.CYLINDER,
+            )
+        )
+        return {product_id: size for product_id, size in result}
+
+    @staticmethod
+    def _order_for(
+        template: OrderTemplate, cylinder_sizes: Dict[int, int]
+    ) -> Optional[OrderCreate]:
+        """Order for the template's current occurrence, None if it cannot be built"""
+        quantities: Dict[str, Any] = {f"qty_{size}": 0 for size in CYLINDER_PRICES}
+        for item in template.products or []:
+            size = cylinder_sizes.get(item["gas_product_id"])
+            key = f"qty_{size}kg"
+            if key in quantities:
+                quantities[key] += item["quantity"]
+
+        try:
+            return OrderCreate(
+                customer_id=template.customer_id,
+                scheduled_date=template.next_scheduled_date,
+                is_urgent=template.priority == "urgent",
+                payment_method=template.payment_method,
+                delivery_notes=template.delivery_notes,
+                **quantities,
+            )
+        except ValueError as e:
+            logger.warning(f"Template {template.template_code} cannot create an order: {e}")
+            return None
+
+
+async def run_template_scheduler() -> Dict[str, int]:
+    """Scheduler job entry point (``python manage.py schedule-templates``)"""
+    return await TemplateScheduler().run_due()
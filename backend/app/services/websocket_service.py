@@ -3,11 +3,14 @@ import json
 import logging
 from datetime import datetime
 from enum import Enum
+from typing import Any, Dict, Optional, Set
 
 import redis.asyncio as redis
 from fastapi import WebSocket
 
 from app.core.config import settings
+from app.services.customer_service import invalidate_delivery_candidates
+from app.services.dashboard_summary_service import invalidate_dashboard_summary
 
 # from app.services.message_queue_service import message_queue, QueuePriority  # Removed during compaction
 
@@ -50,6 +53,12 @@ class EventType(str, Enum):
     PREDICTION_READY = "prediction.ready"
     MAINTENANCE_ALERT = "maintenance.alert"
     SYSTEM_NOTIFICATION = "system.notification"
+    INVOICE_SEQUENCE_ALERT = "invoice_sequence.alert"
+
+    # Report job events
+    REPORT_PROGRESS = "report.progress"
+    REPORT_READY = "report.ready"
+    REPORT_FAILED = "report.failed"
 
 
 class WebSocketManager:
@@ -250,6 +259,10 @@ class WebSocketManager:
         """Publish event to Redis for cross - instance broadcasting"""
         event_data["timestamp"] = datetime.now().isoformat()
 
+        # Order / route events make the dashboard snapshot and candidates stale
+        invalidate_dashboard_summary(event_data.get("type"))
+        invalidate_delivery_candidates(event_data.get("type"))
+
         # Removed message queue during compaction - use Redis directly
         if self.redis_client:
             try:
@@ -1,13 +1,19 @@
 """Banking transfer tasks with scheduling and monitoring."""
 
 import asyncio
+import json
 import logging
-from datetime import datetime, time
-from typing import Any, Dict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from typing import Any, Dict, List, Optional
 
-from celery import Celery
+import redis
+from celery import Celery, chain, chord
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
 from sqlalchemy import create_engine
+from redis.exceptions import LockError, RedisError
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
@@ -19,9 +25,10 @@ from app.models.banking import (
     ReconciliationLog,
 )
 from app.services.banking_service import BankingService
-from app.services.banking_sftp import BankingSFTPService
+from app.services.invoice_number_allocator import close_invoice_number_allocator
+from app.services.sftp_pool import close_bank_sftp_pools
+from app.services.encryption import PGPHandler
 from app.services.file_generators.ach_format import TaiwanACHGenerator
-from app.services.notification_service import NotificationService
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -30,8 +37,8 @@ setup_logging()
 # Initialize Celery
 celery_app = Celery(
     "banking_tasks",
-    broker=settings.REDIS_URL or "redis://localhost:6379 / 0",
-    backend=settings.REDIS_URL or "redis://localhost:6379 / 0",
+    broker=settings.REDIS_URL or "redis://localhost:6379/0",
+    backend=settings.REDIS_URL or "redis://localhost:6379/0",
 )
 
 # Configure Celery
@@ -39,7 +46,7 @@ celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
     result_serializer="json",
-    timezone="Asia / Taipei",
+    timezone="Asia/Taipei",
     enable_utc=True,
     task_track_started=True,
     task_time_limit=3600,  # 1 hour
@@ -48,6 +55,32 @@ celery_app.conf.update(
     worker_max_tasks_per_child=1000,
 )
 
+
+# Per-bank task slots and run summaries live next to the broker
+redis_client = redis.from_url(settings.REDIS_URL or "redis://localhost:6379/0")
+
+# How long run summaries stay available to reports
+RUN_SUMMARY_TTL = 2 * 24 * 3600
+
+# Upload attempts of a failed payment batch made by the retry queue
+MAX_UPLOAD_RETRIES = 3
+
+
+@worker_process_shutdown.connect
+def _close_sftp_sessions(**kwargs):
+    """SFTP sessions are pooled per worker process across tasks"""
+    close_bank_sftp_pools()
+
+
+@worker_process_shutdown.connect
+def _release_invoice_numbers(**kwargs):
+    """Invoice number blocks are reserved per worker process"""
+    try:
+        asyncio.run(close_invoice_number_allocator())
+    except Exception as e:
+        logger.error(f"Failed to release invoice numbers: {e}")
+
+
 # Create database session factory
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -73,7 +106,7 @@ celery_app.conf.beat_schedule = {
     # Check for reconciliation files every 30 minutes during business hours
     "check - reconciliation - files": {
         "task": "banking_tasks.check_and_process_reconciliation",
-        "schedule": crontab(minute="*/30", hour="8 - 18"),
+        "schedule": crontab(minute="*/30", hour="8-18"),
         "args": (),
     },
     # Process retry queue every hour
@@ -97,307 +130,537 @@ celery_app.conf.beat_schedule = {
 }
 
 
-@celery_app.task(bind=True, max_retries=3)
+class TaskBusyError(Exception):
+    """Every slot a banking subtask needs is held by other workers"""
+
+    pass
+
+
+@contextmanager
+def _redis_slot(names: List[str]):
+    """
+    Hold the first free Redis lock among ``names``.
+
+    Locks expire with the task time limit, so a worker that dies never
+    keeps a slot.
+
+    Raises:
+        TaskBusyError: If every lock is held
+    """
+    for name in names:
+        lock = redis_client.lock(name, timeout=celery_app.conf.task_time_limit)
+        if lock.acquire(blocking=False):
+            break
+    else:
+        raise TaskBusyError(f"All slots busy: {names[0]}")
+
+    try:
+        yield
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning(f"Slot {name} expired before the task finished")
+
+
+def _bank_slot(bank_code: str):
+    """One of a bank's BANKING_MAX_CONCURRENT_PER_BANK task slots."""
+    return _redis_slot(
+        [
+            f"banking:bank:{bank_code}:slot:{slot}"
+            for slot in range(settings.BANKING_MAX_CONCURRENT_PER_BANK)
+        ]
+    )
+
+
+def _idempotency_lock(key: str):
+    """Only one worker at a time runs the work behind ``key``."""
+    return _redis_slot([f"banking:idempotency:{key}"])
+
+
+def _on_day(column: Any, day: date) -> tuple:
+    """Filters matching a DateTime ``column`` anywhere on ``day``."""
+    start = datetime.combine(day, time.min)
+    return column >= start, column < start + timedelta(days=1)
+
+
+def _payment_key(bank_code: str, processing_date: Any) -> str:
+    """Idempotency key of a bank's payment batch for one day."""
+    if isinstance(processing_date, datetime):
+        processing_date = processing_date.date()
+    if isinstance(processing_date, date):
+        processing_date = processing_date.isoformat()
+    return f"payments:{bank_code}:{processing_date}"
+
+
+def _bank_result(
+    bank_code: str, key: str, started_at: str, status: str, **fields
+) -> Dict[str, Any]:
+    """Result of one bank's subtasks, as collected by the chord callback."""
+    finished_at = datetime.utcnow()
+    result = {
+        "bank_code": bank_code,
+        "idempotency_key": key,
+        "status": status,
+        "started_at": started_at,
+        "finished_at": finished_at.isoformat(),
+        "duration": (
+            finished_at - datetime.fromisoformat(started_at)
+        ).total_seconds(),
+        "error": None,
+    }
+    result.update(fields)
+    return result
+
+
+def _retry_busy(task, e: TaskBusyError, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Retry a subtask whose slot is taken; report it once retries run out."""
+    if task.request.retries >= task.max_retries:
+        # Raising would fail the whole chord
+        return result
+    raise task.retry(countdown=60, exc=e)
+
+
+@celery_app.task(
+    name="banking_tasks.generate_and_upload_payments", bind=True, max_retries=3
+)
 def generate_and_upload_payments(self) -> Dict[str, Any]:
     """
     Generate and upload daily payment files for all active banks.
 
-    This task:
-    1. Queries pending invoices for each bank
-    2. Creates payment batches
-    3. Generates ACH files
-    4. Uploads via SFTP
-    5. Sends notifications
+    Each bank within its processing window gets its own chain of subtasks
+    (create the batch, then upload it), run as one chord so banks proceed
+    in parallel and a slow or failing bank does not hold up the others.
+    ``summarize_banking_run`` collects the per-bank results for
+    ``generate_daily_report``.
     """
     db = next(get_task_db())
-    results = {
-        "processed_banks": [],
-        "total_batches": 0,
-        "total_transactions": 0,
-        "total_amount": 0,
-        "errors": [],
-    }
 
     try:
-        banking_service = BankingService(db)
-        sftp_service = BankingSFTPService(db)
-        notification_service = NotificationService(db)
-        ach_generator = TaiwanACHGenerator()
-
-        # Get all active bank configurations
         banks = db.query(BankConfiguration).filter_by(is_active=True).all()
-
+        bank_codes = []
         for bank_config in banks:
-            try:
-                logger.info(f"Processing payments for {bank_config.bank_code}")
+            # Check if we're within the bank's processing window
+            if not _is_within_processing_window(bank_config):
+                logger.info(f"Outside processing window for {bank_config.bank_code}")
+                continue
+            bank_codes.append(bank_config.bank_code)
 
-                # Check if we're within the bank's processing window
-                if not _is_within_processing_window(bank_config):
-                    logger.info(
-                        f"Outside processing window for {bank_config.bank_code}"
-                    )
-                    continue
+    except Exception as e:
+        logger.error(f"Fatal error in payment generation task: {e}")
+        self.retry(countdown=300, exc=e)  # Retry in 5 minutes
 
-                # Create payment batch
-                batch = banking_service.create_payment_batch(
-                    bank_code=bank_config.bank_code,
-                    processing_date=datetime.utcnow().date(),
-                )
+    finally:
+        db.close()
 
-                if batch.total_transactions == 0:
-                    logger.info(
-                        f"No transactions to process for {bank_config.bank_code}"
-                    )
-                    continue
+    processing_date = datetime.utcnow().date().isoformat()
+    if not bank_codes:
+        logger.info("No banks to process payments for")
+        return {"processing_date": processing_date, "banks": []}
 
-                # Generate ACH file
-                file_content = ach_generator.generate_payment_file(
-                    batch, encoding=bank_config.encoding or "big5"
-                )
+    started_at = datetime.utcnow().isoformat()
+    run = chord(
+        chain(
+            create_bank_payment_batch.s(bank_code, processing_date, started_at),
+            upload_payment_batch.s(),
+        )
+        for bank_code in bank_codes
+    )(summarize_banking_run.s("payments", started_at))
 
-                # Save file content to batch
-                batch.file_content = file_content.decode(bank_config.encoding or "big5")
-                batch.status = PaymentBatchStatus.GENERATED
-                batch.generated_at = datetime.utcnow()
-                db.commit()
+    logger.info(f"Dispatched payment generation for {bank_codes} as run {run.id}")
+    return {"processing_date": processing_date, "banks": bank_codes, "run_id": run.id}
+
+
+@celery_app.task(
+    name="banking_tasks.create_bank_payment_batch",
+    bind=True,
+    max_retries=3,
+    acks_late=True,
+)
+def create_bank_payment_batch(
+    self, bank_code: str, processing_date: str, started_at: str
+) -> Dict[str, Any]:
+    """
+    Create one bank's payment batch for the day.
+
+    The idempotency key is the bank and processing date: a batch already
+    created for them (and not failed) is reused, so a redelivered or
+    re-run task never batches the same pending invoices twice.
+    """
+    key = _payment_key(bank_code, processing_date)
+    db = next(get_task_db())
 
-                # Prepare file for upload
-                file_name = _generate_file_name(
-                    bank_config.payment_file_pattern,
-                    batch.batch_number,
-                    batch.processing_date,
+    try:
+        with _idempotency_lock(key):
+            processing_day = date.fromisoformat(processing_date)
+            batch = (
+                db.query(PaymentBatch)
+                .filter(
+                    PaymentBatch.bank_code == bank_code,
+                    *_on_day(PaymentBatch.processing_date, processing_day),
+                    PaymentBatch.status != PaymentBatchStatus.FAILED,
+                    PaymentBatch.total_transactions > 0,
                 )
+                .order_by(PaymentBatch.id.desc())
+                .first()
+            )
 
-                # Create temporary file
-                import tempfile
+            if batch is None:
+                logger.info(f"Creating payment batch for {bank_code}")
+                batch = BankingService(db).create_payment_batch(
+                    bank_code=bank_code, processing_date=processing_day
+                )
+            else:
+                logger.info(
+                    f"Reusing payment batch {batch.batch_number} for {bank_code}"
+                )
 
-                with tempfile.NamedTemporaryFile(
-                    delete=False, suffix=".txt"
-                ) as tmp_file:
-                    tmp_file.write(file_content)
-                    tmp_path = tmp_file.name
+            if batch.total_transactions == 0:
+                logger.info(f"No transactions to process for {bank_code}")
+                return _bank_result(bank_code, key, started_at, "skipped")
+
+            return _bank_result(
+                bank_code,
+                key,
+                started_at,
+                "created",
+                batch_id=batch.id,
+                batch_number=batch.batch_number,
+            )
 
-                try:
-                    # Upload via SFTP
-                    remote_path = f"{bank_config.upload_path}/{file_name}"
-                    result = asyncio.run(
-                        sftp_service.transfer_file_with_retry(
-                            bank_config=bank_config,
-                            local_path=tmp_path,
-                            remote_path=remote_path,
-                            direction="upload",
-                            encrypt=True,
-                        )
-                    )
+    except TaskBusyError as e:
+        return _retry_busy(
+            self, e, _bank_result(bank_code, key, started_at, "failed", error=str(e))
+        )
 
-                    if result.success:
-                        # Update batch status
-                        batch.status = PaymentBatchStatus.UPLOADED
-                        batch.uploaded_at = datetime.utcnow()
-                        batch.sftp_upload_path = remote_path
-                        batch.file_name = file_name
-                        batch.file_checksum = result.checksum
-                        db.commit()
-
-                        # Track results
-                        results["total_batches"] += 1
-                        results["total_transactions"] += batch.total_transactions
-                        results["total_amount"] += float(batch.total_amount)
-                        results["processed_banks"].append(
-                            {
-                                "bank_code": bank_config.bank_code,
-                                "batch_number": batch.batch_number,
-                                "transactions": batch.total_transactions,
-                                "amount": float(batch.total_amount),
-                                "file_name": file_name,
-                            }
-                        )
+    except Exception as e:
+        logger.error(f"Error creating payment batch for {bank_code}: {e}")
+        return _bank_result(bank_code, key, started_at, "failed", error=str(e))
 
-                        # Send success notification
-                        # TODO: Fix async notification in sync Celery task
-                        # await notification_service.send_notification(
-                        #     type='email',
-                        #     recipient=settings.BANKING_NOTIFICATION_EMAIL,
-                        #     subject=f'Payment Batch Uploaded - {bank_config.bank_name}',
-                        #     content="""
-                        #     Payment batch {batch.batch_number} has been successfully uploaded.
-                        #
-                        #     Details:
-                        #     - Bank: {bank_config.bank_name}
-                        #     - Transactions: {batch.total_transactions}
-                        #     - Total Amount: NT${batch.total_amount:, .2f}
-                        #     - File: {file_name}
-                        #     - Upload Time: {batch.uploaded_at.strftime('%Y-%m-%d %H:%M:%S')}
-                        #     """
-                        # )
-
-                    else:
-                        # Upload failed
-                        batch.status = PaymentBatchStatus.FAILED
-                        batch.error_message = result.error
-                        db.commit()
-
-                        results["errors"].append(
-                            {
-                                "bank_code": bank_config.bank_code,
-                                "batch_number": batch.batch_number,
-                                "error": result.error,
-                            }
-                        )
+    finally:
+        db.close()
 
-                        # Send failure notification
-                        # TODO: Fix async notification in sync Celery task
-                        # await notification_service.send_notification(
-                        #     type='email',
-                        #     recipient=settings.BANKING_NOTIFICATION_EMAIL,
-                        #     subject=f'Payment Batch Upload Failed - {bank_config.bank_name}',
-                        #     content="""
-                        #     Failed to upload payment batch {batch.batch_number}.
-                        #
-                        #     Error: {result.error}
-                        #     Retry Count: {result.retry_count}
-                        #
-                        #     The batch has been added to the retry queue.
-                        #     """
-                        # )
-
-                finally:
-                    # Clean up temp file
-                    import os
-
-                    if os.path.exists(tmp_path):
-                        os.unlink(tmp_path)
 
-            except Exception as e:
-                logger.error(f"Error processing {bank_config.bank_code}: {e}")
-                results["errors"].append(
-                    {"bank_code": bank_config.bank_code, "error": str(e)}
-                )
+@celery_app.task(
+    name="banking_tasks.upload_payment_batch",
+    bind=True,
+    max_retries=3,
+    acks_late=True,
+)
+def upload_payment_batch(self, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Encrypt and upload one payment batch over SFTP.
+
+    Runs in one of the bank's concurrency slots, holding the batch's
+    idempotency key so a redelivered copy waits and then finds the batch
+    uploaded instead of sending it again.
+    """
+    if result["status"] != "created":
+        return result
+
+    bank_code = result["bank_code"]
+    done = partial(
+        _bank_result,
+        bank_code,
+        result["idempotency_key"],
+        result["started_at"],
+        batch_id=result["batch_id"],
+        batch_number=result["batch_number"],
+    )
+    db = next(get_task_db())
+
+    try:
+        with _idempotency_lock(result["idempotency_key"]), _bank_slot(bank_code):
+            batch = db.get(PaymentBatch, result["batch_id"])
+            if batch.status == PaymentBatchStatus.UPLOADED:
+                return done("already_uploaded", file_name=batch.file_name)
+
+            bank_config = (
+                db.query(BankConfiguration)
+                .filter_by(bank_code=bank_code, is_active=True)
+                .first()
+            )
+            if not bank_config:
+                raise ValueError(f"No active configuration for bank {bank_code}")
+
+            banking_service = BankingService(db)
+            ach_generator = TaiwanACHGenerator()
+            pgp = PGPHandler()
+            encoding = bank_config.encoding or "big5"
+
+            # Prepare file for upload
+            file_name = _generate_file_name(
+                bank_config.payment_file_pattern,
+                batch.batch_number,
+                batch.processing_date,
+            )
+
+            def write_encrypted(remote_file):
+                # generator -> encryption -> SFTP, one record at a time
+                with pgp.encrypting_writer(remote_file, bank_code) as plaintext:
+                    ach_generator.write_payment_file(batch, plaintext, encoding)
 
-                # Send error notification
-                await notification_service.send_alert(
-                    level="error",
-                    message=f"Banking task error for {bank_config.bank_code}: {e}",
+            batch.generated_at = datetime.utcnow()
+            try:
+                upload = banking_service.upload_stream(
+                    bank_config, file_name, write_encrypted
                 )
+            except Exception as e:
+                # Upload failed
+                batch.status = PaymentBatchStatus.FAILED
+                batch.error_message = str(e)
+                db.commit()
+                logger.error(f"Failed to upload {batch.batch_number}: {e}")
+                return done("failed", file_name=file_name, error=str(e))
+
+            # Update batch status
+            batch.status = PaymentBatchStatus.UPLOADED
+            batch.uploaded_at = datetime.utcnow()
+            batch.sftp_upload_path = upload["remote_path"]
+            batch.file_name = file_name
+            db.commit()
+
+            return done(
+                "uploaded",
+                file_name=file_name,
+                transactions=batch.total_transactions,
+                amount=float(batch.total_amount),
+                # payment_batches has no checksum column; the run summary keeps it
+                checksum=upload["checksum"],
+            )
 
-        logger.info(f"Daily payment generation completed: {results}")
-        return results
+    except TaskBusyError as e:
+        return _retry_busy(self, e, done("failed", error=str(e)))
 
     except Exception as e:
-        logger.error(f"Fatal error in payment generation task: {e}")
-        self.retry(countdown=300, exc=e)  # Retry in 5 minutes
+        logger.error(f"Error uploading payment batch for {bank_code}: {e}")
+        return done("failed", error=str(e))
 
     finally:
         db.close()
 
 
-@celery_app.task(bind=True, max_retries=3)
+@celery_app.task(
+    name="banking_tasks.check_and_process_reconciliation", bind=True, max_retries=3
+)
 def check_and_process_reconciliation(self) -> Dict[str, Any]:
     """
     Check for and process reconciliation files from all banks.
+
+    Each bank is checked by its own ``reconcile_bank`` subtask, run as one
+    chord summarized by ``summarize_banking_run``.
     """
     db = next(get_task_db())
+
+    try:
+        bank_codes = [
+            code
+            for (code,) in db.query(BankConfiguration.bank_code).filter_by(
+                is_active=True
+            )
+        ]
+
+    except Exception as e:
+        logger.error(f"Fatal error in reconciliation task: {e}")
+        self.retry(countdown=600, exc=e)  # Retry in 10 minutes
+
+    finally:
+        db.close()
+
+    if not bank_codes:
+        return {"banks_checked": 0}
+
+    started_at = datetime.utcnow().isoformat()
+    run = chord(reconcile_bank.s(bank_code, started_at) for bank_code in bank_codes)(
+        summarize_banking_run.s("reconciliation", started_at)
+    )
+
+    logger.info(f"Dispatched reconciliation for {bank_codes} as run {run.id}")
+    return {"banks_checked": len(bank_codes), "run_id": run.id}
+
+
+@celery_app.task(
+    name="banking_tasks.reconcile_bank",
+    bind=True,
+    max_retries=3,
+    acks_late=True,
+)
+def reconcile_bank(self, bank_code: str, started_at: str) -> Dict[str, Any]:
+    """
+    Download and process one bank's new reconciliation files.
+
+    The idempotency key is the bank: one worker at a time lists and
+    processes its files, and files with a reconciliation log are skipped.
+    """
+    key = f"reconciliation:{bank_code}"
     results = {
-        "banks_checked": 0,
         "files_found": 0,
         "files_processed": 0,
         "transactions_reconciled": 0,
-        "errors": [],
+        "file_errors": [],
     }
+    db = next(get_task_db())
 
     try:
-        banking_service = BankingService(db)
-        BankingSFTPService(db)
-        NotificationService(db)
+        with _idempotency_lock(key), _bank_slot(bank_code):
+            banking_service = BankingService(db)
+            logger.info(f"Checking reconciliation files for {bank_code}")
 
-        # Get all active bank configurations
-        banks = db.query(BankConfiguration).filter_by(is_active=True).all()
-        results["banks_checked"] = len(banks)
+            # Check for new files
+            new_files = banking_service.check_reconciliation_files(bank_code)
+            results["files_found"] = len(new_files)
 
-        for bank_config in banks:
-            try:
-                logger.info(
-                    f"Checking reconciliation files for {bank_config.bank_code}"
-                )
+            # One pooled session, reads pipelined across files
+            contents, _ = banking_service.download_reconciliation_files(
+                bank_code, new_files
+            )
 
-                # Check for new files
-                new_files = banking_service.check_reconciliation_files(
-                    bank_config.bank_code
-                )
-                results["files_found"] += len(new_files)
+            for file_name in new_files:
+                try:
+                    # Files that failed in the batch are downloaded once more
+                    # on their own; a second failure is logged for review
+                    log = banking_service.process_reconciliation_file(
+                        bank_code, file_name, content=contents.get(file_name)
+                    )
 
-                for file_name in new_files:
-                    try:
-                        # Process reconciliation file
-                        log = banking_service.process_reconciliation_file(
-                            bank_config.bank_code, file_name
-                        )
+                    results["files_processed"] += 1
+                    results["transactions_reconciled"] += log.matched_records
 
-                        results["files_processed"] += 1
-                        results["transactions_reconciled"] += log.matched_records
-
-                        # Send notification for unmatched transactions
-                        if log.unmatched_records > 0:
-                            # TODO: Fix async notification in sync Celery task
-                            # await notification_service.send_notification(
-                            #     type='email',
-                            #     recipient=settings.BANKING_NOTIFICATION_EMAIL,
-                            #     subject=f'Reconciliation Alert - {bank_config.bank_name}',
-                            #     content="""
-                            #     Reconciliation file {file_name} has been processed with unmatched transactions.
-                            #
-                            #     Summary:
-                            #     - Total Records: {log.total_records}
-                            #     - Matched: {log.matched_records}
-                            #     - Unmatched: {log.unmatched_records}
-                            #     - Failed: {log.failed_records}
-                            #
-                            #     Please review the unmatched transactions in the admin panel.
-                            #     """
-                            # )
-                            pass  # TODO: Implement sync notification
-
-                    except Exception as e:
-                        logger.error(f"Error processing {file_name}: {e}")
-                        results["errors"].append(
-                            {
-                                "bank_code": bank_config.bank_code,
-                                "file_name": file_name,
-                                "error": str(e),
-                            }
+                    if log.unmatched_records > 0:
+                        # TODO: Implement sync notification for unmatched transactions
+                        logger.warning(
+                            f"{file_name} has {log.unmatched_records} unmatched records"
                         )
 
-            except Exception as e:
-                logger.error(f"Error checking {bank_config.bank_code}: {e}")
-                results["errors"].append(
-                    {"bank_code": bank_config.bank_code, "error": str(e)}
-                )
+                except Exception as e:
+                    logger.error(f"Error processing {file_name}: {e}")
+                    results["file_errors"].append(
+                        {"file_name": file_name, "error": str(e)}
+                    )
+
+        status = "partial" if results["file_errors"] else "completed"
+        return _bank_result(bank_code, key, started_at, status, **results)
 
-        logger.info(f"Reconciliation check completed: {results}")
-        return results
+    except TaskBusyError as e:
+        return _retry_busy(
+            self,
+            e,
+            _bank_result(bank_code, key, started_at, "failed", error=str(e), **results),
+        )
 
     except Exception as e:
-        logger.error(f"Fatal error in reconciliation task: {e}")
-        self.retry(countdown=600, exc=e)  # Retry in 10 minutes
+        logger.error(f"Error checking {bank_code}: {e}")
+        return _bank_result(
+            bank_code, key, started_at, "failed", error=str(e), **results
+        )
 
     finally:
         db.close()
 
 
-@celery_app.task
-def process_retry_queue() -> Dict[str, Any]:
-    """Process failed transfers from the retry queue."""
-    db = next(get_task_db())
+@celery_app.task(name="banking_tasks.summarize_banking_run")
+def summarize_banking_run(
+    results: List[Dict[str, Any]], kind: str, started_at: str
+) -> Dict[str, Any]:
+    """
+    Chord callback: summarize one run's per-bank results.
+
+    The summary is kept in Redis for two days under the run's kind and date,
+    where ``generate_daily_report`` picks it up.
+    """
+    finished_at = datetime.utcnow()
+    durations = [result["duration"] for result in results]
+    summary = {
+        "kind": kind,
+        "started_at": started_at,
+        "finished_at": finished_at.isoformat(),
+        # Wall clock for the run vs. what running banks one by one would take
+        "cycle_seconds": (
+            finished_at - datetime.fromisoformat(started_at)
+        ).total_seconds(),
+        "slowest_bank_seconds": max(durations, default=0),
+        "serial_seconds": sum(durations),
+        "banks": results,
+        "failed_banks": [
+            result["bank_code"] for result in results if result["status"] == "failed"
+        ],
+    }
 
     try:
-        sftp_service = BankingSFTPService(db)
+        redis_client.setex(
+            _run_summary_key(kind, started_at[:10]),
+            RUN_SUMMARY_TTL,
+            json.dumps(summary),
+        )
+    except RedisError as e:
+        logger.error(f"Failed to store {kind} run summary: {e}")
+
+    logger.info(
+        f"Banking {kind} run finished in {summary['cycle_seconds']:.1f}s, "
+        f"failed banks: {summary['failed_banks']}"
+    )
+    return summary
+
+
+def _run_summary_key(kind: str, day: str) -> str:
+    return f"banking:runs:{kind}:{day}"
+
+
+def _load_run_summary(kind: str, day: str) -> Optional[Dict[str, Any]]:
+    """Latest run summary of ``kind`` for ``day`` (ISO date), if any."""
+    try:
+        summary = redis_client.get(_run_summary_key(kind, day))
+    except RedisError as e:
+        logger.error(f"Failed to load {kind} run summary: {e}")
+        return None
+    return json.loads(summary) if summary else None
+
+
+@celery_app.task(name="banking_tasks.process_retry_queue")
+def process_retry_queue() -> Dict[str, Any]:
+    """
+    Upload today's failed payment batches again.
 
-        # Process retry queue
-        processed = asyncio.run(sftp_service.process_retry_queue())
+    Each batch is retried up to ``MAX_UPLOAD_RETRIES`` times through
+    ``upload_payment_batch``, one subtask per batch.
+    """
+    db = next(get_task_db())
 
-        logger.info(f"Processed {processed} items from retry queue")
+    try:
+        batches = (
+            db.query(PaymentBatch)
+            .filter(
+                PaymentBatch.status == PaymentBatchStatus.FAILED,
+                *_on_day(PaymentBatch.processing_date, datetime.utcnow().date()),
+                PaymentBatch.total_transactions > 0,
+                PaymentBatch.retry_count < MAX_UPLOAD_RETRIES,
+            )
+            .all()
+        )
+        if not batches:
+            return {"processed": 0}
+
+        started_at = datetime.utcnow().isoformat()
+        retries = []
+        for batch in batches:
+            batch.retry_count = (batch.retry_count or 0) + 1
+            retries.append(
+                upload_payment_batch.s(
+                    _bank_result(
+                        batch.bank_code,
+                        _payment_key(batch.bank_code, batch.processing_date),
+                        started_at,
+                        "created",
+                        batch_id=batch.id,
+                        batch_number=batch.batch_number,
+                    )
+                )
+            )
+        db.commit()
 
-        return {"processed": processed, "remaining": sftp_service._retry_queue.qsize()}
+        run = chord(retries)(summarize_banking_run.s("retries", started_at))
+        logger.info(f"Retrying {len(retries)} failed payment batches as run {run.id}")
+        return {"processed": len(retries), "run_id": run.id}
 
     except Exception as e:
         logger.error(f"Error processing retry queue: {e}")
@@ -407,7 +670,7 @@ def process_retry_queue() -> Dict[str, Any]:
         db.close()
 
 
-@celery_app.task
+@celery_app.task(name="banking_tasks.generate_daily_report")
 def generate_daily_report() -> Dict[str, Any]:
     """Generate daily banking operations report."""
     db = next(get_task_db())
@@ -418,7 +681,9 @@ def generate_daily_report() -> Dict[str, Any]:
 
         # Query batches
         batches = (
-            db.query(PaymentBatch).filter(PaymentBatch.processing_date == today).all()
+            db.query(PaymentBatch)
+            .filter(*_on_day(PaymentBatch.processing_date, today))
+            .all()
         )
 
         # Query reconciliations
@@ -450,10 +715,14 @@ def generate_daily_report() -> Dict[str, Any]:
                 ),
                 "failed_transactions": sum(r.failed_records for r in reconciliations),
             },
+            # Per-bank timings and failures of today's latest task runs
+            "task_runs": {
+                kind: _load_run_summary(kind, today.isoformat())
+                for kind in ("payments", "reconciliation", "retries")
+            },
         }
 
         # Send report
-        NotificationService(db)
         # TODO: Fix async notification in sync Celery task
         # await notification_service.send_notification(
         #     type='email',
@@ -473,28 +742,38 @@ def generate_daily_report() -> Dict[str, Any]:
         db.close()
 
 
-@celery_app.task
+@celery_app.task(name="banking_tasks.perform_health_check")
 def perform_health_check() -> Dict[str, Any]:
     """Perform health check on banking SFTP connections."""
     db = next(get_task_db())
 
     try:
-        sftp_service = BankingSFTPService(db)
-        health = sftp_service.health_check()
+        banking_service = BankingService(db)
+        checks = []
+        for bank_config in db.query(BankConfiguration).filter_by(is_active=True):
+            try:
+                with banking_service.get_sftp_client(bank_config) as sftp:
+                    sftp.stat(bank_config.upload_path)
+                checks.append({"bank": bank_config.bank_code, "status": "ok"})
+            except Exception as e:
+                checks.append(
+                    {"bank": bank_config.bank_code, "status": "failed", "error": str(e)}
+                )
+
+        failed_banks = [
+            check["bank"] for check in checks if check["status"] == "failed"
+        ]
+        health = {
+            "status": "degraded" if failed_banks else "healthy",
+            "checks": checks,
+        }
 
         # Check for degraded status
-        if health["status"] == "degraded":
-            # Send alert
-            notification_service = NotificationService(db)
-            failed_banks = [
-                check["bank"]
-                for check in health["checks"]
-                if check["status"] == "failed"
-            ]
-
-            await notification_service.send_alert(
-                level="warning",
-                message=f"Banking SFTP connections degraded. Failed banks: {', '.join(failed_banks)}",
+        if failed_banks:
+            # TODO: Fix async notification in sync Celery task
+            # await notification_service.send_alert(...)
+            logger.warning(
+                f"Banking SFTP connections degraded. Failed banks: {', '.join(failed_banks)}"
             )
 
         return health
@@ -520,7 +799,7 @@ def _is_within_processing_window(bank_config: BankConfiguration) -> bool:
         # Get current Taiwan time
         from pytz import timezone
 
-        taiwan_tz = timezone("Asia / Taipei")
+        taiwan_tz = timezone("Asia/Taipei")
         current_time = datetime.now(taiwan_tz).time()
 
         return current_time < cutoff
@@ -538,7 +817,7 @@ def _generate_file_name(pattern: str, batch_number: str, date: datetime) -> str:
         "{YYYY}": date.strftime("%Y"),
         "{MM}": date.strftime("%m"),
         "{DD}": date.strftime("%d"),
-        "{YYYYMMDD}": date.strftime("%Y % m % d"),
+        "{YYYYMMDD}": date.strftime("%Y%m%d"),
         "{BATCH}": batch_number,
         "{TIMESTAMP}": str(int(time_module.time())),
     }
@@ -576,7 +855,7 @@ This is an automated report. For details, please check the admin panel.
 # Manual task triggers for testing
 
 
-@celery_app.task
+@celery_app.task(name="banking_tasks.test_bank_connection")
 def test_bank_connection(bank_code: str) -> Dict[str, Any]:
     """Test SFTP connection for a specific bank."""
     db = next(get_task_db())
@@ -591,9 +870,9 @@ def test_bank_connection(bank_code: str) -> Dict[str, Any]:
         if not bank_config:
             return {"error": f"Bank {bank_code} not found or inactive"}
 
-        sftp_service = BankingSFTPService(db)
+        banking_service = BankingService(db)
 
-        with sftp_service.get_sftp_connection(bank_config) as sftp:
+        with banking_service.get_sftp_client(bank_config) as sftp:
             # Test operations
             sftp.stat(".")
             files = sftp.listdir(bank_config.upload_path)
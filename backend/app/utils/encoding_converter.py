@@ -1,17 +1,33 @@
 """
 Big5 to UTF - 8 encoding converter for Taiwan data migration
 Handles Traditional Chinese character conversion with proper error handling
+
+DataFrame columns are converted in bulk: the encoding is detected once per
+column from a sample, byte values are decoded with a single decode call and
+special characters are mapped with one translate table. SQLite tables are read
+and written in chunks.
 """
 
 import logging
 import sqlite3
+import sys
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import chardet
 import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Bytes of a column passed to chardet
+DETECTION_SAMPLE_SIZE = 64 * 1024
+
+# Rows read from a SQLite table at a time
+SQLITE_CHUNK_SIZE = 10000
+
+# Joins cells for bulk decoding; never part of a Big5 or UTF - 8 sequence
+CELL_SEPARATOR = b"\x00"
+
 
 class Big5ToUTF8Converter:
     """
@@ -31,6 +47,7 @@ class Big5ToUTF8Converter:
         "\u2013": "–",  # En dash
         "\u2014": "—",  # Em dash
     }
+    SPECIAL_CHARS_TABLE = str.maketrans(SPECIAL_CHARS_MAP)
 
     # Known problematic Big5 code points
     PROBLEM_CHARS = {
@@ -59,6 +76,7 @@ class Big5ToUTF8Converter:
             "failed": 0,
             "replaced_chars": 0,
             "encoding_detected": {},
+            "columns": {},
         }
 
     def detect_encoding(self, data: bytes) -> str:
@@ -117,48 +135,55 @@ class Big5ToUTF8Converter:
         if isinstance(text, bytes):
             if not source_encoding:
                 source_encoding = self.detect_encoding(text)
-                self.conversion_stats["encoding_detected"][source_encoding] = (
-                    self.conversion_stats["encoding_detected"].get(source_encoding, 0)
-                    + 1
-                )
+                self._count_encoding(source_encoding, 1)
 
-            try:
-                # Primary conversion attempt
-                result = text.decode(source_encoding, errors="strict")
+            result, ok = self._decode(text, source_encoding)
+            self.conversion_stats["successful" if ok else "failed"] += 1
+            return result
 
-                # Apply special character mappings
-                for old_char, new_char in self.SPECIAL_CHARS_MAP.items():
-                    if old_char in result:
-                        result = result.replace(old_char, new_char)
-                        self.conversion_stats["replaced_chars"] += 1
+        return str(text)
 
-                self.conversion_stats["successful"] += 1
-                return result
+    def _decode(self, text: bytes, encoding: str) -> Tuple[str, bool]:
+        """
+        Decode one value and map special characters.
 
-            except UnicodeDecodeError as e:
-                # Try handling known problematic characters
-                result = self._handle_problem_chars(text, source_encoding)
-                if result:
-                    self.conversion_stats["successful"] += 1
-                    return result
+        Returns:
+            Decoded text and whether it decoded without falling back
+        """
+        try:
+            # Primary conversion attempt
+            result = text.decode(encoding, errors="strict")
+        except UnicodeDecodeError as e:
+            # Try handling known problematic characters
+            result = self._handle_problem_chars(text, encoding)
+            if result:
+                return result, True
+
+            # Fallback error handling
+            self.conversion_errors.append(
+                {
+                    "text": text[:50],  # First 50 bytes for logging
+                    "error": str(e),
+                    "position": e.start,
+                }
+            )
 
-                # Fallback error handling
+            if self.fallback_errors == "strict":
                 self.conversion_stats["failed"] += 1
-                self.conversion_errors.append(
-                    {
-                        "text": text[:50],  # First 50 bytes for logging
-                        "error": str(e),
-                        "position": e.start,
-                    }
-                )
+                raise
 
-                if self.fallback_errors == "strict":
-                    raise
+            # Use fallback error handling
+            return text.decode(encoding, errors=self.fallback_errors), False
 
-                # Use fallback error handling
-                return text.decode(source_encoding, errors=self.fallback_errors)
+        # Apply special character mappings
+        translated = result.translate(self.SPECIAL_CHARS_TABLE)
+        if translated != result:
+            self.conversion_stats["replaced_chars"] += 1
+        return translated, True
 
-        return str(text)
+    def _count_encoding(self, encoding: str, count: int):
+        detected = self.conversion_stats["encoding_detected"]
+        detected[encoding] = detected.get(encoding, 0) + count
 
     def _handle_problem_chars(self, text: bytes, encoding: str) -> Optional[str]:
         """
@@ -222,8 +247,106 @@ class Big5ToUTF8Converter:
 
         return result
 
+    def convert_series(
+        self,
+        series: pd.Series,
+        source_encoding: Optional[str] = None,
+        column: Optional[str] = None,
+    ) -> Tuple[pd.Series, Optional[str]]:
+        """
+        Convert a column from Big5 to UTF - 8 in bulk.
+
+        Byte values are decoded together with one encoding, detected once from
+        a sample of the column unless given. If the bulk decode fails, values
+        are decoded one by one with the same encoding so only the bad cells
+        fall back. Statistics are recorded once for the whole column.
+
+        Args:
+            series: Column to convert
+            source_encoding: Force specific encoding (default: auto - detect)
+            column: Column name used in the statistics
+
+        Returns:
+            Converted column and the encoding used for byte values
+        """
+        values = series[series.notna()]
+        converted = series.astype(object)
+        column_stats = {"processed": len(values), "failed": 0, "encoding": None}
+
+        is_bytes = values.map(lambda value: isinstance(value, (bytes, bytearray)))
+        raw = values[is_bytes]
+        if not raw.empty:
+            if not source_encoding:
+                source_encoding = self.detect_encoding(self._sample(raw))
+            self._count_encoding(source_encoding, len(raw))
+            decoded, column_stats["failed"] = self._decode_column(raw, source_encoding)
+            converted.loc[raw.index] = decoded.values
+            column_stats["encoding"] = source_encoding
+
+        text = values[~is_bytes].map(str)
+        if not text.empty:
+            # Strings that are not valid UTF - 8 (lone surrogates) are re - decoded
+            invalid = text.str.contains("[\ud800-\udfff]", regex=True)
+            for index in text.index[invalid]:
+                result, ok = self._decode(
+                    text[index].encode("big5", errors="ignore"), "big5"
+                )
+                text[index] = result
+                column_stats["failed"] += 0 if ok else 1
+            converted.loc[text.index] = text.values
+
+        self.conversion_stats["total_processed"] += column_stats["processed"]
+        self.conversion_stats["successful"] += (
+            column_stats["processed"] - column_stats["failed"]
+        )
+        self.conversion_stats["failed"] += column_stats["failed"]
+        if column is not None:
+            self.conversion_stats["columns"][column] = column_stats
+
+        return converted, source_encoding
+
+    def _decode_column(self, raw: pd.Series, encoding: str) -> Tuple[pd.Series, int]:
+        """Decode byte values in one call, per value if that fails."""
+        cells = [bytes(value) for value in raw]
+        try:
+            parts = CELL_SEPARATOR.join(cells).decode(encoding, errors="strict")
+            parts = parts.split(CELL_SEPARATOR.decode(encoding))
+        except (UnicodeDecodeError, LookupError):
+            parts = None
+
+        if parts is not None and len(parts) == len(cells):
+            decoded = pd.Series(parts, index=raw.index, dtype=object)
+            translated = decoded.str.translate(self.SPECIAL_CHARS_TABLE)
+            self.conversion_stats["replaced_chars"] += int(
+                (translated != decoded).sum()
+            )
+            return translated, 0
+
+        results = []
+        failed = 0
+        for cell in cells:
+            result, ok = self._decode(cell, encoding)
+            results.append(result)
+            failed += 0 if ok else 1
+        return pd.Series(results, index=raw.index, dtype=object), failed
+
+    @staticmethod
+    def _sample(raw: pd.Series) -> bytes:
+        """Leading bytes of a column for encoding detection."""
+        sample = []
+        size = 0
+        for value in raw:
+            sample.append(bytes(value))
+            size += len(value) + 1
+            if size >= DETECTION_SAMPLE_SIZE:
+                break
+        return CELL_SEPARATOR.join(sample)
+
     def convert_dataframe(
-        self, df: pd.DataFrame, columns: List[str] = None
+        self,
+        df: pd.DataFrame,
+        columns: List[str] = None,
+        source_encodings: Optional[Dict[str, str]] = None,
     ) -> pd.DataFrame:
         """
         Convert pandas DataFrame columns from Big5 to UTF - 8.
@@ -231,6 +354,8 @@ class Big5ToUTF8Converter:
         Args:
             df: DataFrame to convert
             columns: Specific columns to convert (None = all string columns)
+            source_encodings: Encoding per column; columns that are detected
+                are added, so chunks of one table only detect once
 
         Returns:
             DataFrame with converted values
@@ -240,61 +365,110 @@ class Big5ToUTF8Converter:
         # Determine columns to convert
         if columns is None:
             columns = df_copy.select_dtypes(include=["object"]).columns.tolist()
+        if source_encodings is None:
+            source_encodings = {}
 
         # Convert each column
         for col in columns:
             if col in df_copy.columns:
-                df_copy[col] = df_copy[col].apply(
-                    lambda x: self.convert_string(x) if pd.notna(x) else x
+                df_copy[col], encoding = self.convert_series(
+                    df_copy[col], source_encodings.get(col), column=col
                 )
+                if encoding:
+                    source_encodings[col] = encoding
 
         return df_copy
 
+    def iter_sqlite_table(
+        self,
+        db_path: str,
+        table_name: str,
+        text_columns: List[str],
+        chunk_size: int = SQLITE_CHUNK_SIZE,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yield a SQLite table converted from Big5 to UTF - 8 in chunks.
+
+        Column encodings are detected on the first chunk and reused.
+        """
+        conn = sqlite3.connect(db_path)
+        source_encodings: Dict[str, str] = {}
+        try:
+            for chunk in pd.read_sql_query(
+                f"SELECT * FROM {table_name}", conn, chunksize=chunk_size
+            ):
+                yield self.convert_dataframe(
+                    chunk, columns=text_columns, source_encodings=source_encodings
+                )
+        finally:
+            conn.close()
+
     def convert_sqlite_table(
         self,
         db_path: str,
         table_name: str,
         text_columns: List[str],
         output_path: str = None,
-    ) -> pd.DataFrame:
+        chunk_size: int = SQLITE_CHUNK_SIZE,
+        return_data: bool = True,
+    ) -> Optional[pd.DataFrame]:
         """
         Convert SQLite table from Big5 to UTF - 8.
 
+        CSV and SQLite outputs are written chunk by chunk; with
+        ``return_data=False`` memory use is bounded by ``chunk_size``.
+
         Args:
             db_path: Path to SQLite database
             table_name: Table name to convert
             text_columns: List of text columns to convert
             output_path: Optional path to save converted data
+            chunk_size: Rows converted at a time
+            return_data: Return the whole converted table
 
         Returns:
-            Converted DataFrame
+            Converted DataFrame (None if ``return_data`` is False)
         """
-        # Connect to database
-        conn = sqlite3.connect(db_path)
+        keep = return_data or (output_path or "").endswith(".xlsx")
+        chunks = []
+        conn_out = None
+        if output_path and not output_path.endswith((".csv", ".xlsx")):
+            # Save as new SQLite
+            conn_out = sqlite3.connect(output_path)
 
-        # Read table
-        query = f"SELECT * FROM {table_name}"
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        try:
+            for index, chunk in enumerate(
+                self.iter_sqlite_table(db_path, table_name, text_columns, chunk_size)
+            ):
+                if output_path and output_path.endswith(".csv"):
+                    chunk.to_csv(
+                        output_path,
+                        mode="w" if index == 0 else "a",
+                        header=index == 0,
+                        index=False,
+                        encoding="utf - 8",
+                    )
+                elif conn_out is not None:
+                    chunk.to_sql(
+                        table_name,
+                        conn_out,
+                        if_exists="replace" if index == 0 else "append",
+                        index=False,
+                    )
+                if keep:
+                    chunks.append(chunk)
+        finally:
+            if conn_out is not None:
+                conn_out.close()
 
-        # Convert specified columns
-        df_converted = self.convert_dataframe(df, columns=text_columns)
+        if not keep:
+            return None
 
-        # Save if output path provided
-        if output_path:
-            if output_path.endswith(".csv"):
-                df_converted.to_csv(output_path, index=False, encoding="utf - 8")
-            elif output_path.endswith(".xlsx"):
-                df_converted.to_excel(output_path, index=False)
-            else:
-                # Save as new SQLite
-                conn_out = sqlite3.connect(output_path)
-                df_converted.to_sql(
-                    table_name, conn_out, if_exists="replace", index=False
-                )
-                conn_out.close()
+        df_converted = pd.concat(chunks, ignore_index=True)
+        if output_path and output_path.endswith(".xlsx"):
+            df_converted.to_excel(output_path, index=False)
 
-        return df_converted
+        return df_converted if return_data else None
 
     def convert_file(
         self, input_path: str, output_path: str, source_encoding: str = "big5"
@@ -357,6 +531,7 @@ class Big5ToUTF8Converter:
             "failed": 0,
             "replaced_chars": 0,
             "encoding_detected": {},
+            "columns": {},
         }
 
 
@@ -515,4 +690,4 @@ if __name__ == "__main__":
     # print(f"\nConversion complete. Converted {len(results)} tables.")
     for table, df in results.items():
         if df is not None:
-            # print(f"  - {table}: {len(df)} rows")
+            logger.info(f"  - {table}: {len(df)} rows")
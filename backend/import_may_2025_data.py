@@ -8,7 +8,7 @@ import os
 import sys
 import pandas as pd
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
 import logging
 from typing import Optional
@@ -19,7 +19,17 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app.core.config import settings
 from app.core.database import Base
 # Import models from the main models file
-from app.models import Customer, Order, OrderStatus, GasProduct
+from app.models import (
+    Customer,
+    DeliveryHistory,
+    DeliveryHistoryItem,
+    GasProduct,
+    Order,
+    OrderItem,
+    OrderStatus,
+)
+from app.models.order import PaymentStatus
+from app.services.bulk_loader import BulkLoader, iter_source_chunks
 
 # Configure logging
 logging.basicConfig(
@@ -189,127 +199,153 @@ class DataImporter:
             raise
     
     def import_delivery_history(self):
-        """Import delivery history from Excel"""
+        """
+        Import delivery history from Excel
+
+        The file is streamed in chunks. Customer codes are resolved from a map
+        built once, primary keys for history, orders and their items are
+        pre-allocated from the table sequences, and every chunk is written with
+        COPY (executemany INSERT on SQLite) and committed, so memory stays
+        constant for the 350,000+ row backfill.
+        """
         logger.info(f"Reading delivery history from: {self.delivery_file}")
-        
-        # Read Excel file
-        df = pd.read_excel(self.delivery_file)
-        logger.info(f"Found {len(df)} delivery records in Excel file")
-        
-        # Group by date and customer to create delivery batches
+
+        customers = {
+            code: (customer_id, address)
+            for code, customer_id, address in self.session.execute(
+                select(Customer.customer_code, Customer.id, Customer.address)
+            )
+        }
+        logger.info(f"Loaded {len(customers)} customer codes")
+
         imported_count = 0
-        
-        for index, row in df.iterrows():
-            try:
-                # Parse date
-                transaction_date = pd.to_datetime(row.get('交易日期'))
-                if pd.isna(transaction_date):
-                    logger.warning(f"Row {index}: Missing transaction date, skipping")
-                    continue
-                
-                # Get customer
-                customer_code = self.clean_string(row.get('客戶代號'))
-                if not customer_code:
-                    logger.warning(f"Row {index}: Missing customer code, skipping")
-                    continue
-                
-                customer = self.session.query(Customer).filter_by(
-                    customer_code=customer_code
-                ).first()
-                
-                if not customer:
-                    logger.warning(f"Row {index}: Customer {customer_code} not found, skipping")
+        skipped_count = 0
+        for chunk in iter_source_chunks(self.delivery_file):
+            loaded, skipped = self._load_delivery_chunk(chunk, customers)
+            self.session.commit()
+            imported_count += loaded
+            skipped_count += skipped
+            logger.info(f"Processed {imported_count} delivery records...")
+
+        logger.info(
+            f"Delivery history import completed: {imported_count} records imported, "
+            f"{skipped_count} skipped"
+        )
+
+    def _load_delivery_chunk(self, chunk: pd.DataFrame, customers: dict):
+        """Write one chunk of delivery rows; returns (loaded, skipped) counts"""
+        dates = pd.to_datetime(chunk.get('交易日期'), errors='coerce')
+        codes = chunk['客戶代號'].astype(str).str.strip()
+        valid = dates.notna() & codes.isin(list(customers))
+        skipped = int((~valid).sum())
+        if skipped:
+            logger.warning(
+                f"Skipping {skipped} rows with a missing date or unknown customer code"
+            )
+
+        chunk = chunk[valid]
+        if chunk.empty:
+            return 0, skipped
+        dates = dates[valid]
+        codes = codes[valid]
+
+        quantities = {}
+        for product_key in self.product_mapping:
+            column = chunk.get(product_key.upper())
+            if column is None:
+                quantities[product_key] = [0] * len(chunk)
+                continue
+            quantities[product_key] = (
+                pd.to_numeric(column.astype(str).str.replace(',', ''), errors='coerce')
+                .fillna(0)
+                .astype(int)
+                .tolist()
+            )
+        times = [self.clean_string(value) for value in chunk.get('交易時間', [None] * len(chunk))]
+        notes = [self.clean_string(value) for value in chunk.get('備註', [None] * len(chunk))]
+
+        loader = BulkLoader(self.session.connection())
+        history_ids = loader.allocate_ids(DeliveryHistory.__table__, len(chunk))
+        order_ids = loader.allocate_ids(Order.__table__, len(chunk))
+
+        source_file = os.path.basename(self.delivery_file)
+        history_rows, order_rows, history_lines, order_lines = [], [], [], []
+        for index, (transaction_date, code) in enumerate(zip(dates, codes)):
+            customer_id, address = customers[code]
+            history_id, order_id = history_ids[index], order_ids[index]
+            row_quantities = {key: quantities[key][index] for key in self.product_mapping}
+
+            total_amount = 0.0
+            for product_key, quantity in row_quantities.items():
+                if quantity <= 0:
                     continue
-                
-                # Create delivery history record
-                delivery_history = DeliveryHistory(
-                    customer_id=customer.id,
-                    delivery_date=transaction_date.date(),
-                    delivery_time=self.clean_string(row.get('交易時間')),
-                    total_amount=0,  # Will calculate from items
-                    delivery_address=customer.address,
-                    driver_id=None,  # Would need driver mapping
-                    route_id=None,  # Would need route mapping
-                    status='completed',
-                    notes=self.clean_string(row.get('備註'))
-                )
-                self.session.add(delivery_history)
-                self.session.flush()  # Get the ID
-                
-                # Add delivery items
-                total_amount = 0
-                cylinders = {
-                    '50kg': self.clean_numeric(row.get('50KG')),
-                    '20kg': self.clean_numeric(row.get('20KG')),
-                    '16kg': self.clean_numeric(row.get('16KG')),
-                    '10kg': self.clean_numeric(row.get('10KG')),
-                    '4kg': self.clean_numeric(row.get('4KG')),
+                product_info = self.product_mapping[product_key]
+                subtotal = quantity * product_info['unit_price']
+                total_amount += subtotal
+                line = {
+                    'gas_product_id': product_info['id'],
+                    'quantity': quantity,
+                    'unit_price': product_info['unit_price'],
+                    'subtotal': subtotal,
+                    'is_flow_delivery': False,
                 }
-                
-                for product_key, quantity in cylinders.items():
-                    if quantity > 0:
-                        product_info = self.product_mapping[product_key]
-                        
-                        item = DeliveryHistoryItem(
-                            delivery_history_id=delivery_history.id,
-                            product_id=product_info['id'],
-                            quantity=quantity,
-                            unit_price=product_info['unit_price'],
-                            subtotal=quantity * product_info['unit_price']
-                        )
-                        self.session.add(item)
-                        total_amount += item.subtotal
-                
-                # Update total amount
-                delivery_history.total_amount = total_amount
-                
-                # Also create an Order record for tracking
-                order = Order(
-                    customer_id=customer.id,
-                    order_date=transaction_date.date(),
-                    delivery_date=transaction_date.date(),
-                    status=OrderStatus.COMPLETED,
-                    total_amount=total_amount,
-                    delivery_address=customer.address,
-                    notes=f"Imported from May 2025 history"
-                )
-                self.session.add(order)
-                self.session.flush()
-                
-                # Add order items
-                for product_key, quantity in cylinders.items():
-                    if quantity > 0:
-                        product_info = self.product_mapping[product_key]
-                        
-                        order_item = OrderItem(
-                            order_id=order.id,
-                            product_id=product_info['id'],
-                            quantity=quantity,
-                            unit_price=product_info['unit_price'],
-                            subtotal=quantity * product_info['unit_price']
-                        )
-                        self.session.add(order_item)
-                
-                imported_count += 1
-                
-                if imported_count % 100 == 0:
-                    logger.info(f"Processed {imported_count} delivery records...")
-                    self.session.commit()
-                
-            except Exception as e:
-                logger.error(f"Error processing row {index}: {str(e)}")
-                self.session.rollback()
-                continue
-        
-        # Final commit
-        try:
-            self.session.commit()
-            logger.info(f"Delivery history import completed: {imported_count} records imported")
-        except Exception as e:
-            self.session.rollback()
-            logger.error(f"Failed to commit delivery history: {str(e)}")
-            raise
-    
+                history_lines.append({
+                    **line,
+                    'delivery_history_id': history_id,
+                    'legacy_product_code': f"qty_{product_key}",
+                })
+                order_lines.append({**line, 'order_id': order_id, 'final_amount': subtotal})
+
+            history_rows.append({
+                'id': history_id,
+                'transaction_date': transaction_date.date(),
+                'transaction_time': times[index],
+                'customer_id': customer_id,
+                'customer_code': code,
+                **{f"qty_{key}": quantity for key, quantity in row_quantities.items()},
+                'total_cylinders': sum(row_quantities.values()),
+                'total_weight_kg': sum(
+                    quantity * self.product_mapping[key]['size']
+                    for key, quantity in row_quantities.items()
+                ),
+                'source_file': source_file,
+            })
+            order_rows.append({
+                'id': order_id,
+                'order_number': f"HIST-{transaction_date:%Y%m%d}-{history_id:07d}",
+                'customer_id': customer_id,
+                # SQLEnum columns store member names
+                'status': OrderStatus.DELIVERED.name,
+                'payment_status': PaymentStatus.UNPAID.name,
+                'order_date': transaction_date.to_pydatetime(),
+                'scheduled_date': transaction_date.to_pydatetime(),
+                'delivered_at': transaction_date.to_pydatetime(),
+                **{f"qty_{key}": quantity for key, quantity in row_quantities.items()},
+                'total_amount': total_amount,
+                'discount_amount': 0.0,
+                'final_amount': total_amount,
+                'delivery_address': address,
+                'delivery_notes': notes[index] or "Imported from May 2025 history",
+                'is_urgent': False,
+            })
+
+        item_ids = loader.allocate_ids(DeliveryHistoryItem.__table__, len(history_lines))
+        for item_id, line in zip(item_ids, history_lines):
+            line['id'] = item_id
+        order_item_ids = loader.allocate_ids(OrderItem.__table__, len(order_lines))
+        for item_id, line in zip(order_item_ids, order_lines):
+            line['id'] = item_id
+
+        for table, rows in (
+            (DeliveryHistory.__table__, history_rows),
+            (DeliveryHistoryItem.__table__, history_lines),
+            (Order.__table__, order_rows),
+            (OrderItem.__table__, order_lines),
+        ):
+            if rows:
+                loader.copy_rows(table, list(rows[0]), rows)
+        return len(history_rows), skipped
+
     def generate_statistics(self):
         """Generate statistics from imported data"""
         logger.info("Generating statistics...")
@@ -321,7 +357,7 @@ class DataImporter:
         
         # Order statistics
         total_orders = self.session.query(Order).count()
-        completed_orders = self.session.query(Order).filter_by(status=OrderStatus.COMPLETED).count()
+        completed_orders = self.session.query(Order).filter_by(status=OrderStatus.DELIVERED).count()
         
         # Delivery statistics
         total_deliveries = self.session.query(DeliveryHistory).count()
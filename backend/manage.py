@@ -56,6 +56,13 @@ Available commands:
   drop-indexes         Drop all custom indexes
   migrate-data         Import historical data from Excel files
   full-setup          Run complete database setup (init + indexes + data)
+  rebuild-rollups [N]  Rebuild analytics rollups for the last N days (default 400)
+  archive-analytics [N] Export the last N closed months to the Parquet archive (default 2)
+  reconcile-balances   Reconcile the customer balance ledger with orders / invoices
+  schedule-templates [--loop]  Create orders for due recurring templates (--loop: keep running)
+  check-invoice-sequences  Forecast invoice number exhaustion and alert on low sequences
+  blank-invoice-numbers YYYYMM  List reserved but unused invoice numbers (空白字軌) of a period
+  notification-worker [--loop]  Deliver queued notifications from the outbox (--loop: keep running)
   
 Usage:
   python manage.py <command>
@@ -101,6 +108,51 @@ def main():
         asyncio.run(migrate_historical_data())
     elif command == "full-setup":
         asyncio.run(full_setup())
+    elif command == "rebuild-rollups":
+        from app.services.analytics_rollup_service import rebuild_daily_rollups
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+        asyncio.run(rebuild_daily_rollups(days=days))
+    elif command == "archive-analytics":
+        from app.services.analytics_archive_service import export_analytics_archive
+        months = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        asyncio.run(export_analytics_archive(months=months))
+    elif command == "reconcile-balances":
+        from app.services.customer_ledger_service import reconcile_customer_balances
+        asyncio.run(reconcile_customer_balances())
+    elif command == "schedule-templates":
+        from app.services.template_scheduler_service import (
+            TemplateScheduler,
+            run_template_scheduler,
+        )
+        if "--loop" in sys.argv[2:]:
+            asyncio.run(TemplateScheduler().run_forever())
+        else:
+            asyncio.run(run_template_scheduler())
+    elif command == "check-invoice-sequences":
+        from app.services.invoice_number_allocator import check_invoice_sequences
+        asyncio.run(check_invoice_sequences())
+    elif command == "blank-invoice-numbers":
+        from app.core.database_async import get_async_session
+        from app.services.invoice_number_allocator import blank_number_ranges
+
+        async def report(year_month):
+            async for session in get_async_session():
+                for blank in await blank_number_ranges(session, year_month):
+                    print(
+                        f"{blank['prefix']}{blank['range_start']:08d}-"
+                        f"{blank['prefix']}{blank['range_end']:08d} ({blank['count']})"
+                    )
+
+        asyncio.run(report(sys.argv[2]))
+    elif command == "notification-worker":
+        from app.services.notification_outbox_service import (
+            NotificationOutboxWorker,
+            run_notification_worker,
+        )
+        if "--loop" in sys.argv[2:]:
+            asyncio.run(NotificationOutboxWorker().run_forever())
+        else:
+            asyncio.run(run_notification_worker())
     elif command in ["-h", "--help", "help"]:
         show_help()
     else:
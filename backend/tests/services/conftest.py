@@ -1,14 +1,57 @@
 """
 Test configuration for service unit tests
+
+Fixtures shared by the database-backed service tests. They only need the
+models and an in-memory SQLite database.
 """
 
 import sys
 from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
 
 
 # Add the backend directory to Python path
 backend_dir = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(backend_dir))
 
-# This file allows the service tests to run independently
-# without needing the full app setup
+import app.models  # noqa: E402, F401 - register all tables
+from app.core.database import Base  # noqa: E402
+
+# Tables written when orders are created (rollups and balance ledger included)
+ORDER_TABLES = (
+    "customers",
+    "orders",
+    "order_items",
+    "analytics_daily_order_rollups",
+    "analytics_daily_product_rollups",
+    "analytics_daily_customer_rollups",
+    "customer_balance_ledger",
+)
+
+
+@pytest.fixture
+async def engine(request):
+    """In-memory SQLite engine with the test module's ``TABLES`` created"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: Base.metadata.create_all(
+                sync_conn,
+                tables=[Base.metadata.tables[name] for name in request.module.TABLES],
+            )
+        )
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def order_events():
+    """Capture the websocket events published when orders are created"""
+    with patch(
+        "app.services.order_batch_service.websocket_manager.publish_event",
+        new_callable=AsyncMock,
+    ) as publish:
+        yield publish
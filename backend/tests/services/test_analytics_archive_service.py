@@ -0,0 +1,54 @@
+"""
+Unit tests for analytics archive range splitting
+"""
+
+from datetime import date
+
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+from app.services.analytics_archive_service import ArchiveQueryEngine, next_month
+
+
+def make_engine(tmp_path, months):
+    """Archive with empty partition files for the given months"""
+    for month in months:
+        partition = tmp_path / "orders" / f"month={month:%Y-%m}"
+        partition.mkdir(parents=True)
+        (partition / "data.parquet").touch()
+    return ArchiveQueryEngine(str(tmp_path))
+
+
+class TestArchiveWindow:
+    """Test choosing archived months for a requested range"""
+
+    def test_no_archive_reads_everything_live(self, tmp_path):
+        window = ArchiveQueryEngine(str(tmp_path)).split(
+            "orders", date(2025, 1, 1), date(2025, 3, 31)
+        )
+
+        assert not window.has_archive
+
+    def test_consecutive_months_form_one_window(self, tmp_path):
+        engine = make_engine(tmp_path, [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+
+        window = engine.split("orders", date(2025, 1, 15), date(2025, 2, 20))
+
+        assert window.archive_start == date(2025, 1, 1)
+        assert window.archive_end == date(2025, 3, 1)
+
+    def test_gap_uses_longest_run(self, tmp_path):
+        engine = make_engine(
+            tmp_path,
+            [date(2025, 1, 1), date(2025, 3, 1), date(2025, 4, 1), date(2025, 5, 1)],
+        )
+
+        window = engine.split("orders")
+
+        assert window.archive_start == date(2025, 3, 1)
+        assert window.archive_end == date(2025, 6, 1)
+
+    def test_next_month_rolls_over_year(self):
+        assert next_month(date(2025, 12, 31)) == date(2026, 1, 1)
@@ -0,0 +1,177 @@
+"""
+Unit tests for analytics rollup range handling
+"""
+
+import inspect
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.analytics_rollup import DailyOrderRollup, DailyProductRollup
+from app.models.customer import Customer
+from app.models.gas_product import DeliveryMethod, GasProduct, ProductAttribute
+from app.models.order import Order, OrderStatus
+from app.models.order_item import OrderItem
+from app.services.analytics_rollup_service import (
+    AnalyticsRollupService,
+    status_from_key,
+    status_key,
+)
+from app.services.analytics_service import AnalyticsService
+from tests.services.conftest import ORDER_TABLES
+
+TABLES = ORDER_TABLES + ("gas_products",)
+
+
+@pytest.fixture
+async def session(engine):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add(Customer(customer_code="C1", short_name="王記", address="台北市"))
+        session.add(
+            GasProduct(
+                delivery_method=DeliveryMethod.CYLINDER,
+                size_kg=20,
+                attribute=ProductAttribute.REGULAR,
+                sku="CYL-20-R",
+                name_zh="20公斤桶裝瓦斯",
+                unit_price=500,
+            )
+        )
+        await session.commit()
+        yield session
+
+
+class TestRollupWindow:
+    """Test splitting of requested ranges into rollup and live parts"""
+
+    def test_history_only_range(self):
+        window = AnalyticsRollupService.split_range(
+            datetime(2025, 1, 1), datetime(2025, 1, 31, 23, 59), today=date(2025, 3, 1)
+        )
+
+        assert window.history_start == date(2025, 1, 1)
+        assert window.history_end == date(2025, 1, 31)
+        assert not window.has_live
+
+    def test_range_ending_today_adds_live_tail(self):
+        window = AnalyticsRollupService.split_range(
+            datetime(2025, 2, 20), datetime(2025, 3, 1, 18, 0), today=date(2025, 3, 1)
+        )
+
+        assert window.history_end == date(2025, 2, 28)
+        assert window.live_start == datetime(2025, 3, 1)
+        assert window.live_end == datetime(2025, 3, 1, 18, 0)
+
+    def test_today_only_range_is_live(self):
+        window = AnalyticsRollupService.split_range(
+            datetime(2025, 3, 1, 8, 0), datetime(2025, 3, 1, 18, 0), today=date(2025, 3, 1)
+        )
+
+        assert not window.has_history
+        assert window.live_start == datetime(2025, 3, 1, 8, 0)
+
+
+class TestStatusKeys:
+    """Test status normalization for rollup rows"""
+
+    def test_enum_and_value_map_to_name(self):
+        assert status_key(OrderStatus.DELIVERED) == "DELIVERED"
+        assert status_key("delivered") == "DELIVERED"
+
+    def test_round_trip(self):
+        assert status_from_key("CANCELLED") == OrderStatus.CANCELLED
+        assert status_from_key("UNKNOWN") == "UNKNOWN"
+
+
+class TestRecordOrderChange:
+    """Test moving an order's contribution between rollup buckets"""
+
+    async def rollup_rows(self, session, model, measure):
+        result = await session.execute(select(model.status, getattr(model, measure)))
+        return {status: value for status, value in result}
+
+    async def test_previous_amount_and_items_leave_the_old_bucket(self, session):
+        rollups = AnalyticsRollupService(session)
+        order = Order(
+            order_number="ORD-1",
+            customer_id=1,
+            status=OrderStatus.PENDING,
+            total_amount=1000,
+            created_at=datetime.now() - timedelta(days=1),
+        )
+        session.add(order)
+        await session.flush()
+        item = OrderItem(
+            order_id=order.id,
+            gas_product_id=1,
+            quantity=2,
+            unit_price=500,
+            subtotal=1000,
+            final_amount=1000,
+        )
+        session.add(item)
+        await session.flush()
+        await rollups.record_order_change(order)
+
+        previous_items = await rollups.order_items(order)
+        item.quantity, item.subtotal = 3, 1500
+        order.status, order.total_amount = OrderStatus.DELIVERED, 1500
+        await session.flush()
+        await rollups.record_order_change(
+            order, OrderStatus.PENDING, None, 1000, previous_items
+        )
+
+        assert await self.rollup_rows(session, DailyOrderRollup, "revenue") == {
+            "PENDING": 0,
+            "DELIVERED": 1500,
+        }
+        assert await self.rollup_rows(session, DailyProductRollup, "quantity") == {
+            "PENDING": 0,
+            "DELIVERED": 3,
+        }
+
+        yesterday = datetime.combine(date.today() - timedelta(days=1), datetime.min.time())
+        _, by_product = await AnalyticsService(session)._calculate_revenue_trends(
+            yesterday, yesterday + timedelta(hours=23)
+        )
+        assert by_product == [
+            {"product": "20公斤桶裝瓦斯", "amount": 1500.0, "quantity": 3}
+        ]
+
+    async def test_order_types_come_from_the_rollups(self, session):
+        rollups = AnalyticsRollupService(session)
+        yesterday = datetime.now() - timedelta(days=1)
+        orders = [
+            Order(
+                order_number=f"ORD-{index}",
+                customer_id=1,
+                status=OrderStatus.PENDING,
+                total_amount=500,
+                is_urgent=is_urgent,
+                created_at=created_at,
+            )
+            for index, (is_urgent, created_at) in enumerate(
+                [(False, yesterday), (False, yesterday), (True, datetime.now())]
+            )
+        ]
+        session.add_all(orders)
+        await session.flush()
+        await rollups.record_order_changes([(order, None, None) for order in orders])
+
+        # Made urgent after it was rolled up
+        orders[1].is_urgent = True
+        await session.flush()
+        await rollups.record_order_change(
+            orders[1], OrderStatus.PENDING, previous_is_urgent=False
+        )
+
+        get_order_metrics = inspect.unwrap(AnalyticsService.get_order_metrics)
+        metrics = await get_order_metrics(
+            AnalyticsService(session), yesterday - timedelta(hours=1), datetime.now()
+        )
+
+        # Yesterday from the rollup rows, today from the live tail
+        assert metrics["orderTypes"] == {"regular": 1, "urgent": 2}
+        assert metrics["total"] == 3
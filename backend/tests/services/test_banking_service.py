@@ -1,6 +1,6 @@
 """Unit tests for banking service."""
 
-import io
+import hashlib
 from datetime import datetime
 from decimal import Decimal
 from unittest.mock import Mock, patch
@@ -18,9 +18,11 @@ from app.models.banking import (
 )
 from app.models.invoice import InvoicePaymentStatus
 from app.services.banking_service import (
+    RECONCILIATION_FILE_LAYOUT,
     BankingService,
     SFTPConnectionError,
 )
+from app.services.sftp_pool import LocalSFTPClient, close_bank_sftp_pools
 
 # Import banking test marker
 from tests.conftest_payment import requires_banking
@@ -32,6 +34,13 @@ def db_session():
     return Mock(spec=Session)
 
 
+@pytest.fixture(autouse=True)
+def sftp_pools():
+    """SFTP sessions pooled by one test must not leak into the next."""
+    yield
+    close_bank_sftp_pools()
+
+
 @pytest.fixture
 def banking_service(db_session):
     """Create banking service instance."""
@@ -73,6 +82,7 @@ def payment_batch():
     batch.total_transactions = 2
     batch.total_amount = Decimal("5000.00")
     batch.file_content = None
+    batch.retry_count = 0
     batch.transactions = []
     return batch
 
@@ -228,7 +238,7 @@ class TestBankingService:
     ):
         """Test generating CSV format payment file."""
         bank_config.file_format = "csv"
-        bank_config.delimiter = ", "
+        bank_config.delimiter = ","
         payment_batch.transactions = payment_transactions
 
         db_session.query().filter_by().first.side_effect = [payment_batch, bank_config]
@@ -290,6 +300,30 @@ class TestBankingService:
             assert payment_batch.error_message == "Upload failed"
             assert payment_batch.retry_count == 1
 
+    def test_upload_stream_writes_through_to_the_server(
+        self, banking_service, bank_config, tmp_path
+    ):
+        """Test streaming a file straight into the bank's upload directory."""
+        records = [b"D%06d" % n + b" " * 193 + b"\r\n" for n in range(1000)]
+
+        def write(remote_file):
+            for record in records:
+                remote_file.write(record)
+
+        with patch.object(banking_service, "get_sftp_client") as mock_get_sftp:
+            mock_get_sftp.return_value.__enter__.return_value = LocalSFTPClient(
+                str(tmp_path)
+            )
+
+            upload = banking_service.upload_stream(bank_config, "PAY_20240120.txt", write)
+
+        uploaded = tmp_path / "upload" / "PAY_20240120.txt"
+        assert uploaded.read_bytes() == b"".join(records)
+        assert upload["size"] == 202 * 1000
+        assert upload["checksum"] == hashlib.sha256(b"".join(records)).hexdigest()
+        assert not (tmp_path / "upload" / "PAY_20240120.txt.tmp").exists()
+        assert uploaded.stat().st_mode & 0o777 == 0o444
+
     def test_check_reconciliation_files(self, banking_service, bank_config, db_session):
         """Test checking for new reconciliation files."""
         db_session.query().filter_by().first.side_effect = [bank_config, None, None]
@@ -313,49 +347,77 @@ class TestBankingService:
             assert "REC_20240119.txt" in new_files
 
     def test_process_fixed_width_reconciliation(
-        self, banking_service, bank_config, db_session
+        self, banking_service, bank_config, db_session, tmp_path
     ):
         """Test processing fixed - width reconciliation file."""
         # Mock reconciliation file content
-        file_content = """H20240120CTBC001
-D000001CTBC202401201001 - 000001REF001000Payment successful       20240120
-D000002CTBC202401201001 - 000002REF002001Card declined           20240120
-T00000200000300000"""
+        detail = RECONCILIATION_FILE_LAYOUT.records["D"]
+        file_content = b"\r\n".join(
+            [
+                b"H20240120CTBC001",
+                detail.format(
+                    {
+                        "sequence_number": "000001",
+                        "transaction_id": "CTBC202401201001-001",
+                        "bank_reference": "REF001",
+                        "response_code": "000",
+                        "response_message": "Payment successful",
+                        "processed_date": "20240120",
+                    },
+                    "UTF-8",
+                ),
+                # Trailing blanks trimmed by the bank
+                detail.format(
+                    {
+                        "sequence_number": "000002",
+                        "transaction_id": "CTBC202401201001-002",
+                        "bank_reference": "REF002",
+                        "response_code": "001",
+                        "response_message": "Card declined",
+                        "processed_date": "20240120",
+                    },
+                    "UTF-8",
+                ).rstrip(),
+                b"T00000200000300000",
+            ]
+        )
 
         db_session.query().filter_by().first.side_effect = [
             bank_config,
-            Mock(
-                transaction_id="CTBC202401201001 - 000001",
-                invoice_id=1,
-                batch=payment_batch,
-            ),
-            Mock(
-                transaction_id="CTBC202401201001 - 000002",
-                invoice_id=2,
-                batch=payment_batch,
-            ),
-            Mock(id=1),  # Invoice
+            bank_config,  # Download
         ]
+        # Transaction lookup (one query for the whole file)
+        db_session.execute.return_value = [
+            ("CTBC202401201001-001", 1, 1, 1),
+            ("CTBC202401201001-002", 2, 2, 1),
+        ]
+        db_session.get_bind.return_value.dialect.name = "postgresql"
 
         log = ReconciliationLog(
             file_name="REC_20240120.txt", file_received_at=datetime.utcnow()
         )
 
+        # Local stand-in for the bank's SFTP server
+        (tmp_path / "download").mkdir()
+        (tmp_path / "archive").mkdir()
+        (tmp_path / "download" / "REC_20240120.txt").write_bytes(file_content)
+
         with patch.object(banking_service, "get_sftp_client") as mock_get_sftp:
-            mock_sftp = Mock()
-            mock_file = io.BytesIO(file_content.encode("UTF - 8"))
-            mock_sftp.getfo = Mock(
-                side_effect=lambda remote, local: local.write(mock_file.read())
+            mock_get_sftp.return_value.__enter__.return_value = LocalSFTPClient(
+                str(tmp_path)
             )
-            mock_get_sftp.return_value.__enter__.return_value = mock_sftp
 
             result = banking_service.process_reconciliation_file(
                 bank_config.bank_code, "REC_20240120.txt"
             )
 
             # Verify processing results
+            assert (result.total_records, result.matched_records) == (2, 1)
+            assert (result.failed_records, result.unmatched_records) == (1, 0)
             assert db_session.add.called
             assert db_session.commit.called
+            # Downloaded file was archived
+            assert (tmp_path / "archive" / "REC_20240120.txt").exists()
 
     def test_create_payment_batch(self, banking_service, db_session):
         """Test creating a new payment batch."""
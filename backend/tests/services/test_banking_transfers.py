@@ -0,0 +1,367 @@
+"""
+Unit tests for the per-bank banking Celery task graph
+"""
+
+import hashlib
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401 - register all tables
+from app.core.config import settings
+from app.core.database import Base
+from app.models.banking import (
+    BankConfiguration,
+    PaymentBatch,
+    PaymentBatchStatus,
+    PaymentTransaction,
+    ReconciliationLog,
+    ReconciliationStatus,
+    TransactionStatus,
+)
+from app.services.banking_service import BankingService
+from app.services.sftp_pool import close_bank_sftp_pools
+from app.tasks import banking_transfers
+
+TODAY = datetime.utcnow().date()
+
+
+class FakeLock:
+    """Non-blocking stand-in for ``redis.lock.Lock``"""
+
+    def __init__(self, redis, name):
+        self.redis = redis
+        self.name = name
+
+    def acquire(self, blocking=True):
+        if self.name in self.redis.held:
+            return False
+        self.redis.held.add(self.name)
+        return True
+
+    def release(self):
+        self.redis.held.discard(self.name)
+
+
+class FakeRedis:
+    """In-memory stand-in for the locks and summaries the tasks keep in Redis"""
+
+    def __init__(self):
+        self.held = set()
+        self.values = {}
+
+    def lock(self, name, timeout=None):
+        return FakeLock(self, name)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            Base.metadata.tables[name]
+            for name in (
+                "bank_configurations",
+                "customers",
+                "invoices",
+                "payment_batches",
+                "payment_transactions",
+                "reconciliation_logs",
+            )
+        ],
+    )
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(banking_transfers, "redis_client", fake)
+    return fake
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """Stub batch creation: customers have no bank columns in this schema"""
+    calls = []
+
+    def create_payment_batch(self, bank_code, processing_date, invoice_ids=None):
+        calls.append(bank_code)
+        if bank_code == "FUBON":
+            raise RuntimeError("invoice query failed")
+
+        count = 0 if bank_code == "ESUN" else 2
+        batch = PaymentBatch(
+            batch_number=f"{bank_code}{processing_date:%Y%m%d}001",
+            bank_code=bank_code,
+            file_name="",
+            file_format="fixed_width",
+            processing_date=processing_date,
+            status=PaymentBatchStatus.DRAFT,
+            total_transactions=count,
+            total_amount=Decimal("1500.00") * count,
+        )
+        self.db.add(batch)
+        self.db.flush()
+        self.db.add_all(
+            PaymentTransaction(
+                batch_id=batch.id,
+                transaction_id=f"{batch.batch_number}-{n:06d}",
+                customer_id=n,
+                account_number="1234567890",
+                account_holder="王小明",
+                amount=Decimal("1500.00"),
+                scheduled_date=processing_date,
+                status=TransactionStatus.PENDING,
+            )
+            for n in range(1, count + 1)
+        )
+        self.db.commit()
+        return batch
+
+    monkeypatch.setattr(BankingService, "create_payment_batch", create_payment_batch)
+    return calls
+
+
+@pytest.fixture
+def tasks(engine, redis, created, monkeypatch, tmp_path):
+    """Run the task graph eagerly against SQLite and local SFTP directories"""
+    with Session(engine) as db:
+        db.add_all(
+            BankConfiguration(
+                bank_code=code,
+                bank_name=code,
+                sftp_host="localhost",
+                sftp_username="luckygas",
+                sftp_password="secret",
+                upload_path="/upload/",
+                download_path="/download/",
+                file_format="fixed_width",
+                encoding="big5",
+                payment_file_pattern="PAY_{YYYYMMDD}_{BATCH}.txt",
+                reconciliation_file_pattern="REC_{YYYYMMDD}.txt",
+                archive_path="/archive/",
+                is_active=True,
+            )
+            for code in ("CTBC", "ESUN", "FUBON")
+        )
+        db.commit()
+
+    monkeypatch.setattr(
+        banking_transfers, "get_task_db", lambda: iter([Session(engine)])
+    )
+    monkeypatch.setattr(settings, "BANKING_SFTP_LOCAL_ROOT", str(tmp_path))
+    celery_conf = banking_transfers.celery_app.conf
+    monkeypatch.setattr(celery_conf, "task_always_eager", True)
+    yield banking_transfers
+    close_bank_sftp_pools()
+
+
+def created_result(tasks, bank_code="CTBC"):
+    return tasks.create_bank_payment_batch.apply(
+        args=(bank_code, TODAY.isoformat(), datetime.utcnow().isoformat())
+    ).get()
+
+
+class TestPaymentRun:
+    """Test the per-bank chord and its summary"""
+
+    def test_each_bank_runs_in_its_own_chain(self, tasks, engine, redis, tmp_path):
+        run = tasks.generate_and_upload_payments.apply().get()
+
+        assert run["banks"] == ["CTBC", "ESUN", "FUBON"]
+        summary = tasks._load_run_summary("payments", TODAY.isoformat())
+        statuses = {bank["bank_code"]: bank["status"] for bank in summary["banks"]}
+        # FUBON failing did not stop CTBC's upload
+        assert statuses == {"CTBC": "uploaded", "ESUN": "skipped", "FUBON": "failed"}
+        assert summary["failed_banks"] == ["FUBON"]
+        assert summary["serial_seconds"] >= summary["slowest_bank_seconds"]
+
+        uploaded = list((tmp_path / "CTBC" / "upload").iterdir())
+        assert [path.name for path in uploaded] == [
+            f"PAY_{TODAY:%Y%m%d}_CTBC{TODAY:%Y%m%d}001.txt"
+        ]
+        assert uploaded[0].read_bytes().startswith(b"-----BEGIN PGP MESSAGE-----")
+        assert summary["banks"][0]["checksum"] == (
+            hashlib.sha256(uploaded[0].read_bytes()).hexdigest()
+        )
+        with Session(engine) as db:
+            batch = db.scalar(select(PaymentBatch).filter_by(bank_code="CTBC"))
+            assert batch.status == PaymentBatchStatus.UPLOADED
+        # Every slot and key was given back
+        assert redis.held == set()
+
+    def test_redelivered_tasks_reuse_the_batch(self, tasks, engine, created):
+        first = created_result(tasks)
+        again = created_result(tasks)
+
+        assert created == ["CTBC"]
+        assert again["batch_id"] == first["batch_id"]
+        assert again["idempotency_key"] == f"payments:CTBC:{TODAY.isoformat()}"
+
+        assert tasks.upload_payment_batch.apply(args=(first,)).get()["status"] == (
+            "uploaded"
+        )
+        assert tasks.upload_payment_batch.apply(args=(again,)).get()["status"] == (
+            "already_uploaded"
+        )
+        with Session(engine) as db:
+            assert db.query(PaymentBatch).filter_by(bank_code="CTBC").count() == 1
+
+    @pytest.mark.parametrize(
+        "held",
+        [
+            "banking:bank:CTBC:slot:0",
+            f"banking:idempotency:payments:CTBC:{TODAY.isoformat()}",
+        ],
+    )
+    def test_busy_upload_is_retried_then_reported(self, tasks, redis, held):
+        result = created_result(tasks)
+        redis.held.add(held)
+
+        retried = tasks.upload_payment_batch.apply(args=(result,))
+
+        # Eager retries run in place; the last one reports the bank busy
+        assert retried.get()["status"] == "failed"
+        assert "All slots busy" in retried.get()["error"]
+        assert redis.held == {held}
+
+    def test_daily_report_includes_the_run_summary(self, tasks):
+        tasks.generate_and_upload_payments.apply().get()
+
+        report = tasks.generate_daily_report.apply().get()
+
+        runs = report["task_runs"]
+        assert runs["reconciliation"] is None
+        assert [bank["bank_code"] for bank in runs["payments"]["banks"]] == [
+            "CTBC",
+            "ESUN",
+            "FUBON",
+        ]
+        assert report["payment_batches"]["uploaded"] == 1
+
+    def test_retry_queue_uploads_failed_batches_again(self, tasks, engine):
+        result = created_result(tasks)
+        with Session(engine) as db:
+            db.get(PaymentBatch, result["batch_id"]).status = PaymentBatchStatus.FAILED
+            db.commit()
+
+        assert tasks.process_retry_queue.apply().get()["processed"] == 1
+
+        with Session(engine) as db:
+            batch = db.get(PaymentBatch, result["batch_id"])
+            assert batch.status == PaymentBatchStatus.UPLOADED
+            assert batch.retry_count == 1
+
+
+class TestReconciliation:
+    """Test per-file handling of a bank's reconciliation files"""
+
+    @pytest.fixture
+    def bank_dir(self, tasks, engine, tmp_path):
+        with Session(engine) as db:
+            batch = PaymentBatch(
+                batch_number="CTBC20240101001",
+                bank_code="CTBC",
+                file_name="",
+                file_format="fixed_width",
+                processing_date=TODAY,
+                status=PaymentBatchStatus.UPLOADED,
+                total_transactions=3,
+                total_amount=Decimal("4500.00"),
+            )
+            db.add(batch)
+            db.flush()
+            db.add_all(
+                PaymentTransaction(
+                    batch_id=batch.id,
+                    transaction_id=f"T{day}",
+                    customer_id=day,
+                    account_number="1234567890",
+                    account_holder="王小明",
+                    amount=Decimal("1500.00"),
+                    scheduled_date=TODAY,
+                    status=TransactionStatus.PENDING,
+                )
+                for day in (1, 2, 3)
+            )
+            db.commit()
+
+        for name in ("download", "archive"):
+            (tmp_path / "CTBC" / name).mkdir(parents=True)
+        return tmp_path / "CTBC"
+
+    def write_file(self, bank_dir, day):
+        """One-line reconciliation file settling transaction ``T<day>``"""
+        line = (
+            f"D{day:06d}{f'T{day}':<20}{f'REF{day}':<20}000{'OK':<100}2024010{day}"
+        )
+        (bank_dir / "download" / f"REC_2024010{day}.txt").write_bytes(
+            line.encode() + b"\n"
+        )
+
+    def reconcile(self, tasks):
+        return tasks.reconcile_bank.apply(
+            args=("CTBC", datetime.utcnow().isoformat())
+        ).get()
+
+    def test_unreadable_file_does_not_block_the_others(self, tasks, engine, bank_dir):
+        for day in (1, 3):
+            self.write_file(bank_dir, day)
+        # Cannot be opened, in the batch or on its own
+        (bank_dir / "download" / "REC_20240102.txt").mkdir()
+
+        result = self.reconcile(tasks)
+
+        assert result["status"] == "partial"
+        assert result["files_processed"] == 2
+        assert [error["file_name"] for error in result["file_errors"]] == [
+            "REC_20240102.txt"
+        ]
+        assert sorted(path.name for path in (bank_dir / "archive").iterdir()) == [
+            "REC_20240101.txt",
+            "REC_20240103.txt",
+        ]
+        with Session(engine) as db:
+            statuses = dict(
+                db.query(ReconciliationLog.file_name, ReconciliationLog.status)
+            )
+        # The bad file is left for review instead of failing every run
+        assert statuses["REC_20240102.txt"] == ReconciliationStatus.MANUAL_REVIEW
+        assert self.reconcile(tasks)["files_found"] == 0
+
+    def test_files_are_archived_only_once_logged(
+        self, tasks, engine, bank_dir, monkeypatch
+    ):
+        for day in (1, 2):
+            self.write_file(bank_dir, day)
+        process = BankingService.process_reconciliation_file
+
+        def crash(self, bank_code, file_name, content=None):
+            if file_name == "REC_20240102.txt":
+                raise SystemExit("worker killed")
+            return process(self, bank_code, file_name, content)
+
+        monkeypatch.setattr(BankingService, "process_reconciliation_file", crash)
+        with pytest.raises(SystemExit):
+            self.reconcile(tasks)
+        monkeypatch.setattr(BankingService, "process_reconciliation_file", process)
+
+        # The redelivered task still finds the unlogged file
+        result = self.reconcile(tasks)
+
+        assert (result["files_found"], result["files_processed"]) == (1, 1)
+        assert list((bank_dir / "download").iterdir()) == []
+        with Session(engine) as db:
+            assert db.query(ReconciliationLog).count() == 2
@@ -0,0 +1,69 @@
+"""
+Unit tests for the backfill bulk loader
+"""
+
+from datetime import date
+
+from openpyxl import Workbook
+from sqlalchemy import create_engine, func, select
+
+import app.models  # noqa: F401 - register all tables
+from app.core.database import Base
+from app.services.bulk_loader import BulkLoader, iter_source_chunks
+
+delivery_history = Base.metadata.tables["delivery_history"]
+
+
+class TestIterSourceChunks:
+    """Test streaming source files in chunks"""
+
+    def test_csv_chunks_keep_leading_zeros(self, tmp_path):
+        path = tmp_path / "history.csv"
+        path.write_text("客戶代號,50KG\n0012,1\n0013,2\n0014,3\n", encoding="utf-8")
+
+        chunks = list(iter_source_chunks(str(path), chunk_size=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        assert chunks[0]["客戶代號"].tolist() == ["0012", "0013"]
+
+    def test_excel_rows_are_padded_to_header(self, tmp_path):
+        path = tmp_path / "history.xlsx"
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["客戶代號", "50KG", "備註"])
+        sheet.append(["C1", 1])
+        sheet.append(["C2", 2, "急件"])
+        workbook.save(path)
+
+        chunks = list(iter_source_chunks(str(path), chunk_size=10))
+
+        assert len(chunks) == 1
+        assert chunks[0]["備註"].tolist() == [None, "急件"]
+
+
+class TestBulkLoader:
+    """Test key allocation and the INSERT fallback"""
+
+    def test_allocates_ids_and_inserts_without_copy(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[delivery_history])
+
+        with engine.begin() as connection:
+            loader = BulkLoader(connection)
+            first = loader.allocate_ids(delivery_history, 2)
+            rows = [
+                {"id": row_id, "transaction_date": date(2025, 5, 1), "customer_id": 1}
+                for row_id in first
+            ]
+            written = loader.copy_rows(
+                delivery_history, ["id", "transaction_date", "customer_id"], rows
+            )
+            second = loader.allocate_ids(delivery_history, 1)
+            count = connection.execute(
+                select(func.count()).select_from(delivery_history)
+            ).scalar()
+
+        assert first == [1, 2]
+        assert written == 2
+        assert second == [3]
+        assert count == 2
@@ -0,0 +1,146 @@
+"""
+Unit tests for the customer balance ledger
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import event, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Customer
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.order import Order, OrderStatus, PaymentStatus
+from app.services.credit_service import CreditService
+from app.services.customer_ledger_service import (
+    CustomerLedgerService,
+    invoice_exposure,
+    order_exposure,
+)
+
+TABLES = ("customers", "orders", "invoices", "customer_balance_ledger")
+
+
+@pytest.fixture
+async def session(engine):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add(Customer(customer_code="C1", short_name="王記", address="台北市"))
+        await session.commit()
+        yield session
+
+
+async def add_order(session, number, amount, **values):
+    order = Order(
+        order_number=number,
+        customer_id=1,
+        total_amount=amount,
+        status=OrderStatus.PENDING,
+        payment_status=PaymentStatus.UNPAID,
+        **values,
+    )
+    session.add(order)
+    await session.flush()
+    await CustomerLedgerService(session).record_order_change(order)
+    return order
+
+
+class TestLedgerMaintenance:
+    """Test incremental adjustments and reconciliation"""
+
+    async def test_order_and_invoice_changes_adjust_balance(self, session):
+        ledger = CustomerLedgerService(session)
+        order = await add_order(session, "ORD-1", 1000)
+        await add_order(session, "ORD-2", 500)
+
+        # Cancelling removes the order's exposure
+        previous = order_exposure(order)
+        order.status = OrderStatus.CANCELLED
+        await ledger.record_order_change(order, previous)
+
+        invoice = Invoice(
+            invoice_number="AB00000001",
+            invoice_track="AB",
+            invoice_no="00000001",
+            customer_id=1,
+            invoice_date=date(2025, 5, 1),
+            period="202505",
+            total_amount=2100,
+            status=InvoiceStatus.ISSUED,
+        )
+        session.add(invoice)
+        await session.flush()
+        await ledger.record_invoice_change(invoice)
+        previous = invoice_exposure(invoice)
+        invoice.paid_amount = 600
+        await ledger.record_invoice_change(invoice, previous)
+        await session.commit()
+
+        balance = await ledger.get_balance(1)
+        assert balance.unpaid_order_amount == 500
+        assert balance.receivable_amount == 1500
+
+    async def test_reconcile_corrects_drift(self, session):
+        ledger = CustomerLedgerService(session)
+        await add_order(session, "ORD-1", 1000)
+        # A change made behind the ledger's back
+        await session.execute(
+            update(Order).values(payment_status=PaymentStatus.PAID)
+        )
+        await session.commit()
+
+        stats = await ledger.reconcile()
+
+        balance = await ledger.get_balance(1)
+        assert stats == {"checked": 1, "corrected": 1}
+        assert balance.unpaid_order_amount == 0
+        assert balance.reconciled_at is not None
+
+    async def test_update_customer_balance_runs_in_callers_transaction(self, session):
+        await add_order(session, "ORD-1", 1000)
+        await session.commit()
+        await session.execute(update(Order).values(payment_status=PaymentStatus.PAID))
+
+        assert await CreditService.update_customer_balance(session, 1) == 0
+        await session.rollback()
+
+        balance = await CustomerLedgerService(session).get_balance(1)
+        assert balance.unpaid_order_amount == 1000
+
+
+class TestCreditCheck:
+    """Test credit checks served from the ledger"""
+
+    async def test_single_row_read(self, engine, session):
+        await add_order(session, "ORD-1", 8000)
+        await CustomerLedgerService(session).set_credit_settings(1, credit_limit=10000)
+        await session.commit()
+        statements = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        approved = await CreditService.check_credit_limit(session, 1, 1500)
+        declined = await CreditService.check_credit_limit(session, 1, 2500)
+
+        assert len(statements) == 2
+        assert approved["approved"] is True
+        assert approved["details"]["remaining_credit"] == 500
+        assert declined["reason"] == "Credit limit exceeded"
+
+    async def test_blocked_unknown_and_unlimited(self, session):
+        ledger = CustomerLedgerService(session)
+        session.add(Customer(customer_code="C2", short_name="李家", address="台北市"))
+        await session.flush()
+        await ledger.set_credit_settings(1, is_credit_blocked=True)
+        await session.commit()
+
+        results = await CreditService.check_credit_limits(
+            session, {1: 100, 2: 1_000_000, 99: 100}
+        )
+
+        assert results[1]["reason"] == "Customer credit is blocked"
+        assert results[2]["approved"] is True
+        assert results[2]["reason"] == "No credit limit"
+        assert results[99]["reason"] == "Customer not found"
@@ -0,0 +1,165 @@
+"""
+Unit tests for set-based delivery candidate scoring
+"""
+
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import app.models  # noqa: F401 - register all tables
+from app.core.database import Base
+from app.models import Customer
+from app.models.order import Order, OrderStatus
+from app.services.customer_service import (
+    CustomerService,
+    invalidate_delivery_candidates,
+)
+
+TARGET = date(2025, 5, 31)
+
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: Base.metadata.create_all(
+                sync_conn,
+                tables=[Base.metadata.tables[name] for name in ("customers", "orders")],
+            )
+        )
+    invalidate_delivery_candidates()
+    yield engine
+    invalidate_delivery_candidates()
+    await engine.dispose()
+
+
+@pytest.fixture
+async def session(engine):
+    async with AsyncSession(engine) as session:
+        regular = Customer(
+            customer_code="C1",
+            short_name="王記餐廳",
+            address="台北市",
+            area="信義區",
+            customer_type="COMMERCIAL",
+            is_subscription=True,
+        )
+        new = Customer(
+            customer_code="C2", short_name="李家", address="台北市", area="信義區",
+            customer_type="RESIDENTIAL", is_subscription=True,
+        )
+        other_area = Customer(
+            customer_code="C3", short_name="陳家", address="台北市", area="大安區",
+            is_subscription=True,
+        )
+        session.add_all([regular, new, other_area])
+        await session.flush()
+
+        # Every 10 days, last on 5/11: 20 days overdue
+        for number, scheduled in enumerate(
+            [datetime(2025, 4, 21), datetime(2025, 5, 1), datetime(2025, 5, 11)]
+        ):
+            session.add(
+                Order(
+                    order_number=f"ORD-{number}",
+                    customer_id=regular.id,
+                    scheduled_date=scheduled,
+                    status=OrderStatus.DELIVERED,
+                    qty_50kg=3,
+                )
+            )
+        session.add(
+            Order(
+                order_number="ORD-X",
+                customer_id=regular.id,
+                scheduled_date=datetime(2025, 5, 30),
+                status=OrderStatus.CANCELLED,
+                qty_50kg=9,
+            )
+        )
+        await session.commit()
+        yield session
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    return statements
+
+
+class TestDeliveryCandidates:
+    """Test candidate generation, scoring and caching"""
+
+    async def test_scores_from_latest_order_in_one_query(self, engine, session):
+        statements = count_queries(engine)
+
+        candidates = await CustomerService(session).get_delivery_candidates(
+            TARGET, area="信義區"
+        )
+
+        assert len(statements) == 1
+        assert [c["customer_code"] for c in candidates] == ["C1", "C2"]
+        regular, new = candidates
+        # Cancelled 5/30 order is ignored; last delivery was 5/11
+        assert regular["last_order_date"] == date(2025, 5, 11)
+        assert regular["days_since_last"] == 20
+        # cycle passed (50) + subscription (20) + commercial (10) + 7.5 kg / day (10)
+        assert regular["recommendation_score"] == 90
+        assert regular["suggested_products"]["50kg"] == 3
+        assert new["days_since_last"] == 999
+        assert new["recommendation_score"] == 20
+        assert new["suggested_products"] == {
+            "50kg": 0, "20kg": 1, "16kg": 0, "10kg": 0, "4kg": 1,
+        }
+
+    async def test_cached_until_orders_change(self, engine, session):
+        service = CustomerService(session)
+        await service.get_delivery_candidates(TARGET, area="信義區")
+        statements = count_queries(engine)
+
+        await service.get_delivery_candidates(TARGET, area="信義區")
+        assert statements == []
+
+        invalidate_delivery_candidates("order.assigned")
+        await service.get_delivery_candidates(TARGET, area="信義區")
+        assert statements == []
+
+        invalidate_delivery_candidates("order.created")
+        await service.get_delivery_candidates(TARGET, area="信義區")
+        assert len(statements) == 1
+
+    def test_partial_cycle_scores_proportionally(self):
+        candidates = pd.DataFrame(
+            [
+                {
+                    "customer_id": 1,
+                    "customer_code": "C1",
+                    "short_name": "王記",
+                    "area": None,
+                    "customer_type": None,
+                    "is_subscription": False,
+                    "last_date": datetime(2025, 5, 26),
+                    "first_date": datetime(2025, 5, 6),
+                    "order_count": 3,
+                    "total_kg": 0,
+                    "qty_50kg": 0,
+                    "qty_20kg": 1,
+                    "qty_16kg": 0,
+                    "qty_10kg": 0,
+                    "qty_4kg": 0,
+                }
+            ]
+        )
+
+        (candidate,) = CustomerService._score_candidates(candidates, TARGET)
+
+        # 5 of 10 days elapsed
+        assert candidate["recommendation_score"] == 15
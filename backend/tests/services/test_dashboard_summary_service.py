@@ -0,0 +1,53 @@
+"""
+Unit tests for the shared dashboard summary snapshot
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.services.dashboard_summary_service import (
+    DashboardSummaryService,
+    invalidate_dashboard_summary,
+)
+from app.services.websocket_service import EventType
+
+
+@pytest.fixture(autouse=True)
+def clear_snapshot():
+    invalidate_dashboard_summary()
+    yield
+    invalidate_dashboard_summary()
+
+
+class TestDashboardSnapshot:
+    """Test snapshot reuse and event-driven invalidation"""
+
+    def test_snapshot_is_shared_between_callers(self):
+        with patch.object(
+            DashboardSummaryService, "build_summary", return_value={"stats": {}}
+        ) as build:
+            DashboardSummaryService(Mock()).get_summary()
+            DashboardSummaryService(Mock()).get_summary()
+
+        assert build.call_count == 1
+
+    def test_order_event_drops_snapshot(self):
+        with patch.object(
+            DashboardSummaryService, "build_summary", return_value={"stats": {}}
+        ) as build:
+            DashboardSummaryService(Mock()).get_summary()
+            invalidate_dashboard_summary(EventType.ORDER_CREATED)
+            DashboardSummaryService(Mock()).get_summary()
+
+        assert build.call_count == 2
+
+    def test_unrelated_event_keeps_snapshot(self):
+        with patch.object(
+            DashboardSummaryService, "build_summary", return_value={"stats": {}}
+        ) as build:
+            DashboardSummaryService(Mock()).get_summary()
+            invalidate_dashboard_summary(EventType.HEARTBEAT)
+            DashboardSummaryService(Mock()).get_summary()
+
+        assert build.call_count == 1
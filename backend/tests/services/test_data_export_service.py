@@ -0,0 +1,151 @@
+"""
+Unit tests for streaming order exports
+"""
+
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from openpyxl import load_workbook
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import app.models  # noqa: F401 - register all tables
+from app.api.v1.orders import export_orders
+from app.core.database import Base
+from app.models import Customer
+from app.models.gas_product import DeliveryMethod, GasProduct, ProductAttribute
+from app.models.order import Order, OrderStatus
+from app.models.order_item import OrderItem
+from app.models.user import User, UserRole
+from app.services import data_export_service
+from app.services.data_export_service import DataExportService
+
+TABLES = ["customers", "users", "gas_products", "orders", "order_items"]
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: Base.metadata.create_all(
+                sync_conn, tables=[Base.metadata.tables[name] for name in TABLES]
+            )
+        )
+    async with AsyncSession(engine) as session:
+        customer = Customer(customer_code="C1", short_name="王記", address="台北市")
+        driver = User(
+            email="driver@example.com",
+            username="driver",
+            full_name="陳司機",
+            hashed_password="x",
+            role=UserRole.DRIVER,
+        )
+        product = GasProduct(
+            sku="G20",
+            name_zh="20公斤瓦斯",
+            size_kg=20,
+            unit_price=800,
+            delivery_method=DeliveryMethod.CYLINDER,
+            attribute=ProductAttribute.REGULAR,
+        )
+        session.add_all([customer, driver, product])
+        await session.flush()
+
+        for index in range(3):
+            order = Order(
+                order_number=f"ORD-{index}",
+                customer_id=customer.id,
+                scheduled_date=datetime(2025, 5, index + 1, 9),
+                status=OrderStatus.PENDING,
+                total_amount=1600,
+                final_amount=1600,
+                driver_id=driver.id if index == 0 else None,
+            )
+            session.add(order)
+            await session.flush()
+            if index < 2:
+                session.add_all(
+                    OrderItem(
+                        order_id=order.id,
+                        gas_product_id=product.id,
+                        quantity=1,
+                        unit_price=800,
+                        subtotal=800,
+                        final_amount=800,
+                    )
+                    for _ in range(2)
+                )
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+async def collect(service, **kwargs):
+    return [chunk async for chunk in service.stream_orders(**kwargs)]
+
+
+class TestStreamOrders:
+    """Test streaming order exports"""
+
+    async def test_csv_has_one_line_per_item(self, session):
+        chunks = await collect(DataExportService(session), format="csv")
+
+        text = b"".join(chunks).decode("utf-8-sig")
+        lines = text.strip().splitlines()
+        # Header, two items for each of two orders, one line for the empty order
+        assert len(lines) == 6
+        assert lines[1].startswith("ORD-0,王記,")
+        assert "陳司機" in lines[1]
+        assert "20公斤瓦斯" in lines[1]
+        assert lines[5].startswith("ORD-2,")
+
+    async def test_csv_is_emitted_in_chunks(self, session, monkeypatch):
+        monkeypatch.setattr(data_export_service, "EXPORT_CHUNK_SIZE", 1)
+
+        chunks = await collect(DataExportService(session), format="csv")
+
+        # Header chunk plus one per order
+        assert len(chunks) == 4
+        assert chunks[0].startswith(b"\xef\xbb\xbf")
+
+    async def test_json_nests_items_and_filters(self, session):
+        chunks = await collect(
+            DataExportService(session),
+            format="json",
+            start_date=datetime(2025, 5, 2).date(),
+            end_date=datetime(2025, 5, 3).date(),
+        )
+
+        orders = json.loads(b"".join(chunks))
+        assert [order["order_number"] for order in orders] == ["ORD-1", "ORD-2"]
+        assert len(orders[0]["items"]) == 2
+        assert orders[1]["items"] == []
+
+    async def test_status_filter(self, session):
+        delivered = await collect(
+            DataExportService(session), format="json", status=OrderStatus.DELIVERED
+        )
+        pending = await collect(
+            DataExportService(session), format="json", status=OrderStatus.PENDING
+        )
+
+        assert json.loads(b"".join(delivered)) == []
+        assert len(json.loads(b"".join(pending))) == 3
+
+    async def test_unknown_status_is_rejected_before_streaming(self):
+        with pytest.raises(HTTPException) as exc_info:
+            await export_orders(format="csv", status="shipped", current_user=None)
+
+        assert exc_info.value.status_code == 400
+
+    async def test_excel_workbook_has_order_and_item_sheets(self, session):
+        chunks = await collect(DataExportService(session), format="excel")
+
+        workbook = load_workbook(io.BytesIO(b"".join(chunks)))
+        assert workbook.sheetnames == ["訂單", "訂單明細"]
+        assert workbook["訂單"].max_row == 4
+        assert workbook["訂單明細"].max_row == 5
+        assert workbook["訂單"]["A1"].font.bold
@@ -0,0 +1,152 @@
+"""
+Unit tests for the vectorized data import service
+"""
+
+import io
+from datetime import date
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Customer
+from app.models.analytics_rollup import DailyOrderRollup
+from app.models.gas_product import DeliveryMethod, GasProduct, ProductAttribute
+from app.services import data_import_service
+from app.services.customer_ledger_service import CustomerLedgerService
+from app.services.data_import_service import DataImportService
+from tests.services.conftest import ORDER_TABLES
+
+TABLES = ORDER_TABLES + ("gas_products",)
+
+
+@pytest.fixture
+async def session(engine):
+    async with AsyncSession(engine) as session:
+        yield session
+
+
+def customer_csv(rows):
+    return io.BytesIO(pd.DataFrame(rows).to_csv(index=False).encode("utf-8"))
+
+
+class TestColumnParsing:
+    """Test vectorized cleaning helpers"""
+
+    def test_clean_phones(self):
+        phones = pd.Series(["0912-345-678", "(02)2345678", "+886912345678"])
+
+        cleaned = DataImportService._clean_phones(phones)
+
+        assert cleaned.tolist() == ["+886912345678", "+886022345678", "+886912345678"]
+
+    def test_parse_dates_mixed_formats(self):
+        values = pd.Series(["2025-01-02", "2025/01/03", "2025年01月04日", "bad", None])
+
+        parsed = DataImportService._parse_dates(values)
+
+        assert parsed.tolist() == [
+            date(2025, 1, 2),
+            date(2025, 1, 3),
+            date(2025, 1, 4),
+            None,
+            None,
+        ]
+
+
+class TestImportCustomers:
+    """Test bulk customer import"""
+
+    @pytest.fixture(autouse=True)
+    def accept_normalized_phones(self):
+        with patch.object(
+            data_import_service,
+            "validate_phone_number",
+            lambda phone: phone.startswith("+886"),
+        ):
+            yield
+
+    async def test_creates_and_reports_invalid_rows(self, session):
+        file = customer_csv(
+            {
+                "客戶代碼": ["C1", "C2", "C3"],
+                "客戶名稱": ["王記", "李記", "陳記"],
+                "電話": ["0912345678", "123", "0912345679"],
+                "地址": ["台北市", "台北市", "台北市"],
+            }
+        )
+
+        result = await DataImportService(session).import_customers(file, "csv")
+
+        assert result["created"] == 2
+        assert [error["row"] for error in result["errors"]] == [3]
+
+    async def test_constraint_violation_only_skips_offending_row(self, session):
+        session.add(Customer(customer_code="C1", short_name="舊", address="台北市"))
+        await session.commit()
+
+        file = customer_csv(
+            {
+                "客戶代碼": ["C1", "C2"],
+                "客戶名稱": ["王記", "李記"],
+                "電話": ["0912345678", "0912345679"],
+                "地址": ["台北市", "台北市"],
+            }
+        )
+
+        result = await DataImportService(session).import_customers(file, "csv")
+
+        count = await session.execute(select(func.count(Customer.id)))
+        assert result["created"] == 1
+        assert result["errors"][0]["row"] == 2
+        assert count.scalar() == 2
+
+
+class TestImportOrders:
+    """Test bulk order import"""
+
+    async def test_created_orders_reach_rollups_and_ledger(self, session):
+        session.add(
+            Customer(
+                customer_code="C1",
+                short_name="王記",
+                address="台北市",
+                phone="+886912345678",
+            )
+        )
+        session.add(
+            GasProduct(
+                delivery_method=DeliveryMethod.CYLINDER,
+                size_kg=20,
+                attribute=ProductAttribute.REGULAR,
+                sku="CYL-20-R",
+                name_zh="20公斤桶裝瓦斯",
+                unit_price=500,
+            )
+        )
+        await session.commit()
+
+        file = io.BytesIO()
+        with pd.ExcelWriter(file) as writer:
+            pd.DataFrame(
+                {
+                    "客戶電話": ["+886912345678", "+886912345678"],
+                    "配送日期": ["2025-05-01", "2025-05-02"],
+                    "配送地址": ["台北市", "台北市"],
+                }
+            ).to_excel(writer, sheet_name="訂單", index=False)
+            pd.DataFrame(
+                {"訂單編號": [2, 3, 3], "產品代碼": ["CYL-20-R"] * 3, "數量": [1, 2, 1]}
+            ).to_excel(writer, sheet_name="訂單明細", index=False)
+
+        result = await DataImportService(session).import_orders(file, "xlsx")
+
+        rollups = await session.execute(
+            select(DailyOrderRollup.order_count, DailyOrderRollup.revenue)
+        )
+        balance = await CustomerLedgerService(session).get_balance(1)
+        assert result["created"] == 2
+        assert rollups.all() == [(2, 2000.0)]
+        assert balance.unpaid_order_amount == 2000.0
@@ -0,0 +1,114 @@
+"""
+Unit tests for the SQL-aggregated delivery history statistics
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.models  # noqa: F401 - register all tables
+from app.api.v1.delivery_history import get_delivery_stats
+from app.core.config import settings
+from app.models import Customer, DeliveryHistory
+
+TABLES = ("customers", "delivery_history")
+
+
+@pytest.fixture(autouse=True)
+async def seed(engine, monkeypatch, tmp_path):
+    # No Parquet archive, so every statistic comes from the live table
+    monkeypatch.setattr(settings, "ANALYTICS_ARCHIVE_DIR", str(tmp_path / "archive"))
+    async with AsyncSession(engine) as session:
+        wang = Customer(customer_code="C1", short_name="王記", address="台北市")
+        lin = Customer(customer_code="C2", short_name="林家", address="新北市")
+        session.add_all([wang, lin])
+        await session.flush()
+
+        for customer, day, quantities, weight, cylinders in (
+            (wang, date(2025, 5, 1), {"qty_50kg": 1, "qty_20kg": 2}, 90.0, 3),
+            (wang, date(2025, 5, 1), {"qty_ying20": 1, "qty_4kg": 2}, 28.0, 3),
+            (wang, date(2025, 5, 2), {"qty_16kg": 1, "qty_haoyun16": 1}, 32.0, 2),
+            (lin, date(2025, 5, 3), {"qty_10kg": 3, "qty_haoyun20": 1}, None, None),
+        ):
+            session.add(
+                DeliveryHistory(
+                    transaction_date=day,
+                    customer_id=customer.id,
+                    customer_code=customer.customer_code,
+                    total_weight_kg=weight,
+                    total_cylinders=cylinders,
+                    **quantities,
+                )
+            )
+        await session.commit()
+
+
+async def stats(engine, **filters):
+    async with AsyncSession(engine) as db:
+        return await get_delivery_stats(current_user=None, db=db, **filters)
+
+
+class TestDeliveryStats:
+    """Test totals, per-type, per-customer and per-date aggregates"""
+
+    async def test_totals_and_breakdowns(self, engine):
+        result = await stats(engine)
+
+        assert result.total_deliveries == 4
+        # Missing weights and cylinder counts add nothing
+        assert result.total_weight_kg == 150.0
+        assert result.total_cylinders == 8
+        assert result.unique_customers == 2
+        assert result.cylinders_by_type == {
+            "50kg": 1,
+            "20kg": 3,
+            "16kg": 2,
+            "10kg": 3,
+            "4kg": 2,
+            "haoyun20": 1,
+        }
+        assert result.top_customers == [
+            {
+                "customer_code": "C1",
+                "deliveries": 3,
+                "total_weight": 150.0,
+                "total_cylinders": 8,
+                "customer_name": "王記",
+            },
+            {
+                "customer_code": "C2",
+                "deliveries": 1,
+                "total_weight": 0.0,
+                "total_cylinders": 0,
+                "customer_name": "林家",
+            },
+        ]
+        assert result.deliveries_by_date == [
+            {"date": "2025-05-01", "count": 2, "weight": 118.0, "cylinders": 6},
+            {"date": "2025-05-02", "count": 1, "weight": 32.0, "cylinders": 2},
+            {"date": "2025-05-03", "count": 1, "weight": 0.0, "cylinders": 0},
+        ]
+
+    async def test_date_range_filters_every_aggregate(self, engine):
+        result = await stats(engine, date_from=date(2025, 5, 2), date_to=date(2025, 5, 3))
+
+        assert result.total_deliveries == 2
+        assert result.total_weight_kg == 32.0
+        assert result.unique_customers == 2
+        assert result.cylinders_by_type["50kg"] == 0
+        assert result.cylinders_by_type["16kg"] == 2
+        assert [row["deliveries"] for row in result.top_customers] == [1, 1]
+        assert [row["date"] for row in result.deliveries_by_date] == [
+            "2025-05-02",
+            "2025-05-03",
+        ]
+
+    async def test_empty_range(self, engine):
+        result = await stats(engine, date_from=date(2025, 6, 1))
+
+        assert result.total_deliveries == 0
+        assert result.total_weight_kg == 0
+        assert set(result.cylinders_by_type.values()) == {0}
+        assert result.top_customers == []
+        assert result.deliveries_by_date == []
@@ -0,0 +1,109 @@
+"""
+Unit tests for the pooled e-invoice client and concurrent submission
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.services.einvoice_service import EInvoiceService
+
+
+def service(submit=None):
+    """Service without platform configuration"""
+    einvoice = EInvoiceService.__new__(EInvoiceService)
+    einvoice.client_config = {"timeout": httpx.Timeout(5)}
+    einvoice._client = None
+    einvoice.max_retries = 2
+    einvoice.retry_delay = 0
+    if submit is not None:
+        einvoice.submit_invoice = submit
+    return einvoice
+
+
+class TestPooledClient:
+    """Test the long-lived client"""
+
+    async def test_requests_share_one_client(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200 if len(requests) > 1 else 503, json={})
+
+        einvoice = service()
+        einvoice.client_config["transport"] = httpx.MockTransport(handler)
+
+        first = await einvoice._make_request("POST", "https://einvoice.test/issue", {})
+        client = einvoice.client
+        await einvoice._make_request("GET", "https://einvoice.test/query", {})
+
+        # One retry after the 503, then a second request on the same client
+        assert first.status_code == 200
+        assert len(requests) == 3
+        assert einvoice.client is client
+        await einvoice.aclose()
+        assert einvoice._client is None
+
+    async def test_retries_give_up_after_max_retries(self):
+        einvoice = service()
+        einvoice.client_config["transport"] = httpx.MockTransport(
+            lambda request: httpx.Response(500)
+        )
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await einvoice._make_request("POST", "https://einvoice.test/issue", {})
+        await einvoice.aclose()
+
+
+class TestConcurrentSubmission:
+    """Test bounded concurrent submission"""
+
+    async def test_in_flight_limit_and_per_invoice_results(self):
+        in_flight = 0
+        peak = 0
+
+        async def submit(invoice):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if invoice.id == 3:
+                raise ValueError("買方統一編號格式錯誤")
+            return {"status": "success", "einvoice_id": f"E{invoice.id}"}
+
+        invoices = [SimpleNamespace(id=i) for i in range(10)]
+        outcomes = [
+            outcome
+            async for outcome in service(submit).submit_invoices(invoices, max_in_flight=4)
+        ]
+
+        assert peak == 4
+        assert len(outcomes) == 10
+        failed = [invoice.id for invoice, result, error in outcomes if error]
+        assert failed == [3]
+        assert all(
+            result["einvoice_id"] == f"E{invoice.id}"
+            for invoice, result, error in outcomes
+            if not error
+        )
+
+    async def test_stopping_early_cancels_pending_submissions(self):
+        submitted = []
+
+        async def submit(invoice):
+            submitted.append(invoice.id)
+            await asyncio.sleep(0.01)
+            return {"status": "success"}
+
+        invoices = [SimpleNamespace(id=i) for i in range(20)]
+
+        stream = service(submit).submit_invoices(invoices, max_in_flight=2)
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0)
+
+        assert len(submitted) < 20
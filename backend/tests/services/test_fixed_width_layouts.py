@@ -0,0 +1,155 @@
+"""
+Unit tests for compiled fixed-width layouts and the ACH files built on them
+"""
+
+import io
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.file_generators import (
+    ACHReconciliationParser,
+    Field,
+    FileLayout,
+    RecordLayout,
+    TaiwanACHGenerator,
+)
+from app.services.file_generators.ach_format import ACH_DETAIL, ACH_RESULT
+from app.services.file_generators.fixed_width import FILLER, encode_field
+
+
+class TestRecordLayout:
+    """Test byte-width formatting and parsing"""
+
+    def test_big5_text_is_cut_on_a_character_boundary(self):
+        # Four characters need 8 bytes; 7 leave room for three
+        encoded = encode_field("幸福氣體", 7, encoding="big5")
+
+        assert len(encoded) == 7
+        assert encoded == "幸福氣".encode("big5") + b" "
+
+    def test_alignment_and_defaults(self):
+        layout = RecordLayout(
+            "X",
+            [
+                Field("code", 4, default="AB"),
+                Field("amount", 6, "R", "0"),
+                Field(FILLER, 2),
+            ],
+        )
+
+        assert layout.size == 13
+        assert layout.format({"amount": 150}) == b"XAB  000150  "
+        assert layout.parse(b"XAB  000150  ") == {
+            "record_type": "X",
+            "code": "AB",
+            "amount": "000150",
+        }
+
+    def test_fields_are_cut_by_bytes_before_decoding(self):
+        layout = RecordLayout("D", [Field("name", 6), Field("code", 3)])
+        line = layout.format({"name": "王小明", "code": "000"}, "big5")
+
+        # Characters would put the code at offset 4, bytes at 7
+        assert len(line) == 10
+        assert layout.parse(line, "big5") == {
+            "record_type": "D",
+            "name": "王小明",
+            "code": "000",
+        }
+
+    def test_file_is_read_one_record_at_a_time(self):
+        layout = FileLayout(RecordLayout("D", [Field("value", 3)]))
+        fp = io.BytesIO(b"H header\r\nDabc\r\n\r\nDx\r\nDdef\r\n")
+
+        records = layout.read(fp)
+
+        assert next(records) == ("D", {"record_type": "D", "value": "abc"})
+        # Nothing past the first record has been consumed yet
+        assert fp.tell() == len(b"H header\r\nDabc\r\n")
+        assert [fields["value"] for _, fields in records] == ["x", "def"]
+
+    def test_right_trimmed_lines_are_padded(self):
+        layout = RecordLayout("D", [Field("code", 3), Field("message", 20)])
+
+        assert layout.parse(b"D000OK") == {
+            "record_type": "D",
+            "code": "000",
+            "message": "OK",
+        }
+
+
+@pytest.fixture
+def batch():
+    transactions = [
+        SimpleNamespace(
+            transaction_id=f"TX{n:06d}",
+            account_number="822-1234-5678901234",
+            account_holder="王小明" if n % 2 else "陳大文股份有限公司台北分公司營業部",
+            amount=Decimal("1500.50"),
+            scheduled_date=datetime(2024, 1, 20),
+            invoice_id=n,
+            customer_id=n,
+            customer=None,
+        )
+        for n in range(1, 4)
+    ]
+    return SimpleNamespace(
+        batch_number="ACH20240120001", bank_code="ctbc", transactions=transactions
+    )
+
+
+class TestTaiwanACHFiles:
+    """Test ACH generation and reconciliation on the shared layouts"""
+
+    def test_payment_file_records_are_200_bytes(self, batch):
+        content = TaiwanACHGenerator().generate_payment_file(batch, encoding="big5")
+
+        lines = content.split(b"\r\n")
+        assert lines[-1] == b""
+        assert [len(line) for line in lines[:-1]] == [200] * 5
+        assert [line[:1] for line in lines[:-1]] == [b"H", b"D", b"D", b"D", b"T"]
+
+        detail = ACH_DETAIL.parse(lines[2], "big5")
+        assert detail["account_holder"] == "陳大文股份有限公司台北分公司營"
+        assert detail["amount"] == "0000000150050"
+        assert lines[4].startswith(b"T000003000000000450150")
+
+    def test_payment_file_streams_to_a_file_object(self, batch, tmp_path):
+        path = tmp_path / "ACH.txt"
+
+        with open(path, "wb") as fp:
+            written = TaiwanACHGenerator().write_payment_file(
+                batch, fp, transactions=iter(batch.transactions)
+            )
+
+        assert written == path.stat().st_size == 5 * 202
+
+    def test_reconciliation_file_is_parsed_by_byte_offset(self):
+        result = ACH_RESULT.format(
+            {
+                "sequence_number": 1,
+                "transaction_id": "TX000001",
+                "bank_reference": "REF001",
+                "response_code": "000",
+                "processed_date": "20240121",
+                "processed_amount": 150050,
+            }
+        )
+        rejected = (
+            b"R000002" + b"TX000002".ljust(20) + b"R01" + b"20240121" + b"0000000150050"
+        ).ljust(200, b" ")
+        content = b"\r\n".join([b"H20240121", result, b"Dshort", rejected, b"T"])
+
+        records = ACHReconciliationParser().parse_reconciliation_file(content)
+
+        assert [record["transaction_id"] for record in records] == [
+            "TX000001",
+            "TX000002",
+        ]
+        assert records[0]["success"] is True
+        assert records[0]["processed_amount"] == Decimal("1500.50")
+        assert records[1]["return_reason"] == "餘額不足"
+        assert records[1]["success"] is False
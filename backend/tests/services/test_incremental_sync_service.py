@@ -0,0 +1,159 @@
+"""
+Unit tests for batched legacy → new incremental sync
+"""
+
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import app.models  # noqa: F401 - register all tables
+from app.core.database import Base
+from app.models import Customer
+from app.services.incremental_sync_service import IncrementalSyncService
+
+
+class FakeRedis:
+    """In-memory hash store counting round trips"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.round_trips = 0
+
+    async def hmget(self, key, fields):
+        self.round_trips += 1
+        values = self.hashes.get(key, {})
+        return [values.get(field) for field in fields]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hset(self, key, mapping):
+        self.commands.append((key, mapping))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        for key, mapping in self.commands:
+            self.redis.hashes.setdefault(key, {}).update(mapping)
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: Base.metadata.create_all(
+                sync_conn, tables=[Base.metadata.tables["customers"]]
+            )
+        )
+    async with AsyncSession(engine) as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = IncrementalSyncService(str(tmp_path / "legacy.db"))
+    service.redis = FakeRedis()
+    return service
+
+
+def client_batch(rows):
+    return pd.DataFrame(
+        [
+            {
+                "short_name": "客戶",
+                "address": "台北市",
+                "contact_person": "王先生 0912-345-678",
+                "updated_at": "2025-05-01 10:00:00",
+                **row,
+            }
+            for row in rows
+        ]
+    )
+
+
+class TestSyncBatch:
+    """Test batched customer sync"""
+
+    async def test_creates_customers_and_stores_mappings(self, service, session):
+        config = service.sync_config["clients"]
+        batch = client_batch([{"id": 1, "client_code": "C1"}, {"id": 2, "client_code": "C2"}])
+
+        synced = await service.sync_batch(batch, config, session)
+
+        customers = (await session.execute(select(Customer))).scalars().all()
+        assert synced == 2
+        assert {customer.phone for customer in customers} == {"0912345678"}
+        assert set(service.redis.hashes["sync:id_map:customers"]) == {"1", "2"}
+        # One HMGET plus one pipelined write
+        assert service.redis.round_trips == 2
+
+    async def test_existing_code_is_only_mapped(self, service, session):
+        session.add(Customer(customer_code="C1", short_name="舊", address="高雄市"))
+        await session.commit()
+        config = service.sync_config["clients"]
+
+        await service.sync_batch(client_batch([{"id": 7, "client_code": "C1"}]), config, session)
+
+        customer = (await session.execute(select(Customer))).scalar_one()
+        assert customer.short_name == "舊"
+        assert service.redis.hashes["sync:id_map:customers"]["7"] == str(customer.id)
+
+    async def test_mapped_customer_updated_unless_newer(self, service, session):
+        config = service.sync_config["clients"]
+        await service.sync_batch(client_batch([{"id": 1, "client_code": "C1"}]), config, session)
+
+        await service.sync_batch(
+            client_batch(
+                [
+                    {
+                        "id": 1,
+                        "client_code": "C1",
+                        "short_name": "新名稱",
+                        "updated_at": "2025-05-02 10:00:00",
+                    }
+                ]
+            ),
+            config,
+            session,
+        )
+        stale = client_batch(
+            [{"id": 1, "client_code": "C1", "short_name": "過期", "updated_at": "2020-01-01"}]
+        )
+        await service.sync_batch(stale, config, session)
+
+        customer = (await session.execute(select(Customer))).scalar_one()
+        assert customer.short_name == "新名稱"
+        assert service.stats["conflicts_resolved"] == 1
+
+
+class TestFetchLegacyChanges:
+    """Test reading changes from the legacy database"""
+
+    def test_reuses_connection_and_schema(self, service):
+        conn = sqlite3.connect(service.legacy_db_path)
+        conn.execute("CREATE TABLE clients (id INTEGER, client_code TEXT, updated_at TEXT)")
+        conn.execute("INSERT INTO clients VALUES (1, 'C1', '2025-05-01T10:00:00')")
+        conn.commit()
+
+        first = service.fetch_legacy_changes("clients", datetime(2025, 1, 1))
+        connection = service._legacy_conn
+        conn.execute("INSERT INTO clients VALUES (2, 'C2', '2025-05-02T10:00:00')")
+        conn.commit()
+        second = service.fetch_legacy_changes("clients", datetime(2025, 5, 1, 12))
+        conn.close()
+
+        assert first["client_code"].tolist() == ["C1"]
+        assert second["client_code"].tolist() == ["C2"]
+        assert service._legacy_conn is connection
+        assert service._legacy_columns == {"clients": {"id", "client_code", "updated_at"}}
@@ -0,0 +1,192 @@
+"""
+Unit tests for block-allocated invoice numbers
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Customer
+from app.models.invoice import Invoice
+from app.models.invoice_number_block import InvoiceNumberBlock
+from app.models.invoice_sequence import InvoiceSequence
+from app.services import invoice_number_allocator
+from app.services.invoice_number_allocator import (
+    InvoiceNumberAllocator,
+    blank_number_ranges,
+    close_invoice_number_allocator,
+    forecast_exhaustion,
+)
+
+TABLES = ("customers", "invoices", "invoice_sequences", "invoice_number_blocks")
+
+
+@pytest.fixture(autouse=True)
+async def seed(engine):
+    async with AsyncSession(engine) as session:
+        session.add(Customer(customer_code="C1", short_name="王記", address="台北市"))
+        session.add(
+            InvoiceSequence(
+                year_month="202505",
+                prefix="AB",
+                range_start=10000000,
+                range_end=10000249,
+                current_number=10000000,
+            )
+        )
+        await session.commit()
+
+
+def allocator(engine, worker_id="worker-1", block_size=100):
+    async def session_factory():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    return InvoiceNumberAllocator(session_factory, block_size=block_size, worker_id=worker_id)
+
+
+async def scalars(engine, query):
+    async with AsyncSession(engine) as session:
+        return (await session.execute(query)).scalars().all()
+
+
+async def add_invoices(engine, numbers):
+    async with AsyncSession(engine) as session:
+        for number in numbers:
+            session.add(
+                Invoice(
+                    invoice_number=number,
+                    invoice_track=number[:2],
+                    invoice_no=number[2:],
+                    customer_id=1,
+                    invoice_date=date(2025, 5, 1),
+                    period="202505",
+                    total_amount=1050,
+                )
+            )
+        await session.commit()
+
+
+class TestAllocation:
+    """Test reserving blocks and handing out numbers"""
+
+    async def test_numbers_come_from_memory_between_blocks(self, engine):
+        statements = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        await allocator(engine, "worker-1").next_number("202505")
+        worker = allocator(engine, "worker-2")
+        numbers = [await worker.next_number("202505") for _ in range(150)]
+
+        assert numbers[0] == "AB10000100"
+        assert numbers[-1] == "AB10000249"
+        locks = [s for s in statements if s.startswith("SELECT invoice_sequences")]
+        # One reservation for the first worker, two for the second
+        assert len(locks) == 3
+
+    async def test_interleaved_workers_get_disjoint_numbers(self, engine):
+        workers = [allocator(engine, f"worker-{i}", block_size=10) for i in range(3)]
+
+        numbers = [
+            await worker.next_number("202505") for _ in range(25) for worker in workers
+        ]
+
+        assert len(set(numbers)) == 75
+        (sequence,) = await scalars(engine, select(InvoiceSequence))
+        assert sequence.current_number == 10000090  # 9 blocks of 10
+
+    async def test_exhausted_sequence_raises(self, engine):
+        worker = allocator(engine, block_size=200)
+        for _ in range(250):
+            await worker.next_number("202505")
+
+        with pytest.raises(ValueError):
+            await worker.next_number("202505")
+
+    async def test_unconfigured_period_raises(self, engine):
+        # Invoices of a period without an allocated range are refused rather
+        # than numbered outside the government ranges
+        with pytest.raises(ValueError, match="No active invoice sequence found for 202506"):
+            await allocator(engine).next_number("202506")
+
+    def test_each_event_loop_gets_its_own_lock(self, engine):
+        worker = allocator(engine)
+
+        async def locks():
+            return worker._loop_lock(), worker._loop_lock()
+
+        first, again = asyncio.run(locks())
+        other, _ = asyncio.run(locks())
+
+        assert first is again
+        assert other is not first
+
+
+class TestRelease:
+    """Test returning or blanking unused numbers"""
+
+    async def test_tail_block_returns_unused_numbers(self, engine):
+        worker = allocator(engine)
+        for _ in range(30):
+            await worker.next_number("202505")
+
+        await worker.release()
+
+        (sequence,) = await scalars(engine, select(InvoiceSequence))
+        (block,) = await scalars(engine, select(InvoiceNumberBlock))
+        assert sequence.current_number == 10000030
+        assert (block.range_end, block.status) == (10000029, "released")
+        # The next worker continues without a gap
+        assert await allocator(engine, "worker-2").next_number("202505") == "AB10000030"
+
+    async def test_shutdown_releases_the_process_allocator(self, engine, monkeypatch):
+        worker = allocator(engine)
+        monkeypatch.setattr(invoice_number_allocator, "_allocator", worker)
+        await worker.next_number("202505")
+
+        await close_invoice_number_allocator()
+
+        (sequence,) = await scalars(engine, select(InvoiceSequence))
+        assert sequence.current_number == 10000001
+        assert invoice_number_allocator._allocator is None
+
+    async def test_unused_numbers_behind_other_blocks_are_blank(self, engine):
+        first, second = allocator(engine, "worker-1"), allocator(engine, "worker-2")
+        used = [await first.next_number("202505") for _ in range(60)]
+        used += [await second.next_number("202505") for _ in range(100)]
+        await first.release()
+        await add_invoices(engine, used[:59])  # one number never became an invoice
+
+        async with AsyncSession(engine) as session:
+            blanks = await blank_number_ranges(session, "202505")
+
+        assert blanks == [
+            {"prefix": "AB", "range_start": 10000059, "range_end": 10000099, "count": 41},
+            {"prefix": "AB", "range_start": 10000100, "range_end": 10000199, "count": 100},
+        ]
+
+
+class TestForecast:
+    """Test exhaustion prediction"""
+
+    async def test_forecast_from_recent_allocations(self, engine):
+        worker = allocator(engine)
+        for _ in range(150):
+            await worker.next_number("202505")
+
+        async with AsyncSession(engine) as session:
+            (forecast,) = await forecast_exhaustion(
+                session, "202505", now=datetime.utcnow() + timedelta(days=1)
+            )
+
+        # 200 numbers reserved over one day, 50 left
+        assert forecast["available"] == 50
+        assert forecast["daily_usage"] == pytest.approx(200, rel=0.01)
+        assert forecast["days_remaining"] == pytest.approx(0.2, abs=0.1)
+        assert forecast["alert"] is True
@@ -0,0 +1,240 @@
+"""
+Unit tests for the notification outbox and its workers
+"""
+
+import smtplib
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import app.models  # noqa: F401 - register all tables
+from app.core.database import Base
+from app.models.notification import NotificationChannel, NotificationOutbox, OutboxStatus
+from app.services.notification_outbox_service import (
+    OUTBOX_LEASE,
+    NotificationOutboxWorker,
+    enqueue_notifications,
+    retry_delay,
+)
+from app.services.notification_service import (
+    NotificationService,
+    NotificationType,
+    SMTPConnectionPool,
+)
+
+
+class FakeSMTP:
+    """Records connections and messages instead of talking to a server"""
+
+    connections = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.drop_next = False
+        FakeSMTP.connections.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        if self.drop_next:
+            raise smtplib.SMTPServerDisconnected("idle timeout")
+        self.sent.append(msg["To"])
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: Base.metadata.create_all(
+                sync_conn, tables=[Base.metadata.tables["notification_outbox"]]
+            )
+        )
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def notifier():
+    FakeSMTP.connections = []
+    service = NotificationService()
+    service.smtp_pool = SMTPConnectionPool("smtp.test", 587, size=2, smtp_factory=FakeSMTP)
+    return service
+
+
+@pytest.fixture
+def send_bulk_sms():
+    with patch(
+        "app.services.sms_service.enhanced_sms_service.send_bulk_sms",
+        new_callable=AsyncMock,
+    ) as send_bulk_sms:
+        send_bulk_sms.return_value = {"errors": []}
+        yield send_bulk_sms
+
+
+def fail_sms(error_for):
+    """send_bulk_sms stand-in failing the recipients ``error_for`` returns an error for"""
+
+    async def send_bulk_sms(recipients, **kwargs):
+        errors = []
+        for index, recipient in enumerate(recipients):
+            error = error_for(index, recipient)
+            if error:
+                errors.append({"index": index, "recipient": recipient["phone"], "error": error})
+        return {"errors": errors}
+
+    return send_bulk_sms
+
+
+def worker(engine, notifier, batch_size=200):
+    async def session_factory():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    return NotificationOutboxWorker(session_factory, notifier=notifier, batch_size=batch_size)
+
+
+async def enqueue(engine, notifications):
+    async with AsyncSession(engine) as session:
+        await enqueue_notifications(notifications, db=session)
+        await session.commit()
+
+
+async def entries(engine):
+    async with AsyncSession(engine) as session:
+        result = await session.execute(
+            select(NotificationOutbox).order_by(NotificationOutbox.recipient)
+        )
+        return result.scalars().all()
+
+
+def sms(phone, notification_type=NotificationType.ORDER_CANCELLED):
+    return {
+        "channel": NotificationChannel.SMS,
+        "recipient": phone,
+        "notification_type": notification_type,
+        "payload": {"order_number": "ORD-1"},
+    }
+
+
+class TestNotificationOutboxWorker:
+    """Test claiming, batching and retrying outbox entries"""
+
+    async def test_bulk_notifications_are_queued_then_batched(
+        self, engine, notifier, send_bulk_sms
+    ):
+        recipients = [
+            {"phone": f"09120000{i:02d}", "email": f"user{i}@example.com"} for i in range(6)
+        ]
+        async with AsyncSession(engine) as session:
+            queued = await notifier.send_bulk_notifications(
+                recipients, NotificationType.SYSTEM_ALERT, {"message": "停氣通知"}, db=session
+            )
+            await session.commit()
+
+        # Nothing is sent while enqueuing
+        assert queued == {"total": 12, "queued": 12}
+        send_bulk_sms.assert_not_called()
+
+        stats = await worker(engine, notifier).run_once()
+
+        assert stats == {"claimed": 12, "sent": 12, "retried": 0, "failed": 0}
+        # One provider bulk send for all SMS of the same type
+        send_bulk_sms.assert_awaited_once()
+        sent = send_bulk_sms.await_args.kwargs["recipients"]
+        assert [r["message"] for r in sent] == ["【幸福氣】系統通知：停氣通知"] * 6
+        # Emails share the pooled sessions instead of one connection each
+        assert len(FakeSMTP.connections) <= 2
+        assert sum(len(c.sent) for c in FakeSMTP.connections) == 6
+        assert {e.status for e in await entries(engine)} == {OutboxStatus.SENT}
+
+    async def test_failures_back_off_then_give_up(self, engine, notifier, send_bulk_sms):
+        await enqueue(engine, [sms("0912000001"), {**sms("0912000002"), "max_attempts": 2}])
+        send_bulk_sms.side_effect = fail_sms(lambda index, recipient: "gateway timeout")
+        outbox = worker(engine, notifier)
+
+        first = await outbox.run_once()
+        # Not due again until the backoff has passed
+        early = await outbox.run_once()
+        second = await outbox.run_once(datetime.utcnow() + timedelta(hours=1))
+
+        assert first == {"claimed": 2, "sent": 0, "retried": 2, "failed": 0}
+        assert early["claimed"] == 0
+        assert second == {"claimed": 2, "sent": 0, "retried": 1, "failed": 1}
+        retried, failed = await entries(engine)
+        assert retried.status == OutboxStatus.PENDING
+        assert retried.attempts == 2
+        assert retried.last_error == "gateway timeout"
+        assert failed.status == OutboxStatus.FAILED
+
+    async def test_results_map_to_entries_not_phone_numbers(
+        self, engine, notifier, send_bulk_sms
+    ):
+        await enqueue(
+            engine,
+            [sms("0912000001"), sms("0912000001", NotificationType.ORDER_CANCELLED)],
+        )
+        # Only the second message to the shared number fails
+        send_bulk_sms.side_effect = fail_sms(
+            lambda index, recipient: "quota exceeded" if index == 1 else None
+        )
+
+        stats = await worker(engine, notifier).run_once()
+
+        assert stats == {"claimed": 2, "sent": 1, "retried": 1, "failed": 0}
+        statuses = sorted(entry.status.value for entry in await entries(engine))
+        assert statuses == sorted([OutboxStatus.SENT.value, OutboxStatus.PENDING.value])
+
+    async def test_expired_lease_is_reclaimed(self, engine, notifier, send_bulk_sms):
+        await enqueue(engine, [sms("0912000001"), sms("0912000002")])
+        now = datetime.utcnow()
+        async with AsyncSession(engine) as session:
+            stuck, leased = (
+                await session.execute(
+                    select(NotificationOutbox).order_by(NotificationOutbox.recipient)
+                )
+            ).scalars().all()
+            stuck.status = leased.status = OutboxStatus.PROCESSING
+            stuck.locked_until = now - timedelta(seconds=1)
+            leased.locked_until = now + OUTBOX_LEASE
+            await session.commit()
+
+        stats = await worker(engine, notifier).run_once(now)
+
+        assert stats["claimed"] == 1
+        reclaimed, untouched = await entries(engine)
+        assert reclaimed.status == OutboxStatus.SENT
+        assert untouched.status == OutboxStatus.PROCESSING
+
+    async def test_retry_delay_is_capped(self):
+        assert retry_delay(1) == timedelta(seconds=30)
+        assert retry_delay(3) == timedelta(minutes=2)
+        assert retry_delay(20) == timedelta(hours=1)
+
+
+class TestSMTPConnectionPool:
+    """Test SMTP session reuse"""
+
+    async def test_reconnects_after_idle_disconnect(self, notifier):
+        pool = notifier.smtp_pool
+        message = notifier._build_email("a@example.com", NotificationType.SYSTEM_ALERT, {})
+
+        await pool.send(message)
+        await pool.send(message)
+        FakeSMTP.connections[0].drop_next = True
+        await pool.send(message)
+        await pool.close()
+
+        first, second = FakeSMTP.connections
+        assert first.sent == ["a@example.com", "a@example.com"]
+        assert second.sent == ["a@example.com"]
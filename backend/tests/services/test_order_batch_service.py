@@ -0,0 +1,127 @@
+"""
+Unit tests for the batch order engine
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Customer
+from app.models.analytics_rollup import DailyOrderRollup
+from app.models.customer_ledger import CustomerBalanceLedger
+from app.models.order import Order, OrderStatus
+from app.schemas.order import OrderCreate
+from app.services.credit_service import CreditService
+from app.services.order_batch_service import OrderBatchService, price_orders
+from tests.services.conftest import ORDER_TABLES
+
+TABLES = ORDER_TABLES
+
+pytestmark = pytest.mark.usefixtures("order_events")
+
+
+@pytest.fixture
+async def session(engine):
+    # Matches the application's session factory
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add_all(
+            [
+                Customer(customer_code="C1", short_name="王記", address="台北市信義路"),
+                Customer(customer_code="C2", short_name="李家", address="台北市仁愛路"),
+                Customer(
+                    customer_code="C3", short_name="停用", address="高雄市", is_active=False
+                ),
+            ]
+        )
+        await session.commit()
+        yield session
+
+
+def approve_all(declined=()):
+    async def check(db, order_amounts, skip_check=False):
+        return {
+            customer_id: {"approved": customer_id not in declined, "reason": "test"}
+            for customer_id in order_amounts
+        }
+
+    return patch.object(CreditService, "check_credit_limits", side_effect=check)
+
+
+def order(customer_id, **quantities):
+    return OrderCreate(
+        customer_id=customer_id,
+        scheduled_date=datetime.now() + timedelta(days=1),
+        **quantities,
+    )
+
+
+class TestPriceOrders:
+    """Test vectorized pricing"""
+
+    def test_discount_and_surcharge(self):
+        frame = pd.DataFrame(
+            [
+                {"qty_50kg": 1, "qty_20kg": 0, "qty_16kg": 0, "qty_10kg": 0, "qty_4kg": 2, "is_urgent": False},
+                {"qty_50kg": 5, "qty_20kg": 0, "qty_16kg": 0, "qty_10kg": 0, "qty_4kg": 0, "is_urgent": True},
+            ]
+        )
+
+        prices = price_orders(frame)
+
+        assert prices["total_amount"].tolist() == pytest.approx([3200, 13750])
+        # Volume discount is taken on the amount before the surcharge
+        assert prices["discount_amount"].tolist() == [0, 625]
+        assert prices["final_amount"].tolist() == pytest.approx([3200, 13125])
+
+
+class TestCreateOrders:
+    """Test batch creation"""
+
+    async def test_rejects_without_stopping_batch(self, session, order_events):
+        with approve_all(declined={2}):
+            result = await OrderBatchService(session).create_orders(
+                [order(cid, qty_20kg=1) for cid in (1, 2, 3, 99)],
+                created_by=1,
+            )
+
+        assert [o.customer_id for o in result.created] == [1]
+        assert {(e["index"], e["error"]) for e in result.errors} == {
+            (1, "信用額度檢查失敗"),
+            (2, "客戶已停用"),
+            (3, "客戶不存在"),
+        }
+        created = result.created[0]
+        assert created.status == OrderStatus.PENDING
+        assert created.delivery_address == "台北市信義路"
+        assert created.final_amount == 1200
+        order_events.assert_awaited_once()
+        assert order_events.await_args.args[1]["order_ids"] == [created.id]
+
+    async def test_constant_round_trips_and_rollups(self, engine, session):
+        orders = [order(1 + n % 2, qty_16kg=1 + n % 3) for n in range(500)]
+        statements = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        with approve_all():
+            result = await OrderBatchService(session).create_orders(orders, created_by=1)
+
+        assert len(result.created) == 500
+        # Round trips do not grow with the number of orders
+        assert len(statements) < 20
+
+        count = await session.scalar(select(func.count()).select_from(Order))
+        rollup = await session.scalar(select(func.sum(DailyOrderRollup.order_count)))
+        balance = await session.scalar(
+            select(func.sum(CustomerBalanceLedger.unpaid_order_amount))
+        )
+        assert count == 500
+        assert rollup == 500
+        assert balance == sum(order.total_amount for order in result.created)
@@ -0,0 +1,191 @@
+"""
+Unit tests for streaming PGP building blocks
+"""
+
+import io
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.services.banking_service import BankingService
+from app.services.encryption import PGPHandler
+from app.services.encryption.pgp_stream import (
+    ARMOR_LINE_BYTES,
+    END_MESSAGE,
+    FallbackDecryptor,
+    FallbackEncryptor,
+    FallbackSigner,
+    GPGPipeWriter,
+    SigningWriter,
+    SniffingWriter,
+    copy_stream,
+)
+from app.services.sftp_pool import LocalSFTPClient
+
+
+class ChunkRecorder(io.BytesIO):
+    """Destination remembering how much each write carried"""
+
+    def __init__(self):
+        super().__init__()
+        self.sizes = []
+
+    def write(self, data):
+        self.sizes.append(len(data))
+        return super().write(data)
+
+
+def payment_file(records=5000):
+    return b"".join(b"D%06d" % n + "王小明".encode("big5").ljust(193) + b"\r\n" for n in range(records))
+
+
+class TestFallbackFormat:
+    """Test the built-in AES256-CBC message format"""
+
+    def test_round_trip_with_arbitrary_chunks(self):
+        plain = payment_file()
+        encrypted = io.BytesIO()
+
+        encryptor = FallbackEncryptor(encrypted, "ctbc")
+        for start in range(0, len(plain), 1000):
+            encryptor.write(plain[start : start + 1000])
+        encryptor.close()
+
+        message = encrypted.getvalue()
+        assert message.startswith(b"-----BEGIN PGP MESSAGE-----\nVersion: LuckyGas PGP 1.0")
+        assert message.endswith(END_MESSAGE + b"\n")
+        assert plain not in message
+
+        decrypted = io.BytesIO()
+        decryptor = FallbackDecryptor(decrypted)
+        for start in range(0, len(message), 777):
+            decryptor.write(message[start : start + 777])
+        decryptor.close()
+
+        assert decrypted.getvalue() == plain
+
+    def test_ciphertext_is_written_while_encrypting(self):
+        destination = ChunkRecorder()
+        encryptor = FallbackEncryptor(destination, "ctbc")
+
+        for _ in range(100):
+            encryptor.write(b"x" * 200)
+        encryptor.close()
+
+        # Armored lines go out as records arrive, never the whole file at once
+        assert len(destination.sizes) > 50
+        assert max(destination.sizes) < 1000
+        body = destination.getvalue().split(b"\n\n", 1)[1].splitlines()
+        assert len(body[0]) == ARMOR_LINE_BYTES * 4 // 3
+
+    def test_truncated_message_is_rejected(self):
+        encrypted = io.BytesIO()
+        encryptor = FallbackEncryptor(encrypted, "ctbc")
+        encryptor.write(b"payment data")
+        encryptor.close()
+
+        decryptor = FallbackDecryptor(io.BytesIO())
+        decryptor.write(encrypted.getvalue()[:-40])
+
+        with pytest.raises(ValueError, match="truncated"):
+            decryptor.close()
+
+
+class TestStreamWriters:
+    """Test the pipe, sniffing and signing writers"""
+
+    def test_pipe_feeds_the_call_while_writing(self):
+        seen = []
+
+        def call(source):
+            for chunk in iter(lambda: source.read(4096), b""):
+                seen.append(len(chunk))
+            return sum(seen)
+
+        writer = GPGPipeWriter(call)
+        plain = payment_file(2000)
+        copied = copy_stream(io.BytesIO(plain), writer, chunk_size=8192)
+
+        assert writer.close() == copied == len(plain)
+        assert len(seen) > 1
+
+    def test_pipe_reports_the_call_error(self):
+        def call(source):
+            source.read(10)
+            raise ValueError("Encryption failed: no valid recipients")
+
+        writer = GPGPipeWriter(call)
+
+        with pytest.raises(ValueError, match="no valid recipients"):
+            for _ in range(1000):
+                writer.write(b"x" * 65536)
+            writer.close()
+
+    def test_sniffing_writer_chooses_from_the_first_bytes(self):
+        destination = io.BytesIO()
+        heads = []
+
+        def choose(head):
+            heads.append(head)
+            return SigningWriter(destination, FallbackSigner(b""))
+
+        writer = SniffingWriter(choose, sniff_size=8)
+        for chunk in (b"-----", b"BEGIN", b" rest"):
+            writer.write(chunk)
+        writer.close()
+
+        assert heads == [b"-----BEGIN"]
+        assert destination.getvalue() == b"-----BEGIN rest"
+
+    def test_signature_matches_signing_in_one_piece(self):
+        plain = payment_file(100)
+        destination = io.BytesIO()
+
+        writer = SigningWriter(destination, FallbackSigner(b"private key"))
+        copy_stream(io.BytesIO(plain), writer, chunk_size=1000)
+        writer.close()
+
+        whole = FallbackSigner(b"private key")
+        whole.write(plain)
+        assert writer.signature == whole.close()
+        assert destination.getvalue() == plain
+
+
+class TestPGPHandlerStreams:
+    """Test encryption between the file generator and the SFTP upload"""
+
+    def test_encrypted_upload_round_trip(self, tmp_path):
+        plain = payment_file()
+        pgp = PGPHandler()
+        bank_config = Mock(bank_code="ctbc", upload_path="/upload/")
+        banking_service = BankingService(Mock(spec=Session))
+        sftp = LocalSFTPClient(str(tmp_path))
+
+        def write_encrypted(remote_file):
+            with pgp.encrypting_writer(remote_file, "ctbc") as plaintext:
+                copy_stream(io.BytesIO(plain), plaintext, chunk_size=4096)
+
+        with patch.object(banking_service, "get_sftp_client") as mock_get_sftp:
+            mock_get_sftp.return_value.__enter__.return_value = sftp
+            upload = banking_service.upload_stream(
+                bank_config, "PAY.txt.pgp", write_encrypted
+            )
+
+        uploaded = (tmp_path / "upload" / "PAY.txt.pgp").read_bytes()
+        assert upload["size"] == len(uploaded)
+        assert plain not in uploaded
+
+        # Decrypted while downloading
+        decrypted = io.BytesIO()
+        with pgp.decrypting_writer(decrypted) as ciphertext:
+            sftp.getfo("/upload/PAY.txt.pgp", ciphertext)
+
+        assert decrypted.getvalue() == plain
+
+    def test_bytes_api_matches_the_streams(self):
+        pgp = PGPHandler()
+        plain = payment_file(10)
+
+        assert pgp.decrypt(pgp.encrypt(plain, "ctbc")) == plain
+        assert pgp.sign(plain) == pgp.sign_stream(io.BytesIO(plain))
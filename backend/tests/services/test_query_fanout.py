@@ -0,0 +1,75 @@
+"""
+Unit tests for concurrent analytics query fanout
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import Mock
+
+import pytest
+
+from app.core.service_utils import QueryFanout
+
+
+def make_concurrent_fanout(max_concurrency: int) -> QueryFanout:
+    """Fanout whose sessions come from a fake factory instead of an engine"""
+    fanout = QueryFanout(Mock(bind=None), max_concurrency=max_concurrency)
+
+    @asynccontextmanager
+    async def session_factory():
+        yield Mock(name="pooled_session")
+
+    fanout._session_factory = session_factory
+    return fanout
+
+
+class TestQueryFanout:
+    """Test query fanout scheduling"""
+
+    async def test_falls_back_to_request_session_without_engine(self):
+        db = Mock(bind=None)
+        fanout = QueryFanout(db)
+
+        async def query(session):
+            return session
+
+        results = await fanout.run(query, query)
+
+        assert not fanout.concurrent
+        assert results == [db, db]
+
+    async def test_runs_queries_concurrently_within_limit(self):
+        fanout = make_concurrent_fanout(max_concurrency=2)
+        in_flight = 0
+        peak = 0
+
+        async def query(session, value):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return value
+
+        results = await fanout.run(
+            *[lambda session, value=value: query(session, value) for value in range(5)]
+        )
+
+        assert results == [0, 1, 2, 3, 4]
+        assert peak == 2
+
+    async def test_failure_cancels_sibling_queries(self):
+        fanout = make_concurrent_fanout(max_concurrency=2)
+        finished = []
+
+        async def slow(session):
+            await asyncio.sleep(1)
+            finished.append("slow")
+
+        async def failing(session):
+            raise ValueError("查詢失敗")
+
+        with pytest.raises(ValueError):
+            await fanout.run(slow, failing)
+
+        assert finished == []
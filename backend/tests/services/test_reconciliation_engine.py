@@ -0,0 +1,163 @@
+"""
+Unit tests for set-based bank reconciliation
+"""
+
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401 - register all tables
+from app.core.database import Base
+from app.models.banking import PaymentBatch, PaymentTransaction, TransactionStatus
+from app.models.invoice import Invoice, InvoicePaymentStatus
+from app.services.reconciliation_engine import ReconciliationLines, reconcile_lines
+
+PROCESSED = datetime(2024, 1, 15, 10, 30)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            Base.metadata.tables[name]
+            for name in ("payment_batches", "invoices", "payment_transactions")
+        ],
+    )
+    yield engine
+    engine.dispose()
+
+
+def seed(engine, count):
+    with Session(engine) as db:
+        db.execute(
+            insert(PaymentBatch),
+            [
+                {
+                    "id": 1,
+                    "batch_number": "B20240115",
+                    "bank_code": "CTBC",
+                    "file_name": "PAY_20240115.txt",
+                    "file_format": "fixed_width",
+                    "processing_date": PROCESSED,
+                }
+            ],
+        )
+        db.execute(
+            insert(Invoice),
+            [
+                {
+                    "id": n,
+                    "invoice_number": f"AB{n:08d}",
+                    "invoice_track": "AB",
+                    "invoice_no": f"{n:08d}",
+                    "customer_id": 1,
+                    "invoice_date": date(2024, 1, 1),
+                    "period": "202401",
+                    "payment_status": InvoicePaymentStatus.PENDING,
+                }
+                for n in range(1, count + 1)
+            ],
+        )
+        db.execute(
+            insert(PaymentTransaction),
+            [
+                {
+                    "id": n,
+                    "batch_id": 1,
+                    "transaction_id": f"TX{n:08d}",
+                    "customer_id": 1,
+                    "invoice_id": n,
+                    "account_number": "1234567890",
+                    "account_holder": "王小明",
+                    "amount": 1200,
+                    "status": TransactionStatus.PENDING,
+                    "scheduled_date": PROCESSED,
+                }
+                for n in range(1, count + 1)
+            ],
+        )
+        db.commit()
+
+
+def line(n, success=True):
+    return {
+        "transaction_id": f"TX{n:08d}",
+        "bank_reference": f"REF{n}",
+        "response_code": "000" if success else "051",
+        "response_message": "成功" if success else "餘額不足",
+        "processed_date": PROCESSED,
+        "success": success,
+    }
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    return statements
+
+
+class TestReconcileLines:
+    """Test matching and the bulk writes"""
+
+    def test_results_are_applied(self, engine):
+        seed(engine, 3)
+        lines = ReconciliationLines.from_results(
+            [line(1), line(2, success=False), line(99)]
+        )
+
+        with Session(engine) as db:
+            outcome = reconcile_lines(db, lines)
+            db.commit()
+
+            transactions = {
+                t.transaction_id: t for t in db.scalars(select(PaymentTransaction))
+            }
+            invoices = {i.id: i for i in db.scalars(select(Invoice))}
+
+        assert (outcome.matched, outcome.failed, outcome.unmatched) == ([0], [1], [2])
+        assert outcome.batch_id == 1
+        assert transactions["TX00000001"].status == TransactionStatus.SUCCESS
+        assert transactions["TX00000001"].bank_reference == "REF1"
+        assert transactions["TX00000002"].status == TransactionStatus.FAILED
+        assert transactions["TX00000002"].bank_response_message == "餘額不足"
+        assert transactions["TX00000003"].status == TransactionStatus.PENDING
+        assert invoices[1].payment_status == InvoicePaymentStatus.PAID
+        assert invoices[1].paid_date == date(2024, 1, 15)
+        assert invoices[2].payment_status == InvoicePaymentStatus.PENDING
+
+    def test_last_line_of_a_transaction_wins(self, engine):
+        seed(engine, 1)
+        lines = ReconciliationLines.from_results([line(1), line(1, success=False)])
+
+        with Session(engine) as db:
+            outcome = reconcile_lines(db, lines)
+            db.commit()
+            transaction = db.scalar(select(PaymentTransaction))
+            invoice = db.scalar(select(Invoice))
+
+        assert transaction.status == TransactionStatus.FAILED
+        assert invoice.payment_status == InvoicePaymentStatus.PENDING
+        assert outcome.invoices_paid == 0
+
+    def test_statements_do_not_grow_with_lines(self, engine):
+        seed(engine, 3000)
+        lines = ReconciliationLines.from_results(
+            [line(n, success=n % 10 != 0) for n in range(1, 3001)]
+        )
+        statements = count_statements(engine)
+
+        with Session(engine) as db:
+            outcome = reconcile_lines(db, lines)
+            db.commit()
+
+        # Lookup, success and failure updates, invoices
+        assert len(statements) == 4
+        assert (len(outcome.matched), len(outcome.failed)) == (2700, 300)
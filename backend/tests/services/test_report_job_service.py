@@ -0,0 +1,180 @@
+"""
+Unit tests for background report jobs
+"""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from app.services.analytics_service import AnalyticsService
+from app.services.report_job_service import (
+    ReportArtifactStore,
+    ReportJobQueue,
+    ReportJobStatus,
+)
+
+REPORT_DATA = {
+    "revenue": {
+        "total": 12000,
+        "trends": [{"date": "2025-05-01", "revenue": 5000}, {"date": "2025-05-02", "revenue": 7000}],
+    },
+    "orders": {"count": 3, "statuses": ["pending", "delivered"]},
+    "snapshotAt": "2025-05-03T00:00:00",
+}
+
+START = datetime(2025, 5, 1)
+END = datetime(2025, 5, 2, 23, 59, 59)
+
+
+async def no_session():
+    yield None
+
+
+@pytest.fixture
+def notifications():
+    return []
+
+
+@pytest.fixture
+def queue(tmp_path, notifications):
+    async def notify(user_id, message):
+        notifications.append((user_id, message["type"]))
+
+    async def email(address, job):
+        notifications.append((address, "email"))
+
+    return ReportJobQueue(
+        store=ReportArtifactStore(tmp_path),
+        session_factory=no_session,
+        notify=notify,
+        email=email,
+    )
+
+
+class TestReportJobQueue:
+    """Test queuing, deduplication and artifact reuse"""
+
+    async def test_duplicate_requests_share_one_build(self, queue, notifications):
+        calls = []
+
+        async def collect(self, report_type, start_date, end_date):
+            calls.append(report_type)
+            await asyncio.sleep(0)
+            return REPORT_DATA
+
+        with patch.object(AnalyticsService, "collect_report_data", collect):
+            first = await queue.submit("executive", "csv", START, END, "1")
+            second = await queue.submit(
+                "executive", "csv", START, END, "2", email="boss@example.com"
+            )
+            await queue.join()
+        await queue.stop()
+
+        assert second is first
+        assert calls == ["executive"]
+        assert first.status == ReportJobStatus.COMPLETED
+        assert queue.artifact_path(first.job_id).exists()
+        assert ("2", "report.ready") in notifications
+        assert ("boss@example.com", "email") in notifications
+
+    async def test_finished_report_served_from_artifact(self, queue, tmp_path):
+        with patch.object(
+            AnalyticsService, "collect_report_data", return_value=REPORT_DATA
+        ) as collect:
+            job = await queue.submit("executive", "excel", START, END, "1")
+            await queue.join()
+
+            # A new instance only sees the stored artifact
+            other = ReportJobQueue(
+                store=ReportArtifactStore(tmp_path),
+                session_factory=no_session,
+                notify=queue.notify,
+            )
+            reused = await other.submit("executive", "excel", START, END, "3")
+        await queue.stop()
+
+        assert collect.call_count == 1
+        assert reused.job_id == job.job_id
+        assert reused.status == ReportJobStatus.COMPLETED
+        assert other._queue is None
+
+    async def test_only_requesters_can_access_a_job(self, queue):
+        with patch.object(
+            AnalyticsService, "collect_report_data", return_value=REPORT_DATA
+        ):
+            job = await queue.submit("executive", "csv", START, END, "1")
+            await queue.join()
+            # A later request rebuilds nothing and keeps the first requester
+            await queue.submit("executive", "csv", START, END, "2")
+        await queue.stop()
+
+        assert queue.can_access(job.job_id, "1")
+        assert queue.can_access(job.job_id, "2")
+        assert not queue.can_access(job.job_id, "3")
+        assert not queue.can_access("unknown", "1")
+
+    async def test_failed_build_leaves_no_artifact(self, queue, tmp_path, notifications):
+        with patch.object(
+            AnalyticsService, "collect_report_data", side_effect=RuntimeError("db down")
+        ):
+            job = await queue.submit("financial", "csv", START, END, "1")
+            await queue.join()
+        await queue.stop()
+
+        assert job.status == ReportJobStatus.FAILED
+        assert job.error == "db down"
+        assert list(tmp_path.iterdir()) == []
+        assert ("1", "report.failed") in notifications
+
+    async def test_unsupported_format_rejected(self, queue):
+        with pytest.raises(ValueError):
+            await queue.submit("executive", "pdf", START, END, "1")
+
+
+class TestRenderReport:
+    """Test report file rendering"""
+
+    def test_report_tables_split_records_from_metrics(self):
+        tables = AnalyticsService._report_tables(REPORT_DATA)
+
+        assert list(tables) == ["摘要", "revenue.trends"]
+        assert tables["摘要"]["指標"].tolist() == [
+            "revenue.total",
+            "orders.count",
+            "orders.statuses",
+            "snapshotAt",
+        ]
+        assert tables["revenue.trends"]["revenue"].tolist() == [5000, 7000]
+
+    def test_excel_has_sheet_per_table(self, tmp_path):
+        path = tmp_path / "report.xlsx"
+        tables = AnalyticsService._report_tables(REPORT_DATA)
+
+        AnalyticsService._write_excel_report(tables, path)
+
+        workbook = load_workbook(path)
+        assert workbook.sheetnames == ["摘要", "revenue.trends"]
+        assert pd.read_excel(path, sheet_name="摘要").shape == (4, 2)
+
+    async def test_stop_cancels_a_running_build(self, queue, tmp_path):
+        rendering = asyncio.Event()
+
+        async def render(self, data, report_type, format, path):
+            path.write_bytes(b"partial")
+            rendering.set()
+            await asyncio.Event().wait()
+
+        with patch.object(
+            AnalyticsService, "collect_report_data", return_value=REPORT_DATA
+        ), patch.object(AnalyticsService, "render_report", render):
+            job = await queue.submit("financial", "csv", START, END, "1")
+            await rendering.wait()
+            await queue.stop()
+
+        assert job.status == ReportJobStatus.RUNNING
+        assert queue._workers == []
+        assert list(tmp_path.iterdir()) == []
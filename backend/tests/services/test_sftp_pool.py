@@ -0,0 +1,179 @@
+"""
+Unit tests for the per-bank SFTP session pool
+"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.services.sftp_pool import (
+    LocalSFTPClient,
+    LocalSFTPFile,
+    LocalTransport,
+    SFTPSessionPool,
+    close_bank_sftp_pools,
+    download_files,
+    get_bank_sftp_pool,
+)
+
+
+class RecordingSFTPClient(LocalSFTPClient):
+    """Local stand-in recording the order of file operations"""
+
+    def __init__(self, root, calls):
+        super().__init__(root)
+        self.calls = calls
+        self.broken = False
+
+    def stat(self, path):
+        if self.broken:
+            raise EOFError("connection lost")
+        return super().stat(path)
+
+    def open(self, path, mode="r"):
+        self.calls.append(("open", path))
+        calls = self.calls
+
+        class RecordingFile(LocalSFTPFile):
+            def prefetch(self, file_size=None, max_concurrent_requests=None):
+                calls.append(("prefetch", path))
+
+            def read(self, size=-1):
+                calls.append(("read", path))
+                return super().read(size)
+
+        return RecordingFile(self._path(path), mode)
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "download").mkdir()
+    for day in range(1, 6):
+        (tmp_path / "download" / f"REC_2024010{day}.txt").write_text(f"D{day:06d}")
+    return tmp_path
+
+
+@pytest.fixture
+def connections(server):
+    opened = []
+
+    def connect():
+        sftp = RecordingSFTPClient(str(server), [])
+        opened.append((LocalTransport(), sftp))
+        return opened[-1]
+
+    connect.opened = opened
+    return connect
+
+
+class TestSFTPSessionPool:
+    """Test session reuse, health checks and pipelined downloads"""
+
+    def test_operations_reuse_one_session(self, connections):
+        pool = SFTPSessionPool("CTBC", connections, max_size=2)
+
+        for _ in range(5):
+            with pool.session() as sftp:
+                sftp.listdir("/download")
+
+        assert len(connections.opened) == 1
+        assert pool.open_sessions == 1
+
+    def test_dead_and_unhealthy_sessions_are_replaced(self, connections):
+        pool = SFTPSessionPool("CTBC", connections, health_check_after=0)
+
+        with pool.session():
+            pass
+        # Transport dropped while idle
+        connections.opened[0][0].close()
+        with pool.session():
+            pass
+        # Transport up but the server no longer answers
+        connections.opened[1][1].broken = True
+        with pool.session() as sftp:
+            assert sftp is connections.opened[2][1]
+
+        assert len(connections.opened) == 3
+        assert pool.open_sessions == 1
+
+    def test_session_failing_mid_operation_is_discarded(self, connections):
+        pool = SFTPSessionPool("CTBC", connections)
+
+        with pytest.raises(EOFError):
+            with pool.session():
+                raise EOFError("connection lost")
+        with pool.session() as sftp:
+            assert sftp is connections.opened[1][1]
+
+        assert not connections.opened[0][0].is_active()
+        assert pool.open_sessions == 1
+
+    def test_download_prefetches_a_window_before_reading(self, connections):
+        pool = SFTPSessionPool("CTBC", connections)
+        paths = [f"/download/REC_2024010{day}.txt" for day in range(1, 6)]
+
+        contents = pool.download_many(paths, window=3)
+
+        assert contents[paths[4]] == b"D000005"
+        calls = connections.opened[0][1].calls
+        first_window = calls[: calls.index(("read", paths[0]))]
+        # All files of the window are requested before the first is read
+        assert [call for call in first_window if call[0] == "prefetch"] == [
+            ("prefetch", path) for path in paths[:3]
+        ]
+        assert len(connections.opened) == 1
+
+    def test_unreadable_file_is_reported_not_raised(self, server):
+        (server / "download" / "REC_20240106.txt").mkdir()
+        sftp = LocalSFTPClient(str(server))
+        paths = [f"/download/REC_2024010{day}.txt" for day in (5, 6, 1)]
+        errors = {}
+
+        contents = download_files(sftp, paths, window=2, errors=errors)
+
+        assert list(contents) == [paths[0], paths[2]]
+        assert list(errors) == [paths[1]]
+        with pytest.raises(IsADirectoryError):
+            download_files(sftp, paths)
+
+
+class TestBankSFTPPools:
+    """Test the per-bank pool registry against the local stand-in"""
+
+    @pytest.fixture(autouse=True)
+    def local_root(self, server):
+        with patch("app.services.sftp_pool.settings.BANKING_SFTP_LOCAL_ROOT", str(server.parent)):
+            yield
+        close_bank_sftp_pools()
+
+    def bank(self, server, password="secret"):
+        return SimpleNamespace(
+            bank_code=server.name,
+            sftp_host="sftp.bank.test",
+            sftp_port=22,
+            sftp_username="luckygas",
+            sftp_password=password,
+            sftp_private_key=None,
+        )
+
+    def test_pool_is_shared_until_credentials_change(self, server):
+        pool = get_bank_sftp_pool(self.bank(server))
+
+        with pool.session() as sftp:
+            assert sftp.listdir("/download")[0] == "REC_20240101.txt"
+
+        assert get_bank_sftp_pool(self.bank(server)) is pool
+        rotated = get_bank_sftp_pool(self.bank(server, password="rotated"))
+        assert rotated is not pool
+        # Idle sessions of the replaced pool were closed
+        assert pool.open_sessions == 0
+
+    def test_sessions_in_use_are_closed_when_their_pool_is_replaced(self, server):
+        pool = get_bank_sftp_pool(self.bank(server))
+
+        with pool.session():
+            get_bank_sftp_pool(self.bank(server, password="rotated"))
+            assert pool.open_sessions == 1
+
+        assert pool.open_sessions == 0
@@ -0,0 +1,237 @@
+"""
+Unit tests for bulk SMS dispatch
+"""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.notification import (
+    NotificationStatus,
+    ProviderConfig,
+    SMSLog,
+    SMSProvider,
+    SMSTemplate,
+)
+from app.services.sms_service import (
+    EnhancedSMSService,
+    MitakeProvider,
+    SMSProviderBase,
+    TokenBucket,
+)
+from app.services.template_registry import SMSTemplateRegistry
+
+TABLES = ("sms_logs", "sms_templates", "provider_configs")
+
+
+class BatchProvider(SMSProviderBase):
+    """Provider with a multi-recipient endpoint that rejects one number"""
+
+    max_batch_size = 500
+    requests = []
+
+    async def send_batch(self, messages):
+        self.requests.append(messages)
+        return [
+            {"success": False, "error": "Invalid recipient"}
+            if phone == "0900000000"
+            else {"success": True, "message_id": f"M{phone}", "segments": 1}
+            for phone, message in messages
+        ]
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the code under test sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self._text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def text(self):
+        return self._text
+
+
+@pytest.fixture(autouse=True)
+async def seed(engine):
+    async with AsyncSession(engine) as session:
+        session.add(
+            ProviderConfig(
+                provider=SMSProvider.MITAKE,
+                config={},
+                priority=10,
+                total_sent=0,
+                total_failed=0,
+                cost_per_message=0.8,
+            )
+        )
+        session.add(
+            SMSTemplate(
+                code="price_change",
+                name="價格調整",
+                content="【幸福氣】{name}您好，20公斤桶裝瓦斯自下月起調整為{price}元",
+                sent_count=0,
+            )
+        )
+        await session.commit()
+
+
+@pytest.fixture
+def service():
+    with patch.object(
+        EnhancedSMSService, "_init_metrics", lambda self: setattr(self, "metrics", None)
+    ):
+        service = EnhancedSMSService()
+    service.providers[SMSProvider.MITAKE] = BatchProvider
+    BatchProvider.requests = []
+    with patch.object(service, "_monitor_provider_health", new=AsyncMock()):
+        yield service
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    registry = SMSTemplateRegistry()
+    with patch("app.services.sms_service.sms_template_registry", registry):
+        yield registry
+
+
+def recipients(count):
+    return [
+        {"phone": f"09{i:08d}", "data": {"name": f"客戶{i}", "price": 850}}
+        for i in range(count)
+    ]
+
+
+class TestBulkDispatch:
+    """Test the bulk send pipeline"""
+
+    async def test_batches_logs_and_stats(self, engine, service, registry):
+        statements = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        async with AsyncSession(engine) as db:
+            result = await service.send_bulk_sms(
+                recipients(1200), "price_change", template_code="price_change", db=db
+            )
+
+        assert result["success"] == 1199
+        assert result["failed"] == 1
+        assert result["errors"] == [
+            {"index": 0, "recipient": "0900000000", "error": "Invalid recipient"}
+        ]
+        # 500 + 500 + 200 recipients per provider request
+        assert [len(request) for request in BatchProvider.requests] == [500, 500, 200]
+        assert BatchProvider.requests[0][1][1].startswith("【幸福氣】客戶1您好")
+        # Statements do not grow with the number of recipients
+        assert len(statements) < 10
+
+        async with AsyncSession(engine) as db:
+            # Template sent counts are buffered until flushed
+            await registry.flush_stats(db)
+            await db.commit()
+            sent = await db.scalar(
+                select(func.count()).where(SMSLog.status == NotificationStatus.SENT)
+            )
+            config = await db.scalar(select(ProviderConfig))
+            template = await db.scalar(select(SMSTemplate))
+            log = await db.scalar(select(SMSLog).where(SMSLog.recipient == "0900000001"))
+        assert sent == 1199
+        assert (config.total_sent, config.total_failed) == (1199, 1)
+        assert template.sent_count == 1200
+        assert log.cost == 0.8
+
+    async def test_own_session_is_closed(self, engine, service):
+        closed = []
+
+        async def get_async_session():
+            async with AsyncSession(engine) as session:
+                try:
+                    yield session
+                finally:
+                    closed.append(session)
+
+        with patch("app.services.sms_service.get_async_session", get_async_session):
+            result = await service.send_bulk_sms(
+                recipients(3), "price_change", template_code="price_change"
+            )
+
+        assert (result["success"], result["failed"]) == (2, 1)
+        assert len(closed) == 1
+        async with AsyncSession(engine) as db:
+            assert await db.scalar(select(func.count()).select_from(SMSLog)) == 3
+
+    async def test_template_errors_are_not_sent(self, engine, service):
+        async with AsyncSession(engine) as db:
+            result = await service.send_bulk_sms(
+                [{"phone": "0912345678", "data": {"name": "王先生"}}],
+                "price_change",
+                template_code="price_change",
+                db=db,
+            )
+
+        assert result["failed"] == 1
+        assert "Template error" in result["errors"][0]["error"]
+        assert BatchProvider.requests == []
+
+
+class TestMitakeBatch:
+    """Test the SmBulkSend request and response"""
+
+    async def test_one_request_with_per_message_status(self):
+        provider = MitakeProvider({"username": "u", "password": "p"})
+        response = FakeResponse(
+            "[0]\nmsgid=A1\nstatuscode=1\n[1]\nstatuscode=e\nError=Invalid\n[2]\nmsgid=A3\nstatuscode=0\nAccountPoint=97"
+        )
+
+        with patch("aiohttp.ClientSession.post", return_value=response) as post:
+            results = await provider.send_batch(
+                [("+886912345678", "甲"), ("0911", "乙"), ("922222222", "第一行\n第二行")]
+            )
+
+        post.assert_called_once()
+        body = post.call_args.kwargs["data"].decode("utf-8").split("\r\n")
+        assert body[0] == "0$$0912345678$$$$$$$$$$甲"
+        assert body[2].endswith("第一行\x06第二行")
+        assert [r["success"] for r in results] == [True, False, True]
+        assert results[0]["message_id"] == "A1"
+        assert results[1]["error"] == "Invalid"
+
+
+class TestTokenBucket:
+    """Test pacing"""
+
+    async def test_waits_only_for_refill(self):
+        clock = FakeClock()
+        with patch("app.services.sms_service.time", clock), patch(
+            "app.services.sms_service.asyncio.sleep", clock.sleep
+        ):
+            bucket = TokenBucket(rate=100, capacity=10)
+            await bucket.acquire(10)  # full bucket: no wait
+            assert clock.sleeps == []
+
+            await bucket.acquire(5)  # 5 tokens at 100 / s
+
+        assert clock.sleeps == [pytest.approx(0.05)]
@@ -0,0 +1,161 @@
+"""
+Unit tests for the compiled notification template registry
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from jinja2 import DictLoader, Environment
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import app.models  # noqa: F401 - register all tables
+from app.core.database import Base
+from app.models.notification import SMSTemplate
+from app.services.template_registry import (
+    EmailTemplateCache,
+    SMSTemplateGroup,
+    SMSTemplateRegistry,
+)
+
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: Base.metadata.create_all(
+                sync_conn, tables=[Base.metadata.tables["sms_templates"]]
+            )
+        )
+    async with AsyncSession(engine) as session:
+        for code, variant, weight in (("reminder", "A", 75), ("reminder_b", "B", 25)):
+            session.add(
+                SMSTemplate(
+                    code=code,
+                    name="付款提醒",
+                    content=f"【幸福氣】{variant}：訂單 {{order_number}} 尚有 NT${{amount}} 待付款",
+                    variant=variant,
+                    weight=weight,
+                    sent_count=0,
+                    delivered_count=0,
+                )
+            )
+        await session.commit()
+    yield engine
+    await engine.dispose()
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    return statements
+
+
+class TestSMSTemplateRegistry:
+    """Test caching, invalidation and buffered statistics"""
+
+    async def test_templates_are_loaded_once(self, engine):
+        registry = SMSTemplateRegistry()
+        statements = count_statements(engine)
+
+        async with AsyncSession(engine) as db:
+            for _ in range(100):
+                group = await registry.get("reminder", db)
+                message = group.pick().render({"order_number": "ORD-1", "amount": 1200})
+
+        assert message == "【幸福氣】A：訂單 ORD-1 尚有 NT$1200 待付款"
+        # Version check and load, nothing per render
+        assert len(statements) == 2
+
+    async def test_edit_is_picked_up_after_invalidate(self, engine):
+        registry = SMSTemplateRegistry()
+        async with AsyncSession(engine) as db:
+            await registry.get("reminder", db)
+            await db.execute(
+                update(SMSTemplate)
+                .where(SMSTemplate.code == "reminder")
+                .values(
+                    content="【幸福氣】新版：{order_number}",
+                    updated_at=datetime.now() + timedelta(minutes=1),
+                )
+            )
+            await db.commit()
+
+            # Cached until the version is checked again
+            stale = (await registry.get("reminder", db)).pick()
+            registry.invalidate()
+            fresh = (await registry.get("reminder", db)).pick()
+
+        assert stale.content.startswith("【幸福氣】A")
+        assert fresh.render({"order_number": "ORD-1"}) == "【幸福氣】新版：ORD-1"
+
+    async def test_stats_are_buffered_and_flushed_per_template(self, engine):
+        registry = SMSTemplateRegistry()
+        async with AsyncSession(engine) as db:
+            template = (await registry.get("reminder", db)).pick()
+            for _ in range(50):
+                registry.record_sent(template)
+            for _ in range(40):
+                registry.record_delivered("reminder")
+
+            statements = count_statements(engine)
+            await registry.flush_stats(db)
+            await db.commit()
+            # Nothing left to write
+            await registry.flush_stats(db)
+            writes = len(statements)
+
+            stored = await db.scalar(select(SMSTemplate).where(SMSTemplate.code == "reminder"))
+
+        assert writes == 2
+        assert (stored.sent_count, stored.delivered_count) == (50, 40)
+        assert stored.effectiveness_score == pytest.approx(0.8)
+
+    async def test_missing_fields_are_reported_by_name(self, engine):
+        registry = SMSTemplateRegistry()
+        async with AsyncSession(engine) as db:
+            template = (await registry.get("reminder", db)).pick()
+
+        assert template.fields == ("order_number", "amount")
+        with pytest.raises(ValueError, match=r"reminder \(A\) is missing fields: amount"):
+            template.render({"order_number": "ORD-1"})
+
+    def test_variants_follow_weights(self):
+        group = SMSTemplateGroup("promo", ["A", "B"], [75, 25])
+        rng = random.Random(7)
+
+        picks = [group.pick(rng) for _ in range(4000)]
+
+        assert picks.count("A") / len(picks) == pytest.approx(0.75, abs=0.03)
+
+
+class TestEmailTemplateCache:
+    """Test compiled email template lookup"""
+
+    def test_lookup_happens_once_per_type(self):
+        loads = []
+
+        class CountingLoader(DictLoader):
+            def get_source(self, environment, template):
+                loads.append(template)
+                return super().get_source(environment, template)
+
+        env = Environment(
+            loader=CountingLoader({"order_confirmation.html": "訂單 {{ order_number }}"}),
+            auto_reload=False,
+        )
+        cache = EmailTemplateCache(env, "<h2>{{ subject }}</h2>")
+
+        for _ in range(3):
+            confirmation = cache.get("order_confirmation").render(order_number="ORD-1")
+            fallback = cache.get("system_alert").render(subject="幸福氣 - 系統通知")
+
+        assert confirmation == "訂單 ORD-1"
+        assert fallback == "<h2>幸福氣 - 系統通知</h2>"
+        assert loads == ["order_confirmation.html", "system_alert.html"]
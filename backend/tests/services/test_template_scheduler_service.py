@@ -0,0 +1,170 @@
+"""
+Unit tests for the recurring order template scheduler
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Customer
+from app.models.gas_product import DeliveryMethod, GasProduct, ProductAttribute
+from app.models.order import Order
+from app.models.order_template import OrderTemplate
+from app.services.template_scheduler_service import (
+    TemplateScheduler,
+    next_occurrence,
+    schedule_template,
+)
+from tests.services.conftest import ORDER_TABLES
+
+TABLES = ORDER_TABLES + ("gas_products", "order_templates")
+
+pytestmark = pytest.mark.usefixtures("order_events")
+
+NOW = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture(autouse=True)
+async def seed(engine):
+    async with AsyncSession(engine) as session:
+        session.add(Customer(customer_code="C1", short_name="王記", address="台北市信義路五段"))
+        session.add(
+            GasProduct(
+                delivery_method=DeliveryMethod.CYLINDER,
+                size_kg=20,
+                attribute=ProductAttribute.REGULAR,
+                sku="CYL-20",
+                name_zh="20公斤桶裝",
+                unit_price=1200,
+            )
+        )
+        await session.commit()
+
+
+def scheduler(engine, batch_size=200):
+    async def session_factory():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    return TemplateScheduler(session_factory, batch_size=batch_size)
+
+
+async def add_templates(engine, delivery_dates, prefix="C1_TPL"):
+    async with AsyncSession(engine) as session:
+        for number, delivery_date in enumerate(delivery_dates):
+            template = OrderTemplate(
+                template_name="每日配送",
+                template_code=f"{prefix}_{number:03d}",
+                customer_id=1,
+                products=[{"gas_product_id": 1, "quantity": 2}],
+                is_recurring=True,
+                recurrence_pattern="daily",
+                recurrence_interval=1,
+            )
+            schedule_template(template, delivery_date)
+            session.add(template)
+        await session.commit()
+
+
+async def scalars(engine, query):
+    async with AsyncSession(engine) as session:
+        return (await session.execute(query)).scalars().all()
+
+
+class TestTemplateScheduler:
+    """Test claiming and materializing due templates"""
+
+    async def test_due_templates_create_orders_once(self, engine):
+        tomorrow = NOW + timedelta(days=1)
+        await add_templates(engine, [tomorrow, NOW + timedelta(days=3)])
+
+        stats = await scheduler(engine).run_due(NOW)
+        again = await scheduler(engine).run_due(NOW)
+
+        assert stats == {
+            "claimed": 1,
+            "created": 1,
+            "skipped": 0,
+            "rejected": 0,
+            "failed": 0,
+        }
+        assert again["claimed"] == 0
+        (order,) = await scalars(engine, select(Order))
+        assert order.qty_20kg == 2
+        assert order.scheduled_date.date() == tomorrow.date()
+
+        due, later = await scalars(engine, select(OrderTemplate).order_by(OrderTemplate.id))
+        assert due.times_used == 1
+        assert due.next_scheduled_date == tomorrow + timedelta(days=1)
+        assert due.next_run_at == tomorrow
+        assert later.times_used == 0
+
+    async def test_missed_occurrences_are_skipped(self, engine):
+        await add_templates(engine, [NOW - timedelta(days=3)])
+
+        stats = await scheduler(engine).run_due(NOW)
+
+        # 3 days ago .. yesterday skipped, today's delivery created
+        assert stats["skipped"] == 3
+        assert stats["created"] == 1
+        (order,) = await scalars(engine, select(Order))
+        assert order.scheduled_date.date() == NOW.date()
+
+    async def test_failing_template_does_not_block_its_batch(self, engine):
+        await add_templates(engine, [NOW + timedelta(days=1)] * 3)
+        async with AsyncSession(engine) as session:
+            broken = await session.get(OrderTemplate, 2)
+            broken.products = [{"gas_product_id": 1}]  # no quantity
+            await session.commit()
+
+        stats = await scheduler(engine).run_due(NOW)
+
+        assert stats["claimed"] == 3
+        assert stats["created"] == 2
+        assert stats["failed"] == 1
+        first, broken, third = await scalars(
+            engine, select(OrderTemplate).order_by(OrderTemplate.id)
+        )
+        assert first.times_used == third.times_used == 1
+        assert broken.times_used == 0
+        assert broken.failure_count == 1
+        assert "quantity" in broken.last_error
+        # Retried later, not on every sweep
+        assert broken.next_run_at == NOW + timedelta(minutes=15)
+        assert (await scheduler(engine).run_due(NOW))["claimed"] == 0
+
+    async def test_batches_scale_with_due_templates(self, engine):
+        await add_templates(engine, [NOW + timedelta(days=1)] * 30)
+        await add_templates(engine, [NOW + timedelta(days=5)] * 50, prefix="LATER")
+        statements = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        stats = await scheduler(engine, batch_size=10).run_due(NOW)
+
+        assert stats["claimed"] == 30
+        assert stats["created"] == 30
+        # Three full batches and a final empty claim
+        claims = [s for s in statements if s.startswith("SELECT order_templates")]
+        assert len(claims) == 4
+        # Round trips per batch do not depend on the batch size
+        assert len(statements) < 4 * 15
+
+
+class TestNextOccurrence:
+    """Test recurrence date arithmetic"""
+
+    def test_monthly_clamps_to_month_end(self):
+        assert next_occurrence("monthly", 1, base_date=datetime(2025, 1, 31)) == datetime(
+            2025, 2, 28
+        )
+
+    def test_weekly_uses_earliest_day_next_week(self):
+        # Friday → next Monday / Wednesday pattern
+        assert next_occurrence("weekly", 1, [3, 1], datetime(2025, 5, 2)) == datetime(
+            2025, 5, 5
+        )
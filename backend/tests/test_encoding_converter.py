@@ -3,6 +3,7 @@ Test cases for Big5 to UTF - 8 encoding converter
 """
 
 import sqlite3
+from unittest.mock import patch
 
 import pandas as pd
 import pytest
@@ -143,6 +144,69 @@ class TestBig5ToUTF8Converter:
         assert stats["success_rate"] == pytest.approx(66.67, rel=0.01)
 
 
+class TestColumnConversion:
+    """Test bulk column conversion."""
+
+    def test_detects_encoding_once_per_column(self):
+        converter = Big5ToUTF8Converter()
+        series = pd.Series(["李大明".encode("big5")] * 100 + [None])
+
+        with patch.object(
+            converter, "detect_encoding", wraps=converter.detect_encoding
+        ) as detect:
+            result, encoding = converter.convert_series(series, column="name")
+
+        assert detect.call_count == 1
+        assert encoding == "big5"
+        assert result[0] == "李大明"
+        assert pd.isna(result[100])
+        assert converter.conversion_stats["columns"]["name"] == {
+            "processed": 100,
+            "failed": 0,
+            "encoding": "big5",
+        }
+
+    def test_bad_cell_falls_back_alone(self):
+        converter = Big5ToUTF8Converter()
+        series = pd.Series(["台北市".encode("big5"), b"\xff\xfe", "0912345678"])
+
+        result, _ = converter.convert_series(series, source_encoding="big5")
+
+        assert result[0] == "台北市"
+        assert "\ufffd" in result[1]
+        assert result[2] == "0912345678"
+        assert converter.conversion_stats["successful"] == 2
+        assert converter.conversion_stats["failed"] == 1
+
+    def test_sqlite_table_streamed_in_chunks(self, tmp_path):
+        db_path = tmp_path / "legacy.db"
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("CREATE TABLE clients (id INTEGER, name BLOB)")
+        conn.executemany(
+            "INSERT INTO clients VALUES (?, ?)",
+            [(i, "陳小美".encode("big5")) for i in range(5)],
+        )
+        conn.commit()
+        conn.close()
+
+        converter = Big5ToUTF8Converter()
+        output_csv = tmp_path / "clients.csv"
+        chunks = list(
+            converter.iter_sqlite_table(str(db_path), "clients", ["name"], chunk_size=2)
+        )
+        result = converter.convert_sqlite_table(
+            str(db_path),
+            "clients",
+            ["name"],
+            output_path=str(output_csv),
+            chunk_size=2,
+            return_data=False,
+        )
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        assert result is None
+        assert pd.read_csv(output_csv)["name"].tolist() == ["陳小美"] * 5
+
 class TestTaiwanDataValidation:
     """Test Taiwan - specific data validation."""
 
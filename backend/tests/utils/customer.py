@@ -5,6 +5,7 @@ Customer test utilities
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.customer import Customer
+from app.models.customer_ledger import CustomerBalanceLedger
 
 
 async def create_test_customer(
@@ -23,16 +24,24 @@ async def create_test_customer(
         customer_code=customer_code,
         short_name=short_name,
         address=address,
-        credit_limit=credit_limit,
-        current_balance=current_balance,
-        is_credit_blocked=is_credit_blocked,
-        is_terminated=is_terminated,
+        is_active=not is_terminated,
         phone="0912345678",
         area="台北市",
         customer_type="商業",
         **kwargs,
     )
     db.add(customer)
+    await db.flush()
+
+    # Credit settings and balance live in the customer balance ledger
+    db.add(
+        CustomerBalanceLedger(
+            customer_id=customer.id,
+            credit_limit=credit_limit,
+            is_credit_blocked=is_credit_blocked,
+            unpaid_order_amount=current_balance,
+        )
+    )
     await db.commit()
     await db.refresh(customer)
     return customer